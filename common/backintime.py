@@ -33,7 +33,9 @@ import config
 import logger
 import snapshots
 import sshtools
+import sshMaxArg
 import mount
+import progress
 import password
 import encfstools
 import cli
@@ -253,7 +255,8 @@ def createParsers(app_name = 'backintime'):
     command = 'benchmark-cipher'
     nargs = '?'
     aliases.append((command, nargs))
-    description = 'Show a benchmark of all ciphers for ssh transfer.'
+    description = 'Benchmark rsync over ssh with all ciphers and ' +\
+                  'compressions and optionally use the fastest one.'
     benchmarkCipherCP =    subparsers.add_parser(command,
                                                  epilog = epilogCommon,
                                                  help = description,
@@ -265,7 +268,13 @@ def createParsers(app_name = 'backintime'):
                                                  action = 'store',
                                                  default = 40,
                                                  nargs = '?',
-                                                 help = 'File size used for benchmark.')
+                                                 help = 'Size of the test data in MiB.')
+    benchmarkCipherCP.add_argument              ('--json',
+                                                 action = 'store_true',
+                                                 help = 'Print results as JSON.')
+    benchmarkCipherCP.add_argument              ('--apply',
+                                                 action = 'store_true',
+                                                 help = 'Write the fastest cipher and compression into the profile.')
 
     command = 'check-config'
     description = 'Check the profiles configuration and install crontab entries.'
@@ -279,6 +288,22 @@ def createParsers(app_name = 'backintime'):
     checkConfigCP.set_defaults(func = checkConfig)
     parsers[command] = checkConfigCP
 
+    command = 'check-ssh-limits'
+    description = 'Probe the maximum length of commands run on the remote ' +\
+                  'host of SSH profiles.'
+    checkSshLimitsCP =     subparsers.add_parser(command,
+                                                 epilog = epilogCommon,
+                                                 help = description,
+                                                 description = description)
+    checkSshLimitsCP.add_argument               ('--all-profiles',
+                                                 action = 'store_true',
+                                                 help = 'Check all SSH profiles.')
+    checkSshLimitsCP.add_argument               ('--force',
+                                                 action = 'store_true',
+                                                 help = 'Probe again even if there is a cached result.')
+    checkSshLimitsCP.set_defaults(func = checkSshLimits)
+    parsers[command] = checkSshLimitsCP
+
     command = 'decode'
     nargs = '*'
     aliases.append((command, nargs))
@@ -427,6 +452,12 @@ def createParsers(app_name = 'backintime'):
                                                  epilog = epilogCommon,
                                                  help = description,
                                                  description = description)
+    smartRemoveCP.add_argument                  ('--dry-run',
+                                                 action = 'store_true',
+                                                 help = 'Show what would be removed but do not remove any snapshot.')
+    smartRemoveCP.add_argument                  ('--explain',
+                                                 action = 'store_true',
+                                                 help = 'List every snapshot with the rule that keeps or removes it.')
     smartRemoveCP.set_defaults(func = smartRemove)
     parsers[command] = smartRemoveCP
 
@@ -466,6 +497,28 @@ def createParsers(app_name = 'backintime'):
     snapshotsPathCP.set_defaults(func = snapshotsPath)
     parsers[command] = snapshotsPathCP
 
+    command = 'snapshots-size'
+    nargs = 0
+    description = 'Show the size of snapshots recorded when they were taken.'
+    snapshotsSizeCP =      subparsers.add_parser(command,
+                                                 parents = [snapshotPathParser],
+                                                 epilog = epilogCommon,
+                                                 help = description,
+                                                 description = description)
+    snapshotsSizeCP.set_defaults(func = snapshotsSize)
+    parsers[command] = snapshotsSizeCP
+
+    command = 'upgrade-fileinfo'
+    nargs = 0
+    description = 'Convert the permissions stored in snapshots taken with ' \
+                  'older versions into the new indexed format.'
+    upgradeFileInfoCP =    subparsers.add_parser(command,
+                                                 epilog = epilogCommon,
+                                                 help = description,
+                                                 description = description)
+    upgradeFileInfoCP.set_defaults(func = upgradeFileInfo)
+    parsers[command] = upgradeFileInfoCP
+
     command = 'unmount'
     nargs = 0
     aliases.append((command, nargs))
@@ -919,6 +972,55 @@ def snapshotsListPath(args):
         _umount(cfg)
     sys.exit(RETURN_OK)
 
+def snapshotsSize(args):
+    """
+    Command for printing the size of all snapshots in current profile.
+    Total, new and shared (hardlinked with older snapshots) bytes are read
+    from the figures stored in the snapshots info. The snapshots are not
+    scanned.
+
+    Args:
+        args (argparse.Namespace):
+                        previously parsed arguments
+
+    Raises:
+        SystemExit:     0
+    """
+    force_stdout = setQuiet(args)
+    cfg = getConfig(args)
+    _mount(cfg)
+
+    sids = snapshots.listSnapshots(cfg, reverse = False)
+    sizes = snapshots.snapshotSizes(cfg, sids)
+    for sid in sids:
+        size = sizes[sid]
+        if args.quiet:
+            # bytes for scripts
+            if size is None:
+                print('{} - - -'.format(sid), file=force_stdout)
+            else:
+                print('{} {} {} {}'.format(sid, size.totalBytes,
+                                           size.newBytes, size.sharedBytes),
+                      file=force_stdout)
+        elif size is None:
+            print('SnapshotID: {} Size: unknown'.format(sid),
+                  file=force_stdout)
+        else:
+            print('SnapshotID: {} Size: {} New: {} Shared: {} '
+                  'Files: {} New files: {}'.format(
+                      sid,
+                      progress.formatSize(size.totalBytes),
+                      progress.formatSize(size.newBytes),
+                      progress.formatSize(size.sharedBytes),
+                      size.totalInodes,
+                      size.newInodes),
+                  file=force_stdout)
+    if not sids:
+        logger.error("There are no snapshots in '%s'" % cfg.profileName())
+    if not args.keep_mount:
+        _umount(cfg)
+    sys.exit(RETURN_OK)
+
 def lastSnapshot(args):
     """
     Command for printing the very last snapshot in current profile.
@@ -990,10 +1092,10 @@ def unmount(args):
     _umount(cfg)
     sys.exit(RETURN_OK)
 
-def benchmarkCipher(args):
+def upgradeFileInfo(args):
     """
-    Command for transferring a file with scp to remote host with all
-    available ciphers and print its speed and time.
+    Command for converting 'fileinfo.bz2' of all snapshots in current profile
+    into 'fileinfo.idx'.
 
     Args:
         args (argparse.Namespace):
@@ -1005,10 +1107,36 @@ def benchmarkCipher(args):
     setQuiet(args)
     printHeader()
     cfg = getConfig(args)
+    _mount(cfg)
+    count = 0
+    for sid in snapshots.iterSnapshots(cfg):
+        if sid.upgradeFileInfo():
+            logger.info('Converted permissions of snapshot {}'.format(sid))
+            count += 1
+    logger.info('Converted {} snapshots'.format(count))
+    _umount(cfg)
+    sys.exit(RETURN_OK)
+
+def benchmarkCipher(args):
+    """
+    Command for transferring test data with rsync to remote host with all
+    available ciphers and compressions and print their speed and CPU time.
+
+    Args:
+        args (argparse.Namespace):
+                        previously parsed arguments
+
+    Raises:
+        SystemExit:     0 if at least one transfer succeeded, 1 if not
+    """
+    setQuiet(args)
+    printHeader()
+    cfg = getConfig(args)
     if cfg.snapshotsMode() in ('ssh', 'ssh_encfs'):
         ssh = sshtools.SSH(cfg)
-        ssh.benchmarkCipher(args.FILE_SIZE)
-        sys.exit(RETURN_OK)
+        if ssh.benchmarkCipher(args.FILE_SIZE, json = args.json, apply = args.apply):
+            sys.exit(RETURN_OK)
+        sys.exit(RETURN_ERR)
     else:
         logger.error("SSH is not configured for profile '%s'!" % cfg.profileName())
         sys.exit(RETURN_ERR)
@@ -1123,7 +1251,7 @@ def smartRemove(args):
         SystemExit:     0 if okay
                         2 if Smart-Remove is not configured
     """
-    setQuiet(args)
+    force_stdout = setQuiet(args)
     printHeader()
     cfg = getConfig(args)
     sn = snapshots.Snapshots(cfg)
@@ -1131,13 +1259,24 @@ def smartRemove(args):
     enabled, keep_all, keep_one_per_day, keep_one_per_week, keep_one_per_month = cfg.smartRemove()
     if enabled:
         _mount(cfg)
+        explain = {} if args.explain else None
         del_snapshots = sn.smartRemoveList(datetime.today(),
                                            keep_all,
                                            keep_one_per_day,
                                            keep_one_per_week,
-                                           keep_one_per_month)
+                                           keep_one_per_month,
+                                           explain = explain)
+        if explain is not None:
+            remove = set(del_snapshots)
+            for sid in sorted(explain, reverse = True):
+                print('{:<7}{} {}'.format(
+                          'Remove' if sid in remove else 'Keep',
+                          sid,
+                          explain[sid]),
+                      file=force_stdout)
         logger.info('Smart Remove will remove {} snapshots'.format(len(del_snapshots)))
-        sn.smartRemove(del_snapshots, log = logger.info)
+        if not args.dry_run:
+            sn.smartRemove(del_snapshots, log = logger.info)
         _umount(cfg)
         sys.exit(RETURN_OK)
     else:
@@ -1200,5 +1339,33 @@ def checkConfig(args):
               file = force_stdout)
         sys.exit(RETURN_ERR)
 
+def checkSshLimits(args):
+    """
+    Command for probing the maximum length of commands run on the remote
+    host of SSH profiles.
+
+    Args:
+        args (argparse.Namespace):
+                        previously parsed arguments
+
+    Raises:
+        SystemExit:     0 if all profiles were checked, 1 if not
+    """
+    setQuiet(args)
+    printHeader()
+    cfg = getConfig(args)
+    if args.all_profiles:
+        profiles = cfg.profiles()
+    elif cfg.snapshotsMode() in ('ssh', 'ssh_encfs'):
+        profiles = [cfg.currentProfile()]
+    else:
+        logger.error("SSH is not configured for profile '%s'!" % cfg.profileName())
+        sys.exit(RETURN_ERR)
+
+    if sshMaxArg.report_profiles(cfg, profiles, force = args.force):
+        sys.exit(RETURN_OK)
+    else:
+        sys.exit(RETURN_ERR)
+
 if __name__ == '__main__':
     startApp()
@@ -35,6 +35,7 @@ import datetime
 import socket
 import random
 import shlex
+import zlib
 try:
     import pwd
 except ImportError:
@@ -133,6 +134,17 @@ class Config(configfile.ConfigFileWithProfiles):
     DEFAULT_RUN_NOCACHE_ON_LOCAL = False
     DEFAULT_RUN_NOCACHE_ON_REMOTE = False
     DEFAULT_SSH_PREFIX = 'PATH=/opt/bin:/opt/sbin:\\$PATH'
+    # suffixes of files which are already compressed
+    DEFAULT_SSH_SKIP_COMPRESS = '3g2/3gp/7z/aac/ace/apk/avi/bz2/deb/dmg/ear/' \
+                                'f4v/flac/flv/gpg/gz/iso/jar/jpeg/jpg/lrz/lz/' \
+                                'lz4/lzma/lzo/m1a/m1v/m2a/m2ts/m2v/m4a/m4b/' \
+                                'm4p/m4r/m4v/mka/mkv/mov/mp1/mp2/mp3/mp4/' \
+                                'mpa/mpeg/mpg/mpv/mts/odb/odf/odg/odi/odm/' \
+                                'odp/ods/odt/oga/ogg/ogm/ogv/ogx/opus/otg/' \
+                                'oth/otp/ots/ott/oxt/png/qt/rar/rpm/rz/rzip/' \
+                                'spx/squashfs/sxc/sxd/sxg/sxm/sxw/sz/tbz/' \
+                                'tbz2/tgz/tlz/ts/txz/tzo/vob/war/webm/webp/' \
+                                'xz/z/zip/zst'
     DEFAULT_REDIRECT_STDOUT_IN_CRON = True
     DEFAULT_REDIRECT_STDERR_IN_CRON = False
 
@@ -630,6 +642,35 @@ class Config(configfile.ConfigFileWithProfiles):
     def setSshCipher(self, value, profile_id = None):
         self.setProfileStrValue('snapshots.ssh.cipher', value, profile_id)
 
+    def sshCompress(self, profile_id = None):
+        #?Compress file data sent to the remote host with rsync. 'none'
+        #?disables compression. 'auto' chooses the algorithm and level from
+        #?the throughput measured on earlier snapshots and the algorithms
+        #?supported by rsync on both sides. Choices other than 'zlib' need
+        #?rsync >= 3.2 on both sides.;none | auto | zstd | lz4 | zlibx | zlib
+        return self.profileStrValue('snapshots.ssh.compress', 'none', profile_id)
+
+    def setSshCompress(self, value, profile_id = None):
+        self.setProfileStrValue('snapshots.ssh.compress', value, profile_id)
+
+    def sshCompressLevel(self, profile_id = None):
+        #?Compression level used with \fIprofile<N>.snapshots.ssh.compress\fR.
+        #?Ignored with 'auto'. 0 = default level of the chosen algorithm;0-22
+        return self.profileIntValue('snapshots.ssh.compress_level', 0, profile_id)
+
+    def setSshCompressLevel(self, value, profile_id = None):
+        self.setProfileIntValue('snapshots.ssh.compress_level', value, profile_id)
+
+    def sshSkipCompress(self, profile_id = None):
+        #?Suffixes of files which are sent without compression because they
+        #?are compressed already. Empty to use the default list of rsync.
+        #?;'/' separated list of suffixes;3g2/3gp/7z/aac/.../xz/z/zip/zst
+        return self.profileStrValue('snapshots.ssh.skip_compress',
+                                    self.DEFAULT_SSH_SKIP_COMPRESS, profile_id)
+
+    def setSshSkipCompress(self, value, profile_id = None):
+        self.setProfileStrValue('snapshots.ssh.skip_compress', value, profile_id)
+
     def sshUser(self, profile_id = None):
         #?Remote SSH user;;local users name
         return self.profileStrValue('snapshots.ssh.user', self.user(), profile_id)
@@ -671,7 +712,7 @@ class Config(configfile.ConfigFileWithProfiles):
     def sshMaxArgLength(self, profile_id = None):
         #?Maximum command length of commands run on remote host. This can be tested
         #?for all ssh profiles in the configuration
-        #?with 'python3 /usr/share/backintime/common/sshMaxArg.py [initial_ssh_cmd_length]'.\n
+        #?with 'backintime check-ssh-limits --all-profiles'.\n
         #?0 = unlimited;0, >700
         value = self.profileIntValue('snapshots.ssh.max_arg_length', 0, profile_id)
         if value and value < 700:
@@ -681,6 +722,64 @@ class Config(configfile.ConfigFileWithProfiles):
     def setSshMaxArgLength(self, value, profile_id = None):
         self.setProfileIntValue('snapshots.ssh.max_arg_length', value, profile_id)
 
+    def sshMultiplex(self, profile_id = None):
+        #?Share one SSH connection (OpenSSH ControlMaster) between all
+        #?commands run on the remote host while the profile is mounted.
+        return self.profileBoolValue('snapshots.ssh.multiplex', True, profile_id)
+
+    def setSshMultiplex(self, value, profile_id = None):
+        self.setProfileBoolValue('snapshots.ssh.multiplex', value, profile_id)
+
+    def sshControlPath(self, profile_id = None, user = None, host = None, port = None):
+        """
+        Path of the ControlMaster socket for the SSH connection of a profile.
+        The socket name depends on user, host and port, so commands for a
+        different destination never use a foreign connection.
+
+        Args:
+            profile_id (str):   profile ID. Default is current profile
+            user (str):         remote user. Default is user from config
+            host (str):         remote host. Default is host from config
+            port (int):         remote port. Default is port from config
+
+        Returns:
+            str:                full path of the socket
+        """
+        if profile_id is None:
+            profile_id = self.currentProfile()
+        if user is None:
+            user = self.sshUser(profile_id)
+        if host is None:
+            host = self.sshHost(profile_id)
+        if port is None:
+            port = self.sshPort(profile_id)
+        dest = '{}@{}:{}'.format(user, host, port)
+        return os.path.join(self._LOCAL_DATA_FOLDER, 'ssh',
+                            '{}_{:08x}'.format(profile_id, zlib.crc32(dest.encode())))
+
+    def sshControlArgs(self, profile_id = None, user = None, host = None, port = None):
+        """
+        SSH arguments to use the ControlMaster connection started by
+        :py:func:`sshtools.SSH.startMaster`.
+
+        Args:
+            profile_id (str):   profile ID. Default is current profile
+            user (str):         remote user. Default is user from config
+            host (str):         remote host. Default is host from config
+            port (int):         remote port. Default is port from config
+
+        Returns:
+            list:               arguments for ssh or an empty list if
+                                multiplexing is disabled or there is no
+                                running master connection
+        """
+        if not self.sshMultiplex(profile_id):
+            return []
+        path = self.sshControlPath(profile_id, user, host, port)
+        if not os.path.exists(path):
+            return []
+        return ['-o', 'ControlPath={}'.format(path)]
+
     def sshCheckCommands(self, profile_id = None):
         #?Check if all commands (used during takeSnapshot) work like expected
         #?on the remote host.
@@ -722,6 +821,7 @@ class Config(configfile.ConfigFileWithProfiles):
                    nice = True,
                    quote = False,
                    prefix = True,
+                   multiplex = True,
                    profile_id = None):
         """
         Return SSH command with all arguments.
@@ -736,6 +836,9 @@ class Config(configfile.ConfigFileWithProfiles):
             nice (bool):        use nice if configured
             quote (bool):       quote remote command
             prefix (bool):      use prefix from config before remote command
+            multiplex (bool):   use the shared connection to user@host from
+                                config if there is one. Disable this if
+                                ``custom_args`` connect to another host
             profile_id (str):   profile ID that should  be used in config
 
         Returns:
@@ -752,6 +855,9 @@ class Config(configfile.ConfigFileWithProfiles):
         c = self.sshCipher(profile_id)
         if cipher and c != 'default':
             ssh += ['-o', 'Ciphers={}'.format(c)]
+        # shared connection
+        if multiplex:
+            ssh += self.sshControlArgs(profile_id)
         # custom arguments
         if custom_args:
             ssh += custom_args
@@ -1287,6 +1393,33 @@ class Config(configfile.ConfigFileWithProfiles):
     def setOneFileSystem(self, value, profile_id = None):
         return self.setProfileBoolValue('snapshots.one_file_system', value, profile_id)
 
+    def rsyncWorkers(self, profile_id = None):
+        #?Number of rsync processes used to take a snapshot in parallel.
+        #?Include folders are split into this number of groups balanced by
+        #?the number of files they had in the last snapshot.;1-16
+        return self.profileIntValue('snapshots.rsync_workers', 1, profile_id)
+
+    def setRsyncWorkers(self, value, profile_id = None):
+        self.setProfileIntValue('snapshots.rsync_workers', value, profile_id)
+
+    def removeWorkers(self, profile_id = None):
+        #?Number of threads used to remove local snapshots. Several snapshots
+        #?are removed at the same time. Snapshots on remote hosts are removed
+        #?one after another by a helper script on the remote host.;1-32
+        return self.profileIntValue('snapshots.remove_workers', 4, profile_id)
+
+    def setRemoveWorkers(self, value, profile_id = None):
+        self.setProfileIntValue('snapshots.remove_workers', value, profile_id)
+
+    def fileInfoDelta(self, profile_id = None):
+        #?Store permissions of a new snapshot only as differences to the
+        #?previous snapshot and write a full list every N snapshots.\n
+        #?0 = always write the full list;0-99999
+        return self.profileIntValue('snapshots.fileinfo_delta', 0, profile_id)
+
+    def setFileInfoDelta(self, value, profile_id = None):
+        self.setProfileIntValue('snapshots.fileinfo_delta', value, profile_id)
+
     def rsyncOptionsEnabled(self, profile_id = None):
         #?Past additional options to rsync
         return self.profileBoolValue('snapshots.rsync_options.enabled', False, profile_id)
@@ -1347,7 +1480,8 @@ class Config(configfile.ConfigFileWithProfiles):
         return self.setProfileBoolValue('snapshots.continue_on_errors', value, profile_id)
 
     def useChecksum(self, profile_id = None):
-        #?Use checksum to detect changes rather than size + time.
+        #?Use checksum to detect changes rather than size + time. If rsync on
+        #?both hosts supports it the fast xxh128 or xxh3 checksum is used.
         return self.profileBoolValue('snapshots.use_checksum', False, profile_id)
 
     def setUseChecksum(self, value, profile_id = None):
@@ -1405,6 +1539,10 @@ class Config(configfile.ConfigFileWithProfiles):
         return os.path.join(self._LOCAL_DATA_FOLDER,
                             "worker%s.progress" % self.fileId(profile_id))
 
+    def takeSnapshotProgressRecordFile(self, profile_id = None):
+        return os.path.join(self._LOCAL_DATA_FOLDER,
+                            "worker%s.progress.mmap" % self.fileId(profile_id))
+
     def takeSnapshotInstanceFile(self, profile_id=None):
         return os.path.join(
             self._LOCAL_DATA_FOLDER,
@@ -21,6 +21,7 @@ import re
 import shutil
 import tempfile
 from datetime import datetime
+from collections import OrderedDict
 from packaging.version import Version
 
 import config
@@ -341,6 +342,102 @@ class EncFS_SSH(EncFS_mount):
                 d['hash_id'] = d['hash_id_1']
             return d
 
+#: bytes of paths written to encfsctl before the replies are read. Keeps
+#: the replies below the pipe buffer size so encfsctl never blocks on write
+PIPE_BATCH = 4096
+
+class PathCache(object):
+    """
+    LRU cache for paths translated by encfsctl. EncFS translates every path
+    component on its own (with the parent path as IV if name chaining is
+    used). So translating ``a/b/c`` into ``X/Y/Z`` also tells that ``a/b``
+    is ``X/Y`` and ``a`` is ``X``. Those prefixes are cached, too, because
+    they repeat heavily in exclude lists and logs.
+
+    Args:
+        maxsize (int):  maximum number of cached paths
+    """
+    MAXSIZE = 16384
+
+    def __init__(self, maxsize = MAXSIZE):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+
+    def get(self, path):
+        """
+        Cached translation of ``path`` or ``None``.
+        """
+        ret = self._cache.get(path)
+        if ret is not None:
+            self._cache.move_to_end(path)
+        return ret
+
+    def add(self, path, translated, parents = True):
+        """
+        Cache ``translated`` for ``path`` and if ``parents`` is ``True`` for
+        all its parent folders. Parents are only cached if both paths have
+        the same structure.
+        """
+        self._set(path, translated)
+        if not parents:
+            return
+
+        sep = '/' if isinstance(path, str) else b'/'
+        src = path.split(sep)
+        dst = translated.split(sep)
+        if len(src) != len(dst) or (src[0] == src[0][:0]) != (dst[0] == dst[0][:0]):
+            return
+        for i in range(len(src) - 1, 0, -1):
+            if not src[i - 1]:
+                break
+            self._set(sep.join(src[:i]), sep.join(dst[:i]))
+
+    def _set(self, path, translated):
+        self._cache[path] = translated
+        self._cache.move_to_end(path)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last = False)
+
+def pipePaths(proc, paths, newline):
+    """
+    Write ``paths`` to the stdin of ``encfsctl`` running in pipe mode and
+    read one reply line for each of them. Requests are written in batches
+    of :py:data:`PIPE_BATCH` bytes before the replies are read.
+
+    Args:
+        proc (subprocess.Popen):    running 'encfsctl encode|decode' process
+        paths (list):               paths as :py:class:`str` or
+                                    :py:class:`bytes` depending on ``newline``
+        newline (str):              line separator of the pipe
+
+    Returns:
+        list:                       replies without newline. ``None`` for
+                                    paths without reply because encfsctl
+                                    terminated
+    """
+    ret = []
+    start = 0
+    while start < len(paths):
+        end = start
+        size = 0
+        while end < len(paths) and (end == start or size + len(paths[end]) < PIPE_BATCH):
+            size += len(paths[end]) + 1
+            end += 1
+        try:
+            proc.stdin.write(newline.join(paths[start:end]) + newline)
+        except BrokenPipeError:
+            break
+        for _ in range(start, end):
+            line = proc.stdout.readline()
+            if not line.endswith(newline):
+                # EOF
+                break
+            ret.append(line[:-len(newline)])
+        if len(ret) < end:
+            break
+        start = end
+    return ret + [None] * (len(paths) - len(ret))
+
 class Encode(object):
     """
     encode path with encfsctl.
@@ -356,6 +453,8 @@ class Encode(object):
         if not self.remote_path[-1] == os.sep:
             self.remote_path += os.sep
 
+        self.cache = PathCache()
+
         #precompile some regular expressions
         self.re_asterisk = re.compile(r'\*')
         self.re_separate_asterisk = re.compile(r'(.*?)(\*+)(.*)')
@@ -385,19 +484,40 @@ class Encode(object):
         """
         write plain path to encfsctl stdin and read encrypted path from stdout
         """
+        return self.paths([path])[0]
+
+    def paths(self, paths):
+        """
+        Encode a list of plain paths. Paths which are not in :py:attr:`cache`
+        are sent to encfsctl in batches.
+
+        Raises:
+            exceptions.EncodeValueError:    if encfsctl returned an empty
+                                            string for one of the paths
+        """
+        ret = [self.cache.get(path) for path in paths]
+        missing = list(OrderedDict.fromkeys(
+            [path for path, enc in zip(paths, ret) if enc is None]))
+        if not missing:
+            return ret
+
         if not 'p' in vars(self):
             self.startProcess()
         if not self.p.returncode is None:
             logger.warning('\'encfsctl encode\' process terminated. Restarting.', self)
             del self.p
             self.startProcess()
-        self.p.stdin.write(path + '\n')
-        ret = self.p.stdout.readline().strip('\n')
-        if not len(ret) and len(path):
-            logger.debug('Failed to encode %s. Got empty string'
-                         %path, self)
-            raise EncodeValueError()
-        return ret
+
+        encoded = dict(zip(missing, pipePaths(self.p, missing, '\n')))
+        for path, enc in encoded.items():
+            if not enc and len(path):
+                logger.debug('Failed to encode %s. Got empty string'
+                             %path, self)
+                raise EncodeValueError()
+            self.cache.add(path, enc)
+
+        return [encoded[path] if enc is None else enc
+                for path, enc in zip(paths, ret)]
 
     def exclude(self, path):
         """
@@ -474,6 +594,9 @@ class Bounce(object):
     def path(self, path):
         return path
 
+    def paths(self, paths):
+        return list(paths)
+
     def exclude(self, path):
         return path
 
@@ -591,6 +714,9 @@ class Decode(object):
             self.newline = '\n'
         else:
             self.newline = b'\n'
+        self.cache = PathCache()
+        # paths requested by log() while collecting them for logMany()
+        self._requests = None
 
     def __del__(self):
         self.close()
@@ -619,32 +745,86 @@ class Decode(object):
         write encrypted path to encfsctl stdin and read plain path from stdout
         if stdout is empty (most likely because there was an error) return crypt path
         """
-        if self.string:
-            assert isinstance(path, str), 'path is not str type: %s' % path
-        else:
-            assert isinstance(path, bytes), 'path is not bytes type: %s' % path
-        if not 'p' in vars(self):
-            self.startProcess()
-        if not self.p.returncode is None:
-            logger.warning('\'encfsctl decode\' process terminated. Restarting.', self)
-            del self.p
-            self.startProcess()
-        self.p.stdin.write(path + self.newline)
-        ret = self.p.stdout.readline()
-        ret = ret.strip(self.newline)
-        if ret:
+        if self._requests is not None:
+            self._requests.append(path)
+            return path
+        return self.paths([path])[0]
+
+    def paths(self, paths):
+        """
+        Decode a list of encrypted paths. Paths which are not in
+        :py:attr:`cache` are sent to encfsctl in batches. Paths which
+        couldn't be decoded are returned unchanged.
+        """
+        for path in paths:
+            if self.string:
+                assert isinstance(path, str), 'path is not str type: %s' % path
+            else:
+                assert isinstance(path, bytes), 'path is not bytes type: %s' % path
+
+        ret = [self.cache.get(path) for path in paths]
+        missing = list(OrderedDict.fromkeys(
+            [path for path, dec in zip(paths, ret) if dec is None]))
+        if not missing:
             return ret
-        return path
+
+        decoded = {}
+        # retry once if encfsctl terminated while decoding
+        for _ in range(2):
+            if not 'p' in vars(self):
+                self.startProcess()
+            if not self.p.poll() is None:
+                logger.warning('\'encfsctl decode\' process terminated. Restarting.', self)
+                del self.p
+                self.startProcess()
+
+            failed = []
+            for path, dec in zip(missing, pipePaths(self.p, missing, self.newline)):
+                if dec is None:
+                    # no reply. Don't cache anything for it
+                    failed.append(path)
+                elif dec:
+                    self.cache.add(path, dec)
+                    decoded[path] = dec
+                else:
+                    # not encrypted. Don't ask encfsctl again
+                    self.cache.add(path, path, parents = False)
+                    decoded[path] = path
+
+            if not failed:
+                break
+            self.close()
+            missing = failed
+
+        for path in failed:
+            logger.debug('Failed to decode {}. encfsctl terminated'
+                         .format(path), self)
+            decoded[path] = path
+
+        return [decoded[path] if dec is None else dec
+                for path, dec in zip(paths, ret)]
 
     #TODO: rename this, 'list' is corrupting sphinx doc
     def list(self, list_):
         """
         decode a list of paths
         """
-        output = []
-        for path in list_:
-            output.append(self.path(path))
-        return output
+        return self.paths(list(list_))
+
+    def logMany(self, lines):
+        """
+        Decode a list of lines from takesnapshot.log. All encrypted paths in
+        ``lines`` are collected first and decoded in one batch.
+        """
+        self._requests = []
+        try:
+            for line in lines:
+                self.log(line)
+            requests = self._requests
+        finally:
+            self._requests = None
+        self.paths(requests)
+        return [self.log(line) for line in lines]
 
     def log(self, line):
         """
@@ -0,0 +1,743 @@
+#    Back In Time
+#    Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey,
+#    Germar Reitze
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Indexed file format for the permissions stored in a snapshot.
+
+The old ``fileinfo.bz2`` (format version 1) is one bz2 compressed text file
+with one ``<mode> <user> <group> <path>`` line per file. Looking up a single
+path means decompressing and parsing the whole file.
+
+Format version 2 (``fileinfo.idx``) stores all entries sorted by path and
+split into blocks of :py:data:`BLOCK_SIZE` entries. Each block is compressed
+on its own. An index at the end of the file holds the first path of every
+block, so looking up a path is a binary search in the index plus
+decompressing one block.
+
+Layout (all integers little endian)::
+
+    block 0 ... block N-1   zlib compressed records
+    index                   zlib compressed name tables and block index
+    trailer                 index offset, index size, number of entries,
+                            format version, MAGIC
+
+A record is packed as ``<HHIII`` (length of the prefix shared with the
+previous path in the same block, length of the remaining suffix, mode,
+user index, group index) followed by the suffix. The first path of each
+block is stored completely (prefix length 0).
+
+The index starts with the user and the group name table, each packed as
+``<I`` count followed by ``<H`` length and name for every name. Then
+follows ``<I`` number of blocks and for every block ``<QIH`` (offset,
+compressed size, length of first path) followed by its first path.
+
+Format version 3 is a delta against the ``fileinfo.idx`` of a parent snapshot
+(the snapshot used as ``--link-dest``). It has the same layout but only holds
+entries which were added or changed. Removed entries are stored with mode
+:py:data:`REMOVED`. Right in front of the trailer ``<32sHQ`` stores the
+snapshot ID of the parent, the number of deltas down to the next full
+checkpoint (version 2) file and the number of entries of the resolved
+snapshot.
+"""
+
+import bisect
+import os
+import struct
+import zlib
+from array import array
+from collections.abc import ItemsView, Mapping, MutableMapping
+from functools import lru_cache
+
+MAGIC = b'BITFINFO'
+VERSION = 2
+VERSION_DELTA = 3
+
+#: mode of entries which were removed since the parent snapshot
+REMOVED = 0xFFFFFFFF
+
+#: number of entries per block
+BLOCK_SIZE = 256
+
+_RECORD = struct.Struct('<HHIII')
+_TRAILER = struct.Struct('<QQQH8s')
+_BLOCK = struct.Struct('<QIH')
+_COUNT = struct.Struct('<I')
+_NAME = struct.Struct('<H')
+_DELTA = struct.Struct('<32sHQ')
+
+
+class _ItemsView(ItemsView):
+    """
+    Items view of mappings which can iterate their entries a lot faster
+    than looking up every key on its own.
+    """
+    def __iter__(self):
+        return self._mapping._iterItems()
+
+
+class CompactFileInfoDict(MutableMapping):
+    """
+    Memory efficient drop-in replacement for :py:class:`snapshots.FileInfoDict`
+    for snapshots with millions of files.
+
+    A :py:class:`dict` needs a bytes object for every path, a tuple and two
+    more bytes objects for user and group of every entry. Here all paths are
+    stored in one contiguous buffer with an offset index, modes in a typed
+    array and user and group names are interned in one small table which is
+    referenced by index. Lookup is done by an open addressing hash table
+    which stores the entry indices in a typed array as well.
+    """
+    _EMPTY = -1
+    _DELETED = -2
+
+    def __init__(self):
+        self._paths = bytearray()
+        self._offsets = array('Q', (0, ))
+        self._modes = array('i')
+        self._users = array('I')
+        self._groups = array('I')
+        self._nameIndex = {}
+        self._names = []
+        self._table = array('i', (self._EMPTY, )) * 8
+        self._fill = 0
+        self._len = 0
+
+        # default permissions for /
+        # see snapshots.FileInfoDict
+        self[b'/'] = (16877, b'root', b'root')
+
+    def _path(self, i):
+        return bytes(self._paths[self._offsets[i]:self._offsets[i + 1]])
+
+    def _lookup(self, key):
+        """
+        Find ``key`` in the hash table.
+
+        Returns:
+            tuple:  (slot, index) where ``index`` is the entry index or ``-1``
+                    if ``key`` is not present. In that case ``slot`` is the
+                    slot where ``key`` should be inserted.
+        """
+        table = self._table
+        offsets = self._offsets
+        mask = len(table) - 1
+        slot = hash(key) & mask
+        free = -1
+        size = len(key)
+
+        while True:
+            i = table[slot]
+            if i == self._EMPTY:
+                return (slot if free < 0 else free), -1
+
+            if i == self._DELETED:
+                if free < 0:
+                    free = slot
+
+            else:
+                start = offsets[i]
+                end = offsets[i + 1]
+                if end - start == size and self._paths[start:end] == key:
+                    return slot, i
+
+            slot = (slot + 1) & mask
+
+    def _resize(self, count=0):
+        """
+        Rebuild the hash table with enough room for twice the current
+        number of entries (or ``count`` entries if that is more) and drop
+        deleted slots.
+        """
+        size = 8
+        while size < max(self._len, count) * 2:
+            size *= 2
+
+        table = array('i', (self._EMPTY, )) * size
+        mask = size - 1
+        for i in range(len(self._modes)):
+            if self._modes[i] < 0:
+                continue
+
+            slot = hash(self._path(i)) & mask
+            while table[slot] != self._EMPTY:
+                slot = (slot + 1) & mask
+            table[slot] = i
+
+        self._table = table
+        self._fill = self._len
+
+    def _intern(self, name):
+        i = self._nameIndex.get(name)
+        if i is None:
+            i = self._nameIndex[name] = len(self._names)
+            self._names.append(name)
+
+        return i
+
+    def __setitem__(self, key, value):
+        assert isinstance(key, bytes), "key '{}' is not bytes instance".format(key)
+        assert isinstance(value, tuple), "value '{}' is not tuple instance".format(value)
+        assert len(value) == 3, "value '{}' does not have 3 items".format(value)
+        assert isinstance(value[0], int), "first value '{}' is not int instance".format(value[0])
+        assert isinstance(value[1], bytes), "second value '{}' is not bytes instance".format(value[1])
+        assert isinstance(value[2], bytes), "third value '{}' is not bytes instance".format(value[2])
+
+        mode, user, group = value
+        slot, i = self._lookup(key)
+
+        if i >= 0:
+            self._modes[i] = mode
+            self._users[i] = self._intern(user)
+            self._groups[i] = self._intern(group)
+            return
+
+        if self._table[slot] == self._EMPTY:
+            self._fill += 1
+        self._table[slot] = len(self._modes)
+        self._paths += key
+        self._offsets.append(len(self._paths))
+        self._modes.append(mode)
+        self._users.append(self._intern(user))
+        self._groups.append(self._intern(group))
+        self._len += 1
+
+        # keep the load factor below 2/3
+        if self._fill * 3 > len(self._table) * 2:
+            self._resize()
+
+    def __getitem__(self, key):
+        i = self._lookup(key)[1]
+        if i < 0:
+            raise KeyError(key)
+
+        return (self._modes[i],
+                self._names[self._users[i]],
+                self._names[self._groups[i]])
+
+    def __delitem__(self, key):
+        slot, i = self._lookup(key)
+        if i < 0:
+            raise KeyError(key)
+
+        # the path stays in the buffer until the dict is garbage collected
+        self._table[slot] = self._DELETED
+        self._modes[i] = -1
+        self._len -= 1
+
+    def __contains__(self, key):
+        return isinstance(key, bytes) and self._lookup(key)[1] >= 0
+
+    def __iter__(self):
+        for i in range(len(self._modes)):
+            if self._modes[i] >= 0:
+                yield self._path(i)
+
+    def __len__(self):
+        return self._len
+
+    def items(self):
+        return _ItemsView(self)
+
+    def _iterItems(self):
+        names = self._names
+        for i in range(len(self._modes)):
+            mode = self._modes[i]
+            if mode >= 0:
+                yield self._path(i), (mode,
+                                      names[self._users[i]],
+                                      names[self._groups[i]])
+
+    def update(self, other=(), **kwargs):
+        """
+        Same as :py:meth:`dict.update`. Loading all permissions of a
+        snapshot goes through here, so the hash table is grown only once
+        up front if the size of ``other`` is known and the work of
+        :py:meth:`__setitem__` is done inline.
+        """
+        if isinstance(other, Mapping):
+            other = other.items()
+        elif hasattr(other, 'keys'):
+            other = [(key, other[key]) for key in other.keys()]
+
+        try:
+            count = self._len + len(other)
+        except TypeError:
+            count = 0
+        if count * 3 > len(self._table) * 2:
+            self._resize(count)
+
+        paths = self._paths
+        offsets = self._offsets
+        modes = self._modes
+        users = self._users
+        groups = self._groups
+        nameIndex = self._nameIndex
+        intern = self._intern
+        table = self._table
+        mask = len(table) - 1
+        EMPTY = self._EMPTY
+
+        for key, value in other:
+            assert isinstance(key, bytes), "key '{}' is not bytes instance".format(key)
+            mode, user, group = value
+            assert isinstance(mode, int) and isinstance(user, bytes) \
+                and isinstance(group, bytes), \
+                "value '{}' is not a tuple of int, bytes, bytes".format(value)
+
+            user = nameIndex.get(user)
+            if user is None:
+                user = intern(value[1])
+            group = nameIndex.get(group)
+            if group is None:
+                group = intern(value[2])
+
+            # fast path of _lookup() for new keys
+            slot = hash(key) & mask
+            if table[slot] == EMPTY:
+                table[slot] = len(modes)
+                self._fill += 1
+            else:
+                slot, i = self._lookup(key)
+                if i >= 0:
+                    modes[i] = mode
+                    users[i] = user
+                    groups[i] = group
+                    continue
+
+                if table[slot] == EMPTY:
+                    self._fill += 1
+                table[slot] = len(modes)
+
+            paths += key
+            offsets.append(len(paths))
+            modes.append(mode)
+            users.append(user)
+            groups.append(group)
+            self._len += 1
+
+            if self._fill * 3 > len(table) * 2:
+                self._resize()
+                table = self._table
+                mask = len(table) - 1
+
+        for key, value in kwargs.items():
+            self[key] = value
+
+
+class FileInfoIndex(Mapping):
+    """
+    Read-only mapping of path (:py:class:`bytes`) to a tuple of
+    (mode, user, group) backed by a ``fileinfo.idx`` file. Only the index is
+    loaded on creation. Blocks are read and decoded on demand.
+
+    If the file is a delta (format version 3) :py:attr:`parent` is the
+    snapshot ID of the parent snapshot and entries which were removed since
+    the parent map to ``None``. Use :py:class:`FileInfoChain` to resolve a
+    delta together with its parents.
+
+    Args:
+        filename (str): full path to the ``fileinfo.idx`` file
+
+    Raises:
+        OSError:        if the file can not be read
+        ValueError:     if the file is not a valid ``fileinfo.idx`` file
+    """
+    def __init__(self, filename):
+        self.filename = filename
+
+        with open(filename, 'rb') as f:
+            (indexOffset,
+             indexSize,
+             self.count,
+             self.parent,
+             self.depth,
+             self.total) = self._readTrailer(f, filename)
+
+            f.seek(indexOffset)
+            try:
+                index = zlib.decompress(f.read(indexSize))
+            except zlib.error as exc:
+                raise ValueError(f'{filename} has a broken index') from exc
+
+        try:
+            self.users, pos = self._unpackNames(index, 0)
+            self.groups, pos = self._unpackNames(index, pos)
+
+            self.firstPaths = []
+            self.blocks = []
+            count, = _COUNT.unpack_from(index, pos)
+            pos += _COUNT.size
+            for _ in range(count):
+                offset, size, length = _BLOCK.unpack_from(index, pos)
+                pos += _BLOCK.size
+                self.firstPaths.append(index[pos:pos + length])
+                self.blocks.append((offset, size))
+                pos += length
+
+        except struct.error as exc:
+            raise ValueError(f'{filename} has a broken index') from exc
+
+        # decoded blocks are cached per instance
+        self._block = lru_cache(maxsize=16)(self._readBlock)
+
+    def __getitem__(self, path):
+        i = bisect.bisect_right(self.firstPaths, path) - 1
+        if i < 0:
+            raise KeyError(path)
+
+        return self._block(i)[path]
+
+    def __contains__(self, path):
+        i = bisect.bisect_right(self.firstPaths, path) - 1
+
+        return i >= 0 and path in self._block(i)
+
+    def __iter__(self):
+        for i in range(len(self.blocks)):
+            yield from self._readBlock(i)
+
+    def __len__(self):
+        return self.count
+
+    def items(self):
+        return _ItemsView(self)
+
+    def _iterItems(self):
+        for i in range(len(self.blocks)):
+            yield from self._readBlock(i).items()
+
+    def _readBlock(self, i):
+        """
+        Read and decode block ``i``.
+
+        Returns:
+            dict:   all entries of block ``i``
+        """
+        offset, size = self.blocks[i]
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            data = zlib.decompress(f.read(size))
+
+        block = {}
+        path = b''
+        pos = 0
+        end = len(data)
+        while pos < end:
+            prefix, length, mode, user, group = _RECORD.unpack_from(data, pos)
+            pos += _RECORD.size
+            path = path[:prefix] + data[pos:pos + length]
+            pos += length
+            if mode == REMOVED:
+                block[path] = None
+            else:
+                block[path] = (mode, self.users[user], self.groups[group])
+
+        return block
+
+    @staticmethod
+    def _readTrailer(f, filename):
+        """
+        Read and check the trailer of the open file ``f``.
+
+        Returns:
+            tuple:  (index offset, index size, number of entries, parent
+                    snapshot ID or ``None``, depth, number of entries
+                    after resolving the chain)
+        """
+        try:
+            f.seek(-_TRAILER.size, 2)
+            (indexOffset,
+             indexSize,
+             count,
+             version,
+             magic) = _TRAILER.unpack(f.read(_TRAILER.size))
+
+            if magic != MAGIC:
+                raise ValueError(f'{filename} is no fileinfo index')
+
+            if version == VERSION:
+                return indexOffset, indexSize, count, None, 0, count
+
+            if version != VERSION_DELTA:
+                raise ValueError(f'{filename} has unknown format version '
+                                 f'{version}')
+
+            f.seek(-_TRAILER.size - _DELTA.size, 2)
+            parent, depth, total = _DELTA.unpack(f.read(_DELTA.size))
+
+        except (OSError, struct.error) as exc:
+            raise ValueError(f'{filename} is too short') from exc
+
+        return (indexOffset,
+                indexSize,
+                count,
+                parent.rstrip(b'\0').decode(),
+                depth,
+                total)
+
+    @staticmethod
+    def readParent(filename):
+        """
+        Read only the trailer of ``filename`` to find out which parent
+        snapshot it depends on. This is a lot cheaper than loading the index.
+
+        Args:
+            filename (str): full path to the ``fileinfo.idx`` file
+
+        Returns:
+            str:            snapshot ID of the parent or ``None`` if
+                            ``filename`` is a full checkpoint
+
+        Raises:
+            OSError:        if the file can not be read
+            ValueError:     if the file is not a valid ``fileinfo.idx`` file
+        """
+        with open(filename, 'rb') as f:
+            return FileInfoIndex._readTrailer(f, filename)[3]
+
+    @staticmethod
+    def _unpackNames(data, pos):
+        count, = _COUNT.unpack_from(data, pos)
+        pos += _COUNT.size
+        names = []
+        for _ in range(count):
+            length, = _NAME.unpack_from(data, pos)
+            pos += _NAME.size
+            names.append(data[pos:pos + length])
+            pos += length
+
+        return names, pos
+
+    @staticmethod
+    def write(filename, fileInfoDict, blockSize=BLOCK_SIZE,
+              parent=None, depth=0, total=None):
+        """
+        Write ``fileInfoDict`` into a new ``fileinfo.idx`` file. The data
+        goes into a temporary file next to ``filename`` first which replaces
+        ``filename`` only once it is complete and synced to disk.
+
+        Args:
+            filename (str):         full path of the file
+            fileInfoDict (FileInfoDict):
+                                    dict of: {path: (permission, user, group)}
+            blockSize (int):        number of entries per block
+            parent (str):           write a delta against the snapshot
+                                    with this ID. Removed entries have
+                                    ``None`` as value in ``fileInfoDict``
+            depth (int):            number of deltas down to the next full
+                                    checkpoint including this one
+            total (int):            number of entries of the resolved delta
+
+        Raises:
+            OSError:                if the file can not be written
+        """
+        tmp = filename + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                FileInfoIndex._writeFile(f, fileInfoDict, blockSize,
+                                         parent, depth, total)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, filename)
+        except BaseException:
+            # never leave a partial file behind which would be preferred
+            # over an older "fileinfo.bz2"
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def _writeFile(f, fileInfoDict, blockSize, parent, depth, total):
+        # see write() for the arguments
+        users = {}
+        groups = {}
+        firstPaths = []
+        blocks = []
+        block = []
+        previous = b''
+
+        def flush():
+            data = zlib.compress(b''.join(block))
+            blocks.append((f.tell(), len(data)))
+            f.write(data)
+            block.clear()
+
+        for path, value in sorted(fileInfoDict.items()):
+            if value is None:
+                mode, user, group = REMOVED, b'', b''
+            else:
+                mode, user, group = value
+
+            if len(block) >= blockSize:
+                flush()
+
+            if block:
+                prefix = _commonPrefix(path, previous)
+
+            else:
+                firstPaths.append(path)
+                prefix = 0
+
+            suffix = path[prefix:]
+            block.append(_RECORD.pack(prefix,
+                                      len(suffix),
+                                      mode,
+                                      users.setdefault(user, len(users)),
+                                      groups.setdefault(group,
+                                                        len(groups)))
+                         + suffix)
+            previous = path
+
+        if block:
+            flush()
+
+        index = [FileInfoIndex._packNames(users),
+                 FileInfoIndex._packNames(groups),
+                 _COUNT.pack(len(blocks))]
+        for (offset, size), path in zip(blocks, firstPaths):
+            index.append(_BLOCK.pack(offset, size, len(path)) + path)
+
+        index = zlib.compress(b''.join(index))
+        indexOffset = f.tell()
+        f.write(index)
+        if parent is not None:
+            f.write(_DELTA.pack(parent.encode(), depth, total))
+        f.write(_TRAILER.pack(indexOffset,
+                              len(index),
+                              len(fileInfoDict),
+                              VERSION if parent is None else VERSION_DELTA,
+                              MAGIC))
+
+    @staticmethod
+    def writeDelta(filename, fileInfoDict, base, parent,
+                   blockSize=BLOCK_SIZE):
+        """
+        Write only the differences between ``fileInfoDict`` and ``base``
+        into a new delta ``fileinfo.idx`` file.
+
+        Args:
+            filename (str):         full path of the file
+            fileInfoDict (FileInfoDict):
+                                    dict of: {path: (permission, user, group)}
+            base (FileInfoIndex):   resolved permissions of the parent
+                                    snapshot (e.g. a :py:class:`FileInfoChain`)
+            parent (str):           snapshot ID of the parent snapshot
+            blockSize (int):        number of entries per block
+
+        Raises:
+            OSError:                if the file can not be written
+        """
+        delta = {}
+        for path, value in fileInfoDict.items():
+            if base.get(path) != value:
+                delta[path] = value
+
+        for path in base:
+            if path not in fileInfoDict:
+                delta[path] = None
+
+        FileInfoIndex.write(filename,
+                            delta,
+                            blockSize=blockSize,
+                            parent=parent,
+                            depth=base.depth + 1,
+                            total=len(fileInfoDict))
+
+    @staticmethod
+    def _packNames(names):
+        # dicts keep insertion order so the order matches the indices
+        return _COUNT.pack(len(names)) + b''.join(
+            _NAME.pack(len(name)) + name for name in names)
+
+
+class FileInfoChain(Mapping):
+    """
+    Read-only mapping which resolves a chain of delta ``fileinfo.idx`` files
+    down to the full checkpoint.
+
+    Args:
+        indices (list): :py:class:`FileInfoIndex` instances starting with
+                        the newest delta and ending with the full checkpoint
+    """
+    def __init__(self, indices):
+        self.indices = indices
+        self.parent = indices[0].parent
+        self.depth = indices[0].depth
+
+    def __getitem__(self, path):
+        for index in self.indices:
+            value = index.get(path, _MISSING)
+            if value is None:
+                break
+
+            if value is not _MISSING:
+                return value
+
+        raise KeyError(path)
+
+    def __contains__(self, path):
+        try:
+            self[path]
+        except KeyError:
+            return False
+
+        return True
+
+    def __iter__(self):
+        for path, _ in self.items():
+            yield path
+
+    def __len__(self):
+        return self.indices[0].total
+
+    def items(self):
+        """
+        Resolve all deltas in memory starting at the full checkpoint.
+        """
+        resolved = CompactFileInfoDict()
+        del resolved[b'/']
+        resolved.update(self.indices[-1].items())
+        for index in reversed(self.indices[:-1]):
+            for path, value in index.items():
+                if value is None:
+                    resolved.pop(path, None)
+                else:
+                    resolved[path] = value
+
+        return resolved.items()
+
+
+_MISSING = object()
+
+
+def _commonPrefix(a, b):
+    """
+    Length of the common prefix of ``a`` and ``b``. Uses a binary search
+    with slice comparisons which is a lot faster than comparing byte by byte
+    in Python.
+    """
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+
+    return low
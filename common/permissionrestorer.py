@@ -0,0 +1,220 @@
+#    Back In Time
+#    Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey,
+#    Germar Reitze
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Restore owner, group and mode of restored files in bulk.
+
+After rsync restored files from a snapshot their permissions are set back to
+the values stored in ``fileinfo.idx``. Doing that one path after another
+costs several ``stat`` calls per file and dominates the restore of large
+folders.
+
+:py:class:`PermissionRestorer` collects all restored files and folders with
+:py:func:`os.scandir` first. Then it looks them up in the
+:py:class:`fileinfo.FileInfoIndex` in sorted order, so every block of the
+index is decoded only once, and resolves user and group names. Finally a
+pool of threads handles one destination folder per task. Every entry is
+checked with a single ``lstat`` relative to an open descriptor of its folder
+and only changed if owner, group or mode differ.
+
+Files are done first. Folders follow from the deepest to the top, so a
+read-only folder mode is applied after everything inside it.
+"""
+
+import os
+import stat
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+_OPEN_FLAGS = getattr(os, 'O_PATH', os.O_RDONLY) | os.O_DIRECTORY | os.O_CLOEXEC
+
+
+class PermissionRestorer(object):
+    """
+    Restore permissions of restored files and folders.
+
+    Args:
+        fileInfoDict (Mapping): {path: (mode, user, group)} like
+                                :py:class:`fileinfo.FileInfoIndex`
+        uid (method):           called with a user name (:py:class:`bytes`).
+                                Return the UID or -1 if unknown
+        gid (method):           called with a group name (:py:class:`bytes`).
+                                Return the GID or -1 if unknown
+        callback (method):      called with ``ok`` (bool) and a message for
+                                every change
+        workers (int):          number of threads
+    """
+    def __init__(self, fileInfoDict, uid, gid, callback = None, workers = 4):
+        self.fileInfoDict = fileInfoDict
+        self.uid = uid
+        self.gid = gid
+        self.callback = callback
+        self.workers = max(1, workers)
+        # path in snapshot -> real path. Ordered sets without duplicates
+        self.files = OrderedDict()
+        self.dirs = OrderedDict()
+
+    def addPath(self, item_path, real_path):
+        """
+        Add a single folder (or the restored file itself) which is restored
+        together with the folders.
+
+        Args:
+            item_path (bytes):  path as stored in ``fileInfoDict``
+            real_path (bytes):  path of the restored item
+        """
+        self.dirs.setdefault(item_path, real_path)
+
+    def addTree(self, snapshot_path, head, restore_to, src_delta):
+        """
+        Add all files and folders inside ``snapshot_path``.
+
+        Args:
+            snapshot_path (bytes):  full path of the restored folder inside
+                                    the snapshot
+            head (int):             length of the snapshots backup folder
+                                    which is cut from ``snapshot_path`` to
+                                    get the path in ``fileInfoDict``
+            restore_to (bytes):     alternative destination or ``b''``
+            src_delta (int):        length of the original parent folder which
+                                    is replaced by ``restore_to``
+        """
+        stack = [snapshot_path]
+        while stack:
+            try:
+                it = os.scandir(stack.pop())
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    item_path = entry.path[head:]
+                    real_path = restore_to + item_path[src_delta:]
+                    if entry.is_dir(follow_symlinks=False):
+                        self.dirs.setdefault(item_path, real_path)
+                        stack.append(entry.path)
+                    else:
+                        self.files.setdefault(item_path, real_path)
+
+    def run(self):
+        """
+        Restore the permissions of all added files first and then of all
+        folders from the deepest to the top.
+        """
+        with ThreadPoolExecutor(max_workers = self.workers,
+                                thread_name_prefix = 'PermissionRestorer') as pool:
+            self._restore(pool, self.files)
+
+            byDepth = {}
+            for item_path, real_path in self.dirs.items():
+                depth = real_path.rstrip(b'/').count(b'/')
+                byDepth.setdefault(depth, OrderedDict())[item_path] = real_path
+            for depth in sorted(byDepth, reverse = True):
+                self._restore(pool, byDepth[depth])
+
+    def _restore(self, pool, items):
+        """
+        Look up ``items`` in ``fileInfoDict`` and restore them with one task
+        per destination folder. Wait until all tasks are finished.
+        """
+        byFolder = OrderedDict()
+        for item_path in sorted(items):
+            info = self.fileInfoDict.get(item_path)
+            if info is None:
+                continue
+            target = (info[0], self.uid(info[1]), self.gid(info[2]))
+            folder, name = os.path.split(items[item_path])
+            if not name:
+                # root folder
+                folder, name = None, items[item_path]
+            byFolder.setdefault(folder, []).append((name, target))
+
+        futures = [pool.submit(self._restoreFolder, folder, entries)
+                   for folder, entries in byFolder.items()]
+        for future in futures:
+            for ok, msg in future.result():
+                if self.callback:
+                    self.callback(ok, msg)
+
+    def _restoreFolder(self, folder, entries):
+        """
+        Restore ``entries`` in ``folder``.
+
+        Returns:
+            list:   (ok, message) for every change
+        """
+        messages = []
+        fd = None
+        if folder is not None:
+            try:
+                fd = os.open(folder, _OPEN_FLAGS)
+            except OSError:
+                return messages
+
+        try:
+            for name, target in entries:
+                self._restoreEntry(fd, folder, name, target, messages)
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+        return messages
+
+    @staticmethod
+    def _restoreEntry(fd, folder, name, target, messages):
+        """
+        Restore owner, group and mode of ``name`` relative to ``fd``. If
+        'chown' to the new owner fails (most probably because we are not
+        root) try to at least 'chgrp' to the new group.
+        """
+        mode, uid, gid = target
+        try:
+            st = os.stat(name, dir_fd = fd, follow_symlinks = False)
+        except OSError:
+            return
+        path = name if folder is None else os.path.join(folder, name)
+        path = path.decode(errors = 'ignore')
+
+        if uid != -1 or gid != -1:
+            ok = False
+            if uid != st.st_uid:
+                try:
+                    os.chown(name, uid, gid, dir_fd = fd, follow_symlinks = False)
+                    ok = True
+                except OSError:
+                    pass
+                messages.append((ok, 'chown %s %s : %s' % (path, uid, gid)))
+                st = os.stat(name, dir_fd = fd, follow_symlinks = False)
+
+            #if restore uid/gid failed try to restore at least gid
+            if not ok and gid != st.st_gid:
+                try:
+                    os.chown(name, -1, gid, dir_fd = fd, follow_symlinks = False)
+                    ok = True
+                except OSError:
+                    pass
+                messages.append((ok, 'chgrp %s %s' % (path, gid)))
+                st = os.stat(name, dir_fd = fd, follow_symlinks = False)
+
+        # symlinks don't have a mode on their own
+        if mode != st.st_mode and not stat.S_ISLNK(st.st_mode):
+            ok = False
+            try:
+                os.chmod(name, mode, dir_fd = fd)
+                ok = True
+            except OSError:
+                pass
+            messages.append((ok, 'chmod %s %04o' % (path, mode)))
@@ -14,9 +14,27 @@
 #    with this program; if not, write to the Free Software Foundation, Inc.,
 #    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+"""Progress of a running snapshot or restore.
+
+The worker process publishes rsync's progress in a fixed-layout record
+(:py:class:`ProgressRecord`) which is memory-mapped by the writer and the
+readers (GUI, systray icon). Updating and reading the record only packs and
+unpacks a few integers instead of writing and parsing a config file for
+every progress line of rsync.
+
+The old ``worker<N>.progress`` file (:py:class:`ProgressFile`) is still
+written about once per second for external tools.
+"""
+
 import os
+import mmap
+import re
+import struct
+import time
+from collections import namedtuple
 
 import configfile
+import logger
 
 class ProgressFile(configfile.ConfigFile):
 
@@ -37,3 +55,256 @@ class ProgressFile(configfile.ConfigFile):
 
     def fileReadable(self):
         return os.access(self.filename, os.R_OK)
+
+
+class Progress(namedtuple('Progress',
+                          ('seq', 'status', 'percent', 'sent', 'speed', 'eta'))):
+    """
+    One snapshot of the progress record. ``sent`` is in bytes, ``speed`` in
+    bytes per second and ``eta`` in seconds (``-1`` if unknown).
+
+    :py:func:`intValue` and :py:func:`strValue` provide the same values as
+    :py:class:`ProgressFile` does, formatted like rsync does.
+    """
+    __slots__ = ()
+
+    def intValue(self, key, default=0):
+        if key in ('status', 'percent'):
+            return getattr(self, key)
+
+        return default
+
+    def strValue(self, key, default=''):
+        if key == 'sent':
+            return formatSize(self.sent)
+
+        if key == 'speed':
+            return formatSize(self.speed) + 'B/s'
+
+        if key == 'eta':
+            return formatEta(self.eta) if self.eta >= 0 else default
+
+        return default
+
+
+class ProgressRecord(object):
+    """
+    Memory-mapped progress record with a fixed layout (little endian)::
+
+        magic       8s  b'BITPRGRS'
+        seq         Q   sequence counter, odd while the writer is updating
+        status      I   e.g. :py:data:`ProgressFile.RSYNC`
+        percent     I
+        sent        Q   bytes
+        speed       d   bytes per second
+        eta         q   seconds or -1 if unknown
+
+    Readers retry until they got the same even sequence counter before and
+    after reading the fields. The record is created complete under a
+    temporary name and renamed into place, so a mapped record never
+    shrinks.
+
+    Args:
+        cfg (config.Config):    current config
+        filename (str):         full path of the record. Defaults to
+                                :py:func:`config.Config.takeSnapshotProgressRecordFile`
+    """
+    MAGIC = b'BITPRGRS'
+    LAYOUT = struct.Struct('<8sQIIQdq')
+    _SEQ = struct.Struct('<Q')
+    _FIELDS = struct.Struct('<IIQdq')
+    _FIELDS_OFFSET = 16
+
+    #: seconds between two updates of the old ``worker<N>.progress`` file
+    LEGACY_INTERVAL = 1.0
+
+    def __init__(self, cfg, filename=None):
+        self.config = cfg
+        self.filename = filename
+        if self.filename is None:
+            self.filename = self.config.takeSnapshotProgressRecordFile()
+
+        self.map = None
+        self.inode = None
+        self.seq = 0
+        self.lastLegacy = 0.0
+
+    def update(self, status, percent, sent, speed, eta=-1):
+        """
+        Write new progress values. The record is created on first use.
+
+        Args:
+            status (int):   e.g. :py:data:`ProgressFile.RSYNC`
+            percent (int):  percent done
+            sent (float):   bytes sent
+            speed (float):  bytes per second
+            eta (int):      estimated seconds left or ``-1``
+        """
+        if self.map is None:
+            # Never truncate the record in place. Readers which have it
+            # mapped would get SIGBUS while it is shorter than the layout.
+            tmp = self.filename + '.tmp'
+            with open(tmp, 'w+b') as f:
+                f.write(self.LAYOUT.pack(self.MAGIC, 0, 0, 0, 0, 0.0, -1))
+                f.flush()
+                self.map = mmap.mmap(f.fileno(), self.LAYOUT.size)
+            os.replace(tmp, self.filename)
+            self.seq = 0
+
+        self.seq += 1
+        self._SEQ.pack_into(self.map, 8, self.seq)
+        self._FIELDS.pack_into(self.map,
+                               self._FIELDS_OFFSET,
+                               status,
+                               max(0, min(int(percent), 100)),
+                               max(0, int(sent)),
+                               float(speed),
+                               int(eta))
+        self.seq += 1
+        self._SEQ.pack_into(self.map, 8, self.seq)
+
+        now = time.monotonic()
+        if now - self.lastLegacy >= self.LEGACY_INTERVAL:
+            self.lastLegacy = now
+            self._writeLegacy(status, percent, sent, speed, eta)
+
+    def _writeLegacy(self, status, percent, sent, speed, eta):
+        pg = ProgressFile(self.config)
+        pg.setIntValue('status', status)
+        pg.setStrValue('sent', formatSize(sent))
+        pg.setIntValue('percent', int(percent))
+        pg.setStrValue('speed', formatSize(speed) + 'B/s')
+        pg.save()
+
+    def read(self):
+        """
+        Read the current progress.
+
+        Returns:
+            Progress:   current values or ``None`` if there is no running
+                        rsync with progress
+        """
+        try:
+            inode = os.stat(self.filename).st_ino
+        except OSError:
+            self.close()
+            return None
+
+        if self.map is None or inode != self.inode:
+            self.close()
+            try:
+                with open(self.filename, 'rb') as f:
+                    st = os.fstat(f.fileno())
+                    if st.st_size < self.LAYOUT.size:
+                        # not a complete record
+                        return None
+                    self.map = mmap.mmap(f.fileno(),
+                                         self.LAYOUT.size,
+                                         access=mmap.ACCESS_READ)
+            except (OSError, ValueError) as exc:
+                logger.debug(f'Failed to open progress record '
+                             f'{self.filename}: {str(exc)}', self)
+                return None
+
+            self.inode = st.st_ino
+
+        for _ in range(100):
+            magic, seq, *fields = self.LAYOUT.unpack_from(self.map)
+            if magic != self.MAGIC:
+                return None
+
+            if seq & 1 or self._SEQ.unpack_from(self.map, 8)[0] != seq:
+                # writer is just updating
+                continue
+
+            if not seq:
+                # created but no values yet
+                return None
+
+            return Progress(seq, *fields)
+
+        return None
+
+    def close(self):
+        """
+        Unmap the record.
+        """
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            self.inode = None
+
+    def remove(self):
+        """
+        Unmap and delete the record and the old ``worker<N>.progress`` file.
+        """
+        self.close()
+        for filename in (self.filename, self.config.takeSnapshotProgressFile()):
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                logger.debug(f'Failed to remove progress file '
+                             f'{filename}: {str(exc)}', self)
+
+
+def parseSize(value):
+    """
+    Convert sizes like ``517.38K``, ``1,234`` or ``14.46M`` from rsync's
+    progress output into bytes.
+    """
+    units = 'KMGT'
+    factor = 1
+    if value and value[-1].upper() in units:
+        factor = 1024 ** (units.index(value[-1].upper()) + 1)
+        value = value[:-1]
+
+    try:
+        return float(value.replace(',', '')) * factor
+    except ValueError:
+        return 0.0
+
+
+def formatSize(value):
+    """
+    Format ``value`` bytes the same way as rsync's progress output.
+    """
+    for unit in ('', 'K', 'M', 'G'):
+        if abs(value) < 1024:
+            break
+        value /= 1024
+    else:
+        unit = 'T'
+
+    if not unit:
+        return '{:,.0f}'.format(value)
+
+    return '{:.2f}{}'.format(value, unit)
+
+
+_ETA = re.compile(r'(\d+):(\d{2}):(\d{2})$')
+
+
+def parseEta(value):
+    """
+    Convert ``H:MM:SS`` from rsync's progress output into seconds.
+
+    Returns:
+        int:    seconds or ``-1`` if unknown (e.g. ``??:??:??``)
+    """
+    m = _ETA.match(value)
+    if not m:
+        return -1
+
+    hours, minutes, seconds = (int(i) for i in m.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def formatEta(value):
+    """
+    Format ``value`` seconds as ``H:MM:SS``.
+    """
+    return '{}:{:02d}:{:02d}'.format(value // 3600,
+                                     value // 60 % 60,
+                                     value % 60)
@@ -0,0 +1,259 @@
+#    Back In Time
+#    Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey,
+#    Germar Reitze
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Probe the remote host of SSH profiles in a single round trip.
+
+A small shell script is sent to ``sh -s`` on stdin of one SSH session. It
+checks (and creates) the remote snapshot folder, prints the output of
+``rsync --version``, tests if the remote filesystem supports hardlinks and
+which of the optional commands used by `Back In Time` are available::
+
+    created
+    folder <code>
+    rsync: <line of 'rsync --version'>
+    hardlinks <0|1>
+    command <name> <0|1>
+    done
+
+The result (the capability fingerprint) is cached in the local data folder
+keyed by user, host, port and path for :py:data:`TTL` seconds. So mounting
+the same remote path again doesn't need to probe it. The cache entry is
+dropped with :py:func:`invalidateProfile` if a backup failed in a way which
+suggests the remote host changed.
+"""
+
+import os
+import time
+import shlex
+
+import logger
+import tools
+
+#: seconds until the remote host is probed again
+TTL = 24 * 3600
+CACHE_FILE = 'ssh_probe.json'
+
+#: codes for the remote snapshot folder
+FOLDER_OK = 0
+FOLDER_CREATE_FAILED = 10
+FOLDER_NO_DIR = 11
+FOLDER_NOT_WRITABLE = 12
+FOLDER_NOT_EXECUTABLE = 13
+
+#: rsync exit codes which suggest the remote host changed: syntax or usage
+#: error, protocol incompatibility, errors selecting input/output files,
+#: requested action not supported, error starting client-server protocol,
+#: error in rsync protocol data stream, error in IPC code, remote command
+#: can't be run or wasn't found and ssh failed
+STALE_EXIT_CODES = (1, 2, 3, 4, 5, 12, 14, 126, 127, 255)
+
+# name and test command of optional commands on the remote host
+COMMANDS = (('nice', 'nice -n 19 true'),
+            ('ionice', 'ionice -c2 -n7 true'),
+            ('nocache', 'nocache true'),
+            ('bash', 'bash -c true'),
+            ('flock', 'flock -x /dev/null true'),
+            ('mktemp', 't=$(mktemp -d) && rmdir "$t"'))
+
+# The whole script is one compound command. The shell parses it completely
+# before running it, so no command can accidentally read the script itself.
+SCRIPT = r'''{
+path=%(path)s
+tmp=%(tmp)s
+check() {
+    name=$1
+    shift
+    if eval "$*" </dev/null >/dev/null 2>&1; then
+        echo "command $name 1"
+    else
+        echo "command $name 0"
+    fi
+}
+code=0
+if test ! -e "$path"; then
+    if mkdir "$path" >/dev/null 2>&1; then
+        echo "created"
+    else
+        code=%(create_failed)d
+    fi
+fi
+test $code -eq 0 && ! test -d "$path" && code=%(no_dir)d
+test $code -eq 0 && ! test -w "$path" && code=%(not_writable)d
+test $code -eq 0 && ! test -x "$path" && code=%(not_executable)d
+echo "folder $code"
+rsync --version 2>/dev/null </dev/null | while IFS= read -r line; do
+    echo "rsync: $line"
+done
+if test $code -eq 0 && mkdir "$tmp" >/dev/null 2>&1; then
+    hardlinks=0
+    if echo foo >"$tmp/a" && ln "$tmp/a" "$tmp/b" >/dev/null 2>&1; then
+        set -- $(ls -i "$tmp/a")
+        a=$1
+        set -- $(ls -i "$tmp/b")
+        test -n "$a" && test "$a" = "$1" && hardlinks=1
+    fi
+    rm -f "$tmp/a" "$tmp/b"
+    rmdir "$tmp"
+    echo "hardlinks $hardlinks"
+fi
+%(commands)s
+echo "done"
+}
+'''
+
+
+def payload(path, tmp):
+    """
+    Build the data which has to be sent to stdin of ``sh -s`` on the
+    remote host.
+
+    Args:
+        path (str): remote snapshot folder
+        tmp (str):  name of a temporary folder inside ``path`` which is
+                    used to test hardlinks
+
+    Returns:
+        bytes:      probe script
+    """
+    commands = '\n'.join('check {} {}'.format(name, shlex.quote(cmd))
+                         for name, cmd in COMMANDS)
+    script = SCRIPT % {'path': shlex.quote(path),
+                       'tmp': shlex.quote(os.path.join(path, tmp)),
+                       'create_failed': FOLDER_CREATE_FAILED,
+                       'no_dir': FOLDER_NO_DIR,
+                       'not_writable': FOLDER_NOT_WRITABLE,
+                       'not_executable': FOLDER_NOT_EXECUTABLE,
+                       'commands': commands}
+    return script.encode()
+
+
+def parse(output):
+    """
+    Parse the output of the probe script.
+
+    Args:
+        output (str):   stdout of the probe script
+
+    Returns:
+        dict:           with keys ``folder`` (int), ``created`` (bool),
+                        ``rsync`` ('rsync --version' output or empty str),
+                        ``hardlinks`` (bool or ``None`` if not tested) and
+                        ``commands`` (dict name -> bool). ``None`` if the
+                        script didn't finish
+    """
+    result = {'folder': None,
+              'created': False,
+              'rsync': '',
+              'hardlinks': None,
+              'commands': {}}
+    rsync = []
+    finished = False
+
+    for line in output.split('\n'):
+        if line.startswith('rsync: '):
+            rsync.append(line[len('rsync: '):])
+            continue
+
+        items = line.split()
+        if not items:
+            continue
+        if items[0] == 'done':
+            finished = True
+        elif items[0] == 'created':
+            result['created'] = True
+        elif items[0] == 'folder' and len(items) == 2:
+            result['folder'] = int(items[1])
+        elif items[0] == 'hardlinks' and len(items) == 2:
+            result['hardlinks'] = items[1] == '1'
+        elif items[0] == 'command' and len(items) == 3:
+            result['commands'][items[1]] = items[2] == '1'
+
+    if not finished or result['folder'] is None:
+        return None
+
+    if rsync:
+        result['rsync'] = '\n'.join(rsync) + '\n'
+
+    return result
+
+
+def key(user, host, port, path):
+    """
+    Cache key for the remote snapshot folder ``path`` on ``host``.
+    """
+    return '{}@{}:{}:{}'.format(user, host, port, path)
+
+
+def profileKey(config, profile_id = None):
+    """
+    Cache key for the remote snapshot folder of SSH profile ``profile_id``.
+    """
+    return key(config.sshUser(profile_id),
+               config.sshHost(profile_id),
+               config.sshPort(profile_id),
+               config.sshSnapshotsPath(profile_id) or './')
+
+
+def _cacheFile(config):
+    return os.path.join(config._LOCAL_DATA_FOLDER, CACHE_FILE)
+
+
+def load(config, cacheKey, ttl = TTL):
+    """
+    Get the cached probe result for ``cacheKey``.
+
+    Args:
+        config (config.Config): current config
+        cacheKey (str):         see :py:func:`key`
+        ttl (int):              maximum age in seconds
+
+    Returns:
+        dict:                   result like :py:func:`parse` returns or
+                                ``None`` if there is no fresh result
+    """
+    entry = tools.readJsonCache(_cacheFile(config)).get(cacheKey)
+    if not isinstance(entry, dict) or not isinstance(entry.get('result'), dict):
+        return None
+    if time.time() - entry.get('time', 0) > ttl:
+        return None
+    return entry['result']
+
+
+def save(config, cacheKey, result):
+    """
+    Store the probe ``result`` for ``cacheKey``.
+    """
+    tools.updateJsonCache(_cacheFile(config), cacheKey,
+                          {'time': time.time(), 'result': result})
+
+
+def invalidate(config, cacheKey):
+    """
+    Drop the cached probe result for ``cacheKey``. The remote host will be
+    probed again on next mount.
+    """
+    if cacheKey in tools.readJsonCache(_cacheFile(config)):
+        logger.debug('Drop SSH probe result for {}'.format(cacheKey))
+        tools.updateJsonCache(_cacheFile(config), cacheKey, None)
+
+
+def invalidateProfile(config, profile_id = None):
+    """
+    Drop the cached probe result for SSH profile ``profile_id``.
+    """
+    invalidate(config, profileKey(config, profile_id))
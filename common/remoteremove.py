@@ -0,0 +1,143 @@
+#    Back In Time
+#    Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey,
+#    Germar Reitze
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Helper to remove snapshots on a remote host over a single SSH session.
+
+The helper is a small bash script which is sent to ``bash -s`` on stdin of
+one SSH session. The paths of the snapshots follow the script on stdin,
+separated by NUL bytes. So the length of the command line doesn't depend on
+the number of snapshots anymore.
+
+Every snapshot is synced against an empty temporary folder with
+``rsync --delete`` and removed with ``rmdir`` afterwards, while holding an
+exclusive ``flock`` on the lock file shared by all removals of the profile.
+For every snapshot the helper prints one line::
+
+    REMOVED <n> <count> <path>
+    FAILED <n> <count> <path>
+
+In background mode the helper reads all paths, starts the removal as a
+detached job and prints ``STARTED`` before it exits. The SSH session ends
+right away while the removal continues on the remote host.
+"""
+
+import shlex
+
+STARTED = 'STARTED'
+REMOVED = 'REMOVED'
+FAILED = 'FAILED'
+
+# The whole script is one compound command. bash parses it completely
+# before running it, so the following data on stdin is left for 'read'.
+SCRIPT = r'''{
+rsync=(%(rsync)s)
+lock=%(lock)s
+background=%(background)d
+debug=%(debug)d
+log() {
+    test $debug -eq 1 && logger -t "backintime smart-remove [$BASHPID]" "$*"
+}
+sids=()
+while IFS= read -r -d '' sid; do
+    sids+=("$sid")
+done
+removeAll() {
+    local tmp sid i=0 rc=0
+    tmp=$(mktemp -d)
+    # make sure $tmp was created and is empty
+    test -z "$tmp" && return 1
+    test -n "$(ls -A "$tmp")" && return 1
+    log "start"
+    flock -x 9 || return 1
+    log "got exclusive flock"
+    for sid in "${sids[@]}"; do
+        i=$((i + 1))
+        if test -e "$sid"; then
+            log "snapshot $sid still exist"
+            if ! "${rsync[@]}" "$tmp/" "$sid" || ! rmdir "$sid"; then
+                echo "%(failed)s $i ${#sids[@]} $sid"
+                rc=1
+                continue
+            fi
+            log "snapshot $sid remove done"
+        fi
+        echo "%(removed)s $i ${#sids[@]} $sid"
+    done
+    rmdir "$tmp"
+    return $rc
+}
+if test $background -eq 1; then
+    trap '' HUP
+    removeAll 9>"$lock" </dev/null >/dev/null 2>&1 &
+    echo %(started)s
+    exit 0
+fi
+removeAll 9>"$lock"
+exit $?
+}
+'''
+
+
+def payload(rsync, lock, paths, background = False, debug = False):
+    """
+    Build the data which has to be sent to stdin of ``bash -s`` on the
+    remote host.
+
+    Args:
+        rsync (list):       rsync command used to clear a snapshot. The
+                            empty temporary folder and the snapshot path
+                            are appended
+        lock (str):         lock file on the remote host
+        paths (list):       snapshot paths on the remote host
+        background (bool):  detach and remove in background
+        debug (bool):       log to syslog on the remote host
+
+    Returns:
+        bytes:              script followed by NUL separated ``paths``
+    """
+    script = SCRIPT % {'rsync': ' '.join(shlex.quote(i) for i in rsync),
+                       'lock': shlex.quote(lock),
+                       'background': int(background),
+                       'debug': int(debug),
+                       'started': STARTED,
+                       'removed': REMOVED,
+                       'failed': FAILED}
+    data = [script.encode()]
+    for path in paths:
+        data.append(path.encode() + b'\0')
+    return b''.join(data)
+
+
+def parse(line):
+    """
+    Parse one line of output from the helper.
+
+    Args:
+        line (str): output line without newline
+
+    Returns:
+        tuple:      (status, n, count, path) or ``None`` if ``line`` is no
+                    progress line
+    """
+    items = line.split(' ', 3)
+    if len(items) != 4 or items[0] not in (REMOVED, FAILED):
+        return None
+    try:
+        return (items[0], int(items[1]), int(items[2]), items[3])
+    except ValueError:
+        return None
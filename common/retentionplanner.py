@@ -0,0 +1,158 @@
+#    Back In Time
+#    Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey,
+#    Germar Reitze
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Plan which snapshots have to be removed to free space and inodes.
+
+Unchanged files are hardlinked between snapshots. Removing a snapshot only
+frees the blocks and inodes of files which have no link left in any other
+snapshot. So removing the oldest snapshot one by one and checking the free
+space again afterwards often removes a lot more snapshots than necessary
+before the first bytes are actually freed.
+
+:py:class:`RetentionPlanner` scans the oldest snapshots one after another
+and counts the links of every inode it sees. An inode is freed once all of
+its links (``st_nlink``) were found inside the scanned snapshots. The plan
+is the shortest row of oldest snapshots whose removal frees enough blocks
+and inodes.
+"""
+
+import os
+import stat
+
+
+class RetentionPlanner(object):
+    """
+    Count the blocks and inodes freed by removing the scanned snapshots.
+
+    All snapshots added with :py:func:`addTree` or :py:func:`addFindOutput`
+    are considered to be removed together.
+    """
+    #: ``find -printf`` format parsed by :py:func:`addFindOutput`
+    FIND_FORMAT = '%y %D %i %n %b\\n'
+
+    def __init__(self):
+        # (device, inode) -> links which were not seen yet
+        self._remaining = {}
+        self.freedBytes = 0
+        self.freedInodes = 0
+
+    def add(self, dev, ino, nlink, blocks):
+        """
+        Add one link of an inode.
+
+        Args:
+            dev (int):      device of the inode
+            ino (int):      inode number
+            nlink (int):    number of links of the inode
+            blocks (int):   allocated 512 byte blocks
+        """
+        if nlink > 1:
+            key = (dev, ino)
+            remaining = self._remaining.pop(key, nlink) - 1
+            if remaining > 0:
+                self._remaining[key] = remaining
+                return
+
+        self.freedBytes += blocks * 512
+        self.freedInodes += 1
+
+    def addStat(self, st):
+        """
+        Add one link described by :py:class:`os.stat_result` ``st``.
+        Folders can't be hardlinked. Their link count is the number of
+        subfolders, so they are always freed.
+        """
+        if stat.S_ISDIR(st.st_mode):
+            self.add(st.st_dev, st.st_ino, 1, st.st_blocks)
+        else:
+            self.add(st.st_dev, st.st_ino, st.st_nlink, st.st_blocks)
+
+    def addTree(self, path):
+        """
+        Add all files and folders in ``path`` including ``path`` itself.
+
+        Args:
+            path (str): full path to a local folder
+        """
+        try:
+            st = os.lstat(path)
+        except FileNotFoundError:
+            return
+        self.addStat(st)
+
+        stack = [path]
+        while stack:
+            try:
+                it = os.scandir(stack.pop())
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    self.addStat(st)
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+
+    def addFindOutput(self, lines):
+        """
+        Add the output of ``find <path> -printf`` :py:data:`FIND_FORMAT`.
+        This is used for snapshots on remote hosts, because sshfs doesn't
+        provide real inode numbers.
+
+        Args:
+            lines (iterable):   output lines as :py:class:`bytes` or
+                                :py:class:`str`
+        """
+        for line in lines:
+            try:
+                type_, dev, ino, nlink, blocks = line.split()
+                nlink = int(nlink)
+            except ValueError:
+                continue
+            if type_ in ('d', b'd'):
+                nlink = 1
+            self.add(int(dev), int(ino), nlink, int(blocks))
+
+    def plan(self, candidates, scan, enough):
+        """
+        Pick the shortest row of ``candidates`` (oldest first) whose removal
+        frees enough. If even all candidates are not enough all of them are
+        returned.
+
+        Args:
+            candidates (list):  snapshots which may be removed, oldest first
+            scan (method):      called with a candidate. Must add it with
+                                :py:func:`addTree` or :py:func:`addFindOutput`
+            enough (method):    called with :py:attr:`freedBytes` and
+                                :py:attr:`freedInodes`. Return ``True`` if
+                                enough would be freed
+
+        Returns:
+            list:               candidates to remove
+        """
+        ret = []
+        for candidate in candidates:
+            if enough(self.freedBytes, self.freedInodes):
+                break
+            scan(candidate)
+            ret.append(candidate)
+
+        return ret
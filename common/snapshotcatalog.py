@@ -0,0 +1,343 @@
+#    Back In Time
+#    Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey,
+#    Germar Reitze
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Persistent catalog of the snapshots in a snapshots folder.
+
+Listing snapshots used to mean an ``os.listdir()`` of the snapshots folder
+plus two ``os.path.isdir()`` calls for every entry. On remote (sshfs) targets
+with thousands of snapshots this takes seconds. The catalog is an SQLite file
+stored next to the snapshots which remembers the snapshot IDs and some of
+their meta data (name, failed flag, last checked time and info fields).
+
+The catalog is only a cache. The snapshots folder itself stays the single
+source of truth. The modification time of the snapshots folder is stored
+together with the catalog. If it differs from the current one the folder
+was changed by someone else (e.g. smart-remove running in background on the
+remote host) and the catalog is repaired by a new scan of the folder.
+
+The modification time of every snapshot folder is stored, too. Marking a
+snapshot as failed or giving it a name creates or removes a file inside the
+snapshot folder. So snapshots changed outside of the catalog (manually,
+by another or an older `Back In Time`) are probed again and vanished
+snapshots are dropped on the next sync.
+"""
+
+import os
+import json
+import time
+import sqlite3
+from contextlib import closing
+
+import logger
+
+
+class SnapshotCatalog:
+    """
+    SQLite based catalog of all snapshots in ``path``.
+
+    Args:
+        path (str): full path to the snapshots folder
+                    (e.g. ``.../backintime/<HOST>/<USER>/<PROFILE_ID>``)
+    """
+    FILENAME = 'catalog.db'
+    SCHEMA_VERSION = 2
+
+    # Filesystems like sshfs only provide mtime with a granularity of
+    # seconds. A folder changed within this amount of seconds after the
+    # catalog was synchronized can't be trusted to be unchanged.
+    RACY_SECONDS = 2
+
+    def __init__(self, path):
+        self.path = path
+        self.dbFile = os.path.join(path, self.FILENAME)
+
+    def _connect(self):
+        """
+        Open the catalog and create its tables if necessary. A corrupt
+        catalog will be deleted and created again.
+
+        Returns:
+            sqlite3.Connection: open connection to the catalog
+        """
+        for retry in (True, False):
+            conn = sqlite3.connect(self.dbFile, timeout=10)
+
+            try:
+                # Journal files next to the catalog would change the mtime
+                # of the snapshots folder on every transaction. The catalog
+                # is only a cache so a broken transaction is not a problem.
+                conn.execute('PRAGMA journal_mode=MEMORY')
+                conn.execute('PRAGMA synchronous=OFF')
+
+                with conn:
+                    conn.execute('CREATE TABLE IF NOT EXISTS meta '
+                                 '(key TEXT PRIMARY KEY, value)')
+                    conn.execute('CREATE TABLE IF NOT EXISTS snapshots '
+                                 '(sid TEXT PRIMARY KEY, '
+                                 'name TEXT, '
+                                 'failed INTEGER, '
+                                 'last_checked REAL, '
+                                 'info TEXT, '
+                                 'mtime INTEGER)')
+                    conn.execute('INSERT OR IGNORE INTO meta VALUES (?, ?)',
+                                 ('version', self.SCHEMA_VERSION))
+
+                version = conn.execute(
+                    'SELECT value FROM meta WHERE key = ?',
+                    ('version', )).fetchone()[0]
+
+                if version != self.SCHEMA_VERSION:
+                    raise sqlite3.DatabaseError(
+                        f'Unknown catalog version {version}')
+
+                return conn
+
+            except sqlite3.DatabaseError as exc:
+                conn.close()
+
+                if not retry:
+                    raise
+
+                logger.warning(f'Snapshot catalog {self.dbFile} is broken '
+                               f'and will be recreated: {str(exc)}', self)
+                os.remove(self.dbFile)
+
+    def sync(self, probe):
+        """
+        Get all snapshot IDs from the catalog. If the snapshots folder has
+        changed since the last sync it will be scanned again. Only new
+        folders, folders which were no valid snapshot before and snapshots
+        whose folder was modified since they were probed are checked with
+        ``probe``, vanished folders are removed from the catalog.
+
+        Args:
+            probe (method): callable which takes the name of a new folder
+                            and returns a dict with the keys ``name``,
+                            ``failed``, ``lastChecked`` and ``info`` if the
+                            folder is a valid snapshot or ``None`` if not.
+
+        Returns:
+            list:           snapshot IDs (:py:class:`str`) or ``None`` if
+                            the catalog is not usable (e.g. the snapshots
+                            folder is read-only)
+        """
+        try:
+            with closing(self._connect()) as conn:
+                # stat after creating the catalog but before listdir. If the
+                # folder changes during the scan the stored mtime is older
+                # and the next sync will scan again.
+                mtime = os.stat(self.path).st_mtime_ns
+
+                stored = dict(conn.execute(
+                    'SELECT key, value FROM meta '
+                    "WHERE key IN ('mtime', 'checked', 'ignored')").fetchall())
+
+                knownMtimes = dict(conn.execute(
+                    'SELECT sid, mtime FROM snapshots').fetchall())
+                known = set(knownMtimes)
+                ignored = set(json.loads(stored.get('ignored', '[]')))
+
+                rescan = (stored.get('mtime') != mtime
+                          or stored['checked'] - mtime / 1e9
+                          <= self.RACY_SECONDS)
+
+                if not rescan:
+                    # A folder without 'backup' subfolder (e.g. a snapshot
+                    # copied by the user) becomes valid without changing
+                    # the mtime of the snapshots folder.
+                    candidates = ignored
+                    items = known | ignored
+
+                else:
+                    logger.debug(f'Snapshots folder {self.path} changed. '
+                                 'Update snapshot catalog', self)
+                    items = set(os.listdir(self.path)) - {self.FILENAME}
+                    candidates = items - known
+
+                # re-validate cached snapshots against their folder
+                mtimes = {}
+                for item in known & items:
+                    try:
+                        mtimes[item] = os.stat(
+                            os.path.join(self.path, item)).st_mtime_ns
+                    except FileNotFoundError:
+                        items.discard(item)
+                        continue
+                    if mtimes[item] != knownMtimes[item]:
+                        candidates = candidates | {item}
+
+                new = {}
+                for item in candidates:
+                    if item not in mtimes:
+                        try:
+                            mtimes[item] = os.stat(
+                                os.path.join(self.path, item)).st_mtime_ns
+                        except FileNotFoundError:
+                            items.discard(item)
+                            continue
+                    entry = probe(item)
+
+                    if entry is not None:
+                        new[item] = entry
+
+                # snapshots which are no valid snapshot anymore
+                invalid = (known & candidates) - set(new)
+                result = ((known & items) - invalid) | set(new)
+                newIgnored = sorted(items - result)
+                now = time.time()
+
+                if rescan or new or invalid or known - items:
+                    with conn:
+                        conn.executemany(
+                            'DELETE FROM snapshots WHERE sid = ?',
+                            [(i, ) for i in (known - items) | invalid])
+                        conn.executemany(
+                            'INSERT OR REPLACE INTO snapshots '
+                            'VALUES (?, ?, ?, ?, ?, ?)',
+                            [self._row(sid,
+                                       mtime=self._trusted(mtimes[sid], now),
+                                       **e)
+                             for sid, e in new.items()])
+                        conn.executemany(
+                            'INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                            (('mtime', mtime),
+                             ('checked', now),
+                             ('ignored', json.dumps(newIgnored))))
+
+                return sorted(result)
+
+        except (sqlite3.Error, OSError) as exc:
+            logger.debug(f'Snapshot catalog {self.dbFile} not usable: '
+                         f'{str(exc)}', self)
+
+            return None
+
+    def add(self, sid, name='', failed=False, lastChecked=None, info=None):
+        """
+        Add or replace snapshot ``sid`` in the catalog.
+
+        Args:
+            sid (str):              snapshot ID
+            name (str):             name of the snapshot
+            failed (bool):          snapshot is marked as failed
+            lastChecked (float):    last time the snapshot was checked
+                                    against the source
+            info (dict):            content of the snapshots ``info`` file
+        """
+        self._execute('INSERT OR REPLACE INTO snapshots '
+                      'VALUES (?, ?, ?, ?, ?, ?)',
+                      self._row(sid, name, failed, lastChecked, info))
+
+    def discard(self, sid):
+        """
+        Remove snapshot ``sid`` from the catalog.
+
+        Args:
+            sid (str):  snapshot ID
+        """
+        self._execute('DELETE FROM snapshots WHERE sid = ?', (sid, ))
+
+    def update(self, sid, **kwargs):
+        """
+        Update fields of snapshot ``sid`` if it is part of the catalog.
+
+        Args:
+            sid (str):  snapshot ID
+            **kwargs:   ``name``, ``failed``, ``lastChecked`` and/or
+                        ``info`` with their new values
+        """
+        columns = {'name': 'name',
+                   'failed': 'failed',
+                   'lastChecked': 'last_checked',
+                   'info': 'info'}
+        fields = []
+        values = []
+
+        for key, value in kwargs.items():
+            if key == 'failed':
+                value = int(bool(value))
+            elif key == 'info':
+                value = json.dumps(value)
+
+            fields.append(f'{columns[key]} = ?')
+            values.append(value)
+
+        self._execute(f'UPDATE snapshots SET {", ".join(fields)} '
+                      'WHERE sid = ?',
+                      (*values, sid))
+
+    def entries(self):
+        """
+        All cached snapshot fields read in one go.
+
+        Returns:
+            dict:   snapshot ID as key and a dict with the keys ``name``,
+                    ``failed``, ``lastChecked`` and ``info`` as value.
+                    Empty if the catalog is not usable.
+        """
+        try:
+            with closing(self._connect()) as conn:
+                rows = conn.execute('SELECT sid, name, failed, last_checked, '
+                                    'info FROM snapshots').fetchall()
+
+        except (sqlite3.Error, OSError) as exc:
+            logger.debug(f'Failed to read snapshot catalog {self.dbFile}: '
+                         f'{str(exc)}', self)
+
+            return {}
+
+        return {sid: {'name': name or '',
+                      'failed': bool(failed),
+                      'lastChecked': last_checked,
+                      'info': json.loads(info) if info else {}}
+                for sid, name, failed, last_checked, info in rows}
+
+    def _execute(self, sql, params):
+        """
+        Run ``sql`` in its own transaction. Errors will only be logged
+        because the next :py:func:`sync` will repair the catalog anyway.
+        """
+        try:
+            with closing(self._connect()) as conn:
+                with conn:
+                    conn.execute(sql, params)
+
+        except (sqlite3.Error, OSError) as exc:
+            logger.debug(f'Failed to update snapshot catalog {self.dbFile}: '
+                         f'{str(exc)}', self)
+
+    def _trusted(self, mtime, now):
+        """
+        ``mtime`` of a snapshot folder or ``None`` if it is too close to
+        ``now`` to detect later changes (see :py:data:`RACY_SECONDS`).
+        """
+        if now - mtime / 1e9 <= self.RACY_SECONDS:
+            return None
+        return mtime
+
+    @staticmethod
+    def _row(sid, name='', failed=False, lastChecked=None, info=None,
+             mtime=None):
+        # Without mtime the snapshot will be probed again on next sync.
+        # The setters of SID change the folder anyway.
+        return (sid,
+                name,
+                int(bool(failed)),
+                lastChecked,
+                json.dumps(info or {}),
+                mtime)
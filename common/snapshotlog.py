@@ -105,6 +105,9 @@ class LogFilter(object):
                  r')'
              )}
 
+    #: number of lines decoded together by :py:func:`iterFilter`
+    BATCH = 256
+
     def __init__(self, mode = 0, decode = None):
         self.regex = self.REGEX[mode]
         self.decode = decode
@@ -145,6 +148,49 @@ class LogFilter(object):
         else:
             return line
 
+    def filterMany(self, lines):
+        """
+        Same as :py:func:`filter` but for a list of lines. All paths are
+        decoded with one batch of requests to ``encfsctl``.
+
+        Args:
+            lines (list):   log lines read from disk
+
+        Returns:
+            list:           filtered and decoded lines without the lines
+                            which were filtered out
+        """
+        lines = [line for line in lines
+                 if not line or not self.regex or self.regex.match(line)]
+        if not self.decode:
+            return lines
+
+        ret = list(lines)
+        idx = [i for i, line in enumerate(lines) if line]
+        for i, line in zip(idx, self.decode.logMany([lines[i] for i in idx])):
+            ret[i] = line
+        return ret
+
+    def iterFilter(self, lines):
+        """
+        Filter and decode an iterable of ``lines`` in batches of
+        :py:data:`BATCH` lines.
+
+        Args:
+            lines (iterable):   log lines without trailing newline
+
+        Yields:
+            str:                filtered and decoded lines
+        """
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= self.BATCH:
+                yield from self.filterMany(batch)
+                batch = []
+        if batch:
+            yield from self.filterMany(batch)
+
 class SnapshotLog(object):
     """
     Read and write Snapshot log to "~/.local/share/backintime/takesnapshot_<N>.log".
@@ -197,13 +243,12 @@ class SnapshotLog(object):
             with open(self.logFileName, 'rt') as f:
                 if logFilter.header and not skipLines:
                     yield logFilter.header
-                for line in f.readlines():
-                    line = logFilter.filter(line.rstrip('\n'))
-                    if not line is None:
-                        count += 1
-                        if count <= skipLines:
-                            continue
-                        yield line
+                for line in logFilter.iterFilter(
+                        line.rstrip('\n') for line in f.readlines()):
+                    count += 1
+                    if count <= skipLines:
+                        continue
+                    yield line
         except Exception as e:
             msg = ('Failed to get take_snapshot log from {}:'.format(self.logFile), str(e))
             logger.debug(' '.join(msg), self)
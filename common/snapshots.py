@@ -18,11 +18,13 @@
 
 import json
 import os
+import bisect
 from pathlib import Path
 import stat
 import datetime
 import gettext
 import bz2
+import zlib
 import pwd
 import grp
 import subprocess
@@ -30,7 +32,10 @@ import shutil
 import time
 import re
 import fcntl
+import struct
 from tempfile import TemporaryDirectory
+from collections import OrderedDict
+from collections.abc import Mapping
 
 import config
 import configfile
@@ -40,6 +45,13 @@ import encfstools
 import mount
 import progress
 import snapshotlog
+import snapshotcatalog
+import treeremover
+import retentionplanner
+import permissionrestorer
+import remoteprobe
+import remoteremove
+from fileinfo import FileInfoIndex, FileInfoChain, CompactFileInfoDict
 from applicationinstance import ApplicationInstance
 from exceptions import MountException, LastSnapshotSymlink
 
@@ -61,12 +73,17 @@ class Snapshots:
     """
     SNAPSHOT_VERSION = 3
     GLOBAL_FLOCK = '/tmp/backintime.lock'
+    #: lines decoded together by :py:func:`backupPermissionsCallback`
+    DECODE_BATCH = 1024
 
     def __init__(self, cfg = None):
         self.config = cfg
         if self.config is None:
             self.config = config.Config()
         self.snapshotLog = snapshotlog.SnapshotLog(self.config)
+        self.messagePublisher = TakeSnapshotMessagePublisher(self)
+        self.snapshotSize = SnapshotSize()
+        self.snapshotTransfer = None
 
         self.clearIdCache()
         self.clearNameCache()
@@ -83,6 +100,20 @@ class Snapshots:
                                           r'([\d\?]+:[\d\?]{2}:[\d\?]{2})'  #estimated time of arrival
                                           r'(.*$)')                         #trash at the end
 
+        #rsync output of '--out-format=BACKINTIME: %i %U %G %B %n%L'
+        #search for:     BACKINTIME: >f+++++++++ 1000 1000 rw-r--r-- foo/bar
+        self.reRsyncItemizedPerms = re.compile(r'BACKINTIME: '
+                                               r'(.{11}) '              #itemized changes
+                                               r'(\d+) '                #uid
+                                               r'(\d+) '                #gid
+                                               r'([-rwxsStT]{9}) '      #permission bits
+                                               r'(.*)$')                #name and link target
+
+        # progress of rsync processes running in parallel
+        # [weight, sent bytes, percent, speed, eta]
+        self.rsyncWorkerProgress = []
+        self.progressRecord = None
+
         self.lastBusyCheck = datetime.datetime(1, 1, 1)
         self.flock = None
         self.restorePermissionFailed = False
@@ -92,6 +123,7 @@ class Snapshots:
         """Delete message and progress file"""
         Path(self.config.takeSnapshotMessageFile()).unlink(missing_ok=True)
         Path(self.config.takeSnapshotProgressFile()).unlink(missing_ok=True)
+        Path(self.config.takeSnapshotProgressRecordFile()).unlink(missing_ok=True)
 
     # TODO: make own class for takeSnapshotMessage
     def takeSnapshotMessage(self):
@@ -170,6 +202,27 @@ class Snapshots:
                      ignore the timeout value!
         """
 
+        # a newer message supersedes a pending rate-limited one
+        self.messagePublisher.delivered(type_id)
+
+        # Error message?
+        if type_id == 1:
+            self.snapshotLog.append('[E] ' + message, 1)
+        else:
+            self.snapshotLog.append('[I] ' + message, 3)
+
+        self.publishTakeSnapshotMessage(type_id, message, timeout)
+
+    def publishTakeSnapshotMessage(self, type_id, message, timeout=-1):
+        """Write the status message into the message file and send it to
+        the plug-ins without adding it to the snapshot log.
+
+        Args:
+            type_id: Simplified severity level of the status message.
+                     See :py:func:`setTakeSnapshotMessage`
+            message: status message string
+            timeout: Requested maximum processing duration in plug-ins.
+        """
         message_fn = self.config.takeSnapshotMessageFile()
 
         try:
@@ -181,12 +234,6 @@ class Snapshots:
             logger.debug('Failed to set takeSnapshot message '
                          f'to {message_fn}: {str(exc)}', self)
 
-        # Error message?
-        if type_id == 1:
-            self.snapshotLog.append('[E] ' + message, 1)
-        else:
-            self.snapshotLog.append('[I] ' + message, 3)
-
         try:
             profile_id = self.config.currentProfile()
             profile_name = self.config.profileName(profile_id)
@@ -380,11 +427,12 @@ class Snapshots:
             key_path (bytes):       original path during backup.
                                     Same as in fileInfoDict.
             path (bytes):           current path of file that should be changed.
-            fileInfoDict (FileInfoDict):    FileInfoDict
+            fileInfoDict (FileInfoDict):    FileInfoDict or any other mapping
+                                            like :py:class:`fileinfo.FileInfoIndex`
         """
         assert isinstance(key_path, bytes), 'key_path is not bytes type: %s' % key_path
         assert isinstance(path, bytes), 'path is not bytes type: %s' % path
-        assert isinstance(fileInfoDict, FileInfoDict), 'fileInfoDict is not FileInfoDict type: %s' % fileInfoDict
+        assert isinstance(fileInfoDict, Mapping), 'fileInfoDict is not Mapping type: %s' % fileInfoDict
         if key_path not in fileInfoDict or not os.path.exists(path):
             return
         info = fileInfoDict[key_path]
@@ -437,6 +485,23 @@ class Snapshots:
                 pass
             self.restoreCallback(callback, ok, "chmod %s %04o" % (path.decode(errors = 'ignore'), info[0]))
 
+    def restoreRsync(self, cmd, callback = None):
+        """
+        Run one rsync command for :py:func:`restore`.
+
+        Args:
+            cmd (list):         rsync command
+            callback (method):  callable instance which will handle messages
+        """
+        proc = tools.Execute(cmd,
+                             callback=callback,
+                             filters=(self.filterRsyncProgress,),
+                             parent=self)
+
+        self.restoreCallback(callback, True, proc.printable_cmd)
+        proc.run()
+        self.restoreCallback(callback, True, ' ')
+
     def restore(self,
                 sid,
                 paths,
@@ -448,16 +513,19 @@ class Snapshots:
         """
         Restore one or more files from snapshot ``sid`` to either original
         or a different destination. Restore is done with rsync. If available
-        permissions will be restored from ``fileinfo.bz2``.
+        permissions will be restored from ``fileinfo.idx`` (or
+        ``fileinfo.bz2`` for snapshots taken with older versions).
 
         Args:
             sid (SID):                  snapshot from whom to restore
             paths (:py:class:`list`, :py:class:`tuple` or :py:class:`str`):
                                         single path (str) or multiple
                                         paths (list, tuple) that should be
-                                        restored. For every path this will run
-                                        a new rsync process. Permissions will be
-                                        restored for all paths in one run
+                                        restored. Paths from the same source
+                                        folder are restored with a single
+                                        rsync process using ``--files-from``.
+                                        Permissions will be restored for all
+                                        paths in one run
             callback (method):          callable instance which will handle
                                         messages
             restore_to (str):           full path to restore to. If empty
@@ -509,6 +577,8 @@ class Snapshots:
             cmd_prefix.append('--update')
 
         restored_paths = []
+        # paths with the same source folder can be restored with one rsync
+        batches = {}
 
         for path in paths:
             tools.makeDirs(os.path.dirname(path))
@@ -519,8 +589,6 @@ class Snapshots:
             if not src_base.endswith(os.sep):
                 src_base += os.sep
 
-            cmd = cmd_prefix[:]
-
             if restore_to:
                 items = os.path.split(src_path)
                 aux = items[0].lstrip(os.sep)
@@ -536,25 +604,31 @@ class Snapshots:
                 else:
                     src_delta = len(items[0])
 
-            cmd.append(self.rsyncRemotePath('%s.%s' % (src_base, src_path), use_mode=['ssh'], quote=''))
-            cmd.append('%s/' % restore_to)
+            batches.setdefault(src_base, []).append(src_path)
+            restored_paths.append((path, src_delta))
 
-            proc = tools.Execute(cmd,
-                                 callback=callback,
-                                 filters=(self.filterRsyncProgress,),
-                                 parent=self)
+        for src_base, src_paths in batches.items():
+            cmd = cmd_prefix[:]
 
-            self.restoreCallback(callback, True, proc.printable_cmd)
-            proc.run()
-            self.restoreCallback(callback, True, ' ')
-            restored_paths.append((path, src_delta))
+            if len(src_paths) == 1:
+                cmd.append(self.rsyncRemotePath('%s.%s' % (src_base, src_paths[0]), use_mode=['ssh'], quote=''))
+                cmd.append('%s/' % restore_to)
+                self.restoreRsync(cmd, callback)
+                continue
 
-        try:
-            os.remove(self.config.takeSnapshotProgressFile())
-        except Exception as e:
-            logger.debug('Failed to remove snapshot progress file %s: %s'
-                         %(self.config.takeSnapshotProgressFile(), str(e)),
-                         self)
+            with TemporaryDirectory() as tmp:
+                files_from = os.path.join(tmp, 'files-from')
+                with open(files_from, 'wb') as f:
+                    for src_path in src_paths:
+                        f.write(src_path.lstrip('/').encode() + b'\0')
+
+                # --files-from doesn't imply --recursive
+                cmd.extend(('-r', '--from0', '--files-from=%s' % files_from))
+                cmd.append(self.rsyncRemotePath(src_base, use_mode=['ssh'], quote=''))
+                cmd.append('%s/' % restore_to)
+                self.restoreRsync(cmd, callback)
+
+        self.clearProgress()
 
         #restore permissions
         logger.info('Restore permissions', self)
@@ -562,7 +636,7 @@ class Snapshots:
         self.restoreCallback(
             callback, True, '{}:'.format(_('Restore permissions')))
         self.restorePermissionFailed = False
-        fileInfoDict = sid.fileInfo
+        fileInfoDict = sid.fileInfoIndex()
 
         #cache uids/gids
         for uid, name in info.listValue('user', ('int:uid', 'str:name')):
@@ -571,7 +645,14 @@ class Snapshots:
             self.gid(name.encode(), callback = callback, backup = gid)
 
         if fileInfoDict:
-            all_dirs = [] #restore dir permissions after all files are done
+            restorer = permissionrestorer.PermissionRestorer(
+                fileInfoDict,
+                uid = lambda name: self.uid(name, callback = callback),
+                gid = lambda name: self.gid(name, callback = callback),
+                callback = lambda ok, msg: self.restoreCallback(callback, ok, msg))
+            if isinstance(restore_to, str):
+                restore_to = restore_to.encode()
+
             for path, src_delta in restored_paths:
                 #explore items
                 snapshot_path_to = sid.pathBackup(path).rstrip('/')
@@ -579,38 +660,23 @@ class Snapshots:
                 #use bytes instead of string from here
                 if isinstance(path, str):
                     path = path.encode()
-                if isinstance(restore_to, str):
-                    restore_to = restore_to.encode()
 
                 if not restore_to:
                     path_items = path.strip(b'/').split(b'/')
                     curr_path = b'/'
                     for path_item in path_items:
                         curr_path = os.path.join(curr_path, path_item)
-                        if curr_path not in all_dirs:
-                            all_dirs.append(curr_path)
+                        restorer.addPath(curr_path, curr_path)
                 else:
-                    if path not in all_dirs:
-                        all_dirs.append(path)
+                    restorer.addPath(path, restore_to + path[src_delta:])
 
                 if os.path.isdir(snapshot_path_to) and not os.path.islink(snapshot_path_to):
-                    head = len(root_snapshot_path_to.encode())
-                    for explore_path, dirs, files in os.walk(snapshot_path_to.encode()):
-                        for item in dirs:
-                            item_path = os.path.join(explore_path, item)[head:]
-                            if item_path not in all_dirs:
-                                all_dirs.append(item_path)
-
-                        for item in files:
-                            item_path = os.path.join(explore_path, item)[head:]
-                            real_path = restore_to + item_path[src_delta:]
-                            self.restorePermission(item_path, real_path, fileInfoDict, callback)
-
-            all_dirs.reverse()
-            for item_path in all_dirs:
-                real_path = restore_to + item_path[src_delta:]
-                self.restorePermission(item_path, real_path, fileInfoDict, callback)
+                    restorer.addTree(snapshot_path_to.encode(),
+                                     len(root_snapshot_path_to.encode()),
+                                     restore_to,
+                                     src_delta)
 
+            restorer.run()
             self.restoreCallback(callback, True, '')
 
             if self.restorePermissionFailed:
@@ -640,17 +706,8 @@ class Snapshots:
         """
         Remove snapshot ``sid``.
 
-        BUHTZ 2022-10-11: From my understanding rsync is used here to sync the
-        directory of a concrete snapshot (``sid``) against an empty temporary
-        directory. In the consequence the sid directory is empty but not
-        deleted.
-        To delete that directory simple `rm` call (via `shutil` package) is
-        used to delete the directory. No need to do this via SSH because the
-        directory is temporary mounted.
-
-        It is not clear for me why it is done that way. Why not simply "rm"
-        the directory when it is mounted instead of using rsync in a previous
-        step?! But I won't change it yet.
+        Local snapshots are removed with :py:func:`removeLocal`. Snapshots on
+        remote hosts are removed with :py:func:`removeRemote`.
 
         Args:
             sid (SID):              snapshot to remove
@@ -662,45 +719,206 @@ class Snapshots:
         if isinstance(sid, RootSnapshot):
             return
 
-        # build the rsync command and it's arguments
-        rsync = tools.rsyncRemove(self.config)
+        if self.config.snapshotsMode() not in ('ssh', 'ssh_encfs'):
+            return self.removeLocal([sid])
+
+        return sid in self.removeRemote([sid])
 
-        # an empty temporary directory
-        # e.g. /tmp/tmp8g59onuz
-        with TemporaryDirectory() as d:
-            # the temp dir
-            rsync.append(d + os.sep)
+    def removeRemote(self, sids, background = False, log = None):
+        """
+        Remove snapshots ``sids`` on the remote host of SSH profiles. The
+        :py:mod:`remoteremove` helper is sent together with the list of
+        snapshots over stdin of one SSH session. It removes them one after
+        another while holding the same flock as smart-remove.
 
-            # the real remote path of a concrete snapshot (a "sid")
-            # e.g. user@myserver:"/MyBackup/.backintime/backintime/HOST/user/ \
-            # MyProfile/20221005-000003-880"
-            rsync.append(
-                self.rsyncRemotePath(
-                    sid.path(use_mode=['ssh', 'ssh_encfs']),
-                    # No quoting because of new argument protection of rsync.
-                    quote=''
-                )
-            )
+        Args:
+            sids (list):        :py:class:`SID` objects to remove
+            background (bool):  don't wait for the removal to finish. It
+                                continues on the remote host after the
+                                SSH session ended
+            log (method):       called with a progress message for every
+                                removed snapshot
+
+        Returns:
+            list:               removed :py:class:`SID` objects. In
+                                background mode all ``sids`` if the
+                                helper was started
+        """
+        sids = [sid for sid in sids if not isinstance(sid, GenericNonSnapshot)]
+        if not sids:
+            return []
 
-            # Syncing the empty tmp directory against the sid directory
-            # will clear the sid directory.
-            rc = tools.Execute(rsync).run()
+        # the remote helper can't rebase "fileinfo.idx" deltas
+        children = self.fileInfoChildren()
+        sids = [sid for sid in sids if self.rebaseFileInfo(sid, children)]
+        if not sids:
+            return []
 
-            #
-            if rc != 0:
-                logger.error(
-                    f'Last rsync command failed with return code "{rc}". '
-                    'See previous WARNING message in the logs for details.')
-                return False
+        paths = OrderedDict()
+        for sid in sids:
+            paths[sid.path(use_mode = ['ssh', 'ssh_encfs'])] = sid
+        lckFile = os.path.normpath(
+            os.path.join(next(iter(paths)), os.pardir, 'smartremove.lck'))
+
+        data = remoteremove.payload(tools.rsyncRemove(self.config, run_local = False),
+                                    lckFile,
+                                    list(paths),
+                                    background = background,
+                                    debug = logger.DEBUG)
+        cmd = self.config.sshCommand(['bash', '-s'],
+                                     quote = False,
+                                     nice = False,
+                                     ionice = False)
+        logger.debug('Call command: %s' % ' '.join(cmd), self)
+
+        removed = []
+        started = False
+        with subprocess.Popen(cmd,
+                              stdin = subprocess.PIPE,
+                              stdout = subprocess.PIPE,
+                              stderr = subprocess.STDOUT) as proc:
+            try:
+                proc.stdin.write(data)
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
 
-            # Delete the sid dir. BUT here isn't the remote path used but the
-            # temporary mounted variant of it.
-            # e.g. /home/user/.local/share/backintime/mnt/4_8030/backintime/ \
-            # HOST/user/MyProfile/20221005-000003-880
-            shutil.rmtree(sid.path())
+            for line in proc.stdout:
+                line = line.decode(errors = 'replace').rstrip('\n')
+                if line == remoteremove.STARTED:
+                    started = True
+                    continue
+                result = remoteremove.parse(line)
+                if result is None:
+                    if line:
+                        logger.warning('Remove snapshots: %s' % line, self)
+                    continue
+                status, i, count, path = result
+                sid = paths.get(path)
+                if status == remoteremove.FAILED:
+                    logger.error('Failed to remove snapshot %s' % (sid or path), self)
+                    continue
+                if sid is not None:
+                    removed.append(sid)
+                if log:
+                    log('%s/%s' % (i, count))
+
+        if proc.returncode and not removed:
+            logger.error('Remote removal helper failed with return code "{}". '
+                         'See previous WARNING message in the logs for '
+                         'details.'.format(proc.returncode), self)
+
+        if background and started:
+            removed = sids
+
+        for sid in removed:
+            snapshotCatalog(self.config, sid.profileID).discard(sid.sid)
+
+        return removed
+
+    def removeLocal(self, sids, log = None):
+        """
+        Remove all snapshots ``sids`` concurrently with
+        :py:class:`treeremover.TreeRemover`. This walks every snapshot only
+        once instead of syncing an empty directory onto it and calling
+        :py:func:`shutil.rmtree` afterwards. Only for local modes.
+
+        Args:
+            sids (list):            list of :py:class:`SID` to remove
+            log (method):           callable method that will handle progress
+                                    messages
 
+        Returns:
+            (bool): ``True`` if all snapshots were removed
+        """
+        sids = [sid for sid in sids if not isinstance(sid, RootSnapshot)]
+        if not sids:
             return True
 
+        ret = True
+        children = None
+        for sid in sids[:]:
+            if isinstance(sid, GenericNonSnapshot):
+                continue
+            if children is None:
+                children = self.fileInfoChildren()
+            if not self.rebaseFileInfo(sid, children):
+                sids.remove(sid)
+                ret = False
+
+        callback = None
+        if log:
+            callback = lambda count: log(
+                _('{count} files and folders removed').format(count=count))
+
+        remover = treeremover.TreeRemover(self.config.removeWorkers(),
+                                          callback = callback)
+        result = remover.removeMany([sid.path() for sid in sids])
+
+        for sid in sids:
+            if result[sid.path()]:
+                snapshotCatalog(self.config, sid.profileID).discard(sid.sid)
+            else:
+                ret = False
+        return ret
+
+    def fileInfoChildren(self):
+        """
+        Map snapshots to the snapshots which store their "fileinfo.idx" as
+        delta to them. Only the trailer of every "fileinfo.idx" is read.
+
+        Returns:
+            dict:   {snapshot ID: [child :py:class:`SID`, ...]}
+        """
+        children = {}
+        for child in listSnapshots(self.config, reverse=False):
+            parent = child.fileInfoParent()
+            if parent is not None:
+                children.setdefault(parent, []).append(child)
+
+        return children
+
+    def rebaseFileInfo(self, sid, children=None):
+        """
+        Snapshots which store their "fileinfo.idx" as delta to ``sid`` are
+        rebased onto the parent of ``sid`` (or become a full checkpoint) so
+        ``sid`` can be removed.
+
+        Args:
+            sid (SID):          snapshot that will be removed
+            children (dict):    result of :py:func:`fileInfoChildren`. Build
+                                it once if several snapshots get removed.
+                                It is updated with the rebased snapshots
+
+        Returns:
+            bool:               ``True`` if all children were rebased and
+                                ``sid`` can be removed
+        """
+        if children is None:
+            children = self.fileInfoChildren()
+
+        parent = sid.fileInfoParent()
+        if parent is not None:
+            try:
+                parent = SID(parent, self.config)
+            except ValueError:
+                parent = None
+
+        ret = True
+        for child in children.pop(sid.sid, []):
+            if child.sid <= sid.sid:
+                continue
+            if not child.rebaseFileInfo(parent):
+                ret = False
+            elif parent is not None:
+                children.setdefault(parent.sid, []).append(child)
+
+        if not ret:
+            logger.error('Keep snapshot {} because other snapshots still '
+                         'depend on its {}'.format(sid.sid, SID.FILEINFO),
+                         self)
+        return ret
+
     # TODO Refactor: This functions is extremely difficult to understand:
     #  - Nested "if"s
     #  - Fuzzy names of classes, attributes and methods
@@ -972,13 +1190,17 @@ class Snapshots:
 
         return ret_error
 
-    def filterRsyncProgress(self, line):
+    def filterRsyncProgress(self, line, worker=None):
         """
         Filter rsync's stdout for progress information and store them in
-        '~/.local/share/backintime/worker<N>.progress' file.
+        the :py:class:`progress.ProgressRecord`
+        '~/.local/share/backintime/worker<N>.progress.mmap'.
 
         Args:
-            line (str): stdout line from rsync
+            line (str):     stdout line from rsync
+            worker (int):   number of the rsync process if multiple rsync
+                            processes run in parallel. Their progress is
+                            merged with :py:func:`mergeRsyncProgress`
 
         Returns:
             str:        ``line`` if it had no progress infos. ``None`` if
@@ -990,18 +1212,61 @@ class Snapshots:
             if m:
                 # if m.group(5).strip():
                 #     return
-                pg = progress.ProgressFile(self.config)
-                pg.setIntValue('status', pg.RSYNC)
-                pg.setStrValue('sent', m.group(1))
-                pg.setIntValue('percent', int(m.group(2)))
-                pg.setStrValue('speed', m.group(3))
-                #pg.setStrValue('eta', m.group(4))
-                pg.save()
-                del(pg)
+                sent = progress.parseSize(m.group(1))
+                percent = int(m.group(2))
+                speed = progress.parseSize(m.group(3)[:-3])
+                eta = progress.parseEta(m.group(4))
+
+                if worker is not None:
+                    self.rsyncWorkerProgress[worker][1:] = [
+                        sent, percent, speed, eta]
+                    sent, percent, speed, eta = self.mergeRsyncProgress()
+
+                if self.progressRecord is None:
+                    self.progressRecord = progress.ProgressRecord(self.config)
+
+                self.progressRecord.update(progress.ProgressFile.RSYNC,
+                                           percent,
+                                           sent,
+                                           speed,
+                                           eta)
+
+                # rsync may stay quiet for a long time (e.g. on big files)
+                # so the progress updates also push out the pending status
+                self.messagePublisher.tick()
             else:
                 ret.append(l)
         return '\n'.join(ret)
 
+    def mergeRsyncProgress(self):
+        """
+        Merge the progress of all rsync processes running in parallel.
+        Percentages are weighted by the expected number of files of each
+        process, sent bytes and speed are summed up and the slowest process
+        determines the estimated time left.
+
+        Returns:
+            tuple:  (sent bytes, percent, bytes per second, seconds left)
+        """
+        weights = sum(i[0] for i in self.rsyncWorkerProgress) or 1
+        sent = sum(i[1] for i in self.rsyncWorkerProgress)
+        percent = sum(i[0] * i[2] for i in self.rsyncWorkerProgress) // weights
+        speed = sum(i[3] for i in self.rsyncWorkerProgress)
+        eta = max(i[4] for i in self.rsyncWorkerProgress)
+
+        return sent, percent, speed, eta
+
+    def clearProgress(self):
+        """
+        Remove the progress record and the old progress file after rsync
+        has finished.
+        """
+        if self.progressRecord is None:
+            self.progressRecord = progress.ProgressRecord(self.config)
+
+        self.progressRecord.remove()
+        self.progressRecord = None
+
     def rsyncCallback(self, line, params):
         """
         Parse rsync's stdout, send it to takeSnapshotMessage and
@@ -1021,9 +1286,16 @@ class Snapshots:
         if not line:
             return
 
+        self.snapshotSize.addRsyncLine(line)
+        if self.snapshotTransfer is not None:
+            self.snapshotTransfer.addRsyncLine(line)
+
         # Warning (2023-11): Do not modify the source string.
         # See #1559 for details.
-        self.setTakeSnapshotMessage(
+        # rsync reports every single file. Writing each of them into the
+        # message file and sending it to all plug-ins costs more than rsync
+        # itself. So only the latest line is published every few ms.
+        self.messagePublisher.publish(
             0, _('Take snapshot') + " (rsync: %s)" % line)
 
         # Did rsync report an error?
@@ -1042,6 +1314,64 @@ class Snapshots:
                     params[1] = True
                     self.snapshotLog.append('[C] ' + line[12:], 2)
 
+    def rsyncPermissionsCallback(self, line, user_data):
+        """
+        Rsync callback for :py:func:`takeSnapshot` if permissions are
+        collected from rsync's itemized output (see
+        :py:func:`collectPermissionsInline`). Store the permissions into
+        the fileInfoDict and pass the line on to :py:func:`rsyncCallback`
+        in the usual ``BACKINTIME: %i %n%L`` format.
+
+        Args:
+            line (str):         stdout line from rsync
+            user_data (tuple):  two item tuple of (``params``,
+                                :py:class:`FileInfoDict`). See
+                                :py:func:`rsyncCallback` for ``params``
+        """
+        params, fileInfoDict = user_data
+
+        m = self.reRsyncItemizedPerms.match(line)
+        if not m:
+            self.rsyncCallback(line, params)
+            return
+
+        itemized, uid, gid, perms, rest = m.groups()
+
+        # '*deleting' and other messages don't describe a file in the snapshot
+        if itemized[0] != '*':
+            # strip ' -> SYMLINK' or ' => HARDLINK' added by %L. Only links
+            # have a target and the name itself may contain the separator,
+            # so split at the last one.
+            name = rest
+            if itemized[0] == 'h':
+                name = rest.rpartition(' => ')[0] or rest
+            elif itemized[1] == 'L':
+                name = rest.rpartition(' -> ')[0] or rest
+
+            if itemized[1] == 'f':
+                path = b'/' + tools.rsyncUnescape(name)
+                mode = stat.S_IFREG
+                for i, c in enumerate(perms):
+                    if c in 'sStT':
+                        mode |= (stat.S_ISUID, stat.S_ISGID, stat.S_ISVTX)[i // 3]
+                    if c not in '-ST':
+                        mode |= 1 << (8 - i)
+                fileInfoDict[path] = (
+                    mode,
+                    self.userName(int(uid)).encode('utf-8', 'replace'),
+                    self.groupName(int(gid)).encode('utf-8', 'replace'))
+
+            else:
+                # rsync reports modes of folders after '--chmod' was applied
+                # and symlinks need the permissions of their target
+                path = b'/' + tools.rsyncUnescape(name).rstrip(b'/')
+                self.collectPermission(fileInfoDict, path)
+
+        # '-ii' reports unchanged items, too. Those would not show up with
+        # the usual '-i' so don't pass them on.
+        if itemized[2:].strip():
+            self.rsyncCallback(f'BACKINTIME: {itemized} {rest}', params)
+
     def makeDirs(self, path):
         """
         Wrapper for :py:func:`tools.makeDirs()`. Create directories ``path``
@@ -1138,15 +1468,20 @@ class Snapshots:
         i.setListValue('user', ('int:uid', 'str:name'), list(self.userCache.items()))
         i.setListValue('group', ('int:gid', 'str:name'), list(self.groupCache.items()))
         i.setStrValue('filesystem_mounts', json.dumps(tools.filesystemMountInfo()))
+        if self.snapshotSize.valid:
+            self.snapshotSize.save(i)
+        if self.snapshotTransfer is not None and self.snapshotTransfer.valid:
+            self.snapshotTransfer.save(i)
         sid.info = i
 
-    def backupPermissions(self, sid):
+    def backupPermissions(self, sid, parent=None):
         """
         Save permissions (owner, group, read-, write- and executable)
         for all files in Snapshot ``sid`` into snapshots fileInfoDict.
 
         Args:
-            sid (SID):  snapshot that should be scanned
+            sid (SID):      snapshot that should be scanned
+            parent (SID):   snapshot used as ``--link-dest`` for ``sid``
 
         Returns:
             int: Return code of rsync.
@@ -1154,7 +1489,7 @@ class Snapshots:
         logger.info('Save permissions', self)
         self.setTakeSnapshotMessage(0, _('Saving permissions…'))
 
-        fileInfoDict = FileInfoDict()
+        fileInfoDict = CompactFileInfoDict()
 
         if self.config.snapshotsMode() == 'ssh_encfs':
             decode = encfstools.Decode(self.config, False)
@@ -1180,30 +1515,74 @@ class Snapshots:
 
             rsync.append(d + os.sep)
 
+            user_data = (fileInfoDict, decode, [])
             proc = tools.Execute(rsync,
                                  callback=self.backupPermissionsCallback,
-                                 user_data=(fileInfoDict, decode),
+                                 user_data=user_data,
                                  parent=self,
                                  conv_str=False,
                                  join_stderr=False)
             rc = proc.run()
+            self.backupPermissionsFlush(user_data)
 
-        sid.fileInfo = fileInfoDict
+        self.saveFileInfo(sid, fileInfoDict, parent)
 
         return rc
 
+    def saveFileInfo(self, sid, fileInfoDict, parent=None):
+        """
+        Save ``fileInfoDict`` into snapshot ``sid``. If enabled in config
+        only the differences to ``parent`` are saved.
+
+        Args:
+            sid (SID):                      snapshot
+            fileInfoDict (FileInfoDict):    dict of:
+                                            {path: (permission, user, group)}
+            parent (SID):                   snapshot used as ``--link-dest``
+                                            for ``sid``
+        """
+        checkpoint = self.config.fileInfoDelta()
+        if parent is None or checkpoint < 2:
+            sid.fileInfo = fileInfoDict
+        else:
+            sid.setFileInfoDelta(fileInfoDict, parent, checkpoint)
+
     def backupPermissionsCallback(self, line, user_data):
         """
         Rsync callback for :py:func:`Snapshots.backupPermissions`.
 
         Args:
             line(bytes):        output from rsync command
-            user_data (tuple):  two item tuple of (:py:class:`FileInfoDict`,
-                                :py:class:`encfstools.Decode`)
-        """
+            user_data (tuple):  tuple of (:py:class:`FileInfoDict`,
+                                :py:class:`encfstools.Decode`) and optional
+                                a list of pending lines. If the list is
+                                given lines are decoded in batches of
+                                :py:data:`DECODE_BATCH` lines. Call
+                                :py:func:`backupPermissionsFlush` for the
+                                last batch
+        """
+        if len(user_data) > 2:
+            user_data[2].append(line)
+            if len(user_data[2]) >= self.DECODE_BATCH:
+                self.backupPermissionsFlush(user_data)
+            return
+
         fileInfoDict, decode = user_data
         self.collectPermission(fileInfoDict, b'/' + decode.path(line).rstrip(b'/'))
 
+    def backupPermissionsFlush(self, user_data):
+        """
+        Decode and collect permissions of all pending lines in ``user_data``.
+
+        Args:
+            user_data (tuple):  three item tuple of (:py:class:`FileInfoDict`,
+                                :py:class:`encfstools.Decode`, list)
+        """
+        fileInfoDict, decode, pending = user_data
+        for path in decode.paths(pending):
+            self.collectPermission(fileInfoDict, b'/' + path.rstrip(b'/'))
+        del pending[:]
+
     def collectPermission(self, fileinfo, path):
         """
         Collect permission infos about ``path`` and store them into
@@ -1224,11 +1603,27 @@ class Snapshots:
             group = self.groupName(info.st_gid).encode('utf-8', 'replace')
             fileinfo[path] = (mode, user, group)
 
+    def collectPermissionsInline(self):
+        """
+        Check if permissions can be collected from the output of the main
+        rsync call in :py:func:`takeSnapshot` instead of scanning the new
+        snapshot again in :py:func:`backupPermissions`.
+
+        This needs the log format escapes ``%U``, ``%G`` and ``%B``. It is
+        only used for local modes because rsync on a remote host maps uid
+        and gid to the remote users.
+
+        Returns:
+            bool:   ``True`` if permissions can be collected inline
+        """
+        return (self.config.snapshotsMode() in ('local', 'local_encfs')
+                and 'permsformat' in tools.rsyncCaps(config=self.config))
+
     def takeSnapshot(self, sid, now, include_folders):
         """This is the main backup routine.
 
         It will take a new snapshot and store permissions of included files
-        and folders into ``fileinfo.bz2``.
+        and folders into ``fileinfo.idx``.
 
         Args:
             sid (SID): snapshot ID which the new snapshot should get
@@ -1316,6 +1711,15 @@ class Snapshots:
         # rsync prefix & suffix
         rsync_prefix = tools.rsyncPrefix(self.config, no_perms=False)
 
+        if self.config.useChecksum() or self.config.forceUseChecksum:
+            choice = [i for i in rsync_prefix
+                      if i.startswith('--checksum-choice=')]
+            checksum = choice[-1].split('=', 1)[1] if choice \
+                       else _('rsync default')
+            self.snapshotLog.append(
+                '[I] ' + _('Use checksum {algorithm} to detect changes')
+                         .format(algorithm=checksum), 3)
+
         if self.config.excludeBySizeEnabled():
             rsync_prefix.append('--max-size=%sM' % self.config.excludeBySize())
 
@@ -1326,6 +1730,17 @@ class Snapshots:
         rsync_prefix.extend(('--delete', '--delete-excluded'))
         rsync_prefix.append('-v')
 
+        # Total size and transferred size for the snapshot size accounting
+        rsync_prefix.append('--stats')
+        self.snapshotSize = SnapshotSize()
+
+        # Compression and achieved ratio over SSH
+        if self.config.snapshotsMode() in ('ssh', 'ssh_encfs'):
+            self.snapshotTransfer = SnapshotTransfer(
+                *tools.rsyncCompression(self.config))
+        else:
+            self.snapshotTransfer = None
+
         # Use a fixed logging format for the rsync "changed files" list to
         # make it parsable e.g. in rsyncCallback()
         # %i = itemized list (11 characters) of what is being updated
@@ -1334,7 +1749,24 @@ class Snapshots:
         # %L = the string " -> SYMLINK", " => HARDLINK", or ""
         # (where SYMLINK or HARDLINK is a filename)
         # (see log format section in "man rsyncd.conf")
-        rsync_prefix.extend(('-i', '--out-format=BACKINTIME: %i %n%L'))
+        # Permissions can be taken from the same output if rsync reports
+        # unchanged items, too (-ii) and adds
+        # %U = uid, %G = gid and %B = permission bits (e.g. rwxr-xr-x)
+        if self.collectPermissionsInline():
+            fileInfoDict = CompactFileInfoDict()
+            # backup permissions of /
+            # bugfix for https://github.com/bit-team/backintime/issues/708
+            self.collectPermission(fileInfoDict, b'/')
+            callback = self.rsyncPermissionsCallback
+            user_data = (params, fileInfoDict)
+            rsync_prefix.extend(('-ii',
+                                 '--out-format=BACKINTIME: %i %U %G %B %n%L'))
+
+        else:
+            fileInfoDict = None
+            callback = self.rsyncCallback
+            user_data = params
+            rsync_prefix.extend(('-i', '--out-format=BACKINTIME: %i %n%L'))
 
         if prev_sid:
             link_dest = encode.path(os.path.join(prev_sid.sid, 'backup'))
@@ -1344,54 +1776,78 @@ class Snapshots:
         # sync changed folders
         logger.info("Call rsync to take the snapshot", self)
         new_snapshot.saveToContinue = True
-        cmd = rsync_prefix + rsync_suffix
 
-        # No quoting (quote='') because of new argument protection of rsync.
-        cmd.append(self.rsyncRemotePath(
-            new_snapshot.pathBackup(use_mode=['ssh', 'ssh_encfs']),
-            quote=''))
+        groups = self.splitIncludeFolders(include_folders,
+                                          self.config.rsyncWorkers(),
+                                          prev_sid)
+        self.rsyncWorkerProgress = [[weight, 0.0, 0, 0.0, -1]
+                                    for weight, _folders in groups]
 
         self.setTakeSnapshotMessage(0, _('Taking snapshot'))
 
-        # run rsync
-        proc = tools.Execute(cmd,
-                             # TODO
-                             # interprets the user_data in params as: list of
-                             # two bool [error, changes] but params is reused
-                             # as return value of this function with [changes,
-                             # error]. Use a separate variable to avoid
-                             # confusion!
-                             callback=self.rsyncCallback,
-                             user_data=params,
-                             filters=(self.filterRsyncProgress,),
-                             parent=self)
+        procs = []
+        for worker, (_weight, folders) in enumerate(groups):
+            if len(groups) == 1:
+                cmd = rsync_prefix + rsync_suffix
+                filters = (self.filterRsyncProgress,)
 
-        # TODO
-        # introduce centralized log msg builder to avoid spread severity level
-        # indicators like "[I]" here?
-        self.snapshotLog.append('[I] ' + proc.printable_cmd, 3)
+            else:
+                # don't delete files synced by the other rsync processes
+                cmd = rsync_prefix + self.rsyncProtect(
+                    [i for g in groups if g[1] is not folders for i in g[1]])
+                cmd.extend(self.rsyncSuffix(folders))
+                filters = (lambda line, worker=worker:
+                           self.filterRsyncProgress(line, worker), )
+
+            # No quoting (quote='') because of new argument protection of rsync.
+            cmd.append(self.rsyncRemotePath(
+                new_snapshot.pathBackup(use_mode=['ssh', 'ssh_encfs']),
+                quote=''))
+
+            # run rsync
+            proc = tools.Execute(cmd,
+                                 # TODO
+                                 # interprets the user_data in params as: list of
+                                 # two bool [error, changes] but params is reused
+                                 # as return value of this function with [changes,
+                                 # error]. Use a separate variable to avoid
+                                 # confusion!
+                                 callback=callback,
+                                 user_data=user_data,
+                                 filters=filters,
+                                 parent=self)
+
+            # TODO
+            # introduce centralized log msg builder to avoid spread severity level
+            # indicators like "[I]" here?
+            self.snapshotLog.append('[I] ' + proc.printable_cmd, 3)
+            procs.append(proc)
 
         # TODO
         # Process return value with rsync exit code to recognize errors that
         # cannot be recognized by parsing the rsync output currently
 
-        rsync_exit_code = proc.run()
-            # Fix for #1491 and #489
-            # Note that the return value (containing the exit code) of the
-            # rsync child process is not the only way to detect errors (and
-            # sometimes not reliably delivers <> 0 in case of an error):
-            # Errors are also indicated via the pass-by-ref argument
-            # user_data="params" list (updated by the callback function that
-            # parses the rsync output for error message patterns).
-
-        # cleanup
         try:
-            os.remove(self.config.takeSnapshotProgressFile())
+            if len(procs) == 1:
+                rsync_exit_codes = [procs[0].run()]
+            else:
+                # callbacks are serialized so all processes can share params
+                # and fileInfoDict
+                rsync_exit_codes = tools.ExecuteParallel(procs).run()
+        finally:
+            # publish the last status of rsync even if it failed
+            self.messagePublisher.flush()
+
+        # Fix for #1491 and #489
+        # Note that the return value (containing the exit code) of the
+        # rsync child process is not the only way to detect errors (and
+        # sometimes not reliably delivers <> 0 in case of an error):
+        # Errors are also indicated via the pass-by-ref argument
+        # user_data="params" list (updated by the callback function that
+        # parses the rsync output for error message patterns).
 
-        except Exception as e:
-            logger.debug('Failed to remove snapshot progress file %s: %s'
-                         % (self.config.takeSnapshotProgressFile(), str(e)),
-                         self)
+        # cleanup
+        self.clearProgress()
 
         # handle errors
         # TODO
@@ -1410,6 +1866,11 @@ class Snapshots:
                   "(see 'man rsync')")
         }
 
+        # errors win over exit codes which are treated as INFO only
+        rsync_exit_code = max(
+            rsync_exit_codes,
+            key=lambda code: (code not in rsync_non_error_exit_codes, code))
+
         rsync_exit_code_msg = _("'rsync' ended with exit code {exit_code}") \
             .format(exit_code=rsync_exit_code)
 
@@ -1425,6 +1886,11 @@ class Snapshots:
                 1, rsync_exit_code_msg + ": "
                    + _("See 'man rsync' for more details"))
 
+            # the remote host might have changed since it was probed
+            if rsync_exit_code in remoteprobe.STALE_EXIT_CODES \
+                    and self.config.snapshotsMode() in ('ssh', 'ssh_encfs'):
+                remoteprobe.invalidateProfile(self.config)
+
         elif rsync_exit_code < 0:  # an rsync error caused by a signal
             # HACK to fix #489 (params[0] and has_errors should be merged)
             params[0] = True
@@ -1433,6 +1899,19 @@ class Snapshots:
                    + _("Negative rsync exit codes are signal numbers, see "
                        "'kill -l' and 'man kill'"))
 
+        transfer = self.snapshotTransfer
+        if transfer is not None and transfer.valid:
+            logger.info('Compression {} (level {}): ratio {:.2f}, {:.0f} '
+                        'bytes/sec'.format(transfer.compress,
+                                           transfer.level or 'default',
+                                           transfer.ratio,
+                                           transfer.throughput),
+                        self)
+            # remember the link speed for 'auto' compression
+            if rsync_exit_code in rsync_non_error_exit_codes \
+                    and transfer.measured:
+                tools.setLinkThroughput(self.config, transfer.throughput)
+
         # params[0] -> error?
         if params[0]:
 
@@ -1465,7 +1944,14 @@ class Snapshots:
             return [False, has_errors]
 
         self.backupConfig(new_snapshot)
-        self.backupPermissions(new_snapshot)
+
+        if fileInfoDict is None:
+            self.backupPermissions(new_snapshot, prev_sid)
+
+        else:
+            logger.info('Save permissions', self)
+            self.setTakeSnapshotMessage(0, _('Saving permissions…'))
+            self.saveFileInfo(new_snapshot, fileInfoDict, prev_sid)
 
         # copy snapshot log
         try:
@@ -1503,6 +1989,7 @@ class Snapshots:
             return [False, True]
 
         self.backupInfo(sid)
+        snapshotCatalog(self.config).add(sid.sid, **sid.catalogEntry())
 
         if not has_errors and not list(self.config.anacrontabFiles()):
             tools.writeTimeStamp(self.config.anacronSpoolFile())
@@ -1527,12 +2014,10 @@ class Snapshots:
         Returns:
             set:                        set of snapshots that should be kept
         """
-        min_id = SID(min_date, self.config)
-        max_id = SID(max_date, self.config)
-
-        logger.debug("Keep all >= %s and < %s" %(min_id, max_id), self)
+        logger.debug("Keep all >= %s and < %s" %(min_date, max_date), self)
 
-        return set([sid for sid in snapshots if sid >= min_id and sid < max_id])
+        return set(SmartRemoveIndex(snapshots, self.config).all(min_date,
+                                                                max_date))
 
     def smartRemoveKeepFirst(self,
                              snapshots,
@@ -1555,26 +2040,14 @@ class Snapshots:
         Returns:
             set:                        set of snapshots that should be kept
         """
-        min_id = SID(min_date, self.config)
-        max_id = SID(max_date, self.config)
+        logger.debug("Keep first >= %s and < %s" %(min_date, max_date), self)
 
-        logger.debug("Keep first >= %s and < %s" %(min_id, max_id), self)
-
-        for sid in snapshots:
-            # try to keep the first healty snapshot
-            if keep_healthy and sid.failed:
-                logger.debug("Do not keep failed snapshot %s" %sid, self)
-                continue
-            if sid >= min_id and sid < max_id:
-                return set([sid])
-        # if all snapshots failed return the first snapshot
-        # no matter if it has errors
-        if keep_healthy:
-            return self.smartRemoveKeepFirst(snapshots,
-                                             min_date,
-                                             max_date,
-                                             keep_healthy = False)
-        return set()
+        sid = SmartRemoveIndex(snapshots, self.config).first(min_date,
+                                                             max_date,
+                                                             keep_healthy)
+        if sid is None:
+            return set()
+        return set([sid])
 
     def incMonth(self, date):
         """
@@ -1618,11 +2091,16 @@ class Snapshots:
                         keep_all,
                         keep_one_per_day,
                         keep_one_per_week,
-                        keep_one_per_month):
+                        keep_one_per_month,
+                        explain = None):
         """
         Get a list of old snapshots that should be removed based on configurable
         intervals.
 
+        All intervals are looked up in one :py:class:`SmartRemoveIndex`
+        so the snapshots are only sorted once and their failed and name
+        flags are read in one go.
+
         Args:
             now_full (datetime.datetime):   date and time when takeSnapshot was
                                             started
@@ -1634,6 +2112,10 @@ class Snapshots:
                                             last ``keep_one_per_week`` weeks
             keep_one_per_month (int):       keep one snapshot per month for the
                                             last ``keep_one_per_month`` months
+            explain (dict):                 if given it will be filled with
+                                            every considered :py:class:`SID`
+                                            as key and the rule which kept or
+                                            removed it as value
 
         Returns:
             list:                           snapshots that should be removed
@@ -1643,6 +2125,9 @@ class Snapshots:
 
         if len(snapshots) <= 1:
             logger.debug('There is only one snapshot, so keep it', self)
+            if explain is not None:
+                for sid in snapshots:
+                    explain[sid] = 'last snapshot'
             return []
 
         if now_full is None:
@@ -1650,25 +2135,32 @@ class Snapshots:
 
         now = now_full.date()
 
+        index = SmartRemoveIndex(snapshots, self.config)
+
+        # snapshots to keep and the first rule which keeps them
+        keep = {}
+
+        def keepSid(sid, rule):
+            if sid is not None and sid not in keep:
+                keep[sid] = rule
+
         # keep the last snapshot
-        keep = set([snapshots[0]])
+        keepSid(snapshots[0], 'last snapshot')
 
         # keep all for the last keep_all days
         if keep_all > 0:
-            keep |= self.smartRemoveKeepAll(
-                snapshots,
-                now - datetime.timedelta(days=keep_all-1),
-                now + datetime.timedelta(days=1))
+            for sid in index.all(now - datetime.timedelta(days=keep_all-1),
+                                 now + datetime.timedelta(days=1)):
+                keepSid(sid, 'keep all for the last {} days'.format(keep_all))
 
         # keep one per day for the last keep_one_per_day days
         if keep_one_per_day > 0:
             d = now
             for i in range(0, keep_one_per_day):
-                keep |= self.smartRemoveKeepFirst(
-                    snapshots,
-                    d,
-                    d + datetime.timedelta(days=1),
-                    keep_healthy=True)
+                keepSid(index.first(d,
+                                    d + datetime.timedelta(days=1),
+                                    keep_healthy=True),
+                        'one per day ({})'.format(d))
                 d -= datetime.timedelta(days=1)
 
         # keep one per week for the last keep_one_per_week weeks
@@ -1676,11 +2168,11 @@ class Snapshots:
             d = now - datetime.timedelta(days=now.weekday() + 1)
 
             for i in range(0, keep_one_per_week):
-                keep |= self.smartRemoveKeepFirst(
-                    snapshots,
-                    d,
-                    d + datetime.timedelta(days=8),
-                    keep_healthy=True)
+                keepSid(index.first(d,
+                                    d + datetime.timedelta(days=8),
+                                    keep_healthy=True),
+                        'one per week ({} - {})'.format(
+                            d, d + datetime.timedelta(days=7)))
                 d -= datetime.timedelta(days=7)
 
         # keep one per month for the last keep_one_per_month months
@@ -1689,8 +2181,8 @@ class Snapshots:
             d2 = self.incMonth(d1)
 
             for i in range(0, keep_one_per_month):
-                keep |= self.smartRemoveKeepFirst(
-                    snapshots, d1, d2, keep_healthy=True)
+                keepSid(index.first(d1, d2, keep_healthy=True),
+                        'one per month ({})'.format(d1.strftime('%Y-%m')))
                 d2 = d1
                 d1 = self.decMonth(d1)
 
@@ -1698,12 +2190,12 @@ class Snapshots:
         first_year = int(snapshots[-1].sid[:4])
 
         for i in range(first_year, now.year+1):
-            keep |= self.smartRemoveKeepFirst(snapshots,
-                                              datetime.date(i, 1, 1),
-                                              datetime.date(i+1, 1, 1),
-                                              keep_healthy=True)
+            keepSid(index.first(datetime.date(i, 1, 1),
+                                datetime.date(i+1, 1, 1),
+                                keep_healthy=True),
+                    'one per year ({})'.format(i))
 
-        logger.debug(f'Keep snapshots: {keep}', self)
+        logger.debug(f'Keep snapshots: {set(keep)}', self)
 
         del_snapshots = []
 
@@ -1712,13 +2204,21 @@ class Snapshots:
                 continue
 
             if self.config.dontRemoveNamedSnapshots():
-                if sid.name:
+                # the catalog might miss a name written in place by someone
+                # else, so double-check on disk before removing
+                if sid.sid in index.named or sid.name:
                     logger.debug(
                         f'Keep snapshot: {sid}, because it has a name', self)
+                    keep[sid] = 'has a name'
                     continue
 
             del_snapshots.append(sid)
 
+        if explain is not None:
+            explain.update(keep)
+            for sid in del_snapshots:
+                explain[sid] = 'not kept by any rule'
+
         return del_snapshots
 
     def smartRemove(self, del_snapshots, log = None):
@@ -1741,80 +2241,19 @@ class Snapshots:
         if self.config.snapshotsMode() in ['ssh', 'ssh_encfs'] and self.config.smartRemoveRunRemoteInBackground():
             logger.info('[smart remove] remove snapshots in background: %s'
                         % del_snapshots, self)
-            lckFile = os.path.normpath(
-                os.path.join(
-                    del_snapshots[0].path(use_mode=['ssh', 'ssh_encfs']),
-                    os.pardir,
-                    'smartremove.lck'
-                )
-            )
-
-            maxLength = self.config.sshMaxArgLength()
-            if not maxLength:
-                import sshMaxArg
-                user_host = '%s@%s' % (self.config.sshUser(),
-                                       self.config.sshHost())
-                maxLength = sshMaxArg.probe_max_ssh_command_size(self.config)
-                self.config.setSshMaxArgLength(maxLength)
-                self.config.save()
-                sshMaxArg.report_result(user_host, maxLength)
-
-            additionalChars = len(self.config.sshPrefixCmd(cmd_type = str))
-
-            head = 'screen -d -m bash -c "('
-            # create temp dir used for delete files with rsync
-            head += 'TMP=\\$(mktemp -d); '
-            # make sure $TMP dir was created
-            head += 'test -z \\\"\\$TMP\\\" && exit 1; '
-            # make sure $TMP is empty
-            head += 'test -n \\\"\\$(ls \\$TMP)\\\" && exit 1; '
-            if logger.DEBUG:
-                head += 'logger -t \\\"backintime smart-remove [$BASHPID]\\\" \\\"start\\\"; '
-            head += 'flock -x 9; '
-            if logger.DEBUG:
-                head += 'logger -t \\\"backintime smart-remove [$BASHPID]\\\" \\\"got exclusive flock\\\"; '
-
-            tail = 'rmdir \\$TMP) 9>\\\"%s\\\""' %lckFile
-
-            cmds = []
+            self.removeRemote(del_snapshots, background = True)
+        elif self.config.snapshotsMode() in ['ssh', 'ssh_encfs']:
+            logger.info("[smart remove] remove snapshots: %s"
+                        %del_snapshots, self)
 
-            for sid in del_snapshots:
-                remote = self.rsyncRemotePath(sid.path(use_mode = ['ssh', 'ssh_encfs']), use_mode = [], quote = '\\\"')
-                rsync = ' '.join(tools.rsyncRemove(self.config, run_local = False))
-                rsync += ' \\\"\\$TMP/\\\" {}; '.format(remote)
-
-                s = 'test -e \\\"%s\\\" && (' %sid.path(use_mode = ['ssh', 'ssh_encfs'])
-
-                if logger.DEBUG:
-                    s += 'logger -t \\\"backintime smart-remove [$BASHPID]\\\" '
-                    s += '\\\"snapshot %s still exist\\\"; ' %sid
-                    s += 'sleep 1; ' #add one second delay because otherwise you might not see serialized process with small snapshots
-
-                s += rsync
-                s += 'rmdir \\\"%s\\\"; ' %sid.path(use_mode = ['ssh', 'ssh_encfs'])
-
-                if logger.DEBUG:
-                    s += 'logger -t \\\"backintime smart-remove [$BASHPID]\\\" '
-                    s += '\\\"snapshot %s remove done\\\"' %sid
-
-                s += '); '
-                cmds.append(s)
-
-            for cmd in tools.splitCommands(cmds,
-                                           head = head,
-                                           tail = tail,
-                                           maxLength = maxLength - additionalChars):
-                tools.Execute(self.config.sshCommand([cmd,],
-                                                     quote = False,
-                                                     nice = False,
-                                                     ionice = False)).run()
+            self.removeRemote(del_snapshots,
+                              log = lambda x: log(_('Smart remove') + ' ' + x))
         else:
             logger.info("[smart remove] remove snapshots: %s"
                         %del_snapshots, self)
 
-            for i, sid in enumerate(del_snapshots, 1):
-                log(_('Smart remove') + ' %s/%s' %(i, len(del_snapshots)))
-                self.remove(sid)
+            self.removeLocal(del_snapshots,
+                             log = lambda x: log(_('Smart remove') + ': ' + x))
 
     def freeSpace(self, now):
         """
@@ -1845,6 +2284,7 @@ class Snapshots:
             oldBackupId = SID(self.config.removeOldSnapshotsDate(), self.config)
             logger.debug("Remove snapshots older than: {}".format(oldBackupId.withoutTag), self)
 
+            old_snapshots = []
             while True:
                 if len(snapshots) <= 1:
                     break
@@ -1858,9 +2298,20 @@ class Snapshots:
 
                 msg = 'Remove snapshot {} because it is older than {}'
                 logger.debug(msg.format(snapshots[0].withoutTag, oldBackupId.withoutTag), self)
-                self.remove(snapshots[0])
+                old_snapshots.append(snapshots[0])
                 del snapshots[0]
 
+            if self.config.snapshotsMode() in ['ssh', 'ssh_encfs']:
+                self.removeRemote(
+                    old_snapshots,
+                    log = lambda x: self.setTakeSnapshotMessage(
+                        0, _('Removing old snapshots') + ' ' + x))
+            else:
+                self.removeLocal(
+                    old_snapshots,
+                    log = lambda x: self.setTakeSnapshotMessage(
+                        0, _('Removing old snapshots') + ': ' + x))
+
         # smart remove
         enabled, keep_all, keep_one_per_day, keep_one_per_week, keep_one_per_month = self.config.smartRemove()
 
@@ -1873,43 +2324,14 @@ class Snapshots:
                                                  keep_one_per_month)
             self.smartRemove(del_snapshots)
 
-        # try to keep min free space
+        # try to keep min free space and inodes
+        minFreeSpace = None
+        minFreeInodes = None
         if self.config.minFreeSpaceEnabled():
             self.setTakeSnapshotMessage(0, _('Trying to keep min free space'))
-
             minFreeSpace = self.config.minFreeSpaceMib()
-
             logger.debug("Keep min free disk space: {} MiB".format(minFreeSpace), self)
 
-            snapshots = listSnapshots(self.config, reverse = False)
-
-            while True:
-                if len(snapshots) <= 1:
-                    break
-
-                free_space = self.statFreeSpaceLocal(self.config.snapshotsFullPath())
-
-                if free_space is None:
-                    free_space = self.statFreeSpaceSsh()
-
-                if free_space is None:
-                    logger.warning('Failed to get free space. Skipping', self)
-                    break
-
-                if free_space >= minFreeSpace:
-                    break
-
-                if self.config.dontRemoveNamedSnapshots():
-                    if snapshots[0].name:
-                        del snapshots[0]
-                        continue
-
-                msg = "free disk space: {} MiB. Remove snapshot {}"
-                logger.debug(msg.format(free_space, snapshots[0].withoutTag), self)
-                self.remove(snapshots[0])
-                del snapshots[0]
-
-        #try to keep free inodes
         if self.config.minFreeInodesEnabled():
             minFreeInodes = self.config.minFreeInodes()
             self.setTakeSnapshotMessage(
@@ -1921,71 +2343,164 @@ class Snapshots:
                 "Keep min {perc}% free inodes".format(perc=minFreeInodes),
                 self)
 
+        if minFreeSpace is not None or minFreeInodes is not None:
+            self.keepFreeSpace(minFreeSpace, minFreeInodes)
             snapshots = listSnapshots(self.config, reverse = False)
 
-            while True:
-                if len(snapshots) <= 1:
-                    break
-
-                try:
-                    info = os.statvfs(self.config.snapshotsPath())
-                    free_inodes = info.f_favail
-                    max_inodes  = info.f_files
-                except Exception as e:
-                    logger.debug('Failed to get free inodes for snapshot path %s: %s'
-                                 % (self.config.snapshotsPath(), str(e)),
-                                 self)
-                    break
-
-                if free_inodes >= max_inodes * (minFreeInodes / 100.0):
-                    break
-
-                if self.config.dontRemoveNamedSnapshots():
-                    if snapshots[0].name:
-                        del snapshots[0]
-                        continue
-
-                logger.debug("free inodes: %.2f%%. Remove snapshot %s"
-                            %((100.0 / max_inodes * free_inodes), snapshots[0].withoutTag),
-                            self)
-                self.remove(snapshots[0])
-                del snapshots[0]
-
         #set correct last snapshot again
         if last_snapshot is not snapshots[-1]:
             self.createLastSnapshotSymlink(snapshots[-1])
 
-    def statFreeSpaceLocal(self, path):
+    def keepFreeSpace(self, minFreeSpace = None, minFreeInodes = None):
         """
-        Get free space on filesystem containing ``path`` in MiB using
-        :py:func:`os.statvfs()`. Depending on remote SFTP server this might fail
-        on sshfs mounted shares.
+        Remove the oldest snapshots until there are at least ``minFreeSpace``
+        MiB free space and ``minFreeInodes`` percent free inodes.
+
+        Hardlinked files are only freed if all of their links are removed.
+        So instead of removing one snapshot after another and checking the
+        free space in between, :py:class:`retentionplanner.RetentionPlanner`
+        computes the shortest row of oldest snapshots which frees enough.
+        This row is removed in one batch. The newest snapshot is never
+        removed.
 
         Args:
-            path (str): full path
+            minFreeSpace (int):     minimum free space in MiB or ``None``
+            minFreeInodes (int):    minimum free inodes in percent or ``None``
 
         Returns:
-            int         free space in MiB
+            list:                   removed snapshots
         """
-        try:
-            info = os.statvfs(path)
-            if info.f_blocks != info.f_bavail:
-                return info.f_frsize * info.f_bavail // (1024 * 1024)
-        except Exception as e:
-            logger.debug('Failed to get free space for %s: %s'
-                         %(path, str(e)),
-                         self)
-        logger.warning('Failed to stat snapshot path', self)
+        snapshots = listSnapshots(self.config, reverse = False)
+        candidates = snapshots[:-1]
+        if self.config.dontRemoveNamedSnapshots():
+            candidates = [sid for sid in candidates if not sid.name]
+        if not candidates:
+            return []
 
-    def statFreeSpaceSsh(self):
-        """
-        Get free space on remote filesystem in MiB. This will call ``df`` on
-        remote host and parse its output.
+        if minFreeSpace is not None:
+            free_space = self.statFreeSpaceLocal(self.config.snapshotsFullPath())
 
-        Returns:
-            int         free space in MiB
-        """
-        if self.config.snapshotsMode() not in ('ssh', 'ssh_encfs'):
+            if free_space is None:
+                free_space = self.statFreeSpaceSsh()
+
+            if free_space is None:
+                logger.warning('Failed to get free space. Skipping', self)
+                minFreeSpace = None
+            else:
+                logger.debug("free disk space: {} MiB".format(free_space), self)
+
+        if minFreeInodes is not None:
+            try:
+                info = os.statvfs(self.config.snapshotsPath())
+                free_inodes = info.f_favail
+                max_inodes  = info.f_files
+            except Exception as e:
+                logger.debug('Failed to get free inodes for snapshot path %s: %s'
+                             % (self.config.snapshotsPath(), str(e)),
+                             self)
+                minFreeInodes = None
+            else:
+                logger.debug("free inodes: %.2f%%"
+                             %(100.0 / max_inodes * free_inodes), self)
+
+        if minFreeSpace is None and minFreeInodes is None:
+            return []
+
+        def enough(freedBytes, freedInodes):
+            if minFreeSpace is not None \
+                    and free_space + freedBytes / 1024**2 < minFreeSpace:
+                return False
+            if minFreeInodes is not None \
+                    and free_inodes + freedInodes < max_inodes * (minFreeInodes / 100.0):
+                return False
+            return True
+
+        planner = retentionplanner.RetentionPlanner()
+        plan = planner.plan(candidates, lambda sid: self.scanRetention(planner, sid), enough)
+        if not plan:
+            return []
+
+        logger.info('Remove {} snapshots to free {} MiB and {} inodes: {}'
+                    .format(len(plan),
+                            planner.freedBytes // 1024**2,
+                            planner.freedInodes,
+                            plan),
+                    self)
+        if not enough(planner.freedBytes, planner.freedInodes):
+            logger.warning('Removing all old snapshots will not free enough '
+                           'space or inodes', self)
+
+        if self.config.snapshotsMode() in ['ssh', 'ssh_encfs']:
+            self.removeRemote(
+                plan,
+                log = lambda x: self.setTakeSnapshotMessage(
+                    0, _('Removing old snapshots') + ' ' + x))
+        else:
+            self.removeLocal(
+                plan,
+                log = lambda x: self.setTakeSnapshotMessage(
+                    0, _('Removing old snapshots') + ': ' + x))
+
+        return plan
+
+    def scanRetention(self, planner, sid):
+        """
+        Add all files in snapshot ``sid`` to ``planner``. On remote hosts
+        the snapshot is listed with ``find`` over SSH because sshfs doesn't
+        provide real inode numbers.
+
+        Args:
+            planner (retentionplanner.RetentionPlanner):    planner
+            sid (SID):                                      snapshot
+        """
+        if self.config.snapshotsMode() not in ('ssh', 'ssh_encfs'):
+            planner.addTree(sid.path())
+            return
+
+        path = sid.path(use_mode = ['ssh', 'ssh_encfs'])
+        cmd = self.config.sshCommand(['find', '"{}"'.format(path),
+                                      '-printf',
+                                      "'{}'".format(planner.FIND_FORMAT)],
+                                     nice = False,
+                                     ionice = False)
+        proc = subprocess.Popen(cmd,
+                                stdout = subprocess.PIPE,
+                                stderr = subprocess.DEVNULL)
+        with proc.stdout:
+            planner.addFindOutput(proc.stdout)
+        proc.wait()
+
+    def statFreeSpaceLocal(self, path):
+        """
+        Get free space on filesystem containing ``path`` in MiB using
+        :py:func:`os.statvfs()`. Depending on remote SFTP server this might fail
+        on sshfs mounted shares.
+
+        Args:
+            path (str): full path
+
+        Returns:
+            int         free space in MiB
+        """
+        try:
+            info = os.statvfs(path)
+            if info.f_blocks != info.f_bavail:
+                return info.f_frsize * info.f_bavail // (1024 * 1024)
+        except Exception as e:
+            logger.debug('Failed to get free space for %s: %s'
+                         %(path, str(e)),
+                         self)
+        logger.warning('Failed to stat snapshot path', self)
+
+    def statFreeSpaceSsh(self):
+        """
+        Get free space on remote filesystem in MiB. This will call ``df`` on
+        remote host and parse its output.
+
+        Returns:
+            int         free space in MiB
+        """
+        if self.config.snapshotsMode() not in ('ssh', 'ssh_encfs'):
             return None
 
         snapshots_path_ssh = self.config.sshSnapshotsFullPath()
@@ -2036,7 +2551,7 @@ class Snapshots:
                                     Which means if a file is exactly the same in
                                     different snapshots only the first snapshot
                                     will be listed
-            flag_deep_check (bool): use md5sum to check uniqueness of files.
+            flag_deep_check (bool): compare file digests to check uniqueness.
                                     More accurate but slow
             list_equal_to (str):    full path to file. If not empty only return
                                     snapshots which have exactly the same file
@@ -2044,60 +2559,105 @@ class Snapshots:
         Returns:
             list:                   filtered list of :py:class:`SID` objects
         """
-        snapshotsFiltered = []
-
-        base_full_path = base_sid.pathBackup(base_path)
-        if not os.path.lexists(base_full_path):
-            return []
+        return list(self.iterFilter(base_sid, base_path, snapshotsList,
+                                    list_diff_only, flag_deep_check,
+                                    list_equal_to))
 
-        allSnapshotsList = [RootSnapshot(self.config)]
-        allSnapshotsList.extend(snapshotsList)
+    def iterFilter(self,
+                   base_sid,
+                   base_path,
+                   snapshotsList,
+                   list_diff_only  = False,
+                   flag_deep_check = False,
+                   list_equal_to = '',
+                   cancel = None):
+        """
+        Same as :py:func:`filter` but yield snapshots as soon as they qualify.
+        Every snapshot is checked with a single ``lstat``. In deep check mode
+        all candidates are collected first so their digests can be calculated
+        in parallel.
 
-        #links
-        if os.path.islink(base_full_path):
-            targets = []
+        Args:
+            base_sid (SID):         see :py:func:`filter`
+            base_path (str):        see :py:func:`filter`
+            snapshotsList (list):   see :py:func:`filter`
+            list_diff_only (bool):  see :py:func:`filter`
+            flag_deep_check (bool): see :py:func:`filter`
+            list_equal_to (str):    see :py:func:`filter`
+            cancel (method):        called before every snapshot. Stop
+                                    filtering if it returns ``True``
 
-            for sid in allSnapshotsList:
-                path = sid.pathBackup(base_path)
+        Yields:
+            SID:                    snapshots which passed the filter
+        """
+        if cancel is None:
+            cancel = lambda: False
 
-                if os.path.lexists(path) and os.path.islink(path):
-                    if list_diff_only:
-                        target = os.readlink(path)
-                        if target in targets:
-                            continue
-                        targets.append(target)
-                    snapshotsFiltered.append(sid)
+        try:
+            base_mode = os.lstat(base_sid.pathBackup(base_path)).st_mode
+        except OSError:
+            return
 
-            return snapshotsFiltered
+        allSnapshotsList = [RootSnapshot(self.config)]
+        allSnapshotsList.extend(snapshotsList)
 
-        #directories
-        if os.path.isdir(base_full_path):
+        def candidates(check):
             for sid in allSnapshotsList:
+                if cancel():
+                    return
                 path = sid.pathBackup(base_path)
+                try:
+                    mode = os.lstat(path).st_mode
+                except OSError:
+                    continue
+                if check(mode):
+                    yield sid, path
 
-                if os.path.exists(path) and not os.path.islink(path) and os.path.isdir(path):
-                    snapshotsFiltered.append(sid)
+        #links
+        if stat.S_ISLNK(base_mode):
+            targets = set()
+            for sid, path in candidates(stat.S_ISLNK):
+                if list_diff_only:
+                    target = os.readlink(path)
+                    if target in targets:
+                        continue
+                    targets.add(target)
+                yield sid
+            return
 
-            return snapshotsFiltered
+        #directories
+        if stat.S_ISDIR(base_mode):
+            for sid, path in candidates(stat.S_ISDIR):
+                yield sid
+            return
 
         #files
         if not list_diff_only and not list_equal_to:
-            for sid in allSnapshotsList:
-                path = sid.pathBackup(base_path)
-
-                if os.path.exists(path) and not os.path.islink(path) and os.path.isfile(path):
-                    snapshotsFiltered.append(sid)
-
-            return snapshotsFiltered
+            for sid, path in candidates(stat.S_ISREG):
+                yield sid
+            return
 
         # check for duplicates
-        uniqueness = tools.UniquenessSet(flag_deep_check, follow_symlink = False, list_equal_to = list_equal_to)
-        for sid in allSnapshotsList:
-            path = sid.pathBackup(base_path)
-            if os.path.exists(path) and not os.path.islink(path) and os.path.isfile(path) and uniqueness.check(path):
-                snapshotsFiltered.append(sid)
+        cache = tools.digestCache(self.config)
+        uniqueness = tools.UniquenessSet(flag_deep_check,
+                                         follow_symlink = False,
+                                         list_equal_to = list_equal_to,
+                                         cache = cache)
+        files = candidates(stat.S_ISREG)
+        if flag_deep_check:
+            files = list(files)
+            if cancel():
+                return
+            uniqueness.prefetch([path for sid, path in files])
 
-        return snapshotsFiltered
+        try:
+            for sid, path in files:
+                if cancel():
+                    return
+                if uniqueness.check(path):
+                    yield sid
+        finally:
+            cache.save()
 
     #TODO: move this to config.Config -> Don't!
     def rsyncRemotePath(self, path, use_mode = ['ssh', 'ssh_encfs'], quote = '"'):
@@ -2329,6 +2889,532 @@ class Snapshots:
 
         return (items1, items2)
 
+    def rsyncProtect(self, includeFolders):
+        """
+        Format protect filters for rsync which prevent ``--delete`` from
+        removing ``includeFolders`` and their parent folders on the
+        receiving side.
+
+        Args:
+            includeFolders (list):  folders to protect. list of
+                                    tuples (item, int) where ``int`` is ``0``
+                                    if ``item`` is a folder or ``1`` if ``item``
+                                    is a file
+
+        Returns:
+            list:                   rsync filter options
+        """
+        items1, items2 = self.rsyncInclude(includeFolders)
+
+        return ['--filter=P ' + i[len('--include='):]
+                for i in tools.OrderedSet(list(items1) + list(items2))]
+
+    def splitIncludeFolders(self, includeFolders, workers, sid=None):
+        """
+        Split ``includeFolders`` into up to ``workers`` disjoint groups which
+        can be synced by separate rsync processes. Groups are balanced by
+        the number of files each include folder had in snapshot ``sid``.
+        Nested include folders always end up in the same group.
+
+        Args:
+            includeFolders (list):  folders to include. list of
+                                    tuples (item, int) where ``int`` is ``0``
+                                    if ``item`` is a folder or ``1`` if ``item``
+                                    is a file
+            workers (int):          maximum number of groups
+            sid (SID):              previous snapshot used for the number
+                                    of files or ``None``
+
+        Returns:
+            list:                   list of tuples (weight, includeFolders)
+        """
+        if workers < 2 or len(includeFolders) < 2 \
+                or any(i[0] == '/' for i in includeFolders):
+            return [(1, includeFolders)]
+
+        counts = self.includeFileCounts(includeFolders, sid)
+
+        # [weight, folders] of top-level include folders and their nested
+        # include folders
+        roots = []
+        for count, item in sorted(zip(counts, includeFolders),
+                                  key=lambda i: i[1][0]):
+            for root in roots:
+                if (item[0] + '/').startswith(root[1][0][0].rstrip('/') + '/'):
+                    root[0] += count
+                    root[1].append(item)
+                    break
+            else:
+                roots.append([count, [item]])
+
+        # every folder has at least one file
+        groups = [[0, []] for _ in range(min(workers, len(roots)))]
+        for count, items in sorted(roots, key=lambda i: i[0], reverse=True):
+            group = min(groups, key=lambda g: g[0])
+            group[0] += max(count, 1)
+            group[1].extend(items)
+
+        return [tuple(group) for group in groups]
+
+    def includeFileCounts(self, includeFolders, sid):
+        """
+        Count how many files each include folder had in snapshot ``sid``
+        using its "fileinfo.idx".
+
+        Args:
+            includeFolders (list):  folders to include. list of
+                                    tuples (item, int)
+            sid (SID):              snapshot or ``None``
+
+        Returns:
+            list:                   number of files for each item in
+                                    ``includeFolders``. All ``0`` if there
+                                    is no usable "fileinfo.idx"
+        """
+        counts = [0] * len(includeFolders)
+        index = sid.fileInfoIndex(fallback=False) if sid else None
+        if index is None:
+            return counts
+
+        folders = sorted((item[0].encode().rstrip(b'/'), i)
+                         for i, item in enumerate(includeFolders))
+        keys = [folder for folder, _ in folders]
+
+        try:
+            for path in index:
+                # the closest include folder sorted before path
+                # or one of its parents
+                j = bisect.bisect_right(keys, path) - 1
+                while j >= 0:
+                    if path == keys[j] or path.startswith(keys[j] + b'/'):
+                        counts[folders[j][1]] += 1
+                        break
+                    j -= 1
+
+        except (OSError, ValueError, zlib.error) as e:
+            logger.debug('Failed to count files in snapshot {}: {}'.format(
+                         sid, str(e)), self)
+
+        return counts
+
+
+class SmartRemoveIndex(object):
+    """
+    Snapshots sorted by date for the interval lookups done by
+    :py:func:`Snapshots.smartRemoveList`. Every lookup is a binary search
+    in the sorted snapshot IDs instead of a scan over all snapshots.
+
+    The failed and name flags of all snapshots are read on first use from
+    the snapshot catalog in one go. Only snapshots which are missing in the
+    catalog have their flags read from disk.
+
+    Args:
+        snapshots (list):       list of :py:class:`SID` objects in any order
+        cfg (config.Config):    current config
+    """
+    def __init__(self, snapshots, cfg):
+        self.config = cfg
+        self.sids = sorted(snapshots)
+        self.keys = [sid.sid for sid in self.sids]
+        self._entries = None
+        self._failed = None
+        self._named = None
+
+    def _flags(self, key, filename):
+        """
+        Snapshot IDs whose catalog field ``key`` is set. Snapshots missing in
+        the catalog are checked for ``filename`` inside the snapshot folder.
+        """
+        if self._entries is None:
+            self._entries = snapshotCatalog(self.config).entries()
+
+        # SID.path() looks up the snapshots folder in the config for every
+        # call. That's too expensive for thousands of snapshots
+        base = self.config.snapshotsFullPath()
+        ret = set()
+        for sid in self.sids:
+            entry = self._entries.get(sid.sid)
+            if entry is not None:
+                if entry[key]:
+                    ret.add(sid.sid)
+            elif os.path.isfile(os.path.join(base, sid.sid, filename)):
+                ret.add(sid.sid)
+
+        return ret
+
+    @property
+    def failed(self):
+        """
+        Set of snapshot IDs (:py:class:`str`) which are marked as failed.
+        """
+        if self._failed is None:
+            self._failed = self._flags('failed', SID.FAILED)
+
+        return self._failed
+
+    @property
+    def named(self):
+        """
+        Set of snapshot IDs (:py:class:`str`) which have a name.
+        """
+        if self._named is None:
+            self._named = set(sid for sid in self._flags('name', SID.NAME)
+                              if sid in self._entries
+                              or SID(sid, self.config).name)
+
+        return self._named
+
+    def range(self, min_date, max_date):
+        """
+        Indexes of the first snapshot ``>= min_date`` and the first snapshot
+        ``>= max_date`` in :py:attr:`sids`.
+
+        Args:
+            min_date (datetime.date):   start of the interval
+            max_date (datetime.date):   end of the interval (excluded)
+
+        Returns:
+            tuple:                      two int
+        """
+        lo = bisect.bisect_left(self.keys, SID(min_date, self.config).sid)
+        hi = bisect.bisect_left(self.keys, SID(max_date, self.config).sid, lo)
+        return lo, hi
+
+    def all(self, min_date, max_date):
+        """
+        All snapshots between ``min_date`` and ``max_date``.
+
+        Returns:
+            list:   list of :py:class:`SID` oldest first
+        """
+        lo, hi = self.range(min_date, max_date)
+        return self.sids[lo:hi]
+
+    def first(self, min_date, max_date, keep_healthy = False):
+        """
+        The newest snapshot between ``min_date`` and ``max_date``.
+
+        Args:
+            min_date (datetime.date):   start of the interval
+            max_date (datetime.date):   end of the interval (excluded)
+            keep_healthy (bool):        skip snapshots marked as failed
+                                        unless all of them failed
+
+        Returns:
+            SID:                        snapshot or ``None`` if there is none
+                                        in the interval
+        """
+        lo, hi = self.range(min_date, max_date)
+        if lo == hi:
+            return None
+
+        if keep_healthy:
+            failed = self.failed
+            for i in range(hi - 1, lo - 1, -1):
+                if self.keys[i] not in failed:
+                    return self.sids[i]
+                logger.debug("Do not keep failed snapshot %s" %self.sids[i],
+                             self)
+
+        # if all snapshots failed return the first snapshot
+        # no matter if it has errors
+        return self.sids[hi - 1]
+
+
+class TakeSnapshotMessagePublisher(object):
+    """
+    Rate-limited publisher for status messages which come in at a high rate
+    (e.g. one for every line of rsync's output). Every message is added to
+    the snapshot log right away but only the latest one is kept in memory
+    and written to the message file and sent to the plug-ins at most every
+    :py:data:`INTERVAL` seconds or when the severity changes. A message
+    kept back is published by the next :py:func:`tick` (rsync's progress
+    updates) or the final :py:func:`flush` at the latest.
+
+    Args:
+        snapshots (Snapshots):  instance used to publish the messages
+        interval (float):       minimum seconds between two published
+                                messages
+    """
+    INTERVAL = 0.25
+
+    def __init__(self, snapshots, interval=INTERVAL):
+        self.snapshots = snapshots
+        self.interval = interval
+        self.pending = None
+        self.lastType = None
+        self.lastPublished = 0.0
+
+    def publish(self, type_id, message):
+        """
+        Add ``message`` to the snapshot log and publish it if the last
+        published message is older than :py:attr:`interval` or had a
+        different severity. Otherwise keep it until the next
+        :py:func:`flush`.
+
+        Args:
+            type_id (int):  severity level. See
+                            :py:func:`Snapshots.setTakeSnapshotMessage`
+            message (str):  status message
+        """
+        if type_id == 1:
+            self.snapshots.snapshotLog.append('[E] ' + message, 1)
+        else:
+            self.snapshots.snapshotLog.append('[I] ' + message, 3)
+
+        self.pending = (type_id, message)
+        if type_id != self.lastType \
+                or time.monotonic() - self.lastPublished >= self.interval:
+            self.flush()
+
+    def tick(self):
+        """
+        Publish the pending message if it was kept back for longer than
+        :py:attr:`interval`. Call this periodically so the status doesn't
+        get stuck on an old message while no new ones come in.
+        """
+        if self.pending is not None \
+                and time.monotonic() - self.lastPublished >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Publish the pending message if there is one.
+        """
+        if self.pending is None:
+            return
+
+        type_id, message = self.pending
+        self.pending = None
+        self.delivered(type_id)
+        self.snapshots.publishTakeSnapshotMessage(type_id, message)
+
+    def delivered(self, type_id):
+        """
+        A message with severity ``type_id`` was published directly. Drop the
+        pending message because it is older.
+        """
+        self.pending = None
+        self.lastType = type_id
+        self.lastPublished = time.monotonic()
+
+
+class SnapshotSize(object):
+    """
+    Disk usage of one snapshot collected while it was taken and stored in
+    its ``info`` file. Walking a snapshot with ``du`` would stat every
+    hardlink again.
+
+    ``total`` is the size of all files in the snapshot as reported by
+    ``rsync --stats``. ``new`` are the bytes rsync transferred and the
+    folders, files and symlinks rsync created (counted from the itemized
+    output). Everything else is ``shared`` with older snapshots through
+    ``--link-dest``.
+
+    Args:
+        totalBytes (int):   size of all files
+        newBytes (int):     size of new and changed files
+        totalInodes (int):  number of files, folders and symlinks
+        newInodes (int):    number of new and changed files, folders and
+                            symlinks
+    """
+    KEYS = ('size.total_bytes', 'size.new_bytes',
+            'size.total_inodes', 'size.new_inodes')
+
+    #rsync --stats output
+    RE_STATS = re.compile(r'^(Number of files|Total file size|'
+                          r'Total transferred file size): ([\d,.]+[KMGT]?)')
+
+    def __init__(self, totalBytes=0, newBytes=0, totalInodes=0, newInodes=0):
+        self.totalBytes = totalBytes
+        self.newBytes = newBytes
+        self.totalInodes = totalInodes
+        self.newInodes = newInodes
+        self.valid = False
+
+    @property
+    def sharedBytes(self):
+        return max(0, self.totalBytes - self.newBytes)
+
+    @property
+    def sharedInodes(self):
+        return max(0, self.totalInodes - self.newInodes)
+
+    def addRsyncLine(self, line):
+        """
+        Count one line of rsync's output. Parallel rsync processes are
+        summed up.
+
+        Args:
+            line (str): stdout line from rsync
+        """
+        # BACKINTIME: >f+++++++++ foo
+        # BACKINTIME: cd+++++++++ bar/
+        if line.startswith('BACKINTIME: '):
+            if line[12:13] in ('>', 'c'):
+                self.newInodes += 1
+            return
+
+        m = self.RE_STATS.match(line)
+        if not m:
+            return
+
+        key, value = m.groups()
+        value = int(progress.parseSize(value))
+        if key == 'Number of files':
+            self.totalInodes += value
+        elif key == 'Total file size':
+            self.totalBytes += value
+            self.valid = True
+        else:
+            self.newBytes += value
+
+    def save(self, info):
+        """
+        Store the figures in ``info``.
+
+        Args:
+            info (configfile.ConfigFile):   snapshots info
+        """
+        for key, value in zip(self.KEYS, (self.totalBytes, self.newBytes,
+                                          self.totalInodes, self.newInodes)):
+            info.setIntValue(key, value)
+
+    @classmethod
+    def load(cls, info):
+        """
+        Read the figures stored with :py:func:`save`.
+
+        Args:
+            info (dict):    content of a snapshots info file
+                            (:py:attr:`configfile.ConfigFile.dict`)
+
+        Returns:
+            SnapshotSize:   figures or ``None`` if the snapshot was taken
+                            without size accounting
+        """
+        try:
+            ret = cls(*[int(info[key]) for key in cls.KEYS])
+        except (KeyError, ValueError):
+            return None
+
+        ret.valid = True
+        return ret
+
+
+class SnapshotTransfer(object):
+    """
+    Compression used to send a snapshot to the remote host of SSH profiles
+    and what it achieved according to ``rsync --stats``. Stored in the
+    snapshots ``info`` file.
+
+    ``ratio`` is the size of the file data rsync had to send divided by
+    the bytes which were really sent, including the file list and protocol
+    overhead. ``throughput`` are the bytes sent and received per second
+    as rsync reports them at the end. That is end-to-end over the whole run
+    including building the file list and checking unchanged files, so it
+    is lower than the link speed. It is only taken as link speed
+    (:py:attr:`measured`) if at least :py:data:`MIN_BYTES` were sent, so
+    the transfer dominates the run.
+
+    Args:
+        compress (str): compression, 'none' if disabled
+        level (int):    compression level, 0 for the default level
+    """
+    #: minimum bytes sent to treat the end-to-end throughput as link speed
+    MIN_BYTES = 256 * 1024 * 1024
+
+    #rsync --stats output
+    RE_STATS = re.compile(r'^(Literal data|Total bytes sent): ([\d,.]+[KMGT]?)')
+    RE_RATE = re.compile(r'^sent [\d,.]+[KMGT]? bytes\s+received [\d,.]+[KMGT]? '
+                         r'bytes\s+([\d,.]+[KMGT]?) bytes/sec')
+
+    def __init__(self, compress = 'none', level = 0):
+        self.compress = compress
+        self.level = level
+        self.literalBytes = 0
+        self.sentBytes = 0
+        self.throughput = 0.0
+        self.valid = False
+
+    @property
+    def ratio(self):
+        if not self.sentBytes:
+            return 0.0
+        return self.literalBytes / self.sentBytes
+
+    @property
+    def measured(self):
+        """
+        ``True`` if enough data was sent to measure the link speed.
+        """
+        return self.sentBytes >= self.MIN_BYTES and self.throughput > 0
+
+    def addRsyncLine(self, line):
+        """
+        Count one line of rsync's output. Parallel rsync processes are
+        summed up.
+
+        Args:
+            line (str): stdout line from rsync
+        """
+        m = self.RE_RATE.match(line)
+        if m:
+            # parallel processes share the link
+            self.throughput += progress.parseSize(m.group(1))
+            return
+
+        m = self.RE_STATS.match(line)
+        if not m:
+            return
+
+        key, value = m.groups()
+        value = int(progress.parseSize(value))
+        if key == 'Literal data':
+            self.literalBytes += value
+        else:
+            self.sentBytes += value
+            self.valid = True
+
+    def save(self, info):
+        """
+        Store compression and figures in ``info``.
+
+        Args:
+            info (configfile.ConfigFile):   snapshots info
+        """
+        info.setStrValue('transfer.compress', self.compress)
+        info.setIntValue('transfer.compress_level', self.level)
+        info.setIntValue('transfer.literal_bytes', self.literalBytes)
+        info.setIntValue('transfer.sent_bytes', self.sentBytes)
+        info.setStrValue('transfer.ratio', '{:.2f}'.format(self.ratio))
+        info.setIntValue('transfer.throughput', int(self.throughput))
+
+    @classmethod
+    def load(cls, info):
+        """
+        Read the figures stored with :py:func:`save`.
+
+        Args:
+            info (dict):    content of a snapshots info file
+                            (:py:attr:`configfile.ConfigFile.dict`)
+
+        Returns:
+            SnapshotTransfer:   figures or ``None`` if the snapshot wasn't
+                                sent to a remote host
+        """
+        try:
+            ret = cls(info['transfer.compress'],
+                      int(info['transfer.compress_level']))
+            ret.literalBytes = int(info['transfer.literal_bytes'])
+            ret.sentBytes = int(info['transfer.sent_bytes'])
+            ret.throughput = float(info['transfer.throughput'])
+        except (KeyError, ValueError):
+            return None
+
+        ret.valid = True
+        return ret
+
 
 class FileInfoDict(dict):
     """
@@ -2337,7 +3423,7 @@ class FileInfoDict(dict):
     """
     def __init__(self):
         # default permissions for /
-        # only used if fileinfo.bz2 does not contain a value for /
+        # only used if fileinfo does not contain a value for /
         # when it was created with version <= 1.1.12
         # bugfix for https://github.com/bit-team/backintime/issues/708
         self[b'/'] = (16877, b'root', b'root')
@@ -2377,7 +3463,8 @@ class SID(object):
     INFO     = 'info'
     NAME     = 'name'
     FAILED   = 'failed'
-    FILEINFO = 'fileinfo.bz2'
+    FILEINFO = 'fileinfo.idx'
+    FILEINFO_BZ2 = 'fileinfo.bz2'
     LOG      = 'takesnapshot.log.bz2'
 
     def __init__(self, date, cfg):
@@ -2683,6 +3770,8 @@ class SID(object):
             logger.debug('Failed to set snapshot {} name: {}'.format(
                          self.sid, str(e)),
                          self)
+        else:
+            self.updateCatalog(name=name)
 
     @property
     def lastChecked(self):
@@ -2708,6 +3797,7 @@ class SID(object):
         info = self.path(self.INFO)
         if os.path.exists(info):
             os.utime(info, None)
+            self.updateCatalog(lastChecked=os.path.getatime(info))
 
     @property
     def failed(self):
@@ -2735,9 +3825,12 @@ class SID(object):
                 logger.debug('Failed to mark snapshot {} failed: {}'.format(
                              self.sid, str(e)),
                              self)
+                return
         elif os.path.exists(failedFile):
             os.remove(failedFile)
 
+        self.updateCatalog(failed=enable)
+
     @property
     def info(self):
         """
@@ -2757,12 +3850,14 @@ class SID(object):
     @info.setter
     def info(self, i):
         assert isinstance(i, configfile.ConfigFile), 'i is not configfile.ConfigFile type: {}'.format(i)
-        i.save(self.path(self.INFO))
+        if i.save(self.path(self.INFO)):
+            self.updateCatalog(info=i.dict)
 
     @property
     def fileInfo(self):
         """
-        Load/save "fileinfo.bz2"
+        Load/save "fileinfo.idx". Snapshots taken with older versions only
+        have a "fileinfo.bz2" which will be loaded instead.
 
         Args:
             d (FileInfoDict): dict of: {path: (permission, user, group)}
@@ -2771,44 +3866,247 @@ class SID(object):
             FileInfoDict:     dict of: {path: (permission, user, group)}
         """
         d = FileInfoDict()
-        infoFile = self.path(self.FILEINFO)
-        if not os.path.isfile(infoFile):
+        index = self.fileInfoIndex(fallback=False)
+        if index is not None:
+            try:
+                d.update(index.items())
+                return d
+            except (OSError, ValueError, zlib.error) as e:
+                logger.error('Failed to load {} from snapshot {}: {}'.format(
+                             self.FILEINFO, self.sid, str(e)),
+                             self)
+                d = FileInfoDict()
+
+        return self._loadFileInfoBz2(d)
+
+    def _loadFileInfoBz2(self, d, strict=False):
+        """
+        Load "fileinfo.bz2" from snapshots taken with older versions.
+
+        Args:
+            d (FileInfoDict):   mapping to fill
+            strict (bool):      raise errors instead of logging them and
+                                returning what could be loaded
+
+        Returns:
+            FileInfoDict:       ``d``
+
+        Raises:
+            OSError:            if ``strict`` and the file is missing or
+                                can not be read
+            EOFError:           if ``strict`` and the file is truncated
+            ValueError:         if ``strict`` and a line is broken
+        """
+        infoFile = self.path(self.FILEINFO_BZ2)
+        if not strict and not os.path.isfile(infoFile):
             return d
 
+        def parse(fileinfo):
+            for line in fileinfo:
+                line = line.strip(b'\n')
+                if not line:
+                    continue
+                index = line.find(b'/')
+                if index < 0:
+                    continue
+                f = line[index:]
+                if not f:
+                    continue
+                info = line[:index].strip().split(b' ')
+                if len(info) == 3:
+                    yield f, (int(info[0]), info[1], info[2]) #perms, user, group
+
         try:
             with bz2.BZ2File(infoFile, 'rb') as fileinfo:
-                for line in fileinfo:
-                    line = line.strip(b'\n')
-                    if not line:
-                        continue
-                    index = line.find(b'/')
-                    if index < 0:
-                        continue
-                    f = line[index:]
-                    if not f:
-                        continue
-                    info = line[:index].strip().split(b' ')
-                    if len(info) == 3:
-                        d[f] = (int(info[0]), info[1], info[2]) #perms, user, group
+                d.update(parse(fileinfo))
         except (FileNotFoundError, PermissionError) as e:
+            if strict:
+                raise
             logger.error('Failed to load {} from snapshot {}: {}'.format(
-                         self.FILEINFO, self.sid, str(e)),
+                         self.FILEINFO_BZ2, self.sid, str(e)),
                          self)
         return d
 
     @fileInfo.setter
     def fileInfo(self, d):
-        assert isinstance(d, FileInfoDict), 'd is not FileInfoDict type: {}'.format(d)
+        self.setFileInfo(d)
+
+    def setFileInfo(self, d):
+        """
+        Save "fileinfo.idx" as full checkpoint and remove an old
+        "fileinfo.bz2". Same as assigning :py:attr:`fileInfo`.
+
+        Args:
+            d (FileInfoDict):   dict of: {path: (permission, user, group)}
+
+        Returns:
+            bool:               ``True`` if "fileinfo.idx" was written
+        """
+        assert isinstance(d, Mapping), 'd is not Mapping type: {}'.format(d)
         try:
-            with bz2.BZ2File(self.path(self.FILEINFO), 'wb') as f:
-                for path, info in d.items():
-                    f.write(b' '.join((str(info[0]).encode('utf-8', 'replace'),
-                                       info[1],
-                                       info[2],
-                                       path))
-                                       + b'\n')
-        except PermissionError as e:
+            FileInfoIndex.write(self.path(self.FILEINFO), d)
+        except (OSError, ValueError, struct.error) as e:
             logger.error('Failed to write {}: {}'.format(self.FILEINFO, str(e)))
+            return False
+
+        # the old format is replaced now
+        bz2File = self.path(self.FILEINFO_BZ2)
+        if os.path.exists(bz2File):
+            os.remove(bz2File)
+        return True
+
+    def fileInfoIndex(self, fallback=True):
+        """
+        Open "fileinfo.idx" for looking up single paths without loading
+        all permissions of the snapshot. If "fileinfo.idx" only holds the
+        differences to its parent snapshot the whole chain of parents down
+        to the last full checkpoint is opened.
+
+        Args:
+            fallback (bool):    load the whole "fileinfo.bz2" if there
+                                is no usable "fileinfo.idx" (e.g. snapshots
+                                taken with older versions)
+
+        Returns:
+            fileinfo.FileInfoIndex: read-only mapping of
+                                    {path: (permission, user, group)}
+                                    (:py:class:`fileinfo.FileInfoChain` for
+                                    deltas) or
+                                    :py:class:`fileinfo.CompactFileInfoDict`
+                                    on fallback or ``None`` if not available
+        """
+        infoFile = self.path(self.FILEINFO)
+        if os.path.isfile(infoFile):
+            try:
+                indices = [FileInfoIndex(infoFile)]
+                child = self
+                while indices[-1].parent is not None:
+                    parent = SID(indices[-1].parent, self.config)
+                    if parent.sid >= child.sid:
+                        raise ValueError('parent {} is not older than {}'
+                                         .format(parent.sid, child.sid))
+
+                    indices.append(FileInfoIndex(parent.path(self.FILEINFO)))
+                    child = parent
+
+                if len(indices) == 1:
+                    return indices[0]
+
+                return FileInfoChain(indices)
+
+            except (OSError, ValueError) as e:
+                logger.error('Failed to load {} from snapshot {}: {}'.format(
+                             self.FILEINFO, self.sid, str(e)),
+                             self)
+
+        if fallback:
+            return self._loadFileInfoBz2(CompactFileInfoDict())
+
+    def setFileInfoDelta(self, d, parent, checkpoint=0):
+        """
+        Save "fileinfo.idx" with only the differences to the permissions of
+        snapshot ``parent``. A full "fileinfo.idx" is written instead if
+        ``parent`` has no usable "fileinfo.idx" or if this would be the
+        ``checkpoint``'th snapshot since the last full one.
+
+        Args:
+            d (FileInfoDict):   dict of: {path: (permission, user, group)}
+            parent (SID):       snapshot used as ``--link-dest``
+            checkpoint (int):   write a full "fileinfo.idx" every
+                                ``checkpoint`` snapshots. ``0`` for no limit
+
+        Returns:
+            bool:               ``True`` if "fileinfo.idx" was written
+        """
+        base = parent.fileInfoIndex(fallback=False)
+        if base is None or (checkpoint and base.depth + 1 >= checkpoint):
+            return self.setFileInfo(d)
+
+        try:
+            FileInfoIndex.writeDelta(self.path(self.FILEINFO),
+                                     d, base, parent.sid)
+        except (OSError, ValueError, zlib.error, struct.error) as e:
+            logger.error('Failed to write {} as delta to snapshot {}: {}'
+                         .format(self.FILEINFO, parent.sid, str(e)),
+                         self)
+            return self.setFileInfo(d)
+
+        bz2File = self.path(self.FILEINFO_BZ2)
+        if os.path.exists(bz2File):
+            os.remove(bz2File)
+        return True
+
+    def fileInfoParent(self):
+        """
+        Snapshot ID of the parent snapshot "fileinfo.idx" is a delta to.
+
+        Returns:
+            str:    snapshot ID or ``None`` if "fileinfo.idx" is a full
+                    checkpoint or not available
+        """
+        try:
+            return FileInfoIndex.readParent(self.path(self.FILEINFO))
+        except (OSError, ValueError):
+            return None
+
+    def rebaseFileInfo(self, parent):
+        """
+        Rewrite "fileinfo.idx" as delta to ``parent`` or as full checkpoint
+        if ``parent`` is ``None``. Used before the current parent snapshot
+        gets removed.
+
+        Args:
+            parent (SID):   new parent snapshot or ``None``
+
+        Returns:
+            bool:           ``True`` if "fileinfo.idx" was rewritten
+        """
+        index = self.fileInfoIndex(fallback=False)
+        if index is None:
+            return False
+
+        d = CompactFileInfoDict()
+        try:
+            d.update(index.items())
+        except (OSError, ValueError, zlib.error) as e:
+            logger.error('Failed to rebase {} of snapshot {}: {}'.format(
+                         self.FILEINFO, self.sid, str(e)),
+                         self)
+            return False
+
+        if b'/' not in index:
+            del d[b'/']
+
+        logger.debug('Rebase {} of snapshot {} to {}'.format(
+                     self.FILEINFO, self.sid, parent), self)
+        self.makeWritable()
+        if parent is None:
+            return self.setFileInfo(d)
+        return self.setFileInfoDelta(d, parent)
+
+    def upgradeFileInfo(self):
+        """
+        Convert an old "fileinfo.bz2" into "fileinfo.idx".
+
+        Returns:
+            bool:   ``True`` if the snapshot was converted, ``False`` if
+                    there was nothing to convert or it failed
+        """
+        if not os.path.isfile(self.path(self.FILEINFO_BZ2)) \
+                or os.path.isfile(self.path(self.FILEINFO)):
+            return False
+
+        # a partial dict would replace the only copy of the permissions
+        try:
+            d = self._loadFileInfoBz2(FileInfoDict(), strict=True)
+        except (OSError, EOFError, ValueError) as e:
+            logger.error('Failed to load {} from snapshot {}: {}'.format(
+                         self.FILEINFO_BZ2, self.sid, str(e)),
+                         self)
+            return False
+
+        self.makeWritable()
+        return self.setFileInfo(d)
 
     # TODO use @property decorator? IMHO not because it is not a "getter" but processes data
     # TODO Should have an action name like "loadLogFile"
@@ -2830,10 +4128,8 @@ class SID(object):
             with bz2.BZ2File(logFile, 'rb') as f:
                 if logFilter.header:
                     yield logFilter.header
-                for line in f.readlines():
-                    line = logFilter.filter(line.decode('utf-8').rstrip('\n'))
-                    if not line is None:
-                        yield line
+                yield from logFilter.iterFilter(
+                    line.decode('utf-8').rstrip('\n') for line in f.readlines())
         except Exception as e:
             msg = ('Failed to get snapshot log from {}:'.format(logFile), str(e))
             logger.debug(' '.join(msg), self)
@@ -2858,6 +4154,34 @@ class SID(object):
                          logFile, str(e)),
                          self)
 
+    def catalogEntry(self):
+        """
+        Read the fields stored in the snapshot catalog from disk.
+
+        Returns:
+            dict:   with keys ``name``, ``failed``, ``lastChecked`` and
+                    ``info`` (see :py:class:`snapshotcatalog.SnapshotCatalog`)
+        """
+        info = self.path(self.INFO)
+        lastChecked = None
+        if os.path.exists(info):
+            lastChecked = os.path.getatime(info)
+
+        return {'name': self.name,
+                'failed': self.failed,
+                'lastChecked': lastChecked,
+                'info': self.info.dict}
+
+    def updateCatalog(self, **kwargs):
+        """
+        Update cached fields of this snapshot in the snapshot catalog.
+
+        Args:
+            **kwargs:   fields to update. See
+                        :py:func:`snapshotcatalog.SnapshotCatalog.update`
+        """
+        snapshotCatalog(self.config, self.profileID).update(self.sid, **kwargs)
+
     def makeWritable(self):
         """
         Make the snapshot path writable so we can change files inside
@@ -2875,6 +4199,10 @@ class GenericNonSnapshot(SID):
     def displayID(self):
         return self.name
 
+    def updateCatalog(self, **kwargs):
+        # only real snapshots are part of the snapshot catalog
+        pass
+
     @property
     def displayName(self):
         return self.name
@@ -3029,11 +4357,50 @@ class RootSnapshot(GenericNonSnapshot):
             return os.path.join(os.sep, *path)
 
 
+def snapshotCatalog(cfg, profile_id = None):
+    """
+    Snapshot catalog of the snapshots folder of profile ``profile_id``.
+
+    Args:
+        cfg (config.Config):    current config
+        profile_id (str):       profile ID or ``None`` for the current profile
+
+    Returns:
+        snapshotcatalog.SnapshotCatalog:    catalog of the snapshots folder
+    """
+    return snapshotcatalog.SnapshotCatalog(cfg.snapshotsFullPath(profile_id))
+
+
+def probeSnapshot(cfg, item):
+    """
+    Check if folder ``item`` inside the snapshots folder is a valid snapshot.
+
+    Args:
+        cfg (config.Config):    current config
+        item (str):             name of the folder
+
+    Returns:
+        SID:                    snapshot ID or ``None`` if ``item`` is no
+                                valid snapshot
+    """
+    try:
+        sid = SID(item, cfg)
+        if sid.exists():
+            return sid
+    except Exception as e:
+        if not isinstance(e, LastSnapshotSymlink):
+            logger.debug("'{}' is not a snapshot ID: {}".format(item, str(e)))
+
+
 def iterSnapshots(cfg, includeNewSnapshot = False):
     """
     Iterate over snapshots in current snapshot path. Use this in a 'for' loop
     for faster processing than list object
 
+    The snapshot IDs are taken from the snapshot catalog which rescan the
+    snapshots folder only if it has changed. If the catalog is not usable
+    the snapshots folder is scanned directly.
+
     Args:
         cfg (config.Config):        current config
         includeNewSnapshot (bool):  include a NewSnapshot instance if
@@ -3045,19 +4412,32 @@ def iterSnapshots(cfg, includeNewSnapshot = False):
     path = cfg.snapshotsFullPath()
     if not os.path.exists(path):
         return None
+
+    if includeNewSnapshot:
+        newSid = NewSnapshot(cfg)
+        if newSid.exists():
+            yield newSid
+
+    def probe(item):
+        if item == NewSnapshot.NEWSNAPSHOT:
+            return None
+        sid = probeSnapshot(cfg, item)
+        if sid is not None:
+            return sid.catalogEntry()
+
+    items = snapshotCatalog(cfg).sync(probe)
+
+    if items is not None:
+        for item in items:
+            yield SID(item, cfg)
+        return
+
     for item in os.listdir(path):
         if item == NewSnapshot.NEWSNAPSHOT:
-            newSid = NewSnapshot(cfg)
-            if newSid.exists() and includeNewSnapshot:
-                yield newSid
             continue
-        try:
-            sid = SID(item, cfg)
-            if sid.exists():
-                yield sid
-        except Exception as e:
-            if not isinstance(e, LastSnapshotSymlink):
-                logger.debug("'{}' is not a snapshot ID: {}".format(item, str(e)))
+        sid = probeSnapshot(cfg, item)
+        if sid is not None:
+            yield sid
 
 
 def listSnapshots(cfg, includeNewSnapshot = False, reverse = True):
@@ -3078,6 +4458,33 @@ def listSnapshots(cfg, includeNewSnapshot = False, reverse = True):
     return ret
 
 
+def snapshotSizes(cfg, sids):
+    """
+    Size figures stored while the snapshots ``sids`` were taken. They are
+    read from the snapshot catalog. Only snapshots missing in the catalog
+    have their ``info`` file read.
+
+    Args:
+        cfg (config.Config):    current config
+        sids (list):            list of :py:class:`SID` objects
+
+    Returns:
+        dict:                   :py:class:`SID` as key and
+                                :py:class:`SnapshotSize` or ``None`` if
+                                unknown as value
+    """
+    entries = snapshotCatalog(cfg).entries()
+    ret = {}
+    for sid in sids:
+        if sid.sid in entries:
+            info = entries[sid.sid]['info']
+        else:
+            info = sid.info.dict
+        ret[sid] = SnapshotSize.load(info)
+
+    return ret
+
+
 def lastSnapshot(cfg):
     """
     Most recent snapshot.
@@ -19,46 +19,108 @@
 
 It can also can run as a stand alone script. The solution is based on
 https://www.theeggeadventure.com/wikimedia/index.php/Ssh_argument_length
+
+The probe bisects between a working and a failing length with a bounded
+number of SSH commands. If the profile is mounted (or the probe runs
+through :py:func:`report_profiles`) all of them use the shared SSH
+connection of :py:func:`sshtools.SSH.startMaster`. Results are cached in the
+local data folder per host, port and banner of the SSH daemon, so they are
+probed again after the remote sshd changed.
 """
 
+import os
+import time
 import random
 import string
 import subprocess
 import socket
 import argparse
 
+import logger
+import tools
+
 # must be divisible by 8
 _INITIAL_SSH_COMMAND_SIZE = 1048320
+# stop if working and failing length are closer than this
+_RESOLUTION = 1024
+# maximum number of SSH commands for one probe
+_MAX_STEPS = 16
+
+CACHE_FILE = 'ssh_max_arg.json'
 
 
 def probe_max_ssh_command_size(config,
                                ssh_command_size=_INITIAL_SSH_COMMAND_SIZE,
-                               size_offset=_INITIAL_SSH_COMMAND_SIZE):
+                               max_steps=_MAX_STEPS,
+                               resolution=_RESOLUTION):
     """Determine the maximum length of SSH commands for the current config
 
-    Try a SSH command with length ``ssh_command_size``. The command is
-    decreased by ``size_offset`` if it was too long or increased if it worked.
-    The function calls itself recursively until it finds the maximum
-    possible length. The offset ``size_offset`` is bisect in each try.
+    Try a SSH command with length ``ssh_command_size``. If that works it is
+    used as maximum. Otherwise bisect between the longest working and the
+    shortest failing length until they are closer than ``resolution`` or
+    ``max_steps`` commands were run.
 
     Args:
         config (config.Config): Back In Time config instance including the
                                 details about the current SSH snapshot profile.
                                 The current profile must use the SSH mode.
         ssh_command_size (int): Initial length used for the test argument.
-        size_offset (int): Offset for increase or decrease
-                           ``ssh_command_size``.
+        max_steps (int):        Maximum number of SSH commands.
+        resolution (int):       Precision of the result.
 
     Returns:
         (int): The maximum possible SSH command length
 
     Raises:
-        Exception: If there are unhandled cases or the recurse ends in an
-                   undefined state.
+        Exception: If there are unhandled cases or not even the shortest
+                   tested length worked.
         OSError: If there are unhandled cases.
     """
-    size_offset = round(size_offset / 2)
+    good = 0
+    bad = None
+    size = ssh_command_size
+
+    for step in range(max_steps):
+        start = time.perf_counter()
+        ok, msg = _try_ssh_command_size(config, size)
+        duration = time.perf_counter() - start
+
+        if ok:
+            good = size
+            if bad is None:
+                report_test(size, duration, 'Works. Use it as maximum.')
+                break
+            msg += 'Can be longer'
+        else:
+            bad = size
+            msg += 'Too long'
+
+        if bad - good <= resolution:
+            report_test(size, duration, f'{msg}. Found correct length.')
+            break
+
+        tried, size = size, (good + bad) // 2
+        report_test(tried, duration, f'{msg}, try {size:,} next.')
+    else:
+        report_test(size, 0, 'Stop after {} tries.'.format(max_steps))
+
+    if not good:
+        raise Exception('Even SSH commands with {:,} characters failed.'
+                        .format(bad))
+
+    # add length of "printf" to the final command size
+    return good + len('printf')
+
+
+def _try_ssh_command_size(config, ssh_command_size):
+    """
+    Run ``printf`` with a random argument of length ``ssh_command_size`` on
+    the remote host.
 
+    Returns:
+        tuple:  (bool, str) ``True`` if the command worked and a message
+                with the reason if it didn't
+    """
     # random string of desired length
     command_string = ''.join(random.choices(
         string.ascii_uppercase+string.digits, k=ssh_command_size))
@@ -82,60 +144,169 @@ def probe_max_ssh_command_size(config,
         if err.errno != 7:
             raise err
 
-        report_test(
-            ssh_command_size,
-            f'Python exception: "{err.strerror}". Decrease '
-            f'by {size_offset:,} and try again.')
+        return False, f'Python exception: "{err.strerror}". '
 
-        # test again with new ssh_command_size
-        return probe_max_ssh_command_size(
-            config,
-            ssh_command_size - size_offset,
-            size_offset)
+    # Successful SSH command
+    if out == command_string:
+        return True, ''
 
-    else:
-        # Successful SSH command
-        if out == command_string:
-
-            # no increases possible anymore
-            if size_offset == 0:
-                report_test(ssh_command_size,
-                            'Found correct length. Adding '
-                            f'length of "{ssh[-2]}" to it.')
-
-                # the final command size
-                return ssh_command_size + len(ssh[-2])  # length of "printf"
-
-            # there is room to increase the length
-            report_test(ssh_command_size,
-                        f'Can be longer. Increase by {size_offset:,} '
-                        'and try again.')
-
-            # increase by "size_offset" and try again
-            return probe_max_ssh_command_size(
-                config,
-                ssh_command_size + size_offset,
-                size_offset)
-
-        # command string was too long
-        elif 'Argument list too long' in err:
-            report_test(ssh_command_size,
-                        f'stderr: "{err.strip()}". Decrease '
-                        f'by {size_offset:,} and try again.')
-
-            # reduce by "size_offset" and try again
-            return probe_max_ssh_command_size(
-                config,
-                ssh_command_size - size_offset,
-                size_offset)
+    # command string was too long
+    if 'Argument list too long' in err:
+        return False, f'stderr: "{err.strip()}". '
 
     raise Exception('Unhandled case.\n'
                     f'{ssh[:-1]}\nout="{out}"\nerr="{err}"\n'
-                    f'ssh_command_size={ssh_command_size:,}\nsize_offset={size_offset:,}')
+                    f'ssh_command_size={ssh_command_size:,}')
+
+
+def sshd_banner(host, port, timeout=10):
+    """Get the identification string of the SSH daemon.
 
+    Args:
+        host (str):     remote host
+        port (int):     port of the SSH daemon
+        timeout (int):  seconds to wait for the connection
+
+    Returns:
+        (str): e.g. ``SSH-2.0-OpenSSH_9.6p1 Ubuntu-3ubuntu13``
+
+    Raises:
+        OSError: If the host is not reachable.
+    """
+    with socket.create_connection((host, int(port)), timeout) as sock:
+        with sock.makefile('rb') as f:
+            # the server may send other lines before its identification
+            for i in range(32):
+                line = f.readline(256)
+                if not line:
+                    break
+                if line.startswith(b'SSH-'):
+                    return line.decode(errors='replace').strip()
+    return ''
+
+
+def cache_key(config):
+    """Cache key for the remote host of the current profile.
+
+    Args:
+        config (config.Config): Back In Time config instance
+
+    Returns:
+        (str): key or ``None`` if the SSH daemon is not reachable
+    """
+    host = config.sshHost()
+    port = config.sshPort()
+    try:
+        banner = sshd_banner(host, port)
+    except OSError as e:
+        logger.debug(f'Failed to get banner of {host}:{port}: {e}')
+        return None
+    return f'{host}:{port}:{banner}'
 
-def report_test(ssh_command_size, msg):
-    print(f'Tried length {ssh_command_size:,}... {msg}')
+
+def _cache_file(config):
+    return os.path.join(config._LOCAL_DATA_FOLDER, CACHE_FILE)
+
+
+def load_cached(config, key):
+    """Get the cached maximum SSH command length for ``key``.
+
+    Returns:
+        (int): length or ``None`` if there is no cached value
+    """
+    entry = tools.readJsonCache(_cache_file(config)).get(key)
+    if not isinstance(entry, dict) or not isinstance(entry.get('size'), int):
+        return None
+    return entry['size']
+
+
+def save_cached(config, key, size):
+    """Store the maximum SSH command length ``size`` for ``key``."""
+    tools.updateJsonCache(_cache_file(config), key,
+                          {'size': size, 'time': time.time()})
+
+
+def max_ssh_command_size(config, force=False):
+    """Cached maximum length of SSH commands for the current profile.
+
+    Args:
+        config (config.Config): Back In Time config instance
+        force (bool):           probe again even if there is a cached value
+
+    Returns:
+        (int): The maximum possible SSH command length
+    """
+    key = cache_key(config)
+    if key and not force:
+        size = load_cached(config, key)
+        if size:
+            return size
+
+    size = probe_max_ssh_command_size(config)
+    if key:
+        save_cached(config, key, size)
+    return size
+
+
+def report_profiles(config, profile_ids, force=False,
+                    ssh_command_size=_INITIAL_SSH_COMMAND_SIZE):
+    """Probe and print the maximum SSH command length for SSH profiles.
+
+    All commands for one profile share one SSH connection. Cached results
+    are only printed unless ``force`` is set.
+
+    Args:
+        config (config.Config): Back In Time config instance
+        profile_ids (list):     profiles to check. Other than SSH profiles
+                                are skipped
+        force (bool):           probe again even if there is a cached value
+        ssh_command_size (int): Initial length used for the test argument.
+
+    Returns:
+        (bool): ``True`` if all SSH profiles were checked successfully
+    """
+    import sshtools
+
+    success = True
+    for profile_id in profile_ids:
+        config.setCurrentProfile(profile_id)
+        mode = config.snapshotsMode()
+        print(f'Profile {profile_id} - {config.profileName()}: Mode = {mode}')
+        if mode not in ('ssh', 'ssh_encfs'):
+            continue
+
+        start = time.perf_counter()
+        key = cache_key(config)
+        size = None
+        if key and not force:
+            size = load_cached(config, key)
+
+        if size:
+            report_result(config.sshHost(), size)
+            print(f'Cached result for "{key}".')
+            continue
+
+        ssh = sshtools.SSH(config, profile_id=profile_id)
+        ssh.startMaster()
+        try:
+            size = probe_max_ssh_command_size(config, ssh_command_size)
+        except Exception as e:
+            print(f'Failed to check profile {profile_id}: {e}')
+            success = False
+            continue
+        finally:
+            ssh.stopMaster()
+
+        if key:
+            save_cached(config, key, size)
+        report_result(config.sshHost(), size)
+        print(f'Checked in {time.perf_counter() - start:.2f} s.')
+
+    return success
+
+
+def report_test(ssh_command_size, duration, msg):
+    print(f'Tried length {ssh_command_size:,} ({duration:.2f} s)... {msg}')
 
 
 def report_result(host, max_ssh_cmd_size):
@@ -158,12 +329,6 @@ if __name__ == '__main__':
 
     import config
     cfg = config.Config()
-    profiles = cfg.profiles()  # list of profile IDs
-
     # loop over all profiles in the configuration
-    for profile_ID in profiles:
-        cfg.setCurrentProfile(profile_ID)
-        print(f"Profile {profile_ID} - {cfg.profileName()}: Mode = {cfg.snapshotsMode()}")
-        if cfg.snapshotsMode() == "ssh":
-            ssh_command_size = probe_max_ssh_command_size(cfg, args.SSH_COMMAND_SIZE)
-            report_result(cfg.sshHost(), ssh_command_size)
+    report_profiles(cfg, cfg.profiles(), force=True,
+                    ssh_command_size=args.SSH_COMMAND_SIZE)
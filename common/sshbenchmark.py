@@ -0,0 +1,383 @@
+#    Back In Time
+#    Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey,
+#    Germar Reitze
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Measure rsync over SSH throughput per cipher and compression.
+
+The benchmark transfers generated test data (half random, half compressible
+text) with ``rsync --whole-file --ignore-times`` into a temporary folder
+inside the remote snapshot folder of an SSH profile. It runs in two phases:
+
+1. every cipher supported by the local ssh client without compression
+2. every rsync compression supported on both sides with the fastest cipher
+   of phase 1
+
+Every transfer is repeated and the fastest run is kept. Wall time and CPU
+time of local child processes (rsync and ssh) are measured. The fastest
+combination can be written back into the profile with :py:meth:`Benchmark.apply`.
+
+The ssh command can be replaced with ``rsh`` to run the benchmark against a
+local stand-in. rsync calls it like ssh with options, the host and the
+remote command.
+"""
+
+import os
+import json
+import time
+import shlex
+import random
+import resource
+import subprocess
+from tempfile import TemporaryDirectory
+
+import logger
+import tools
+
+#: compression levels tested per rsync compression. 0 is the default level
+LEVELS = {'none': (0,),
+          'zstd': (0, 1, 9),
+          'lz4': (0,),
+          'zlibx': (0, 1),
+          'zlib': (0, 1)}
+
+MIB = 1024 * 1024
+
+_WORDS = ('backup', 'snapshot', 'remote', 'folder', 'include', 'exclude',
+          'profile', 'rsync', 'cipher', 'compress', 'transfer', 'hardlink',
+          'the', 'a', 'of', 'and', 'to', 'in', 'is', 'with')
+
+
+def compressArgs(choice, level = 0, choices = None):
+    """
+    rsync args for compression ``choice``.
+
+    Args:
+        choice (str):   'none' or one of the choices listed by rsync
+        level (int):    compression level, 0 for the default level
+        choices (list): compressions supported by the local rsync. If empty
+                        only plain ``--compress`` (zlib) is used
+
+    Returns:
+        list:           rsync args
+    """
+    if choice == 'none':
+        return []
+    cmd = ['--compress']
+    if choices:
+        cmd.append('--compress-choice={}'.format(choice))
+    if level:
+        cmd.append('--compress-level={}'.format(level))
+    return cmd
+
+
+def createTestData(path, size):
+    """
+    Create test data with ``size`` MiB in folder ``path``. One half is
+    random data, the other half is compressible text.
+
+    Args:
+        path (str): existing folder
+        size (int): size in MiB
+    """
+    randomSize = size * MIB // 2
+    with open(os.path.join(path, 'random.bin'), 'wb') as f:
+        for i in range(0, randomSize, MIB):
+            f.write(os.urandom(min(MIB, randomSize - i)))
+
+    textSize = size * MIB - randomSize
+    rnd = random.Random(0)
+    with open(os.path.join(path, 'text.txt'), 'wt') as f:
+        written = 0
+        while written < textSize:
+            line = ' '.join(rnd.choice(_WORDS) for i in range(12)) + '\n'
+            line = line[:textSize - written]
+            f.write(line)
+            written += len(line)
+
+
+def formatTable(results):
+    """
+    Format benchmark ``results`` as a table.
+
+    Args:
+        results (list): dicts like :py:meth:`Benchmark.run` returns
+
+    Returns:
+        str:            table with one line per result
+    """
+    lines = ['{:<24}{:<8}{:>6}{:>10}{:>10}{:>10}'.format(
+        'cipher', 'compress', 'level', 'time', 'cpu', 'MiB/s')]
+    for r in results:
+        if r['ok']:
+            lines.append('{:<24}{:<8}{:>6}{:>9.2f}s{:>9.2f}s{:>10.1f}'.format(
+                r['cipher'], r['compress'], r['level'],
+                r['seconds'], r['cpu'], r['mibps']))
+        else:
+            lines.append('{:<24}{:<8}{:>6}{:>30}'.format(
+                r['cipher'], r['compress'], r['level'], 'failed'))
+    return '\n'.join(lines)
+
+
+def fastest(results):
+    """
+    Get the result with the highest throughput.
+
+    Args:
+        results (list): dicts like :py:meth:`Benchmark.run` returns
+
+    Returns:
+        dict:           fastest successful result or ``None``
+    """
+    ok = [r for r in results if r['ok']]
+    if not ok:
+        return None
+    return max(ok, key = lambda r: r['mibps'])
+
+
+class Benchmark(object):
+    """
+    Benchmark rsync over SSH for SSH profile ``profile_id``.
+
+    Args:
+        config (config.Config): current config
+        profile_id (str):       profile ID
+        size (int):             size of the test data in MiB
+        repeat (int):           transfers per combination
+        rsh (list):             command used instead of ssh. Cipher options
+                                are appended to it
+        ciphers (list):         ciphers to test instead of all supported
+        compressions (list):    tuple of compression and level to test
+                                instead of all supported
+    """
+    def __init__(self,
+                 config,
+                 profile_id = None,
+                 size = 40,
+                 repeat = 2,
+                 rsh = None,
+                 ciphers = None,
+                 compressions = None):
+        self.config = config
+        self.profile_id = profile_id
+        self.size = size
+        self.repeat = max(1, repeat)
+        self.ciphers = ciphers
+        self.compressions = compressions
+        if rsh is None:
+            rsh = config.sshCommand(user_host = False,
+                                    cipher = False,
+                                    ionice = False,
+                                    nice = False,
+                                    multiplex = False,
+                                    profile_id = profile_id)
+        self.rsh = rsh
+        self.userHost = '{}@{}'.format(config.sshUser(profile_id),
+                                       config.sshHost(profile_id))
+        self.remotePath = os.path.join(
+            config.sshSnapshotsPath(profile_id) or './',
+            'benchmark_{:08x}'.format(random.getrandbits(32)))
+        self.localChoices = tools.rsyncChoices(tools.rsyncVersion(config),
+                                               'Compress')
+        self.results = []
+
+    def rshCommand(self, cipher):
+        """
+        ssh command used by rsync for ``cipher``.
+        """
+        if cipher == 'default':
+            return list(self.rsh)
+        return self.rsh + ['-o', 'Ciphers={}'.format(cipher)]
+
+    def supportedCiphers(self):
+        """
+        Ciphers of :py:data:`config.Config.SSH_CIPHERS` which the local ssh
+        client supports, always starting with 'default'.
+        """
+        try:
+            out = subprocess.check_output(['ssh', '-Q', 'cipher'],
+                                          stderr = subprocess.DEVNULL,
+                                          universal_newlines = True)
+        except (OSError, subprocess.CalledProcessError):
+            return ['default']
+        known = out.split()
+        return ['default'] + sorted(c for c in self.config.SSH_CIPHERS
+                                    if c != 'default' and c in known)
+
+    def remoteRsyncVersion(self):
+        """
+        'rsync --version' output on the remote host or an empty string.
+        """
+        cmd = self.rsh + [self.userHost, 'rsync --version']
+        try:
+            return subprocess.check_output(cmd,
+                                           stdin = subprocess.DEVNULL,
+                                           stderr = subprocess.DEVNULL,
+                                           universal_newlines = True)
+        except (OSError, subprocess.CalledProcessError):
+            return ''
+
+    def supportedCompressions(self):
+        """
+        Tuples of compression and level supported by local and remote rsync,
+        always starting with ``('none', 0)``.
+        """
+        result = [('none', 0)]
+        if self.localChoices:
+            remote = tools.rsyncChoices(self.remoteRsyncVersion(), 'Compress')
+            choices = [c for c in self.localChoices
+                       if c != 'none' and (not remote or c in remote)]
+        else:
+            # rsync < 3.2 only knows zlib
+            choices = ['zlib']
+        for choice in choices:
+            for level in LEVELS.get(choice, (0,)):
+                result.append((choice, level))
+        return result
+
+    def transfer(self, src, cipher, compress, level):
+        """
+        Transfer ``src`` once.
+
+        Returns:
+            tuple:  (returncode, wall time, CPU time of child processes)
+        """
+        cmd = ['rsync', '--recursive', '--times', '--whole-file',
+               '--ignore-times']
+        cmd += compressArgs(compress, level, self.localChoices)
+        cmd.append('--rsh=' + ' '.join(self.rshCommand(cipher)))
+        cmd += [src + os.sep,
+                '{}:{}/'.format(self.userHost, self.remotePath)]
+        logger.debug('Call command: {}'.format(' '.join(cmd)), self)
+
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time.perf_counter()
+        proc = subprocess.run(cmd,
+                              stdin = subprocess.DEVNULL,
+                              stdout = subprocess.DEVNULL,
+                              stderr = subprocess.PIPE,
+                              universal_newlines = True)
+        duration = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu = (after.ru_utime - before.ru_utime) \
+              + (after.ru_stime - before.ru_stime)
+        if proc.returncode:
+            logger.debug('rsync failed with {}: {}'.format(
+                         proc.returncode, proc.stderr.strip()), self)
+        return (proc.returncode, duration, cpu)
+
+    def run(self, src, cipher, compress = 'none', level = 0):
+        """
+        Transfer ``src`` :py:attr:`repeat` times and keep the fastest run.
+
+        Returns:
+            dict:   with keys ``cipher``, ``compress``, ``level``, ``ok``,
+                    ``seconds``, ``cpu`` and ``mibps``
+        """
+        logger.info('Benchmark cipher {}, compression {} {}'.format(
+                    cipher, compress, level or 'default'))
+        result = {'cipher': cipher,
+                  'compress': compress,
+                  'level': level,
+                  'ok': False,
+                  'seconds': None,
+                  'cpu': None,
+                  'mibps': None}
+        for i in range(self.repeat):
+            returncode, duration, cpu = self.transfer(src, cipher, compress, level)
+            if returncode:
+                return result
+            if result['seconds'] is None or duration < result['seconds']:
+                result['seconds'] = duration
+                result['cpu'] = cpu
+        result['ok'] = True
+        result['mibps'] = self.size / max(result['seconds'], 1e-6)
+        return result
+
+    def cleanup(self):
+        """
+        Remove the temporary folder on the remote host.
+        """
+        cmd = self.rsh + [self.userHost,
+                          'rm -rf {}'.format(shlex.quote(self.remotePath))]
+        subprocess.call(cmd,
+                        stdin = subprocess.DEVNULL,
+                        stdout = subprocess.DEVNULL,
+                        stderr = subprocess.DEVNULL)
+
+    def benchmark(self):
+        """
+        Run both phases of the benchmark.
+
+        Returns:
+            list:   all results like :py:meth:`run` returns them
+        """
+        self.results = []
+        ciphers = self.ciphers or self.supportedCiphers()
+        with TemporaryDirectory() as src:
+            createTestData(src, self.size)
+            try:
+                for cipher in ciphers:
+                    self.results.append(self.run(src, cipher))
+                best = fastest(self.results)
+                if best is None:
+                    return self.results
+
+                compressions = self.compressions or self.supportedCompressions()
+                for compress, level in compressions:
+                    if compress == 'none' and not level:
+                        # already measured in phase 1
+                        continue
+                    self.results.append(self.run(src, best['cipher'],
+                                                 compress, level))
+            finally:
+                self.cleanup()
+        return self.results
+
+    def fastest(self):
+        """
+        Fastest result of the last :py:meth:`benchmark` or ``None``.
+        """
+        return fastest(self.results)
+
+    def json(self):
+        """
+        Results of the last :py:meth:`benchmark` as JSON.
+        """
+        return json.dumps({'host': self.config.sshHost(self.profile_id),
+                           'port': self.config.sshPort(self.profile_id),
+                           'size': self.size,
+                           'repeat': self.repeat,
+                           'results': self.results,
+                           'fastest': self.fastest()},
+                          indent = 2)
+
+    def apply(self):
+        """
+        Write cipher and compression of the fastest result into the profile
+        and save the config.
+
+        Returns:
+            dict:   the applied result or ``None`` if all transfers failed
+        """
+        best = self.fastest()
+        if best is None:
+            return None
+        self.config.setSshCipher(best['cipher'], self.profile_id)
+        self.config.setSshCompress(best['compress'], self.profile_id)
+        self.config.setSshCompressLevel(best['level'], self.profile_id)
+        self.config.save()
+        return best
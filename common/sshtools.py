@@ -27,9 +27,10 @@ from time import sleep
 import logger
 import tools
 import password_ipc
+import remoteprobe
+import sshbenchmark
 from mount import MountControl
 from exceptions import MountException, NoPubKeyLogin, KnownHost
-import bcolors
 import version
 
 
@@ -93,6 +94,9 @@ class SSH(MountControl):
         This is why all values will be added as arguments.
     """
 
+    # seconds an idle shared SSH connection stays open
+    CONTROL_PERSIST = 60
+
     def __init__(self, *args, **kwargs):
 
         # init MountControl
@@ -176,8 +180,11 @@ class SSH(MountControl):
             exceptions.MountException:  if mount wasn't successful
         """
 
+        self.startMaster()
+
         sshfs = [self.mountproc]
         sshfs += self.config.sshDefaultArgs(self.profile_id)
+        sshfs += self.controlArgs()
         sshfs += ['-p', str(self.port)]
 
         if not self.cipher == 'default':
@@ -212,16 +219,146 @@ class SSH(MountControl):
         if proc.returncode == 0:
             return
 
+        # the remote host might have changed since it was probed
+        remoteprobe.invalidate(
+            self.config,
+            remoteprobe.key(self.user, self.host, self.port, self.path))
+
         raise MountException("{}\n\n{}".format(
             _("Can't mount {sshfs}").format(sshfs=" ".join(sshfs)),
             err))
 
+    def _umount(self):
+        """
+        Unmount ``sshfs`` and stop the shared SSH connection afterwards.
+
+        Raises:
+            exceptions.MountException: If unmount failed.
+        """
+        try:
+            super(SSH, self)._umount()
+        finally:
+            self.stopMaster()
+
+    def controlArgs(self):
+        """
+        SSH arguments to use the shared connection to ``self.user_host``.
+
+        Returns:
+            list:   arguments for ssh or an empty list if there is no shared
+                    connection
+        """
+        return self.config.sshControlArgs(self.profile_id,
+                                          self.user,
+                                          self.host,
+                                          self.port)
+
+    def startMaster(self):
+        """
+        Start an SSH ControlMaster connection to the remote host in
+        background. All following SSH commands of this profile (checks,
+        ``sshfs``, ``rsync`` and remote commands) are multiplexed over it
+        instead of doing their own key exchange. The master exits
+        :py:data:`CONTROL_PERSIST` seconds after its last session ended or
+        when :py:func:`stopMaster` is called on unmount.
+
+        Failing to start the master is not fatal. All commands will then
+        connect on their own.
+        """
+        if not self.config.sshMultiplex(self.profile_id):
+            return
+
+        path = self.config.sshControlPath(self.profile_id,
+                                          self.user,
+                                          self.host,
+                                          self.port)
+
+        if os.path.exists(path):
+            if self.controlCommand('check') == 0:
+                logger.debug('SSH master for %s is already running'
+                             % self.user_host, self)
+                return
+            # stale socket from a master which died
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        tools.makeDirs(os.path.dirname(path))
+
+        ssh = ['ssh']
+        ssh += self.config.sshDefaultArgs(self.profile_id)
+        ssh += ['-p', str(self.port)]
+        if not self.cipher == 'default':
+            ssh.extend(['-o', 'Ciphers=%s' % self.cipher])
+        ssh.extend(['-o', 'ControlMaster=yes',
+                    '-o', 'ControlPath=%s' % path,
+                    '-o', 'ControlPersist=%s' % self.CONTROL_PERSIST,
+                    '-o', 'BatchMode=yes',
+                    '-N', '-f',
+                    self.user_host])
+
+        logger.debug('Start SSH master: %s' % ' '.join(ssh), self)
+
+        # the master forks into background. Don't let it inherit a pipe
+        # which would block until it exits
+        with tempfile.TemporaryFile(mode='w+') as err:
+            returncode = subprocess.call(ssh,
+                                         stdin=subprocess.DEVNULL,
+                                         stdout=subprocess.DEVNULL,
+                                         stderr=err)
+            if returncode:
+                err.seek(0)
+                logger.warning('Failed to start shared SSH connection to %s. '
+                               'Continue without it: %s'
+                               % (self.user_host, err.read().strip()), self)
+
+    def stopMaster(self):
+        """
+        Stop the SSH ControlMaster connection started by
+        :py:func:`startMaster`.
+        """
+        path = self.config.sshControlPath(self.profile_id,
+                                          self.user,
+                                          self.host,
+                                          self.port)
+        if not os.path.exists(path):
+            return
+
+        logger.debug('Stop SSH master for %s' % self.user_host, self)
+
+        # the master removes its socket on exit. Clean up if it's gone already
+        if self.controlCommand('exit'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def controlCommand(self, command):
+        """
+        Send ``command`` (``check`` or ``exit``) to the ControlMaster.
+
+        Returns:
+            int:    return code of ``ssh -O``
+        """
+        path = self.config.sshControlPath(self.profile_id,
+                                          self.user,
+                                          self.host,
+                                          self.port)
+        return subprocess.call(['ssh',
+                                '-o', 'ControlPath=%s' % path,
+                                '-O', command,
+                                self.user_host],
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+
     def preMountCheck(self, first_run=False):
         """
         Check that everything is prepared and ready for successfully mount the
         remote path. Default is to run a light version of checks which will
-        only make sure the remote host is online, ``sshfs`` is installed and
-        the remote folder is available.
+        only make sure the remote host is online and ``sshfs`` is installed.
+        Login, remote folder and remote commands are checked with
+        :py:func:`checkRemote` which reuses a cached probe result.
 
         After changing settings this should be run with ``first_run = True``
         to run a full check with all tests.
@@ -241,15 +378,14 @@ class SSH(MountControl):
             self.unlockSshAgent(force=True)
             self.checkKnownHosts()
 
-        self.checkLogin()
+        # share one connection between all following checks and the mount
+        self.startMaster()
 
-        if first_run:
-            self.checkCipher()
-
-        self.checkRemoteFolder()
+        # login, remote folder and remote commands
+        self.checkRemote(force=first_run)
 
         if first_run:
-            self.checkRemoteCommands()
+            self.checkCipher()
 
         return True
 
@@ -435,7 +571,7 @@ class SSH(MountControl):
         logger.debug('Check login', self)
 
         ssh = self.config.sshCommand(cmd=['exit'],
-                                     custom_args=[
+                                     custom_args=self.controlArgs() + [
                                           '-o',
                                           'PreferredAuthentications=publickey',
                                           '-p',
@@ -446,6 +582,7 @@ class SSH(MountControl):
                                      user_host=False,
                                      nice=False,
                                      ionice=False,
+                                     multiplex=False,
                                      profile_id=self.profile_id)
         proc = subprocess.Popen(ssh,
                                 stdout=subprocess.DEVNULL,
@@ -489,6 +626,7 @@ class SSH(MountControl):
                                          user_host=False,
                                          nice=False,
                                          ionice=False,
+                                         multiplex=False,
                                          profile_id=self.profile_id)
 
             proc = subprocess.Popen(ssh,
@@ -509,61 +647,42 @@ class SSH(MountControl):
                     host=self.host)
                 raise MountException(f'{msg}:\n{err}')
 
-    def benchmarkCipher(self, size=40):
+    def benchmarkCipher(self, size=40, json=False, apply=False):
         """
-        Rudimental benchmark to compare transfer speed of all available
-        ciphers.
+        Benchmark rsync transfer speed and CPU time of all available ciphers
+        and compressions. See :py:class:`sshbenchmark.Benchmark`.
 
         Args:
-            size (int):     size of the testfile in MiB
-        """
-
-        temp = tempfile.mkstemp()[1]
+            size (int):     size of the test data in MiB
+            json (bool):    print results as JSON instead of a table
+            apply (bool):   write the fastest cipher and compression into
+                            the profile
 
-        print('create random data file')
-
-        subprocess.call([
-            'dd',
-            'if=/dev/urandom',
-            'of=%s' % temp,
-            'bs=1M',
-            'count=%s' % size
-        ])
-
-        keys = list(self.config.SSH_CIPHERS.keys())
-        keys.sort()
-
-        for cipher in keys:
-
-            if cipher == 'default':
-                continue
-
-            print('%s%s:%s' % (bcolors.BOLD, cipher, bcolors.ENDC))
-
-            for i in range(2):
-                # scp uses -P instead of -p for port
-                subprocess.call([
-                    'scp',
-                    '-P',
-                    str(self.port),
-                    '-c',
-                    cipher,
-                    temp,
-                    self.user_host_path
-                ])
-
-        ssh = self.config.sshCommand(
-            cmd=['rm', os.path.join(self.path, os.path.basename(temp))],
-            custom_args=['-p', str(self.port), self.user_host],
-            port=False,
-            cipher=False,
-            user_host=False,
-            nice=False,
-            ionice=False,
-            profile_id=self.profile_id)
-
-        subprocess.call(ssh)
-        os.remove(temp)
+        Returns:
+            dict:           fastest result or ``None`` if all transfers
+                            failed
+        """
+        bench = sshbenchmark.Benchmark(self.config,
+                                       profile_id=self.profile_id,
+                                       size=size)
+        bench.benchmark()
+        if json:
+            print(bench.json())
+        else:
+            print(sshbenchmark.formatTable(bench.results))
+
+        best = bench.fastest()
+        if best is None:
+            logger.error('All benchmark transfers to {} failed'.format(
+                         self.user_host), self)
+        elif apply:
+            bench.apply()
+            logger.info('Use cipher {} and compression {} {} for profile {}'
+                        .format(best['cipher'], best['compress'],
+                                best['level'] or 'default',
+                                self.config.profileName(self.profile_id)),
+                        self)
+        return best
 
     def checkKnownHosts(self):
         """
@@ -626,11 +745,12 @@ class SSH(MountControl):
 
         ssh = self.config.sshCommand(
             cmd=[cmd],
-            custom_args=['-p', str(self.port), self.user_host],
+            custom_args=self.controlArgs() + ['-p', str(self.port), self.user_host],
             port=False,
             user_host=False,
             nice=False,
             ionice=False,
+            multiplex=False,
             profile_id=self.profile_id)
 
         logger.debug('Call command: %s' % ' '.join(ssh), self)
@@ -649,29 +769,179 @@ class SSH(MountControl):
                 # clean exit
                 pass
 
-            elif proc.returncode == 11:
-                raise MountException('{}:\n{}'.format(
-                    _('Remote path exists but is not a directory.'),
-                    self.path))
+            else:
+                raise self.remoteFolderError(proc.returncode)
+        else:
 
-            elif proc.returncode == 12:
-                raise MountException('{}:\n{}'.format(
-                    _('Remote path is not writable.'),
-                    self.path))
+            # returncode is 0
+            logger.info('Create remote folder %s' % self.path, self)
 
-            elif proc.returncode == 13:
-                raise MountException('{}:\n{}'.format(
-                    _('Remote path is not executable.'),
-                    self.path))
+    def remoteFolderError(self, code):
+        """
+        Exception for a failed check of the remote path.
 
-            else:
-                raise MountException('{}:\n{}'.format(
-                    _("Couldn't create remote path."),
-                    self.path))
+        Args:
+            code (int): 11 if the path is no directory, 12 if it is not
+                        writable, 13 if it is not executable. Everything
+                        else means it couldn't be created
+
+        Returns:
+            exceptions.MountException:  exception with a readable message
+        """
+        if code == remoteprobe.FOLDER_NO_DIR:
+            msg = _('Remote path exists but is not a directory.')
+        elif code == remoteprobe.FOLDER_NOT_WRITABLE:
+            msg = _('Remote path is not writable.')
+        elif code == remoteprobe.FOLDER_NOT_EXECUTABLE:
+            msg = _('Remote path is not executable.')
         else:
+            msg = _("Couldn't create remote path.")
+        return MountException('{}:\n{}'.format(msg, self.path))
 
-            # returncode is 0
+    def checkRemote(self, force=False):
+        """
+        Check login, remote path and remote commands with one
+        :py:mod:`remoteprobe` run. The result is cached for
+        :py:data:`remoteprobe.TTL` seconds, so following mounts of the same
+        remote path only need to evaluate it again.
+
+        Args:
+            force (bool):               probe even if there is a cached
+                                        result
+
+        Raises:
+            exceptions.NoPubKeyLogin:   if login failed
+            exceptions.MountException:  if the remote path or a command is
+                                        not usable
+        """
+        cacheKey = remoteprobe.key(self.user, self.host, self.port, self.path)
+        result = None
+        if not force:
+            result = remoteprobe.load(self.config, cacheKey)
+
+        if result is not None:
+            logger.debug('Use cached probe result for %s' % cacheKey, self)
+            self.checkProbeResult(result)
+            return
+
+        result = self.probeRemote()
+        self.checkProbeResult(result)
+        remoteprobe.save(self.config, cacheKey, result)
+
+    def probeRemote(self):
+        """
+        Run the :py:mod:`remoteprobe` script on the remote host.
+
+        Returns:
+            dict:                       see :py:func:`remoteprobe.parse`
+
+        Raises:
+            exceptions.NoPubKeyLogin:   if login failed
+            exceptions.MountException:  if the script didn't finish
+        """
+        logger.debug('Probe remote host', self)
+
+        ssh = self.config.sshCommand(
+            cmd=['sh', '-s'],
+            custom_args=self.controlArgs() + [
+                '-o',
+                'PreferredAuthentications=publickey',
+                '-p',
+                str(self.port),
+                self.user_host
+            ],
+            port=False,
+            user_host=False,
+            nice=False,
+            ionice=False,
+            multiplex=False,
+            profile_id=self.profile_id)
+
+        logger.debug('Call command: %s' % ' '.join(ssh), self)
+
+        proc = subprocess.Popen(ssh,
+                                stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        out, err = proc.communicate(
+            remoteprobe.payload(self.path, 'tmp_%s' % self.randomId()))
+        out = out.decode(errors='replace')
+        err = err.decode(errors='replace')
+
+        logger.debug('Command stdout: %s' % out, self)
+        logger.debug('Command returncode: %s' % proc.returncode, self)
+
+        # ssh returns 255 if it couldn't connect or login
+        if proc.returncode == 255:
+            raise NoPubKeyLogin(
+                'Password-less authentication for %(user)s@%(host)s '
+                'failed. Look at \'man backintime\' for further '
+                'instructions.' % {
+                    'user': self.user,
+                    'host': self.host}
+                + '\n\n' + err)
+
+        result = remoteprobe.parse(out)
+        if result is None:
+            msg = _('Check commands on host {host} returned unknown error') \
+                .format(host=self.host)
+            raise MountException('{}:\n{}\n{}'.format(
+                msg,
+                err,
+                _("Look at 'man backintime' for further instructions")))
+
+        return result
+
+    def checkProbeResult(self, result):
+        """
+        Check a :py:mod:`remoteprobe` result against the current settings.
+
+        Args:
+            result (dict):              see :py:func:`remoteprobe.parse`
+
+        Raises:
+            exceptions.MountException:  if the remote path or a command is
+                                        not usable
+        """
+        if result['folder'] != remoteprobe.FOLDER_OK:
+            raise self.remoteFolderError(result['folder'])
+
+        if result['created']:
             logger.info('Create remote folder %s' % self.path, self)
+            # don't tell that again if the result is cached
+            result['created'] = False
+
+        if not self.config.sshCheckCommands(self.profile_id):
+            return
+
+        required = ['rsync']
+        if self.nice:
+            required.append('nice')
+        if self.ionice:
+            required.append('ionice')
+        if self.nocache:
+            required.append('nocache')
+        # used by smart-remove running in background
+        if self.config.smartRemoveRunRemoteInBackground(self.profile_id):
+            required.extend(('bash', 'flock', 'mktemp'))
+
+        available = dict(result['commands'])
+        available['rsync'] = bool(result['rsync'])
+        for command in required:
+            if not available.get(command):
+                msg = _("Remote host {host} doesn't support {command}") \
+                    .format(host=self.host, command=command)
+                raise MountException('{}\n{}'.format(
+                    msg,
+                    _("Look at 'man backintime' for further instructions")))
+
+        if result['hardlinks'] is False:
+            raise MountException(
+                _("Remote host {host} doesn't support hardlinks")
+                .format(host=self.host))
+
+        tools.setRsyncRemoteVersion(self.config, result['rsync'],
+                                    self.user, self.host, self.port)
 
     def checkPingHost(self):
         """
@@ -759,7 +1029,8 @@ class SSH(MountControl):
                 self)
 
             import sshMaxArg
-            max_arg_size = sshMaxArg.probe_max_ssh_command_size(self.config)
+            max_arg_size = sshMaxArg.max_ssh_command_size(self.config,
+                                                          force=True)
             sshMaxArg.report_result(self.host, max_arg_size)
 
             self.config.setSshMaxArgLength(max_arg_size, self.profile_id)
@@ -818,6 +1089,9 @@ class SSH(MountControl):
                             err=err)
                     )
 
+        # remote rsync might have changed after changing the settings
+        tools.rsyncRemoteCaps(self.config, self.profile_id, force=True)
+
         # check cp chmod find and rm
         head = 'tmp1="%s"; tmp2="%s"; ' % (remote_tmp_dir_1, remote_tmp_dir_2)
 
@@ -888,11 +1162,12 @@ class SSH(MountControl):
 
             c = self.config.sshCommand(
                 cmd=[cmd],
-                custom_args=['-p', str(self.port), self.user_host],
+                custom_args=self.controlArgs() + ['-p', str(self.port), self.user_host],
                 port=False,
                 user_host=False,
                 nice=False,
                 ionice=False,
+                multiplex=False,
                 profile_id=self.profile_id)
 
             try:
@@ -0,0 +1,94 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Compare the checksums of the local rsync on a --checksum run.
+
+Create SIZE MiB of test data and an identical copy. Then run
+``rsync --checksum --dry-run`` from the data to the copy once per checksum
+listed by ``rsync --version``. Nothing needs to be transferred, so the run
+is dominated by hashing every file on both ends like an unchanged snapshot
+taken with checksums. Wall time and CPU time of rsync are printed.
+
+Usage::
+
+    python3 test/benchmark_checksum.py [SIZE [FILES]]
+"""
+
+import os
+import sys
+import time
+import shutil
+import resource
+import subprocess
+from tempfile import TemporaryDirectory
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import tools
+
+MIB = 1024 * 1024
+
+
+def createData(path, size, files):
+    os.mkdir(path)
+    fileSize = size * MIB // files
+    for i in range(files):
+        with open(os.path.join(path, 'file{:05d}'.format(i)), 'wb') as f:
+            f.write(os.urandom(fileSize))
+
+
+def run(src, dst, choice):
+    cmd = ['rsync', '--recursive', '--times', '--checksum', '--dry-run',
+           '--checksum-choice={}'.format(choice),
+           src + os.sep, dst + os.sep]
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    ret = subprocess.call(cmd, stdout=subprocess.DEVNULL)
+    duration = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) \
+          + (after.ru_stime - before.ru_stime)
+    return ret, duration, cpu
+
+
+def main(size, files):
+    choices = [c for c in tools.rsyncChoices(tools.rsyncVersion(), 'Checksum')
+               if c != 'none']
+    if not choices:
+        sys.exit('rsync does not support --checksum-choice (rsync < 3.2)')
+
+    print('{:<10}{:>10}{:>10}{:>10}'.format('checksum', 'time', 'cpu', 'MiB/s'))
+    with TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'src')
+        dst = os.path.join(tmp, 'dst')
+        createData(src, size, files)
+        shutil.copytree(src, dst)
+        for choice in choices:
+            ret, duration, cpu = run(src, dst, choice)
+            if ret:
+                print('{:<10}{:>30}'.format(choice, 'failed'))
+                continue
+            # both ends hash every file
+            print('{:<10}{:>9.2f}s{:>9.2f}s{:>10.1f}'.format(
+                choice, duration, cpu, 2 * size / duration))
+    print('\nBack In Time uses: {}'.format(
+        ([c for c in tools.RSYNC_CHECKSUM_ORDER if c in choices]
+         or ['rsync default'])[0]))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 512,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 64)
@@ -0,0 +1,89 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Memory benchmark for the FileInfoDict implementations.
+
+Fill a plain dict (like :py:class:`snapshots.FileInfoDict`) and a
+:py:class:`fileinfo.CompactFileInfoDict` with the same synthetic entries the
+way :py:func:`snapshots.Snapshots.collectPermission` does and report the peak
+memory and the time for building and looking up all entries.
+
+Usage::
+
+    python3 test/benchmark_fileinfo.py [NUMBER_OF_FILES]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from fileinfo import CompactFileInfoDict
+
+
+def paths(count):
+    for i in range(count):
+        yield b'/home/user/Documents/project%d/src/module%d/file%d.py' % (
+            i // 10000, i // 100, i)
+
+
+def fill(d, count):
+    users = ('user', 'root', 'www-data')
+    for i, path in enumerate(paths(count)):
+        # collectPermission() encodes user and group for every file
+        d[path] = (0o100644,
+                   users[i % 3].encode('utf-8', 'replace'),
+                   users[i % 2].encode('utf-8', 'replace'))
+
+    return d
+
+
+def measure(factory, count):
+    # tracemalloc slows down allocations a lot. So measure time separately.
+    tracemalloc.start()
+    d = fill(factory(), count)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del d
+
+    start = time.perf_counter()
+    d = fill(factory(), count)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for path in paths(count):
+        d[path]
+    lookup = time.perf_counter() - start
+
+    return size, peak, build, lookup
+
+
+def main(count):
+    print('{} files'.format(count))
+    print('{:<22}{:>12}{:>12}{:>10}{:>10}'.format(
+        'implementation', 'size MiB', 'peak MiB', 'build s', 'lookup s'))
+
+    for name, factory in (('dict', dict),
+                          ('CompactFileInfoDict', CompactFileInfoDict)):
+        size, peak, build, lookup = measure(factory, count)
+        print('{:<22}{:>12.1f}{:>12.1f}{:>10.2f}{:>10.2f}'.format(
+            name, size / 2**20, peak / 2**20, build, lookup))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,134 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Benchmark for :py:func:`snapshots.Snapshots.smartRemoveList`.
+
+Build a synthetic history of snapshots taken every five minutes and compare
+the linear scans over all snapshots for every kept day, week, month and year
+(like smart-remove worked before) with the lookups in
+:py:class:`snapshots.SmartRemoveIndex`. Both check the failed flag of the
+snapshots on disk, because the synthetic snapshots are not in the snapshot
+catalog.
+
+Usage::
+
+    python3 test/benchmark_smartremove.py [NUMBER_OF_SNAPSHOTS]
+"""
+
+import os
+import sys
+import time
+import datetime
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import config
+import snapshots
+from snapshots import SID
+
+# keep_all, keep_one_per_day, keep_one_per_week, keep_one_per_month
+RULES = (2, 7, 4, 24)
+
+
+def history(cfg, count, now):
+    """
+    ``count`` snapshots taken every five minutes until ``now``. Newest first
+    like :py:func:`snapshots.listSnapshots` returns them.
+    """
+    return [SID(now - datetime.timedelta(minutes=5 * i), cfg)
+            for i in range(count)]
+
+
+def linearKeepFirst(cfg, sids, min_date, max_date):
+    min_id = SID(min_date, cfg)
+    max_id = SID(max_date, cfg)
+    for sid in sids:
+        if sid.failed:
+            continue
+        if sid >= min_id and sid < max_id:
+            return set([sid])
+    for sid in sids:
+        if sid >= min_id and sid < max_id:
+            return set([sid])
+    return set()
+
+
+def linearSmartRemoveList(sn, sids, now_full):
+    cfg = sn.config
+    keep_all, keep_one_per_day, keep_one_per_week, keep_one_per_month = RULES
+    now = now_full.date()
+    keep = set([sids[0]])
+
+    min_id = SID(now - datetime.timedelta(days=keep_all-1), cfg)
+    max_id = SID(now + datetime.timedelta(days=1), cfg)
+    keep |= set([sid for sid in sids if sid >= min_id and sid < max_id])
+
+    d = now
+    for i in range(keep_one_per_day):
+        keep |= linearKeepFirst(cfg, sids, d, d + datetime.timedelta(days=1))
+        d -= datetime.timedelta(days=1)
+
+    d = now - datetime.timedelta(days=now.weekday() + 1)
+    for i in range(keep_one_per_week):
+        keep |= linearKeepFirst(cfg, sids, d, d + datetime.timedelta(days=8))
+        d -= datetime.timedelta(days=7)
+
+    d1 = datetime.date(now.year, now.month, 1)
+    d2 = sn.incMonth(d1)
+    for i in range(keep_one_per_month):
+        keep |= linearKeepFirst(cfg, sids, d1, d2)
+        d2 = d1
+        d1 = sn.decMonth(d1)
+
+    for i in range(int(sids[-1].sid[:4]), now.year + 1):
+        keep |= linearKeepFirst(cfg, sids,
+                                datetime.date(i, 1, 1),
+                                datetime.date(i + 1, 1, 1))
+
+    return [sid for sid in sids if sid not in keep]
+
+
+def main(count):
+    with TemporaryDirectory() as tmp:
+        cfg = config.Config(os.path.join(tmp, 'config'),
+                            os.path.join(tmp, 'share'))
+        cfg.setSnapshotsPath(tmp)
+        cfg.setProfileStrValue('snapshots.tag', '123')
+        sn = snapshots.Snapshots(cfg)
+        now = datetime.datetime(2024, 6, 30, 23, 55)
+        sids = history(cfg, count, now)
+
+        print('{} snapshots from {} to {}'.format(count, sids[-1], sids[0]))
+
+        start = time.perf_counter()
+        linear = linearSmartRemoveList(sn, sids, now)
+        print('{:<10}{:>10.2f} s'.format('linear',
+                                          time.perf_counter() - start))
+
+        with patch('snapshots.listSnapshots', return_value=sids):
+            start = time.perf_counter()
+            indexed = sn.smartRemoveList(now, *RULES)
+            print('{:<10}{:>10.2f} s'.format('index',
+                                              time.perf_counter() - start))
+
+        assert linear == indexed, 'results differ'
+        print('{} snapshots to remove'.format(len(indexed)))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
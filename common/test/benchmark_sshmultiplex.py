@@ -0,0 +1,131 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Count SSH handshakes of one backup with and without a shared connection.
+
+Run a backup of an existing SSH profile twice, once with
+``snapshots.ssh.multiplex`` disabled and once enabled. Both runs use a copy of
+the configuration. A wrapper named ``ssh`` is put in front of ``PATH``, so
+every ssh process started by Back In Time, ``sshfs`` and ``rsync`` is logged
+before the real ssh is executed. Every call which can't use a running
+ControlMaster socket pays a full key exchange.
+
+Usage::
+
+    python3 test/benchmark_sshmultiplex.py [PROFILE_ID [CONFIG]]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import subprocess
+from tempfile import TemporaryDirectory
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import config
+
+BACKINTIME = os.path.join(os.path.dirname(__file__), '..', 'backintime.py')
+
+WRAPPER = '''#!{python}
+import os
+import sys
+import json
+
+args = sys.argv[1:]
+options = []
+for i, arg in enumerate(args):
+    if arg == '-o' and i + 1 < len(args):
+        options.append(args[i + 1])
+    elif arg.startswith('-o') and len(arg) > 2:
+        options.append(arg[2:])
+
+if '-O' in args:
+    kind = 'control'
+elif 'ControlMaster=yes' in options:
+    kind = 'master'
+else:
+    kind = 'handshake'
+    for option in options:
+        if option.startswith('ControlPath=') \\
+                and os.path.exists(option[len('ControlPath='):]):
+            kind = 'multiplexed'
+
+with open({log!r}, 'a') as f:
+    f.write(json.dumps({{'kind': kind, 'args': args}}) + '\\n')
+os.execv({ssh!r}, ['ssh'] + args)
+'''
+
+
+def run(tmp, cfgFile, profile_id, multiplex):
+    name = 'multiplex' if multiplex else 'direct'
+    copy = os.path.join(tmp, name + '.config')
+    shutil.copy(cfgFile, copy)
+    cfg = config.Config(copy)
+    cfg.setSshMultiplex(multiplex, profile_id)
+    cfg.save()
+
+    log = os.path.join(tmp, name + '.log')
+    binDir = os.path.join(tmp, name + '-bin')
+    os.mkdir(binDir)
+    wrapper = os.path.join(binDir, 'ssh')
+    with open(wrapper, 'wt') as f:
+        f.write(WRAPPER.format(python=sys.executable,
+                               log=log,
+                               ssh=shutil.which('ssh')))
+    os.chmod(wrapper, 0o755)
+
+    env = os.environ.copy()
+    env['PATH'] = binDir + os.pathsep + env['PATH']
+    start = time.perf_counter()
+    subprocess.call([sys.executable, BACKINTIME,
+                     '--config', copy,
+                     '--profile-id', str(profile_id),
+                     'backup'],
+                    env=env)
+    duration = time.perf_counter() - start
+
+    counts = {'handshake': 0, 'master': 0, 'multiplexed': 0, 'control': 0}
+    if os.path.exists(log):
+        with open(log, 'rt') as f:
+            for line in f:
+                counts[json.loads(line)['kind']] += 1
+
+    print('{:<10}{:>8}{:>12}{:>8}{:>10.2f} s'.format(
+        name,
+        counts['handshake'] + counts['master'] + counts['multiplexed'],
+        counts['handshake'] + counts['master'],
+        counts['multiplexed'],
+        duration))
+
+
+def main(profile_id, cfgFile):
+    cfg = config.Config(cfgFile)
+    if cfg.snapshotsMode(profile_id) not in ('ssh', 'ssh_encfs'):
+        sys.exit('Profile {} is not an SSH profile'.format(profile_id))
+
+    print('{:<10}{:>8}{:>12}{:>8}{:>12}'.format(
+        '', 'calls', 'handshakes', 'shared', 'duration'))
+    with TemporaryDirectory() as tmp:
+        for multiplex in (False, True):
+            run(tmp, cfg._LOCAL_CONFIG_PATH, profile_id, multiplex)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else '1',
+         sys.argv[2] if len(sys.argv) > 2 else None)
@@ -237,5 +237,19 @@ class TestArgParser(generic.TestCase):
         with self.assertRaises(SystemExit):
             backintime.argParse(('restore', '--local-backup', '--no-local-backup'))
 
+    ############################################################################
+    ###                           check-ssh-limits                           ###
+    ############################################################################
+    def test_cmd_check_ssh_limits(self):
+        args = backintime.argParse(['check-ssh-limits'])
+        self.assertIs(args.func, backintime.checkSshLimits)
+        self.assertFalse(args.all_profiles)
+        self.assertFalse(args.force)
+
+    def test_cmd_check_ssh_limits_all_profiles(self):
+        args = backintime.argParse(['check-ssh-limits', '--all-profiles', '--force'])
+        self.assertTrue(args.all_profiles)
+        self.assertTrue(args.force)
+
 if __name__ == '__main__':
     unittest.main()
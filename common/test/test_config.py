@@ -24,6 +24,7 @@ from unittest.mock import patch
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 import config
+import tools
 
 class TestConfig(generic.TestCaseCfg):
     def test_set_snapshots_path_test_writes(self):
@@ -160,6 +161,45 @@ class TestSshCommand(generic.SSHTestCase):
                                    '{}@localhost'.format(self.cfg.user()),
                                    'echo', 'foo'])
 
+    def test_multiplex(self):
+        path = self.cfg.sshControlPath()
+        # no master running
+        self.assertNotIn('ControlPath={}'.format(path),
+                         self.cfg.sshCommand(cmd = ['echo', 'foo']))
+
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        # stands in for the socket of a running master
+        with open(path, 'w'):
+            pass
+        cmd = self.cfg.sshCommand(cmd = ['echo', 'foo'])
+        self.assertListEqual(cmd, ['ssh',
+                                   '-o', 'ServerAliveInterval=240',
+                                   '-o', 'LogLevel=Error',
+                                   '-o', 'IdentityFile={}'.format(generic.PRIV_KEY_FILE),
+                                   '-p', '22',
+                                   '-o', 'ControlPath={}'.format(path),
+                                   '{}@localhost'.format(self.cfg.user()),
+                                   'echo', 'foo'])
+        self.assertIn('ControlPath={}'.format(path),
+                      ' '.join(tools.rsyncSshArgs(self.cfg)))
+        self.assertNotIn('ControlPath={}'.format(path),
+                         self.cfg.sshCommand(cmd = ['echo', 'foo'],
+                                             multiplex = False))
+
+        self.cfg.setSshMultiplex(False)
+        self.assertNotIn('ControlPath={}'.format(path),
+                         self.cfg.sshCommand(cmd = ['echo', 'foo']))
+
+    def test_controlPath(self):
+        # different destinations never share a connection
+        self.assertNotEqual(self.cfg.sshControlPath(),
+                            self.cfg.sshControlPath(host = 'otherhost'))
+        self.assertNotEqual(self.cfg.sshControlPath(),
+                            self.cfg.sshControlPath(profile_id = '2'))
+        self.assertEqual(self.cfg.sshControlPath(),
+                         self.cfg.sshControlPath(user = self.cfg.sshUser(),
+                                                 port = 22))
+
     def test_disable_args(self):
         cmd = self.cfg.sshCommand(port = False, user_host = False)
         self.assertListEqual(cmd, ['ssh',
@@ -17,8 +17,22 @@
 
 import os
 import sys
+import subprocess
+import unittest
 from test import generic
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import encfstools
+
+# fake 'encfsctl' in pipe mode which reverses every path component and
+# terminates on 'exit'
+FAKE_ENCFSCTL = [sys.executable, '-u', '-c',
+                 'import sys\n'
+                 'for line in sys.stdin:\n'
+                 '    line = line.rstrip("\\n")\n'
+                 '    if line == "exit":\n'
+                 '        break\n'
+                 '    out = "" if line == "fail" else "/".join(c[::-1] for c in line.split("/"))\n'
+                 '    print(out, flush=True)\n']
 
 class TestEncFS_mount(generic.TestCase):
 
@@ -35,3 +49,119 @@ class TestEncFS_mount(generic.TestCase):
 
     def test_dummy(self):
         self.assertTrue(True)
+
+
+class TestPathCache(unittest.TestCase):
+    def test_parents(self):
+        cache = encfstools.PathCache()
+        cache.add('foo/bar/baz', 'X/Y/Z')
+        self.assertEqual(cache.get('foo/bar/baz'), 'X/Y/Z')
+        self.assertEqual(cache.get('foo/bar'), 'X/Y')
+        self.assertEqual(cache.get('foo'), 'X')
+        self.assertIsNone(cache.get('foo/ba'))
+
+    def test_parents_absolute(self):
+        cache = encfstools.PathCache()
+        cache.add(b'/foo/bar', b'/X/Y')
+        self.assertEqual(cache.get(b'/foo'), b'/X')
+        self.assertIsNone(cache.get(b''))
+
+    def test_different_structure(self):
+        cache = encfstools.PathCache()
+        cache.add('/foo/bar', 'X/Y')
+        cache.add('baz/', 'Z')
+        self.assertEqual(cache.get('/foo/bar'), 'X/Y')
+        self.assertEqual(cache.get('baz/'), 'Z')
+        self.assertIsNone(cache.get('/foo'))
+        self.assertIsNone(cache.get('baz'))
+
+    def test_no_parents(self):
+        cache = encfstools.PathCache()
+        cache.add('foo/bar', 'foo/bar', parents=False)
+        self.assertIsNone(cache.get('foo'))
+
+    def test_maxsize(self):
+        cache = encfstools.PathCache(maxsize=2)
+        cache.add('a', 'A')
+        cache.add('b', 'B')
+        cache.get('a')
+        cache.add('c', 'C')
+        self.assertEqual(cache.get('a'), 'A')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'C')
+
+
+class TestPipe(unittest.TestCase):
+    def setUp(self):
+        self.proc = subprocess.Popen(FAKE_ENCFSCTL,
+                                     stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     universal_newlines=True,
+                                     bufsize=0)
+
+    def tearDown(self):
+        self.proc.communicate()
+
+    def test_pipePaths(self):
+        # a lot more than the pipe buffer size
+        paths = ['foo%d/%s' % (i, 'bar' * 20) for i in range(5000)]
+        result = encfstools.pipePaths(self.proc, paths, '\n')
+        self.assertEqual(len(result), 5000)
+        self.assertEqual(result[42], '24oof/' + 'rab' * 20)
+
+    def test_decode_paths(self):
+        decode = encfstools.Decode.__new__(encfstools.Decode)
+        decode.string = True
+        decode.newline = '\n'
+        decode.cache = encfstools.PathCache()
+        decode._requests = None
+        decode.p = self.proc
+
+        self.assertListEqual(decode.paths(['oof/rab', 'fail', 'oof/rab']),
+                             ['foo/bar', 'fail', 'foo/bar'])
+        self.assertEqual(decode.cache.get('oof'), 'foo')
+        self.assertListEqual(decode.list(['oof', 'fail']), ['foo', 'fail'])
+
+        # everything is cached now
+        decode.p = None
+        self.assertEqual(decode.path('oof/rab'), 'foo/bar')
+        decode.p = self.proc
+
+    def test_decode_paths_terminated(self):
+        decode = encfstools.Decode.__new__(encfstools.Decode)
+        decode.string = True
+        decode.newline = '\n'
+        decode.cache = encfstools.PathCache()
+        decode._requests = None
+        decode.p = self.proc
+        procs = []
+
+        def startProcess():
+            decode.p = subprocess.Popen(FAKE_ENCFSCTL,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        universal_newlines=True,
+                                        bufsize=0)
+            procs.append(decode.p)
+
+        decode.startProcess = startProcess
+        # encfsctl terminates on 'exit' every time so 'rab' fails on retry, too
+        self.assertListEqual(decode.paths(['oof', 'exit', 'rab']),
+                             ['foo', 'exit', 'rab'])
+        self.assertEqual(len(procs), 1)
+        self.assertIsNone(decode.cache.get('exit'))
+        self.assertIsNone(decode.cache.get('rab'))
+
+        self.assertListEqual(decode.paths(['rab']), ['bar'])
+        self.assertEqual(len(procs), 2)
+        decode.close()
+
+    def test_encode_paths(self):
+        encode = encfstools.Encode.__new__(encfstools.Encode)
+        encode.cache = encfstools.PathCache()
+        encode.p = self.proc
+
+        self.assertListEqual(encode.paths(['foo/bar', 'foo']),
+                             ['oof/rab', 'oof'])
+        with self.assertRaises(encfstools.EncodeValueError):
+            encode.path('fail')
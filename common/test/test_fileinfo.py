@@ -0,0 +1,296 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import sys
+import unittest
+from tempfile import TemporaryDirectory
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import fileinfo
+from fileinfo import FileInfoIndex, FileInfoChain, CompactFileInfoDict
+
+
+class TestFileInfoIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.fileName = os.path.join(self.tmp.name, 'fileinfo.idx')
+
+        self.d = {b'/': (16877, b'root', b'root')}
+        for i in range(1000):
+            path = b'/home/foo/dir%d/file%d' % (i // 10, i)
+            self.d[path] = (33188 + i % 3,
+                            b'user%d' % (i % 2),
+                            b'group%d' % (i % 5))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_read(self):
+        FileInfoIndex.write(self.fileName, self.d, blockSize=16)
+        index = FileInfoIndex(self.fileName)
+
+        self.assertEqual(len(index), len(self.d))
+        self.assertEqual(len(index.blocks), 63)
+        self.assertDictEqual(dict(index.items()), self.d)
+        self.assertListEqual(list(index), sorted(self.d))
+
+    def test_lookup(self):
+        FileInfoIndex.write(self.fileName, self.d, blockSize=16)
+        index = FileInfoIndex(self.fileName)
+
+        for path in (b'/', b'/home/foo/dir0/file0', b'/home/foo/dir99/file999'):
+            self.assertIn(path, index)
+            self.assertTupleEqual(index[path], self.d[path])
+
+        for path in (b'', b'/a', b'/home/foo/dir0/file', b'/zzz'):
+            self.assertNotIn(path, index)
+            with self.assertRaises(KeyError):
+                index[path]
+            self.assertIsNone(index.get(path))
+
+    def test_empty(self):
+        FileInfoIndex.write(self.fileName, {})
+        index = FileInfoIndex(self.fileName)
+
+        self.assertEqual(len(index), 0)
+        self.assertNotIn(b'/', index)
+        self.assertDictEqual(dict(index.items()), {})
+
+    def test_special_paths(self):
+        d = {b'/foo bar': (1, b'', b'root'),
+             b'/foo\nbar': (2, b'root', b'root'),
+             b'/f\xc3\xb6\xff': (3, b'root', b'root')}
+        FileInfoIndex.write(self.fileName, d)
+        index = FileInfoIndex(self.fileName)
+
+        self.assertDictEqual(dict(index.items()), d)
+
+    def test_invalid_file(self):
+        with open(self.fileName, 'wb') as f:
+            f.write(b'123 foo bar /tmp\n')
+
+        with self.assertRaises(ValueError):
+            FileInfoIndex(self.fileName)
+
+    def test_truncated_file(self):
+        FileInfoIndex.write(self.fileName, self.d)
+        with open(self.fileName, 'r+b') as f:
+            f.truncate(os.path.getsize(self.fileName) - 10)
+
+        with self.assertRaises(ValueError):
+            FileInfoIndex(self.fileName)
+
+    def test_write_failed(self):
+        FileInfoIndex.write(self.fileName, self.d)
+        with open(self.fileName, 'rb') as f:
+            old = f.read()
+
+        # a value which can't be packed fails in the middle of writing
+        d = dict(self.d)
+        d[b'/zzz'] = (-1, b'root', b'root')
+        with self.assertRaises(Exception):
+            FileInfoIndex.write(self.fileName, d, blockSize=16)
+
+        with open(self.fileName, 'rb') as f:
+            self.assertEqual(f.read(), old)
+        self.assertListEqual(os.listdir(self.tmp.name), ['fileinfo.idx'])
+
+    def test_commonPrefix(self):
+        self.assertEqual(fileinfo._commonPrefix(b'/foo/bar', b'/foo/baz'), 7)
+        self.assertEqual(fileinfo._commonPrefix(b'/foo', b'/foo/bar'), 4)
+        self.assertEqual(fileinfo._commonPrefix(b'', b'/foo'), 0)
+        self.assertEqual(fileinfo._commonPrefix(b'/a', b'/b'), 1)
+
+
+class TestFileInfoChain(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.full = os.path.join(self.tmp.name, 'full.idx')
+        self.delta1 = os.path.join(self.tmp.name, 'delta1.idx')
+        self.delta2 = os.path.join(self.tmp.name, 'delta2.idx')
+
+        self.d0 = {b'/': (16877, b'root', b'root'),
+                   b'/foo': (1, b'foo', b'bar'),
+                   b'/bar': (2, b'foo', b'bar'),
+                   b'/baz': (3, b'foo', b'bar')}
+        self.d1 = dict(self.d0)
+        self.d1[b'/foo'] = (4, b'asdf', b'bar')
+        self.d1[b'/new'] = (5, b'foo', b'bar')
+        del self.d1[b'/bar']
+        self.d2 = dict(self.d1)
+        del self.d2[b'/baz']
+        self.d2[b'/bar'] = (6, b'foo', b'qwer')
+
+        FileInfoIndex.write(self.full, self.d0, blockSize=2)
+        FileInfoIndex.writeDelta(self.delta1, self.d1,
+                                 FileInfoIndex(self.full),
+                                 '20151219-010324-123', blockSize=2)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_delta(self):
+        delta = FileInfoIndex(self.delta1)
+
+        self.assertEqual(delta.parent, '20151219-010324-123')
+        self.assertEqual(delta.depth, 1)
+        self.assertEqual(delta.total, len(self.d1))
+        self.assertDictEqual(dict(delta.items()),
+                             {b'/foo': (4, b'asdf', b'bar'),
+                              b'/new': (5, b'foo', b'bar'),
+                              b'/bar': None})
+
+        full = FileInfoIndex(self.full)
+        self.assertIsNone(full.parent)
+        self.assertEqual(full.depth, 0)
+
+    def test_readParent(self):
+        self.assertEqual(FileInfoIndex.readParent(self.delta1),
+                         '20151219-010324-123')
+        self.assertIsNone(FileInfoIndex.readParent(self.full))
+
+    def test_chain(self):
+        chain = FileInfoChain([FileInfoIndex(self.delta1),
+                               FileInfoIndex(self.full)])
+
+        self.assertEqual(len(chain), len(self.d1))
+        self.assertEqual(chain, self.d1)
+        self.assertDictEqual(dict(chain.items()), self.d1)
+        self.assertNotIn(b'/bar', chain)
+        self.assertIn(b'/baz', chain)
+        self.assertTupleEqual(chain[b'/foo'], (4, b'asdf', b'bar'))
+        with self.assertRaises(KeyError):
+            chain[b'/bar']
+
+    def test_chain_depth(self):
+        base = FileInfoChain([FileInfoIndex(self.delta1),
+                              FileInfoIndex(self.full)])
+        FileInfoIndex.writeDelta(self.delta2, self.d2, base,
+                                 '20151219-020324-123')
+        chain = FileInfoChain([FileInfoIndex(self.delta2),
+                               FileInfoIndex(self.delta1),
+                               FileInfoIndex(self.full)])
+
+        self.assertEqual(chain.depth, 2)
+        self.assertEqual(chain.parent, '20151219-020324-123')
+        self.assertDictEqual(dict(chain.items()), self.d2)
+        self.assertTupleEqual(chain[b'/bar'], (6, b'foo', b'qwer'))
+        self.assertNotIn(b'/baz', chain)
+
+
+class TestCompactFileInfoDict(unittest.TestCase):
+    def test_default(self):
+        d = CompactFileInfoDict()
+        self.assertEqual(len(d), 1)
+        self.assertTupleEqual(d[b'/'], (16877, b'root', b'root'))
+
+    def test_set_get(self):
+        d = CompactFileInfoDict()
+        ref = {b'/': (16877, b'root', b'root')}
+        for i in range(1000):
+            path = b'/foo/bar%d' % i
+            d[path] = ref[path] = (i, b'user%d' % (i % 3), b'group')
+
+        self.assertEqual(len(d), 1001)
+        self.assertEqual(d, ref)
+        self.assertListEqual(list(d), list(ref))
+        self.assertIn(b'/foo/bar999', d)
+        self.assertNotIn(b'/foo/bar1000', d)
+        self.assertNotIn('/foo/bar1', d)
+        self.assertIsNone(d.get(b'/foo'))
+        with self.assertRaises(KeyError):
+            d[b'/foo']
+
+        # user and group names are interned
+        self.assertEqual(len(d._names), 5)
+
+    def test_overwrite(self):
+        d = CompactFileInfoDict()
+        d[b'/foo'] = (1, b'foo', b'bar')
+        d[b'/foo'] = (2, b'asdf', b'qwer')
+
+        self.assertEqual(len(d), 2)
+        self.assertTupleEqual(d[b'/foo'], (2, b'asdf', b'qwer'))
+
+    def test_delete(self):
+        d = CompactFileInfoDict()
+        d[b'/foo'] = (1, b'foo', b'bar')
+        d[b'/bar'] = (2, b'foo', b'bar')
+        del d[b'/foo']
+
+        self.assertEqual(len(d), 2)
+        self.assertNotIn(b'/foo', d)
+        self.assertDictEqual(dict(d.items()),
+                             {b'/': (16877, b'root', b'root'),
+                              b'/bar': (2, b'foo', b'bar')})
+        with self.assertRaises(KeyError):
+            del d[b'/foo']
+
+        d[b'/foo'] = (3, b'foo', b'bar')
+        self.assertTupleEqual(d[b'/foo'], (3, b'foo', b'bar'))
+
+    def test_items(self):
+        d = CompactFileInfoDict()
+        d[b'/foo'] = (1, b'foo', b'bar')
+        items = d.items()
+
+        self.assertEqual(len(items), 2)
+        self.assertIn((b'/foo', (1, b'foo', b'bar')), items)
+        self.assertNotIn((b'/foo', (2, b'foo', b'bar')), items)
+        self.assertListEqual(list(items), list(items))
+        d[b'/bar'] = (2, b'foo', b'bar')
+        self.assertEqual(len(items), 3)
+
+    def test_update(self):
+        ref = {b'/': (16877, b'root', b'root')}
+        for i in range(1000):
+            ref[b'/foo/bar%d' % i] = (i, b'user%d' % (i % 3), b'group')
+
+        for other in (ref, ref.items(), iter(ref.items())):
+            d = CompactFileInfoDict()
+            d[b'/foo/bar1'] = (1, b'foo', b'bar')
+            d[b'/baz'] = (1, b'foo', b'bar')
+            del d[b'/baz']
+            d.update(other)
+
+            self.assertEqual(len(d), 1001)
+            self.assertEqual(d, ref)
+            self.assertNotIn(b'/baz', d)
+            self.assertEqual(len(d._names), 7)
+
+        with self.assertRaises(AssertionError):
+            d.update({b'/foo': (1, 'foo', b'bar')})
+
+    def test_invalid_value(self):
+        d = CompactFileInfoDict()
+        with self.assertRaises(AssertionError):
+            d['/foo'] = (1, b'foo', b'bar')
+        with self.assertRaises(AssertionError):
+            d[b'/foo'] = (1, 'foo', b'bar')
+
+    def test_write_index(self):
+        d = CompactFileInfoDict()
+        d[b'/foo'] = (1, b'foo', b'bar')
+        with TemporaryDirectory() as tmp:
+            fileName = os.path.join(tmp, 'fileinfo.idx')
+            FileInfoIndex.write(fileName, d)
+            self.assertEqual(FileInfoIndex(fileName), d)
+
+
+if __name__ == '__main__':
+    unittest.main()
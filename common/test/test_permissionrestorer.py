@@ -0,0 +1,127 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import sys
+import stat
+import unittest
+from tempfile import TemporaryDirectory
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from permissionrestorer import PermissionRestorer
+
+IS_ROOT = os.geteuid() == 0
+
+
+class TestPermissionRestorer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        # snapshot backup folder and destination of the restore
+        self.backup = os.path.join(self.tmp.name, 'backup').encode()
+        self.dest = os.path.join(self.tmp.name, 'dest').encode()
+        self.fileInfo = {}
+        self.messages = []
+
+        for root in (self.backup, self.dest):
+            os.makedirs(os.path.join(root, b'foo', b'bar'))
+            for name in (b'foo/a', b'foo/bar/b'):
+                with open(os.path.join(root, name), 'wt') as f:
+                    f.write('foo')
+            os.symlink(b'a', os.path.join(root, b'foo', b'link'))
+
+        for name in (b'/foo', b'/foo/bar', b'/foo/a', b'/foo/bar/b', b'/foo/link'):
+            st = os.lstat(self.dest + name)
+            self.fileInfo[name] = (st.st_mode, b'user', b'group')
+
+    def tearDown(self):
+        for path, dirs, files in os.walk(self.dest):
+            os.chmod(path, stat.S_IRWXU)
+        self.tmp.cleanup()
+
+    def restorer(self, uid=-1, gid=-1):
+        r = PermissionRestorer(self.fileInfo,
+                               uid=lambda name: uid,
+                               gid=lambda name: gid,
+                               callback=lambda ok, msg: self.messages.append((ok, msg)),
+                               workers=2)
+        r.addPath(b'/foo', self.dest + b'/foo')
+        r.addTree(self.backup + b'/foo', len(self.backup), self.dest, 0)
+        return r
+
+    def mode(self, name):
+        return stat.S_IMODE(os.lstat(self.dest + name).st_mode)
+
+    def test_addTree(self):
+        r = self.restorer()
+        self.assertCountEqual(r.files.keys(),
+                              [b'/foo/a', b'/foo/bar/b', b'/foo/link'])
+        self.assertCountEqual(r.dirs.keys(), [b'/foo', b'/foo/bar'])
+        self.assertEqual(r.files[b'/foo/a'], self.dest + b'/foo/a')
+
+    def test_no_changes(self):
+        st = os.stat(self.dest + b'/foo/a')
+        self.restorer(st.st_uid, st.st_gid).run()
+        self.assertListEqual(self.messages, [])
+
+    def test_chmod(self):
+        self.fileInfo[b'/foo/a'] = (stat.S_IFREG | 0o600, b'user', b'group')
+        self.fileInfo[b'/foo/bar/b'] = (stat.S_IFREG | 0o640, b'user', b'group')
+        # read-only folders are changed after their content
+        self.fileInfo[b'/foo/bar'] = (stat.S_IFDIR | 0o500, b'user', b'group')
+        self.fileInfo[b'/foo'] = (stat.S_IFDIR | 0o500, b'user', b'group')
+        self.restorer().run()
+
+        self.assertEqual(self.mode(b'/foo/a'), 0o600)
+        self.assertEqual(self.mode(b'/foo/bar/b'), 0o640)
+        self.assertEqual(self.mode(b'/foo/bar'), 0o500)
+        self.assertEqual(self.mode(b'/foo'), 0o500)
+        self.assertEqual(len(self.messages), 4)
+        self.assertTrue(all(ok for ok, msg in self.messages))
+        # folders come last, deepest first
+        self.assertListEqual([msg for ok, msg in self.messages[2:]],
+                             ['chmod {}/foo/bar 40500'.format(self.dest.decode()),
+                              'chmod {}/foo 40500'.format(self.dest.decode())])
+
+    def test_symlink(self):
+        self.fileInfo[b'/foo/link'] = (stat.S_IFLNK | 0o700, b'user', b'group')
+        before = self.mode(b'/foo/a')
+        self.restorer().run()
+        self.assertEqual(self.mode(b'/foo/a'), before)
+        self.assertListEqual(self.messages, [])
+
+    def test_unknown(self):
+        del self.fileInfo[b'/foo/a']
+        self.fileInfo[b'/foo/bar/b'] = (stat.S_IFREG | 0o600, b'user', b'group')
+        os.remove(self.dest + b'/foo/bar/b')
+        self.restorer().run()
+        self.assertListEqual(self.messages, [])
+
+    @unittest.skipIf(not IS_ROOT, 'Changing the owner requires root.')
+    def test_chown(self):
+        self.restorer(uid=65534, gid=65534).run()
+        st = os.lstat(self.dest + b'/foo/bar/b')
+        self.assertEqual((st.st_uid, st.st_gid), (65534, 65534))
+        # symlinks are changed themselves
+        st = os.lstat(self.dest + b'/foo/link')
+        self.assertEqual((st.st_uid, st.st_gid), (65534, 65534))
+        self.assertEqual(os.stat(self.dest + b'/foo/a').st_uid, 65534)
+        self.assertEqual(len(self.messages), 5)
+        self.assertTrue(all(ok for ok, msg in self.messages))
+
+
+if __name__ == '__main__':
+    unittest.main()
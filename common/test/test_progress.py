@@ -0,0 +1,111 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import sys
+from test import generic
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import progress
+
+
+class TestProgressRecord(generic.TestCaseCfg):
+    def setUp(self):
+        super(TestProgressRecord, self).setUp()
+        self.writer = progress.ProgressRecord(self.cfg)
+        self.reader = progress.ProgressRecord(self.cfg)
+
+    def tearDown(self):
+        self.writer.remove()
+        super(TestProgressRecord, self).tearDown()
+
+    def test_no_record(self):
+        self.assertIsNone(self.reader.read())
+
+    def test_update_read(self):
+        self.writer.update(progress.ProgressFile.RSYNC, 26, 529797, 15162327, 156)
+        pg = self.reader.read()
+        self.assertEqual(pg.status, progress.ProgressFile.RSYNC)
+        self.assertEqual(pg.percent, 26)
+        self.assertEqual(pg.sent, 529797)
+        self.assertEqual(pg.speed, 15162327)
+        self.assertEqual(pg.eta, 156)
+
+        # update in place
+        self.writer.update(progress.ProgressFile.RSYNC, 27, 600000, 0, -1)
+        pg2 = self.reader.read()
+        self.assertGreater(pg2.seq, pg.seq)
+        self.assertEqual(pg2.percent, 27)
+        self.assertEqual(pg2.strValue('eta', 'foo'), 'foo')
+
+    def test_writer_busy(self):
+        self.writer.update(progress.ProgressFile.RSYNC, 26, 1, 1, 1)
+        # odd sequence counter while the writer is updating
+        progress.ProgressRecord._SEQ.pack_into(self.writer.map, 8, 3)
+        self.assertIsNone(self.reader.read())
+
+    def test_recreated(self):
+        self.writer.update(progress.ProgressFile.RSYNC, 26, 1, 1, 1)
+        self.assertEqual(self.reader.read().percent, 26)
+
+        self.writer.remove()
+        self.assertIsNone(self.reader.read())
+
+        self.writer.update(progress.ProgressFile.RSYNC, 5, 1, 1, 1)
+        self.assertEqual(self.reader.read().percent, 5)
+
+    def test_recreated_mapped(self):
+        self.writer.update(progress.ProgressFile.RSYNC, 26, 1, 1, 1)
+        self.assertEqual(self.reader.read().percent, 26)
+        mapped = self.reader.map
+
+        # a new writer replaces the record instead of truncating the one
+        # the reader has mapped
+        writer = progress.ProgressRecord(self.cfg)
+        writer.update(progress.ProgressFile.RSYNC, 5, 1, 1, 1)
+        self.assertEqual(mapped[:8], progress.ProgressRecord.MAGIC)
+        self.assertEqual(self.reader.read().percent, 5)
+        self.assertNotExists(self.writer.filename + '.tmp')
+        writer.close()
+
+    def test_short_record(self):
+        with open(self.reader.filename, 'wb') as f:
+            f.write(progress.ProgressRecord.MAGIC)
+        self.assertIsNone(self.reader.read())
+        self.assertIsNone(self.reader.map)
+
+    def test_strValue(self):
+        pg = progress.Progress(2, progress.ProgressFile.RSYNC, 26, 529797,
+                               15162327, 3723)
+        self.assertEqual(pg.strValue('sent'), '517.38K')
+        self.assertEqual(pg.strValue('speed'), '14.46MB/s')
+        self.assertEqual(pg.strValue('eta'), '1:02:03')
+        self.assertEqual(pg.intValue('percent'), 26)
+
+
+class TestProgressFormat(generic.TestCase):
+    def test_size(self):
+        self.assertEqual(progress.formatSize(1000), '1,000')
+        self.assertEqual(progress.formatSize(1536), '1.50K')
+        self.assertEqual(progress.parseSize('1,536'), 1536)
+        self.assertEqual(progress.parseSize('1.50K'), 1536)
+        self.assertEqual(progress.parseSize('-1.00k'), -1024)
+
+    def test_eta(self):
+        self.assertEqual(progress.parseEta('0:02:36'), 156)
+        self.assertEqual(progress.parseEta('??:??:??'), -1)
+        self.assertEqual(progress.formatEta(156), '0:02:36')
@@ -0,0 +1,137 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import sys
+import time
+import subprocess
+import unittest
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+from test import generic
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import remoteprobe
+
+
+class TestProbeScript(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def probe(self, path):
+        proc = subprocess.run(['sh', '-s'],
+                              input=remoteprobe.payload(path, 'tmp_ABC123'),
+                              stdout=subprocess.PIPE)
+        self.assertEqual(proc.returncode, 0)
+        return remoteprobe.parse(proc.stdout.decode())
+
+    def test_folder(self):
+        result = self.probe(self.tmp.name)
+        self.assertEqual(result['folder'], remoteprobe.FOLDER_OK)
+        self.assertFalse(result['created'])
+        self.assertTrue(result['hardlinks'])
+        self.assertTrue(result['commands']['nice'])
+        self.assertCountEqual(result['commands'].keys(),
+                              [name for name, cmd in remoteprobe.COMMANDS])
+        # temporary folder was removed
+        self.assertListEqual(os.listdir(self.tmp.name), [])
+
+    def test_create_folder(self):
+        path = os.path.join(self.tmp.name, 'foo bar')
+        result = self.probe(path)
+        self.assertEqual(result['folder'], remoteprobe.FOLDER_OK)
+        self.assertTrue(result['created'])
+        self.assertTrue(os.path.isdir(path))
+
+    def test_no_dir(self):
+        path = os.path.join(self.tmp.name, 'foo')
+        with open(path, 'wt') as f:
+            f.write('foo')
+        result = self.probe(path)
+        self.assertEqual(result['folder'], remoteprobe.FOLDER_NO_DIR)
+        self.assertIsNone(result['hardlinks'])
+
+    def test_create_failed(self):
+        path = os.path.join(self.tmp.name, 'foo', 'bar')
+        result = self.probe(path)
+        self.assertEqual(result['folder'], remoteprobe.FOLDER_CREATE_FAILED)
+
+    def test_parse(self):
+        output = ('folder 0\n'
+                  'rsync: rsync  version 3.1.3  protocol version 31\n'
+                  'rsync: Capabilities:\n'
+                  'hardlinks 0\n'
+                  'command nocache 0\n'
+                  'done\n')
+        self.assertDictEqual(remoteprobe.parse(output),
+                             {'folder': 0,
+                              'created': False,
+                              'rsync': 'rsync  version 3.1.3  protocol version 31\n'
+                                       'Capabilities:\n',
+                              'hardlinks': False,
+                              'commands': {'nocache': False}})
+
+    def test_parse_unfinished(self):
+        self.assertIsNone(remoteprobe.parse('folder 0\nhardlinks 1\n'))
+        self.assertIsNone(remoteprobe.parse('done\n'))
+
+
+class TestProbeCache(generic.TestCaseCfg):
+    def setUp(self):
+        super(TestProbeCache, self).setUp()
+        self.cfg.setSshHost('localhost')
+        self.cfg.setSshSnapshotsPath('/foo')
+        self.key = remoteprobe.profileKey(self.cfg)
+        self.result = {'folder': 0,
+                       'created': False,
+                       'rsync': 'rsync  version 3.1.3\n',
+                       'hardlinks': True,
+                       'commands': {'nice': True}}
+
+    def test_save_load(self):
+        self.assertIsNone(remoteprobe.load(self.cfg, self.key))
+        remoteprobe.save(self.cfg, self.key, self.result)
+        self.assertDictEqual(remoteprobe.load(self.cfg, self.key), self.result)
+        # other path on the same host
+        self.assertIsNone(remoteprobe.load(
+            self.cfg,
+            remoteprobe.key(self.cfg.sshUser(), 'localhost', 22, '/bar')))
+
+    def test_ttl(self):
+        remoteprobe.save(self.cfg, self.key, self.result)
+        with patch('time.time', return_value=time.time() + remoteprobe.TTL + 1):
+            self.assertIsNone(remoteprobe.load(self.cfg, self.key))
+
+    def test_invalidateProfile(self):
+        remoteprobe.save(self.cfg, self.key, self.result)
+        remoteprobe.invalidateProfile(self.cfg)
+        self.assertIsNone(remoteprobe.load(self.cfg, self.key))
+
+    def test_corrupt_cache(self):
+        with open(os.path.join(self.cfg._LOCAL_DATA_FOLDER,
+                               remoteprobe.CACHE_FILE), 'wt') as f:
+            f.write('foo')
+        self.assertIsNone(remoteprobe.load(self.cfg, self.key))
+        remoteprobe.save(self.cfg, self.key, self.result)
+        self.assertDictEqual(remoteprobe.load(self.cfg, self.key), self.result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import sys
+import time
+import shutil
+import subprocess
+import unittest
+from tempfile import TemporaryDirectory
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import remoteremove
+
+# stands in for 'rsync -a --delete EMPTY/ SNAPSHOT' and clears the snapshot
+FAKE_RSYNC = ['sh', '-c', 'rm -rf -- "$2" && mkdir -- "$2"', 'rsync']
+
+
+@unittest.skipIf(not (shutil.which('bash') and shutil.which('flock')),
+                 'bash and flock are required')
+class TestRemoteRemove(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.lock = os.path.join(self.tmp.name, 'smartremove.lck')
+        self.paths = []
+        for name in ('20151219-010324-123', '20151219-020324-123 with blank'):
+            path = os.path.join(self.tmp.name, name)
+            os.makedirs(os.path.join(path, 'backup', 'foo'))
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_helper(self, rsync=FAKE_RSYNC, paths=None, background=False):
+        if paths is None:
+            paths = self.paths
+        proc = subprocess.run(['bash', '-s'],
+                              input=remoteremove.payload(rsync, self.lock,
+                                                         paths, background),
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT)
+        return proc.returncode, proc.stdout.decode().splitlines()
+
+    def test_remove(self):
+        rc, lines = self.run_helper()
+        self.assertEqual(rc, 0)
+        self.assertListEqual(
+            [remoteremove.parse(line) for line in lines],
+            [(remoteremove.REMOVED, 1, 2, self.paths[0]),
+             (remoteremove.REMOVED, 2, 2, self.paths[1])])
+        for path in self.paths:
+            self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(self.lock))
+
+    def test_remove_missing(self):
+        missing = os.path.join(self.tmp.name, 'missing')
+        rc, lines = self.run_helper(paths=[missing])
+        self.assertEqual(rc, 0)
+        self.assertListEqual(lines, ['REMOVED 1 1 {}'.format(missing)])
+
+    def test_remove_failed(self):
+        rc, lines = self.run_helper(rsync=['false'])
+        self.assertEqual(rc, 1)
+        self.assertListEqual(
+            [remoteremove.parse(line)[0] for line in lines],
+            [remoteremove.FAILED] * 2)
+        for path in self.paths:
+            self.assertTrue(os.path.exists(path))
+
+    def test_remove_background(self):
+        rc, lines = self.run_helper(background=True)
+        self.assertEqual(rc, 0)
+        self.assertListEqual(lines, [remoteremove.STARTED])
+        for i in range(100):
+            if not any(os.path.exists(path) for path in self.paths):
+                break
+            time.sleep(0.1)
+        for path in self.paths:
+            self.assertFalse(os.path.exists(path))
+
+    def test_parse(self):
+        self.assertTupleEqual(remoteremove.parse('FAILED 3 10 /foo/bar baz'),
+                              (remoteremove.FAILED, 3, 10, '/foo/bar baz'))
+        self.assertIsNone(remoteremove.parse('STARTED'))
+        self.assertIsNone(remoteremove.parse('REMOVED a b /foo'))
+        self.assertIsNone(remoteremove.parse('rsync: some warning here'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import sys
+import unittest
+from tempfile import TemporaryDirectory
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from retentionplanner import RetentionPlanner
+
+
+class TestRetentionPlanner(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.snapshots = []
+        for i in range(3):
+            path = os.path.join(self.tmp.name, 'snapshot%d' % i, 'sub')
+            os.makedirs(path)
+            self.snapshots.append(os.path.dirname(path))
+
+        # 'shared' is hardlinked in all snapshots, 'own' exists only once
+        shared = os.path.join(self.snapshots[0], 'sub', 'shared')
+        with open(shared, 'wb') as f:
+            f.write(b'x' * 8192)
+        for path in self.snapshots:
+            if path != self.snapshots[0]:
+                os.link(shared, os.path.join(path, 'sub', 'shared'))
+            with open(os.path.join(path, 'own'), 'wb') as f:
+                f.write(b'x' * 4096)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_add(self):
+        planner = RetentionPlanner()
+        planner.add(1, 10, 1, 8)
+        self.assertEqual(planner.freedInodes, 1)
+        self.assertEqual(planner.freedBytes, 4096)
+
+        planner.add(1, 11, 2, 8)
+        self.assertEqual(planner.freedInodes, 1)
+        # same inode on another device
+        planner.add(2, 11, 2, 8)
+        self.assertEqual(planner.freedInodes, 1)
+        planner.add(1, 11, 2, 8)
+        self.assertEqual(planner.freedInodes, 2)
+        self.assertEqual(planner.freedBytes, 8192)
+
+    def test_addTree(self):
+        planner = RetentionPlanner()
+        planner.addTree(self.snapshots[0])
+        # two folders and 'own'
+        self.assertEqual(planner.freedInodes, 3)
+
+        planner.addTree(self.snapshots[1])
+        self.assertEqual(planner.freedInodes, 6)
+
+        planner.addTree(self.snapshots[2])
+        self.assertEqual(planner.freedInodes, 10)
+
+    def test_addFindOutput(self):
+        planner = RetentionPlanner()
+        planner.addFindOutput([b'd 2049 100 3 8\n',
+                               b'f 2049 101 2 16\n',
+                               b'garbage\n',
+                               'f 2049 102 1 8\n'])
+        self.assertEqual(planner.freedInodes, 2)
+        self.assertEqual(planner.freedBytes, 8192)
+        planner.addFindOutput([b'f 2049 101 2 16\n'])
+        self.assertEqual(planner.freedInodes, 3)
+
+    def test_plan(self):
+        planner = RetentionPlanner()
+        plan = planner.plan(self.snapshots,
+                            planner.addTree,
+                            lambda b, inodes: inodes >= 4)
+        self.assertListEqual(plan, self.snapshots[:2])
+
+    def test_plan_enough(self):
+        planner = RetentionPlanner()
+        plan = planner.plan(self.snapshots,
+                            planner.addTree,
+                            lambda b, inodes: True)
+        self.assertListEqual(plan, [])
+
+    def test_plan_not_enough(self):
+        planner = RetentionPlanner()
+        plan = planner.plan(self.snapshots,
+                            planner.addTree,
+                            lambda b, inodes: False)
+        self.assertListEqual(plan, self.snapshots)
+
+
+if __name__ == '__main__':
+    unittest.main()
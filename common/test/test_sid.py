@@ -20,6 +20,7 @@ import sys
 import unittest
 import stat
 import re
+import bz2
 from datetime import date, datetime
 from test import generic
 from unittest.mock import patch
@@ -27,6 +28,7 @@ from unittest.mock import patch
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 import configfile
 import snapshots
+import fileinfo
 import logger
 from snapshotlog import LogFilter, SnapshotLog
 
@@ -291,7 +293,7 @@ class TestSID(generic.SnapshotsTestCase):
         os.makedirs(os.path.join(self.snapshotPath, '20151219-010324-123'))
         infoFile = os.path.join(self.snapshotPath,
                                 '20151219-010324-123',
-                                'fileinfo.bz2')
+                                'fileinfo.idx')
 
         d = snapshots.FileInfoDict()
         d[b'/tmp']     = (123, b'foo', b'bar')
@@ -304,6 +306,134 @@ class TestSID(generic.SnapshotsTestCase):
         sid2 = snapshots.SID('20151219-010324-123', self.cfg)
         self.assertDictEqual(sid2.fileInfo, d)
 
+    def test_fileInfo_bz2(self):
+        sid = snapshots.SID('20151219-010324-123', self.cfg)
+        os.makedirs(os.path.join(self.snapshotPath, '20151219-010324-123'))
+        with bz2.BZ2File(sid.path(sid.FILEINFO_BZ2), 'wb') as f:
+            f.write(b'123 foo bar /tmp\n'
+                    b'456 asdf qwer /tmp/foo bar\n')
+
+        d = snapshots.FileInfoDict()
+        d[b'/tmp']         = (123, b'foo', b'bar')
+        d[b'/tmp/foo bar'] = (456, b'asdf', b'qwer')
+        self.assertDictEqual(sid.fileInfo, d)
+        self.assertDictEqual(dict(sid.fileInfoIndex().items()), d)
+
+        self.assertTrue(sid.upgradeFileInfo())
+        self.assertIsFile(sid.path(sid.FILEINFO))
+        self.assertNotExists(sid.path(sid.FILEINFO_BZ2))
+        self.assertDictEqual(sid.fileInfo, d)
+        self.assertFalse(sid.upgradeFileInfo())
+
+    def test_upgradeFileInfo_failed(self):
+        sid = snapshots.SID('20151219-010324-123', self.cfg)
+        os.makedirs(os.path.join(self.snapshotPath, '20151219-010324-123'))
+        with bz2.BZ2File(sid.path(sid.FILEINFO_BZ2), 'wb') as f:
+            f.write(b'123 foo bar /tmp\n'
+                    b'-1 asdf qwer /tmp/foo\n')
+
+        self.assertFalse(sid.upgradeFileInfo())
+        self.assertNotExists(sid.path(sid.FILEINFO))
+        self.assertNotExists(sid.path(sid.FILEINFO + '.tmp'))
+        self.assertIsFile(sid.path(sid.FILEINFO_BZ2))
+
+    @patch('logger.error')
+    def test_upgradeFileInfo_unreadable(self, mock_logger):
+        sid = snapshots.SID('20151219-010324-123', self.cfg)
+        os.makedirs(os.path.join(self.snapshotPath, '20151219-010324-123'))
+        with bz2.BZ2File(sid.path(sid.FILEINFO_BZ2), 'wb') as f:
+            f.write(b'123 foo bar /tmp\n' * 1000)
+
+        with patch('bz2.BZ2File', side_effect=PermissionError('denied')):
+            self.assertFalse(sid.upgradeFileInfo())
+        self.assertNotExists(sid.path(sid.FILEINFO))
+        self.assertIsFile(sid.path(sid.FILEINFO_BZ2))
+
+        # truncated
+        with open(sid.path(sid.FILEINFO_BZ2), 'r+b') as f:
+            f.truncate(os.path.getsize(sid.path(sid.FILEINFO_BZ2)) // 2)
+        self.assertFalse(sid.upgradeFileInfo())
+        self.assertNotExists(sid.path(sid.FILEINFO))
+        self.assertIsFile(sid.path(sid.FILEINFO_BZ2))
+        self.assertTrue(mock_logger.called)
+
+    def test_fileInfoIndex(self):
+        sid = snapshots.SID('20151219-010324-123', self.cfg)
+        os.makedirs(os.path.join(self.snapshotPath, '20151219-010324-123'))
+        self.assertDictEqual(dict(sid.fileInfoIndex().items()),
+                             snapshots.FileInfoDict())
+
+        d = snapshots.FileInfoDict()
+        d[b'/tmp']     = (123, b'foo', b'bar')
+        d[b'/tmp/foo'] = (456, b'asdf', b'qwer')
+        sid.fileInfo = d
+
+        index = sid.fileInfoIndex()
+        self.assertIsInstance(index, fileinfo.FileInfoIndex)
+        self.assertEqual(len(index), 3)
+        self.assertIn(b'/tmp/foo', index)
+        self.assertNotIn(b'/tmp/bar', index)
+        self.assertTupleEqual(index[b'/tmp/foo'], (456, b'asdf', b'qwer'))
+
+    def test_fileInfoDelta(self):
+        sid1 = snapshots.SID('20151219-010324-123', self.cfg)
+        sid2 = snapshots.SID('20151219-020324-123', self.cfg)
+        sid3 = snapshots.SID('20151219-030324-123', self.cfg)
+        for sid in (sid1, sid2, sid3):
+            os.makedirs(sid.path())
+
+        d1 = snapshots.FileInfoDict()
+        d1[b'/tmp']     = (123, b'foo', b'bar')
+        d1[b'/tmp/foo'] = (456, b'asdf', b'qwer')
+        sid1.fileInfo = d1
+
+        d2 = snapshots.FileInfoDict()
+        d2[b'/tmp']     = (123, b'foo', b'bar')
+        d2[b'/tmp/bar'] = (789, b'asdf', b'qwer')
+        sid2.setFileInfoDelta(d2, sid1, checkpoint=3)
+
+        self.assertEqual(sid2.fileInfoParent(), sid1.sid)
+        self.assertIsInstance(sid2.fileInfoIndex(), fileinfo.FileInfoChain)
+        self.assertDictEqual(sid2.fileInfo, d2)
+        self.assertNotIn(b'/tmp/foo', sid2.fileInfoIndex())
+
+        # every second snapshot is a full checkpoint
+        sid3.setFileInfoDelta(d1, sid2, checkpoint=2)
+        self.assertIsNone(sid3.fileInfoParent())
+        self.assertDictEqual(sid3.fileInfo, d1)
+
+    def test_rebaseFileInfo(self):
+        sid1 = snapshots.SID('20151219-010324-123', self.cfg)
+        sid2 = snapshots.SID('20151219-020324-123', self.cfg)
+        for sid in (sid1, sid2):
+            os.makedirs(sid.path())
+
+        d1 = snapshots.FileInfoDict()
+        d1[b'/tmp'] = (123, b'foo', b'bar')
+        sid1.fileInfo = d1
+        d2 = snapshots.FileInfoDict()
+        d2[b'/tmp'] = (456, b'foo', b'bar')
+        sid2.setFileInfoDelta(d2, sid1)
+
+        sid2.rebaseFileInfo(None)
+        self.assertIsNone(sid2.fileInfoParent())
+        self.assertIsInstance(sid2.fileInfoIndex(), fileinfo.FileInfoIndex)
+        self.assertDictEqual(sid2.fileInfo, d2)
+
+    @patch('logger.error')
+    def test_fileInfoDeltaBrokenChain(self, mock_logger):
+        sid1 = snapshots.SID('20151219-010324-123', self.cfg)
+        sid2 = snapshots.SID('20151219-020324-123', self.cfg)
+        for sid in (sid1, sid2):
+            os.makedirs(sid.path())
+
+        sid1.fileInfo = snapshots.FileInfoDict()
+        sid2.setFileInfoDelta(snapshots.FileInfoDict(), sid1)
+        os.remove(sid1.path(sid1.FILEINFO))
+
+        self.assertIsNone(sid2.fileInfoIndex(fallback=False))
+        self.assertTrue(mock_logger.called)
+
     @patch('logger.error')
     def test_fileInfoErrorRead(self, mock_logger):
         sid = snapshots.SID('20151219-010324-123', self.cfg)
@@ -321,12 +451,8 @@ class TestSID(generic.SnapshotsTestCase):
     def test_fileInfoErrorWrite(self, mock_logger):
         sid = snapshots.SID('20151219-010324-123', self.cfg)
         os.makedirs(os.path.join(self.snapshotPath, '20151219-010324-123'))
-        infoFile = sid.path(sid.FILEINFO)
-        # remove all permissions from file
-        with open(infoFile, 'wt') as f:
-            pass
-
-        with generic.mockPermissions(infoFile):
+        # "fileinfo.idx" is replaced so the folder needs to be writable
+        with generic.mockPermissions(sid.path(), 0o555):
             d = snapshots.FileInfoDict()
             d[b'/tmp']     = (123, b'foo', b'bar')
             d[b'/tmp/foo'] = (456, b'asdf', b'qwer')
@@ -0,0 +1,167 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import sys
+import unittest
+from unittest.mock import patch
+from test import generic
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import snapshots
+import snapshotcatalog
+
+
+class TestSnapshotCatalog(generic.SnapshotsTestCase):
+    def setUp(self):
+        super(TestSnapshotCatalog, self).setUp()
+
+        for i in ('20151219-010324-123',
+                  '20151219-020324-123',
+                  '20151219-030324-123'):
+            os.makedirs(os.path.join(self.snapshotPath, i, 'backup'))
+
+        self.catalog = snapshots.snapshotCatalog(self.cfg)
+
+    def probe(self, item):
+        sid = snapshots.probeSnapshot(self.cfg, item)
+        if sid is not None:
+            return sid.catalogEntry()
+
+    def test_sync(self):
+        self.assertListEqual(self.catalog.sync(self.probe),
+                             ['20151219-010324-123',
+                              '20151219-020324-123',
+                              '20151219-030324-123'])
+        self.assertExists(self.catalog.dbFile)
+
+    def test_sync_new_and_removed(self):
+        self.catalog.sync(self.probe)
+
+        os.makedirs(os.path.join(self.snapshotPath,
+                                 '20151219-040324-123',
+                                 'backup'))
+        os.rename(os.path.join(self.snapshotPath, '20151219-010324-123'),
+                  os.path.join(self.snapshotPath, 'foo'))
+
+        self.assertListEqual(self.catalog.sync(self.probe),
+                             ['20151219-020324-123',
+                              '20151219-030324-123',
+                              '20151219-040324-123'])
+
+    @patch.object(snapshotcatalog.SnapshotCatalog, 'RACY_SECONDS', -3600)
+    def test_sync_unchanged_folder(self):
+        self.catalog.sync(self.probe)
+
+        with patch.object(os, 'listdir') as listdir:
+            self.assertListEqual(self.catalog.sync(self.probe),
+                                 ['20151219-010324-123',
+                                  '20151219-020324-123',
+                                  '20151219-030324-123'])
+            listdir.assert_not_called()
+
+    @patch.object(snapshotcatalog.SnapshotCatalog, 'RACY_SECONDS', -3600)
+    def test_sync_snapshot_without_backup(self):
+        sid = '20151219-040324-123'
+        os.makedirs(os.path.join(self.snapshotPath, sid))
+        self.assertNotIn(sid, self.catalog.sync(self.probe))
+
+        # doesn't change the mtime of the snapshots folder
+        os.makedirs(os.path.join(self.snapshotPath, sid, 'backup'))
+        self.assertIn(sid, self.catalog.sync(self.probe))
+
+    @patch.object(snapshotcatalog.SnapshotCatalog, 'RACY_SECONDS', -3600)
+    def test_sync_changed_snapshot(self):
+        self.catalog.sync(self.probe)
+        sid = '20151219-020324-123'
+        self.assertFalse(self.catalog.entries()[sid]['failed'])
+
+        # marked as failed by someone else
+        path = os.path.join(self.snapshotPath, sid)
+        with open(os.path.join(path, snapshots.SID.FAILED), 'wt'):
+            pass
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+        self.catalog.sync(self.probe)
+        self.assertTrue(self.catalog.entries()[sid]['failed'])
+
+    @patch.object(snapshotcatalog.SnapshotCatalog, 'RACY_SECONDS', -3600)
+    def test_sync_vanished_snapshot(self):
+        self.catalog.sync(self.probe)
+
+        # snapshots folder looks unchanged
+        st = os.stat(self.snapshotPath)
+        os.rename(os.path.join(self.snapshotPath, '20151219-010324-123'),
+                  os.path.join(self.snapshotPath, 'foo'))
+        os.utime(self.snapshotPath, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        self.assertListEqual(self.catalog.sync(self.probe),
+                             ['20151219-020324-123',
+                              '20151219-030324-123'])
+        self.assertNotIn('20151219-010324-123', self.catalog.entries())
+
+    def test_sync_broken_catalog(self):
+        with open(self.catalog.dbFile, 'wt') as f:
+            f.write('foo' * 1000)
+
+        self.assertListEqual(self.catalog.sync(self.probe),
+                             ['20151219-010324-123',
+                              '20151219-020324-123',
+                              '20151219-030324-123'])
+
+    def test_sync_nonexisting_path(self):
+        catalog = snapshotcatalog.SnapshotCatalog(
+            os.path.join(self.snapshotPath, 'foo'))
+        self.assertIsNone(catalog.sync(self.probe))
+
+    def test_update(self):
+        self.catalog.sync(self.probe)
+        sid = snapshots.SID('20151219-010324-123', self.cfg)
+
+        sid.name = 'foo'
+        sid.failed = True
+
+        entry = self.catalog.entries()['20151219-010324-123']
+        self.assertEqual(entry['name'], 'foo')
+        self.assertTrue(entry['failed'])
+
+        sid.failed = False
+        entry = self.catalog.entries()['20151219-010324-123']
+        self.assertFalse(entry['failed'])
+
+    def test_add_discard(self):
+        self.catalog.add('20151219-040324-123', name='foo')
+        self.assertEqual(
+            self.catalog.entries()['20151219-040324-123']['name'], 'foo')
+
+        self.catalog.discard('20151219-040324-123')
+        self.assertNotIn('20151219-040324-123', self.catalog.entries())
+
+    def test_remove(self):
+        self.catalog.sync(self.probe)
+        sid = snapshots.SID('20151219-010324-123', self.cfg)
+
+        self.assertTrue(self.sn.remove(sid))
+        self.assertNotIn('20151219-010324-123', self.catalog.entries())
+        self.assertListEqual(snapshots.listSnapshots(self.cfg),
+                             ['20151219-030324-123',
+                              '20151219-020324-123'])
+
+
+if __name__ == '__main__':
+    unittest.main()
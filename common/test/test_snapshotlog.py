@@ -19,6 +19,7 @@ import os
 import sys
 import unittest
 import re
+from unittest.mock import Mock, patch
 from test import generic
 from tempfile import TemporaryDirectory
 from datetime import datetime
@@ -89,6 +90,37 @@ class TestLogFilter(generic.TestCase):
         for line in (self.n):
             self.assertEqual(line, logFilter.filter(line))  # empty line stays empty line
 
+    def test_filterMany(self):
+        class FakeDecode(object):
+            config = Mock(**{'currentProfile.return_value': '1'})
+            calls = []
+
+            def logMany(self, lines):
+                self.calls.append(lines)
+                return [line.upper() for line in lines]
+
+            def log(self, line):
+                return self.logMany([line])[0]
+
+        decode = FakeDecode()
+        logFilter = snapshotlog.LogFilter(mode=snapshotlog.LogFilter.ERROR_AND_CHANGES,
+                                          decode=decode)
+        lines = [self.e, self.i, self.n, self.c]
+        self.assertListEqual(logFilter.filterMany(lines),
+                             [self.e.upper(), '', self.c.upper()])
+        self.assertListEqual(decode.calls, [[self.e, self.c]])
+
+        # same result as filter() line by line
+        decode.calls.clear()
+        with patch.object(snapshotlog.LogFilter, 'BATCH', 3):
+            result = list(logFilter.iterFilter(lines * 3))
+        # one call per batch
+        self.assertEqual(len(decode.calls), 4)
+        expected = [logFilter.filter(line) for line in lines * 3]
+        self.assertListEqual(result,
+                             [line for line in expected if line is not None])
+
+
 class TestSnapshotLog(generic.SnapshotsTestCase):
     def setUp(self):
         super(TestSnapshotLog, self).setUp()
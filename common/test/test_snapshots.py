@@ -38,6 +38,8 @@ import config
 import snapshots
 import tools
 import mount
+import progress
+import encfstools
 
 CURRENTUID = os.geteuid()
 CURRENTUSER = pwd.getpwuid(CURRENTUID).pw_name
@@ -311,6 +313,87 @@ class TestSnapshots(generic.SnapshotsTestCase):
                                            r'--include=/baz/1/2 '   +
                                            r'--exclude=\* /$')
 
+    def test_rsyncProtect(self):
+        self.assertListEqual(self.sn.rsyncProtect([('/foo', 0),
+                                                   ('/baz/1/2', 1)]),
+                             ['--filter=P /foo/',
+                              '--filter=P /baz/1/',
+                              '--filter=P /baz/',
+                              '--filter=P /foo/**',
+                              '--filter=P /baz/1/2'])
+
+    def test_splitIncludeFolders(self):
+        include = [('/foo', 0), ('/bar', 0), ('/baz', 0), ('/foo/1', 0)]
+
+        self.assertListEqual(self.sn.splitIncludeFolders(include, 1),
+                             [(1, include)])
+        self.assertListEqual(self.sn.splitIncludeFolders([('/', 0),
+                                                          ('/foo', 0)], 4),
+                             [(1, [('/', 0), ('/foo', 0)])])
+
+        with patch.object(self.sn, 'includeFileCounts',
+                          return_value=[10, 5, 8, 4]):
+            groups = self.sn.splitIncludeFolders(include, 2)
+        # nested /foo/1 stays together with /foo
+        self.assertListEqual(groups,
+                             [(14, [('/foo', 0), ('/foo/1', 0)]),
+                              (13, [('/baz', 0), ('/bar', 0)])])
+
+        groups = self.sn.splitIncludeFolders(include, 8)
+        self.assertEqual(len(groups), 3)
+
+    def test_includeFileCounts(self):
+        sid = snapshots.SID('20151219-010324-123', self.cfg)
+        os.makedirs(sid.path())
+        d = snapshots.FileInfoDict()
+        for path in (b'/foo', b'/foo/1', b'/foo/2', b'/foo-bar/1',
+                     b'/foo/bar/1', b'/bar', b'/baz'):
+            d[path] = (33188, b'root', b'root')
+        sid.fileInfo = d
+
+        self.assertListEqual(
+            self.sn.includeFileCounts([('/foo', 0),
+                                       ('/foo/bar', 0),
+                                       ('/bar', 1)], sid),
+            [3, 1, 1])
+        self.assertListEqual(self.sn.includeFileCounts([('/foo', 0)], None),
+                             [0])
+
+    def test_filterRsyncProgress(self):
+        self.assertEqual(self.sn.filterRsyncProgress(
+            'foo\n    2.00K  50%   2.00MB/s    0:02:36'), 'foo')
+
+        pg = progress.ProgressRecord(self.cfg).read()
+        self.assertEqual(pg.percent, 50)
+        self.assertEqual(pg.sent, 2048)
+        self.assertEqual(pg.speed, 2 * 1024 ** 2)
+        self.assertEqual(pg.eta, 156)
+
+        # compatibility for external tools
+        legacy = progress.ProgressFile(self.cfg)
+        legacy.load()
+        self.assertEqual(legacy.strValue('sent'), '2.00K')
+        self.assertEqual(legacy.intValue('percent'), 50)
+        self.assertEqual(legacy.strValue('speed'), '2.00MB/s')
+
+        self.sn.clearProgress()
+        self.assertIsNone(progress.ProgressRecord(self.cfg).read())
+        self.assertNotExists(self.cfg.takeSnapshotProgressFile())
+
+    def test_filterRsyncProgress_worker(self):
+        self.sn.rsyncWorkerProgress = [[1, 0.0, 0, 0.0, -1],
+                                       [3, 0.0, 0, 0.0, -1]]
+        self.assertFalse(self.sn.filterRsyncProgress(
+            '    1,024  10%   1.00MB/s    0:00:10', 0))
+        self.assertFalse(self.sn.filterRsyncProgress(
+            '    2.00K  50%   2.00MB/s    ??:??:??', 1))
+
+        pg = progress.ProgressRecord(self.cfg).read()
+        self.assertEqual(pg.strValue('sent'), '3.00K')
+        self.assertEqual(pg.intValue('percent'), 40)
+        self.assertEqual(pg.strValue('speed'), '3.00MB/s')
+        self.assertEqual(pg.strValue('eta'), '0:00:10')
+
     ############################################################################
     ###                            callback                                  ###
     ############################################################################
@@ -379,6 +462,71 @@ class TestSnapshots(generic.SnapshotsTestCase):
             self.assertEqual('[I] Take snapshot (rsync: rsync: send_files failed to open "/foo/bar": Operation not permitted (1))\n' \
                              '[E] Error: rsync: send_files failed to open "/foo/bar": Operation not permitted (1)\n', f.read())
 
+    def test_rsyncCallback_rate_limited(self):
+        params = [False, False]
+
+        self.sn.rsyncCallback('BACKINTIME: <f+++++++++ /foo/bar', params)
+        with patch.object(self.sn, 'publishTakeSnapshotMessage') as publish:
+            self.sn.rsyncCallback('BACKINTIME: <f+++++++++ /foo/baz', params)
+            publish.assert_not_called()
+
+            # errors are delivered immediately
+            self.sn.rsyncCallback('rsync: send_files failed to open "/foo/bar": Operation not permitted (1)', params)
+            publish.assert_called_once_with(
+                1, 'Error: rsync: send_files failed to open "/foo/bar": Operation not permitted (1)', -1)
+
+        # the full change list is still in the log
+        self.sn.snapshotLog.flush()
+        with open(self.cfg.takeSnapshotLogFile(), 'rt') as f:
+            self.assertIn('[C] <f+++++++++ /foo/baz\n', f.read())
+
+    def test_messagePublisher(self):
+        publisher = snapshots.TakeSnapshotMessagePublisher(self.sn,
+                                                           interval=3600)
+        with patch.object(self.sn, 'publishTakeSnapshotMessage') as publish:
+            publisher.publish(0, 'foo')
+            publisher.publish(0, 'bar')
+            publisher.publish(0, 'baz')
+            publish.assert_called_once_with(0, 'foo')
+
+            # change of severity
+            publisher.publish(1, 'error')
+            publish.assert_called_with(1, 'error')
+
+            publisher.publish(0, 'qwe')
+            publisher.publish(0, 'asd')
+            publisher.flush()
+            publish.assert_called_with(0, 'asd')
+            self.assertEqual(publish.call_count, 4)
+
+            publisher.flush()
+            self.assertEqual(publish.call_count, 4)
+
+    def test_messagePublisher_tick(self):
+        publisher = snapshots.TakeSnapshotMessagePublisher(self.sn,
+                                                           interval=3600)
+        with patch.object(self.sn, 'publishTakeSnapshotMessage') as publish:
+            publisher.publish(0, 'foo')
+            publisher.publish(0, 'bar')
+            publisher.tick()
+            publish.assert_called_once_with(0, 'foo')
+
+            publisher.interval = 0
+            publisher.tick()
+            publish.assert_called_with(0, 'bar')
+            publisher.tick()
+            self.assertEqual(publish.call_count, 2)
+
+    def test_filterRsyncProgress_publish(self):
+        # rsync reported no more files since 'bar'
+        self.sn.messagePublisher.interval = 0
+        self.sn.messagePublisher.lastType = 0
+        self.sn.messagePublisher.pending = (0, 'bar')
+        with patch.object(self.sn, 'publishTakeSnapshotMessage') as publish:
+            self.sn.filterRsyncProgress('    2.00K  50%   2.00MB/s    0:02:36')
+        publish.assert_called_once_with(0, 'bar')
+        self.sn.clearProgress()
+
     ############################################################################
     ###                          smart remove                                ###
     ############################################################################
@@ -521,6 +669,72 @@ class TestSnapshots(generic.SnapshotsTestCase):
                                              sid22, sid24, sid27, sid28, sid30])
 
 
+    def test_smartRemoveList_explain(self):
+        sid1 = snapshots.SID('20160424-215134-123', self.cfg)
+        sid2 = snapshots.SID('20160424-115134-123', self.cfg)
+        sid3 = snapshots.SID('20160421-013218-123', self.cfg)
+        sid4 = snapshots.SID('20160420-013218-123', self.cfg)
+        sid5 = snapshots.SID('20160420-003218-123', self.cfg)
+        for sid in (sid1, sid2, sid3, sid4, sid5):
+            sid.makeDirs()
+        sid4.failed = True
+        now = datetime(2016, 4, 24, 21, 51, 34)
+
+        explain = {}
+        del_snapshots = self.sn.smartRemoveList(now, 1, 5, 0, 0, explain)
+        self.assertListEqual(del_snapshots, [sid4])
+        self.assertDictEqual(explain,
+                             {sid1: 'last snapshot',
+                              sid2: 'keep all for the last 1 days',
+                              sid3: 'one per day (2016-04-21)',
+                              sid4: 'not kept by any rule',
+                              sid5: 'one per day (2016-04-20)'})
+
+    @patch('snapshotcatalog.SnapshotCatalog.RACY_SECONDS', -3600)
+    def test_smartRemoveList_named_outside_catalog(self):
+        sid1 = snapshots.SID('20160424-215134-123', self.cfg)
+        sid2 = snapshots.SID('20160420-013218-123', self.cfg)
+        for sid in (sid1, sid2):
+            sid.makeDirs()
+        open(sid2.path(snapshots.SID.NAME), 'wt').close()
+        snapshots.listSnapshots(self.cfg)
+        # name written in place by someone else doesn't change the mtime
+        # of the snapshot folder. The catalog still says no name
+        with open(sid2.path(snapshots.SID.NAME), 'wt') as f:
+            f.write('foo')
+        now = datetime(2016, 4, 24, 21, 51, 34)
+
+        explain = {}
+        self.assertListEqual(self.sn.smartRemoveList(now, 1, 0, 0, 0, explain),
+                             [])
+        self.assertEqual(explain[sid2], 'has a name')
+
+    def test_smartRemoveIndex(self):
+        sids = [snapshots.SID(i, self.cfg) for i in ('20160424-215134-123',
+                                                     '20160422-030324-123',
+                                                     '20160422-010324-123',
+                                                     '20160410-134327-123')]
+        sids[1].makeDirs()
+        sids[1].failed = True
+        sids[3].makeDirs()
+        sids[3].name = 'foo'
+        index = snapshots.SmartRemoveIndex(sids, self.cfg)
+
+        self.assertListEqual(index.sids, sorted(sids))
+        self.assertSetEqual(index.failed, {sids[1].sid})
+        self.assertSetEqual(index.named, {sids[3].sid})
+        self.assertListEqual(index.all(date(2016, 4, 22), date(2016, 4, 25)),
+                             [sids[2], sids[1], sids[0]])
+        self.assertListEqual(index.all(date(2016, 4, 11), date(2016, 4, 22)),
+                             [])
+        self.assertEqual(index.first(date(2016, 4, 22), date(2016, 4, 23)),
+                         sids[1])
+        self.assertEqual(index.first(date(2016, 4, 22), date(2016, 4, 23),
+                                     keep_healthy = True),
+                         sids[2])
+        self.assertIsNone(index.first(date(2016, 4, 11), date(2016, 4, 22)))
+
+
 class TestSnapshotWithSID(generic.SnapshotsWithSidTestCase):
     def test_backupConfig(self):
         self.sn.backupConfig(self.sid)
@@ -528,6 +742,132 @@ class TestSnapshotWithSID(generic.SnapshotsWithSidTestCase):
         self.assertEqual(tools.md5sum(self.sid.path('config')),
                          tools.md5sum(self.cfgFile))
 
+    def restoreCommands(self, paths, restore_to):
+        calls = []
+
+        def run(cmd, callback=None):
+            filesFrom = [c for c in cmd if c.startswith('--files-from=')]
+            if filesFrom:
+                with open(filesFrom[0][len('--files-from='):], 'rb') as f:
+                    filesFrom = f.read().split(b'\0')[:-1]
+            calls.append((cmd[1:], filesFrom))
+
+        # don't create the original parent folders
+        with patch('tools.rsyncPrefix', return_value=['rsync']), \
+             patch('tools.makeDirs'), \
+             patch.object(self.sn, 'restoreRsync', side_effect=run):
+            self.sn.restore(self.sid, paths, restore_to=restore_to)
+        return calls
+
+    def test_restore_batch(self):
+        with TemporaryDirectory() as dest:
+            calls = self.restoreCommands(['/foo/bar/baz', '/foo/bar/qux'],
+                                         dest)
+        backup = self.sid.pathBackup()
+        self.assertEqual(len(calls), 1)
+        cmd, filesFrom = calls[0]
+        self.assertListEqual(filesFrom, [b'baz', b'qux'])
+        self.assertIn('--from0', cmd)
+        self.assertIn('-r', cmd)
+        self.assertEqual(cmd[-2], os.path.join(backup, 'foo/bar') + '/')
+        self.assertEqual(cmd[-1], dest + '/')
+
+    def test_restore_batch_original(self):
+        calls = self.restoreCommands(['/foo/bar/baz', '/foo/qux'], '')
+        self.assertEqual(len(calls), 1)
+        cmd, filesFrom = calls[0]
+        self.assertListEqual(filesFrom, [b'foo/bar/baz', b'foo/qux'])
+        self.assertEqual(cmd[-1], '/')
+
+    def test_restore_different_roots(self):
+        with TemporaryDirectory() as dest:
+            calls = self.restoreCommands(['/foo/bar/baz', '/foo/qux'], dest)
+        backup = self.sid.pathBackup()
+        self.assertListEqual(
+            [(cmd[-2], cmd[-1], filesFrom) for cmd, filesFrom in calls],
+            [(os.path.join(backup, 'foo/bar') + '/./baz', dest + '/', []),
+             (os.path.join(backup, 'foo') + '/./qux', dest + '/', [])])
+
+    def test_backupPermissionsCallback_batch(self):
+        d = snapshots.FileInfoDict()
+        decode = encfstools.Bounce()
+        user_data = (d, decode, [])
+        paths = [self.testDirFullPath, self.testFileFullPath]
+        with patch.object(self.sn, 'DECODE_BATCH', 2), \
+             patch.object(decode, 'paths', wraps=decode.paths) as decodePaths:
+            for path in paths * 2:
+                self.sn.backupPermissionsCallback(path.lstrip('/').encode(),
+                                                  user_data)
+            self.sn.backupPermissionsCallback(paths[0].lstrip('/').encode(),
+                                              user_data)
+            self.assertEqual(decodePaths.call_count, 2)
+            self.sn.backupPermissionsFlush(user_data)
+            self.assertEqual(decodePaths.call_count, 3)
+
+        self.assertListEqual(user_data[2], [])
+        self.assertCountEqual(d.keys(), [b'/'] + [p.encode() for p in paths])
+
+    def test_rsyncPermissionsCallback(self):
+        params = [False, False]
+        d = snapshots.FileInfoDict()
+
+        self.sn.rsyncPermissionsCallback(
+            'BACKINTIME: >f+++++++++ {} {} rwsr-x--T foo/b\\#303\\#244r'
+            .format(CURRENTUID, CURRENTGID),
+            (params, d))
+        self.assertListEqual([False, True], params)
+        self.assertTupleEqual(d['/foo/bär'.encode()],
+                              (stat.S_IFREG | stat.S_ISUID | stat.S_ISVTX | 0o750,
+                               CURRENTUSER.encode(),
+                               CURRENTGROUP.encode()))
+        self.sn.snapshotLog.flush()
+        with open(self.cfg.takeSnapshotLogFile(), 'rt') as f:
+            self.assertIn('[C] >f+++++++++ foo/b\\#303\\#244r\n', f.read())
+
+    def test_rsyncPermissionsCallback_unchanged(self):
+        params = [False, False]
+        d = snapshots.FileInfoDict()
+
+        self.sn.rsyncPermissionsCallback(
+            'BACKINTIME: hf          {} {} rw-r--r-- foo/bar => '
+            .format(CURRENTUID, CURRENTGID),
+            (params, d))
+        self.assertListEqual([False, False], params)
+        self.assertEqual(d[b'/foo/bar'][0], stat.S_IFREG | 0o644)
+
+    def test_rsyncPermissionsCallback_arrow_in_name(self):
+        params = [False, False]
+        d = snapshots.FileInfoDict()
+
+        self.sn.rsyncPermissionsCallback(
+            'BACKINTIME: >f+++++++++ {} {} rw-r--r-- foo/a -> b => c'
+            .format(CURRENTUID, CURRENTGID),
+            (params, d))
+        self.sn.rsyncPermissionsCallback(
+            'BACKINTIME: hf          {} {} rw-r--r-- foo/d => e => foo/c'
+            .format(CURRENTUID, CURRENTGID),
+            (params, d))
+        with patch.object(self.sn, 'collectPermission') as collect:
+            self.sn.rsyncPermissionsCallback(
+                'BACKINTIME: cL+++++++++ {} {} rwxrwxrwx foo/f -> g -> foo/c'
+                .format(CURRENTUID, CURRENTGID),
+                (params, d))
+        collect.assert_called_once_with(d, b'/foo/f -> g')
+        self.assertIn(b'/foo/a -> b => c', d)
+        self.assertIn(b'/foo/d => e', d)
+
+    def test_rsyncPermissionsCallback_dir(self):
+        params = [False, False]
+        d = snapshots.FileInfoDict()
+        path = self.cfg.include()[0][0]
+
+        self.sn.rsyncPermissionsCallback(
+            'BACKINTIME: cd+++++++++ {} {} rwx------ {}/'
+            .format(CURRENTUID, CURRENTGID, path.lstrip(os.sep)),
+            (params, d))
+        self.assertListEqual([False, False], params)
+        self.assertEqual(d[path.encode()][0], os.stat(path).st_mode)
+
     def test_backupInfo(self):
         self.sn.backupInfo(self.sid)
         self.assertIsFile(self.sid.path('info'))
@@ -542,11 +882,79 @@ snapshot_user=.+
 snapshot_version=.+
 user.size=.+''', re.MULTILINE))
 
+    def test_backupInfo_size(self):
+        for line in ('BACKINTIME: cd+++++++++ foo/',
+                     'BACKINTIME: >f+++++++++ foo/bar',
+                     'BACKINTIME: >f.st...... foo/baz',
+                     'BACKINTIME: *deleting   foo/old',
+                     'Number of files: 1,234 (reg: 1,000, dir: 234)',
+                     'Number of created files: 2 (reg: 1, dir: 1)',
+                     'Total file size: 12,345,678 bytes',
+                     'Total transferred file size: 1,024 bytes'):
+            self.sn.rsyncCallback(line, [False, False])
+
+        self.sn.backupInfo(self.sid)
+        size = snapshots.SnapshotSize.load(self.sid.info.dict)
+        self.assertEqual(size.totalBytes, 12345678)
+        self.assertEqual(size.newBytes, 1024)
+        self.assertEqual(size.sharedBytes, 12345678 - 1024)
+        self.assertEqual(size.totalInodes, 1234)
+        self.assertEqual(size.newInodes, 3)
+        self.assertEqual(size.sharedInodes, 1231)
+
+        # read from the snapshot catalog
+        sizes = snapshots.snapshotSizes(self.cfg, [self.sid])
+        self.assertEqual(sizes[self.sid].totalBytes, 12345678)
+        self.assertEqual(sizes[self.sid].newInodes, 3)
+
+    def test_backupInfo_transfer(self):
+        self.sn.snapshotTransfer = snapshots.SnapshotTransfer('zstd', 3)
+        for line in ('Literal data: 900,000,000 bytes',
+                     'Matched data: 0 bytes',
+                     'Total bytes sent: 300,000,000',
+                     'Total bytes received: 1,234',
+                     '',
+                     'sent 300,000,000 bytes  received 1,234 bytes  '
+                     '4,000,000.00 bytes/sec'):
+            self.sn.rsyncCallback(line, [False, False])
+
+        self.assertTrue(self.sn.snapshotTransfer.measured)
+        self.sn.backupInfo(self.sid)
+        self.assertEqual(self.sid.info.strValue('transfer.ratio'), '3.00')
+        transfer = snapshots.SnapshotTransfer.load(self.sid.info.dict)
+        self.assertEqual((transfer.compress, transfer.level), ('zstd', 3))
+        self.assertEqual(transfer.literalBytes, 900000000)
+        self.assertEqual(transfer.sentBytes, 300000000)
+        self.assertEqual(transfer.ratio, 3.0)
+        self.assertEqual(transfer.throughput, 4000000)
+
+    def test_transfer_measured(self):
+        # the end-to-end rate of small transfers is mostly file list
+        # building and not the link speed
+        transfer = snapshots.SnapshotTransfer('zstd', 3)
+        for line in ('Total bytes sent: 20,000,000',
+                     'sent 20,000,000 bytes  received 1,234 bytes  '
+                     '4,000,000.00 bytes/sec'):
+            transfer.addRsyncLine(line)
+        self.assertTrue(transfer.valid)
+        self.assertFalse(transfer.measured)
+
+    def test_backupInfo_transfer_local(self):
+        self.assertIsNone(self.sn.snapshotTransfer)
+        self.sn.rsyncCallback('Total bytes sent: 20,000,000', [False, False])
+        self.sn.backupInfo(self.sid)
+        self.assertIsNone(snapshots.SnapshotTransfer.load(self.sid.info.dict))
+
+    def test_snapshotSizes_unknown(self):
+        self.sn.backupInfo(self.sid)
+        self.assertDictEqual(snapshots.snapshotSizes(self.cfg, [self.sid]),
+                             {self.sid: None})
+
     def test_backupPermissions(self):
         #TODO: add test for save permissions over SSH (and one SSH-test for path with spaces)
         infoFilePath = os.path.join(self.snapshotPath,
                                     '20151219-010324-123',
-                                    'fileinfo.bz2')
+                                    'fileinfo.idx')
 
         include = self.cfg.include()[0][0]
         with TemporaryDirectory(dir = include) as tmp:
@@ -715,6 +1123,70 @@ class TestRestorePathInfo(generic.SnapshotsTestCase):
         self.assertEqual(s.st_gid, CURRENTGID)
 
 
+class TestFilter(generic.SnapshotsTestCase):
+    def setUp(self):
+        super(TestFilter, self).setUp()
+        self.srcDir = TemporaryDirectory()
+        self.path = os.path.join(self.srcDir.name, 'foo')
+        with open(self.path, 'wt') as f:
+            f.write('foo')
+
+        self.sids = []
+        for i, data in enumerate(('foo', 'bar', 'foo')):
+            sid = snapshots.SID('2015121{}-010324-123'.format(i + 1), self.cfg)
+            sid.makeDirs(self.srcDir.name)
+            with open(sid.pathBackup(self.path), 'wt') as f:
+                f.write(data)
+            os.utime(sid.pathBackup(self.path), times=(i, i))
+            self.sids.append(sid)
+        self.sids.reverse()
+        # neither a file in this snapshot
+        sid = snapshots.SID('20151209-010324-123', self.cfg)
+        sid.makeDirs(self.path)
+        self.sids.append(sid)
+
+    def tearDown(self):
+        super(TestFilter, self).tearDown()
+        self.srcDir.cleanup()
+
+    def filter(self, *args, **kwargs):
+        root = snapshots.RootSnapshot(self.cfg)
+        return [sid.sid for sid in
+                self.sn.filter(root, self.path, self.sids, *args, **kwargs)]
+
+    def test_filter(self):
+        self.assertListEqual(self.filter(),
+                             ['/', '20151213-010324-123',
+                              '20151212-010324-123', '20151211-010324-123'])
+
+    def test_filter_diff(self):
+        # all have different mtimes
+        self.assertEqual(len(self.filter(True)), 4)
+        self.assertListEqual(self.filter(True, True),
+                             ['/', '20151212-010324-123'])
+
+    def test_filter_equal(self):
+        self.assertListEqual(self.filter(False, True, self.path),
+                             ['/', '20151213-010324-123',
+                              '20151211-010324-123'])
+
+    def test_filter_dir(self):
+        root = snapshots.RootSnapshot(self.cfg)
+        result = self.sn.filter(root, self.srcDir.name, self.sids)
+        self.assertListEqual([sid.sid for sid in result],
+                             ['/', '20151213-010324-123',
+                              '20151212-010324-123', '20151211-010324-123',
+                              '20151209-010324-123'])
+
+    def test_iterFilter_cancel(self):
+        root = snapshots.RootSnapshot(self.cfg)
+        result = []
+        for sid in self.sn.iterFilter(root, self.path, self.sids,
+                                      cancel=lambda: len(result) >= 2):
+            result.append(sid)
+        self.assertEqual(len(result), 2)
+
+
 class TestDeletePath(generic.SnapshotsWithSidTestCase):
     def test_delete_file(self):
         self.assertExists(self.testFileFullPath)
@@ -763,6 +1235,198 @@ class TestRemoveSnapshot(generic.SnapshotsWithSidTestCase):
         self.sn.remove(self.sid)
         self.assertFalse(self.sid.exists())
 
+    def test_removeLocal(self):
+        sids = [self.sid]
+        for i in ('20151219-020324-123', '20151219-030324-123'):
+            sid = snapshots.SID(i, self.cfg)
+            sid.makeDirs()
+            sids.append(sid)
+        logs = []
+
+        self.assertTrue(self.sn.removeLocal(sids[:2], log=logs.append))
+        self.assertFalse(sids[0].exists())
+        self.assertFalse(sids[1].exists())
+        self.assertTrue(sids[2].exists())
+        self.assertTrue(logs)
+
+    def test_removeRemote(self):
+        sids = [self.sid]
+        for i in ('20151219-020324-123', '20151219-030324-123'):
+            sid = snapshots.SID(i, self.cfg)
+            sid.makeDirs()
+            sids.append(sid)
+        logs = []
+        # run the helper in a local shell instead of the remote host
+        rsync = ['sh', '-c', 'rm -rf -- "$2" && mkdir -- "$2"', 'rsync']
+
+        with patch.object(self.cfg, 'sshCommand', return_value=['bash', '-s']), \
+             patch('tools.rsyncRemove', return_value=rsync):
+            removed = self.sn.removeRemote(sids[:2], log=logs.append)
+        self.assertListEqual(removed, sids[:2])
+        self.assertFalse(sids[0].exists())
+        self.assertFalse(sids[1].exists())
+        self.assertTrue(sids[2].exists())
+        self.assertListEqual(logs, ['1/2', '2/2'])
+
+    def deltaChain(self):
+        sids = [self.sid]
+        for i in ('20151219-020324-123', '20151219-030324-123'):
+            sid = snapshots.SID(i, self.cfg)
+            sid.makeDirs()
+            sids.append(sid)
+
+        self.cfg.setFileInfoDelta(10)
+        dicts = []
+        for i, sid in enumerate(sids):
+            d = snapshots.FileInfoDict()
+            d[b'/foo%d' % i] = (i, b'foo', b'bar')
+            dicts.append(d)
+            self.sn.saveFileInfo(sid, d, sids[i - 1] if i else None)
+        self.assertEqual(sids[2].fileInfoParent(), sids[1].sid)
+        return sids, dicts
+
+    def test_removeLocal_rebase(self):
+        sids, dicts = self.deltaChain()
+
+        with patch('snapshots.listSnapshots',
+                   side_effect=snapshots.listSnapshots) as listSnapshots:
+            self.assertTrue(self.sn.removeLocal(sids[:2]))
+        listSnapshots.assert_called_once()
+        self.assertFalse(sids[1].exists())
+        self.assertIsNone(sids[2].fileInfoParent())
+        self.assertDictEqual(sids[2].fileInfo, dicts[2])
+
+    @patch('logger.error')
+    def test_removeLocal_rebase_failed(self, mock_logger):
+        sids, dicts = self.deltaChain()
+
+        with patch.object(snapshots.SID, 'setFileInfoDelta', return_value=False):
+            self.assertFalse(self.sn.removeLocal(sids[1:2]))
+        self.assertTrue(sids[1].exists())
+        self.assertEqual(sids[2].fileInfoParent(), sids[1].sid)
+        self.assertDictEqual(sids[2].fileInfo, dicts[2])
+        self.assertTrue(mock_logger.called)
+
+    @patch('logger.error')
+    def test_removeRemote_rebase_failed(self, mock_logger):
+        sids, dicts = self.deltaChain()
+
+        with patch.object(snapshots.SID, 'setFileInfo', return_value=False), \
+             patch('subprocess.Popen') as popen:
+            self.assertListEqual(self.sn.removeRemote(sids[:1]), [])
+        popen.assert_not_called()
+        self.assertTrue(sids[0].exists())
+        self.assertEqual(sids[1].fileInfoParent(), sids[0].sid)
+
+    def test_keepFreeSpace(self):
+        sids = [self.sid]
+        for i in ('20151219-020324-123', '20151219-030324-123'):
+            sid = snapshots.SID(i, self.cfg)
+            sid.makeDirs()
+            sids.append(sid)
+        # hardlinked into every snapshot. Removing the oldest alone won't
+        # free it
+        shared = os.path.join(sids[0].path(), 'shared')
+        with open(shared, 'wb') as f:
+            f.write(b'x' * 1024**2)
+        for sid in sids[1:]:
+            os.link(shared, os.path.join(sid.path(), 'shared'))
+
+        with patch.object(self.sn, 'statFreeSpaceLocal', return_value=0):
+            # even removing all but the newest snapshot is not enough
+            self.assertListEqual(self.sn.keepFreeSpace(minFreeSpace=1),
+                                 sids[:2])
+        self.assertFalse(sids[0].exists())
+        self.assertFalse(sids[1].exists())
+        self.assertTrue(sids[2].exists())
+        self.assertTrue(os.path.exists(os.path.join(sids[2].path(), 'shared')))
+
+    def test_keepFreeSpace_ssh(self):
+        sids = [self.sid]
+        for i in ('20151219-020324-123', '20151219-030324-123'):
+            sid = snapshots.SID(i, self.cfg)
+            sid.makeDirs()
+            sids.append(sid)
+
+        for sid in sids:
+            with open(os.path.join(sid.path(), 'foo'), 'wb') as f:
+                f.write(b'x' * 1024**2)
+
+        # all snapshots are removed in one SSH session
+        with patch.object(self.sn, 'statFreeSpaceLocal', return_value=0), \
+             patch('snapshots.listSnapshots',
+                   side_effect=lambda *args, **kwargs: list(sids)), \
+             patch.object(self.cfg, 'snapshotsMode', return_value='ssh'), \
+             patch.object(self.sn, 'scanRetention',
+                          side_effect=lambda planner, sid: planner.addTree(sid.path())), \
+             patch.object(self.sn, 'removeRemote') as removeRemote:
+            self.assertListEqual(self.sn.keepFreeSpace(minFreeSpace=1),
+                                 sids[:2])
+        removeRemote.assert_called_once()
+        self.assertListEqual(removeRemote.call_args[0][0], sids[:2])
+
+    def test_freeSpace_removeOld_ssh(self):
+        sids = [self.sid]
+        for i in ('20151220-020324-123', '20160101-030324-123'):
+            sid = snapshots.SID(i, self.cfg)
+            sid.makeDirs()
+            sids.append(sid)
+
+        # all old snapshots are removed in one SSH session
+        with patch('snapshots.listSnapshots',
+                   side_effect=lambda *args, **kwargs: list(sids)), \
+             patch.object(self.cfg, 'snapshotsMode', return_value='ssh'), \
+             patch.object(self.cfg, 'removeOldSnapshotsEnabled', return_value=True), \
+             patch.object(self.cfg, 'removeOldSnapshotsDate',
+                          return_value=date(2016, 1, 1)), \
+             patch.object(self.cfg, 'smartRemove',
+                          return_value=(False, 0, 0, 0, 0)), \
+             patch.object(self.cfg, 'minFreeSpaceEnabled', return_value=False), \
+             patch.object(self.cfg, 'minFreeInodesEnabled', return_value=False), \
+             patch.object(self.sn, 'removeRemote') as removeRemote:
+            self.sn.freeSpace(datetime.today())
+        removeRemote.assert_called_once()
+        self.assertListEqual(removeRemote.call_args[0][0], sids[:2])
+
+    def test_keepFreeSpace_enough(self):
+        snapshots.SID('20151219-020324-123', self.cfg).makeDirs()
+        with patch.object(self.sn, 'statFreeSpaceLocal', return_value=10):
+            self.assertListEqual(self.sn.keepFreeSpace(minFreeSpace=5), [])
+        self.assertTrue(self.sid.exists())
+
+    def test_rebaseFileInfo(self):
+        sids = [self.sid]
+        for i in ('20151219-020324-123', '20151219-030324-123'):
+            sid = snapshots.SID(i, self.cfg)
+            sid.makeDirs()
+            sids.append(sid)
+
+        dicts = []
+        for i, sid in enumerate(sids):
+            d = snapshots.FileInfoDict()
+            d[b'/foo'] = (i, b'foo', b'bar')
+            d[b'/foo%d' % i] = (i, b'foo', b'bar')
+            dicts.append(d)
+            self.sn.saveFileInfo(sid, d, sids[i - 1] if i else None)
+
+        # disabled by default
+        self.assertIsNone(sids[1].fileInfoParent())
+
+        self.cfg.setFileInfoDelta(10)
+        for i in (1, 2):
+            self.sn.saveFileInfo(sids[i], dicts[i], sids[i - 1])
+        self.assertEqual(sids[2].fileInfoParent(), sids[1].sid)
+
+        self.sn.rebaseFileInfo(sids[1])
+        self.assertEqual(sids[2].fileInfoParent(), sids[0].sid)
+        self.assertDictEqual(sids[2].fileInfo, dicts[2])
+
+        self.sn.rebaseFileInfo(sids[0])
+        self.assertIsNone(sids[2].fileInfoParent())
+        self.assertIsNone(sids[1].fileInfoParent())
+        self.assertDictEqual(sids[1].fileInfo, dicts[1])
+        self.assertDictEqual(sids[2].fileInfo, dicts[2])
+
 
 @unittest.skipIf(not generic.LOCAL_SSH, generic.SKIP_SSH_TEST_MESSAGE)
 class TestSshSnapshots(generic.SSHTestCase):
@@ -1093,8 +1757,8 @@ class TestSshPermissions(unittest.TestCase):
         # expected field where the permissions are stored in
         # e.g. /tmp/BITa6ekd80lTEST/foo/backintime/test-host/test-user/1
         infoFilePath = pathlib.Path(cfg.snapshotsFullPath())
-        # ...'/20151219-010324-123/fileinfo.bz2'
-        infoFilePath = infoFilePath / str(sid.sid) / 'fileinfo.bz2'
+        # ...'/20151219-010324-123/fileinfo.idx'
+        infoFilePath = infoFilePath / str(sid.sid) / 'fileinfo.idx'
 
         # Does it exists as a file?
         self.assertTrue(infoFilePath.exists())
@@ -0,0 +1,128 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import sys
+import socket
+import threading
+import unittest
+from unittest.mock import patch
+from test import generic
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import sshMaxArg
+
+
+def fakeLimit(limit):
+    """
+    Replacement for sshMaxArg._try_ssh_command_size with a remote host which
+    accepts commands up to ``limit`` characters.
+    """
+    calls = []
+
+    def tryCommandSize(config, size):
+        calls.append(size)
+        if size <= limit:
+            return True, ''
+        return False, 'stderr: "Argument list too long". '
+
+    return tryCommandSize, calls
+
+
+@patch('sshMaxArg.report_test')
+class TestProbe(unittest.TestCase):
+    def test_initial_size_works(self, report):
+        tryCommandSize, calls = fakeLimit(2 * 1024 * 1024)
+        with patch('sshMaxArg._try_ssh_command_size', tryCommandSize):
+            size = sshMaxArg.probe_max_ssh_command_size(None)
+        self.assertEqual(size, sshMaxArg._INITIAL_SSH_COMMAND_SIZE + len('printf'))
+        self.assertEqual(len(calls), 1)
+
+    def test_bisect(self, report):
+        tryCommandSize, calls = fakeLimit(131072)
+        with patch('sshMaxArg._try_ssh_command_size', tryCommandSize):
+            size = sshMaxArg.probe_max_ssh_command_size(None)
+        self.assertLessEqual(size - len('printf'), 131072)
+        self.assertGreater(size - len('printf'), 131072 - sshMaxArg._RESOLUTION)
+        self.assertLessEqual(len(calls), sshMaxArg._MAX_STEPS)
+
+    def test_max_steps(self, report):
+        tryCommandSize, calls = fakeLimit(131072)
+        with patch('sshMaxArg._try_ssh_command_size', tryCommandSize):
+            size = sshMaxArg.probe_max_ssh_command_size(None, max_steps=4)
+        self.assertEqual(len(calls), 4)
+        # never more than the limit
+        self.assertLessEqual(size - len('printf'), 131072)
+        self.assertGreater(size, 0)
+
+    def test_nothing_works(self, report):
+        tryCommandSize, calls = fakeLimit(0)
+        with patch('sshMaxArg._try_ssh_command_size', tryCommandSize):
+            with self.assertRaises(Exception):
+                sshMaxArg.probe_max_ssh_command_size(None)
+        self.assertLessEqual(len(calls), sshMaxArg._MAX_STEPS)
+
+
+class TestBanner(unittest.TestCase):
+    def test_sshd_banner(self):
+        with socket.socket() as server:
+            server.bind(('127.0.0.1', 0))
+            server.listen(1)
+
+            def serve():
+                conn, addr = server.accept()
+                with conn:
+                    conn.sendall(b'some pre-banner text\r\n'
+                                 b'SSH-2.0-OpenSSH_9.6p1 Foo\r\n')
+
+            thread = threading.Thread(target=serve)
+            thread.start()
+            banner = sshMaxArg.sshd_banner('127.0.0.1', server.getsockname()[1])
+            thread.join()
+        self.assertEqual(banner, 'SSH-2.0-OpenSSH_9.6p1 Foo')
+
+
+class TestCache(generic.TestCaseCfg):
+    def test_save_load(self):
+        self.assertIsNone(sshMaxArg.load_cached(self.cfg, 'foo:22:SSH-2.0-bar'))
+        sshMaxArg.save_cached(self.cfg, 'foo:22:SSH-2.0-bar', 131072)
+        self.assertEqual(sshMaxArg.load_cached(self.cfg, 'foo:22:SSH-2.0-bar'),
+                         131072)
+        # other sshd version
+        self.assertIsNone(sshMaxArg.load_cached(self.cfg, 'foo:22:SSH-2.0-baz'))
+
+    @patch('sshMaxArg.cache_key', return_value='foo:22:SSH-2.0-bar')
+    def test_max_ssh_command_size(self, cacheKey):
+        with patch('sshMaxArg.probe_max_ssh_command_size',
+                   return_value=131072) as probe:
+            self.assertEqual(sshMaxArg.max_ssh_command_size(self.cfg), 131072)
+            self.assertEqual(sshMaxArg.max_ssh_command_size(self.cfg), 131072)
+            probe.assert_called_once()
+            sshMaxArg.max_ssh_command_size(self.cfg, force=True)
+            self.assertEqual(probe.call_count, 2)
+
+    @patch('sshMaxArg.cache_key', return_value=None)
+    def test_max_ssh_command_size_unreachable(self, cacheKey):
+        with patch('sshMaxArg.probe_max_ssh_command_size',
+                   return_value=131072) as probe:
+            sshMaxArg.max_ssh_command_size(self.cfg)
+            sshMaxArg.max_ssh_command_size(self.cfg)
+            self.assertEqual(probe.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
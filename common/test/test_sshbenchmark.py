@@ -0,0 +1,207 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import sys
+import json
+import shutil
+import unittest
+from unittest.mock import patch
+from tempfile import TemporaryDirectory
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import sshbenchmark
+from test import generic
+
+RSYNC_310_VERSION = """rsync  version 3.1.0  protocol version 31
+Capabilities:
+    64-bit files, 64-bit inums, 64-bit timestamps, 64-bit long ints
+
+"""
+
+RSYNC_327_VERSION = """rsync  version 3.2.7  protocol version 31
+Capabilities:
+    64-bit files, 64-bit inums, 64-bit timestamps, 64-bit long ints
+Checksum list:
+    xxh128 xxh3 xxh64 (xxhash) md5 md4 sha1 none
+Compress list:
+    zstd lz4 zlibx zlib none
+
+"""
+
+# Stand-in for ssh. Skip ssh options and the host and run the remote
+# command with a local shell.
+STAND_IN = '''#!/bin/sh
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -o|-p|-l|-i) shift 2 ;;
+        -*) shift ;;
+        *) shift; break ;;
+    esac
+done
+exec sh -c "$*"
+'''
+
+
+class TestSshBenchmark(generic.TestCaseCfg):
+    def setUp(self):
+        super(TestSshBenchmark, self).setUp()
+        self.tmp = TemporaryDirectory()
+        self.remote = os.path.join(self.tmp.name, 'remote')
+        os.mkdir(self.remote)
+        self.cfg.setSnapshotsMode('ssh')
+        self.cfg.setSshHost('localhost')
+        self.cfg.setSshSnapshotsPath(self.remote)
+
+        self.standIn = os.path.join(self.tmp.name, 'ssh')
+        with open(self.standIn, 'wt') as f:
+            f.write(STAND_IN)
+        os.chmod(self.standIn, 0o755)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        super(TestSshBenchmark, self).tearDown()
+
+    def benchmark(self, version=RSYNC_327_VERSION, **kwargs):
+        with patch('tools.rsyncVersion', return_value=version):
+            return sshbenchmark.Benchmark(self.cfg, size=1,
+                                          rsh=[self.standIn], **kwargs)
+
+    def test_compressArgs(self):
+        choices = ['zstd', 'zlib', 'none']
+        self.assertListEqual(sshbenchmark.compressArgs('none', 0, choices), [])
+        self.assertListEqual(sshbenchmark.compressArgs('zstd', 0, choices),
+                             ['--compress', '--compress-choice=zstd'])
+        self.assertListEqual(sshbenchmark.compressArgs('zstd', 3, choices),
+                             ['--compress', '--compress-choice=zstd',
+                              '--compress-level=3'])
+        # rsync < 3.2
+        self.assertListEqual(sshbenchmark.compressArgs('zlib', 1, []),
+                             ['--compress', '--compress-level=1'])
+
+    def test_createTestData(self):
+        sshbenchmark.createTestData(self.tmp.name, 3)
+        sizes = [os.path.getsize(os.path.join(self.tmp.name, name))
+                 for name in ('random.bin', 'text.txt')]
+        self.assertEqual(sum(sizes), 3 * sshbenchmark.MIB)
+        self.assertEqual(sizes[0], 3 * sshbenchmark.MIB // 2)
+
+    def test_supportedCompressions(self):
+        bench = self.benchmark()
+        # remote rsync doesn't know zstd
+        with patch.object(bench, 'remoteRsyncVersion',
+                          return_value=RSYNC_327_VERSION.replace('zstd ', '')):
+            self.assertListEqual(bench.supportedCompressions(),
+                                 [('none', 0), ('lz4', 0),
+                                  ('zlibx', 0), ('zlibx', 1),
+                                  ('zlib', 0), ('zlib', 1)])
+
+        bench = self.benchmark(RSYNC_310_VERSION)
+        self.assertListEqual(bench.supportedCompressions(),
+                             [('none', 0), ('zlib', 0), ('zlib', 1)])
+
+    def test_rshCommand(self):
+        bench = self.benchmark()
+        self.assertListEqual(bench.rshCommand('default'), [self.standIn])
+        self.assertListEqual(bench.rshCommand('aes128-ctr'),
+                             [self.standIn, '-o', 'Ciphers=aes128-ctr'])
+
+    def test_benchmark(self):
+        # seconds per transfer
+        speed = {('default', 'none', 0): 4.0,
+                 ('aes128-ctr', 'none', 0): 2.0,
+                 ('aes256-ctr', 'none', 0): 3.0,
+                 ('aes128-ctr', 'zstd', 0): 1.0,
+                 ('aes128-ctr', 'zlib', 0): 5.0}
+        bench = self.benchmark(ciphers=['default', 'aes128-ctr', 'aes256-ctr'],
+                               compressions=[('none', 0), ('zstd', 0),
+                                             ('zlib', 0), ('lz4', 0)])
+
+        def transfer(src, cipher, compress, level):
+            if compress == 'lz4':
+                return (1, 0.1, 0.1)
+            return (0, speed[(cipher, compress, level)], 0.5)
+
+        with patch.object(bench, 'transfer', side_effect=transfer):
+            results = bench.benchmark()
+
+        # phase 2 uses the fastest cipher of phase 1
+        self.assertListEqual([(r['cipher'], r['compress'], r['ok'])
+                              for r in results],
+                             [('default', 'none', True),
+                              ('aes128-ctr', 'none', True),
+                              ('aes256-ctr', 'none', True),
+                              ('aes128-ctr', 'zstd', True),
+                              ('aes128-ctr', 'zlib', True),
+                              ('aes128-ctr', 'lz4', False)])
+        best = bench.fastest()
+        self.assertEqual((best['cipher'], best['compress']), ('aes128-ctr', 'zstd'))
+        self.assertEqual(best['mibps'], 1.0)
+
+        table = sshbenchmark.formatTable(results).split('\n')
+        self.assertEqual(len(table), 7)
+        self.assertIn('failed', table[-1])
+
+        data = json.loads(bench.json())
+        self.assertEqual(data['host'], 'localhost')
+        self.assertEqual(len(data['results']), 6)
+        self.assertEqual(data['fastest']['compress'], 'zstd')
+
+        with patch.object(self.cfg, 'save') as save:
+            self.assertEqual(bench.apply(), best)
+        save.assert_called_once()
+        self.assertEqual(self.cfg.sshCipher(), 'aes128-ctr')
+        self.assertEqual(self.cfg.sshCompress(), 'zstd')
+        self.assertEqual(self.cfg.sshCompressLevel(), 0)
+
+    def test_benchmark_all_failed(self):
+        bench = self.benchmark(ciphers=['default'])
+        with patch.object(bench, 'transfer', return_value=(255, 0.1, 0.1)) as transfer, \
+             patch.object(bench, 'supportedCompressions') as compressions:
+            bench.benchmark()
+        # repeats and phase 2 are skipped
+        self.assertEqual(transfer.call_count, 1)
+        compressions.assert_not_called()
+        self.assertIsNone(bench.fastest())
+        self.assertIsNone(bench.apply())
+        self.assertEqual(self.cfg.sshCipher(), 'default')
+
+    def test_cleanup(self):
+        bench = self.benchmark()
+        os.mkdir(bench.remotePath)
+        with open(os.path.join(bench.remotePath, 'foo'), 'wt') as f:
+            f.write('bar')
+        bench.cleanup()
+        self.assertFalse(os.path.exists(bench.remotePath))
+        self.assertTrue(os.path.exists(self.remote))
+
+    @unittest.skipIf(not shutil.which('rsync'), 'rsync is not installed')
+    def test_transfer(self):
+        with patch('tools.rsyncVersion', return_value=RSYNC_310_VERSION):
+            bench = sshbenchmark.Benchmark(self.cfg, size=1, repeat=1,
+                                           rsh=[self.standIn],
+                                           ciphers=['default'],
+                                           compressions=[('none', 0), ('zlib', 1)])
+        with patch.object(bench, 'cleanup'):
+            results = bench.benchmark()
+        self.assertTrue(all(r['ok'] for r in results), results)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(os.path.getsize(os.path.join(bench.remotePath, 'random.bin')),
+                         sshbenchmark.MIB // 2)
+        self.assertGreater(results[0]['mibps'], 0)
+        bench.cleanup()
+        self.assertFalse(os.path.exists(bench.remotePath))
@@ -30,6 +30,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 import config
 import logger
 import mount
+import remoteprobe
 import sshtools
 import tools
 from exceptions import MountException
@@ -76,6 +77,55 @@ class TestSSH(generic.SSHTestCase):
         with self.assertRaisesRegex(MountException, r"Could not unlock ssh private key\. Wrong password or password not available for cron\."):
             ssh.unlockSshAgent(force = True)
 
+    def test_startMaster(self):
+        ssh = sshtools.SSH(cfg = self.cfg, **self.mount_kwargs)
+        path = self.cfg.sshControlPath()
+        ssh.startMaster()
+        try:
+            self.assertTrue(os.path.exists(path))
+            self.assertListEqual(ssh.controlArgs(),
+                                 ['-o', 'ControlPath={}'.format(path)])
+            # connections to the same host use it automatically
+            self.assertIn('ControlPath={}'.format(path),
+                          self.cfg.sshCommand(cmd = ['exit']))
+            self.assertEqual(ssh.controlCommand('check'), 0)
+        finally:
+            ssh.stopMaster()
+        self.assertFalse(os.path.exists(path))
+        self.assertListEqual(ssh.controlArgs(), [])
+
+    def test_startMaster_disabled(self):
+        self.cfg.setSshMultiplex(False)
+        ssh = sshtools.SSH(cfg = self.cfg, **self.mount_kwargs)
+        ssh.startMaster()
+        self.assertFalse(os.path.exists(self.cfg.sshControlPath()))
+
+    def test_checkRemote(self):
+        ssh = sshtools.SSH(cfg = self.cfg, **self.mount_kwargs)
+        key = remoteprobe.key(ssh.user, ssh.host, ssh.port, ssh.path)
+        ssh.checkRemote()
+        self.assertTrue(os.path.isdir(self.remotePath))
+        result = remoteprobe.load(self.cfg, key)
+        self.assertTrue(result['hardlinks'])
+        self.assertTrue(result['rsync'].startswith('rsync'))
+
+        # the cached result is used without probing again
+        with patch.object(ssh, 'probeRemote') as probe:
+            ssh.checkRemote()
+            probe.assert_not_called()
+            ssh.checkRemote(force = True)
+            probe.assert_called_once()
+
+    def test_checkRemote_fail_not_a_folder(self):
+        with open(self.remotePath, 'wt') as f:
+            f.write('foo')
+        ssh = sshtools.SSH(cfg = self.cfg, **self.mount_kwargs)
+        with self.assertRaisesRegex(MountException, 'not a directory'):
+            ssh.checkRemote()
+        # failed results are not cached
+        self.assertIsNone(remoteprobe.load(
+            self.cfg, remoteprobe.key(ssh.user, ssh.host, ssh.port, ssh.path)))
+
     def test_checkLogin(self):
         ssh = sshtools.SSH(cfg = self.cfg)
         ssh.checkLogin()
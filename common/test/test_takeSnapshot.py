@@ -71,7 +71,7 @@ class TestTakeSnapshot(generic.SnapshotsTestCase):
         self.assertTrue(sid1.isExistingPathInsideSnapshotFolder(os.path.join(self.include.name, 'file with spaces')))
         self.assertExists(self.cfg.anacronSpoolFile())
         for f in ('config',
-                  'fileinfo.bz2',
+                  'fileinfo.idx',
                   'info',
                   'takesnapshot.log.bz2'):
             self.assertExists(sid1.path(f))
@@ -128,7 +128,7 @@ class TestTakeSnapshot(generic.SnapshotsTestCase):
         self.assertTrue(sid1.isExistingPathInsideSnapshotFolder(os.path.join(include, 'foo', 'bar', 'baz')))
         self.assertTrue(sid1.isExistingPathInsideSnapshotFolder(os.path.join(include, 'test')))
         for f in ('config',
-                  'fileinfo.bz2',
+                  'fileinfo.idx',
                   'info',
                   'takesnapshot.log.bz2'):
             self.assertExists(sid1.path(f))
@@ -149,7 +149,7 @@ class TestTakeSnapshot(generic.SnapshotsTestCase):
         self.assertFalse(sid1.isExistingPathInsideSnapshotFolder(os.path.join(self.include.name, 'foo', 'bar', 'baz')))
         self.assertTrue(sid1.isExistingPathInsideSnapshotFolder(os.path.join(self.include.name, 'test')))
         for f in ('config',
-                  'fileinfo.bz2',
+                  'fileinfo.idx',
                   'info',
                   'takesnapshot.log.bz2'):
             self.assertExists(sid1.path(f))
@@ -172,7 +172,7 @@ class TestTakeSnapshot(generic.SnapshotsTestCase):
         self.assertTrue(sid1.isExistingPathInsideSnapshotFolder(os.path.join(self.include.name, 'test')))
         self.assertFalse(sid1.isExistingPathInsideSnapshotFolder(exclude))
         for f in ('config',
-                  'fileinfo.bz2',
+                  'fileinfo.idx',
                   'info',
                   'takesnapshot.log.bz2'):
             self.assertExists(sid1.path(f))
@@ -192,7 +192,7 @@ class TestTakeSnapshot(generic.SnapshotsTestCase):
             self.assertTrue(sid1.isExistingPathInsideSnapshotFolder(os.path.join(self.include.name, 'foo', 'bar', 'baz')))
             self.assertFalse(sid1.isExistingPathInsideSnapshotFolder(os.path.join(self.include.name, 'test')))
             for f in ('config',
-                      'fileinfo.bz2',
+                      'fileinfo.idx',
                       'info',
                       'takesnapshot.log.bz2',
                       'failed'):
@@ -246,6 +246,28 @@ class TestTakeSnapshot(generic.SnapshotsTestCase):
 
             self.assertListEqual([False, True], self.sn.takeSnapshot(sid1, now, [(self.include.name, 0),]))
 
+    @patch('time.sleep') # speed up unittest
+    def test_takeSnapshot_workers(self, sleep):
+        # runs without rsync installed. Only check the rsync processes
+        # are set up for every worker
+        for name in ('foo', 'bar'):
+            os.mkdir(os.path.join(self.include.name, name + '_worker'))
+        include = [(os.path.join(self.include.name, name + '_worker'), 0)
+                   for name in ('foo', 'bar')]
+        self.cfg.setRsyncWorkers(2)
+        now = datetime.today()
+        sid1 = snapshots.SID(now, self.cfg)
+
+        with patch('tools.rsyncVersion',
+                   return_value='rsync  version 3.2.7  protocol version 31\n'), \
+             patch('tools.ExecuteParallel.run', return_value=[0, 0]) as run, \
+             patch.object(self.sn, 'setTakeSnapshotMessage') as message:
+            self.sn.takeSnapshot(sid1, now, include)
+
+        run.assert_called_once()
+        message.assert_any_call(0, 'Taking snapshot')
+        self.assertEqual(len(self.sn.rsyncWorkerProgress), 2)
+
 @unittest.skipIf(not generic.LOCAL_SSH, 'Skip as this test requires a local ssh server, public and private keys installed')
 class TestTakeSnapshotSSH(generic.SSHSnapshotTestCase, TestTakeSnapshot):
     def setUp(self):
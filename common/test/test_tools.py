@@ -27,6 +27,7 @@ import signal
 import unittest
 from unittest.mock import patch
 import uuid
+import hashlib
 from copy import deepcopy
 from tempfile import NamedTemporaryFile, TemporaryDirectory
 from datetime import datetime
@@ -76,6 +77,29 @@ are welcome to redistribute it under certain conditions.  See the GNU
 General Public License for details.
 """
 
+RSYNC_327_VERSION = """rsync  version 3.2.7  protocol version 31
+Copyright (C) 1996-2022 by Andrew Tridgell, Wayne Davison, and others.
+Web site: https://rsync.samba.org/
+Capabilities:
+    64-bit files, 64-bit inums, 64-bit timestamps, 64-bit long ints,
+    socketpairs, symlinks, symtimes, hardlinks, hardlink-specials,
+    hardlink-symlinks, IPv6, atimes, batchfiles, inplace, append, ACLs,
+    xattrs, optional protect-args, iconv, prealloc, stop-at, no crtimes
+Optimizations:
+    SIMD-roll, no asm-roll, openssl-crypto, no asm-MD5
+Checksum list:
+    xxh128 xxh3 xxh64 (xxhash) md5 md4 sha1 none
+Compress list:
+    zstd lz4 zlibx zlib none
+Daemon auth list:
+    sha512 sha256 sha1 md5 md4
+
+rsync comes with ABSOLUTELY NO WARRANTY.  This is free software, and you
+are welcome to redistribute it under certain conditions.  See the GNU
+General Public License for details.
+"""
+
+
 
 class TestTools(generic.TestCase):
     """
@@ -333,6 +357,16 @@ class TestTools(generic.TestCase):
             self.assertFalse(tools.powerStatusAvailable())
         self.assertIsInstance(tools.onBattery(), bool)
 
+    def test_rsyncChoices(self):
+        self.assertListEqual(tools.rsyncChoices(RSYNC_327_VERSION, 'Compress'),
+                             ['zstd', 'lz4', 'zlibx', 'zlib', 'none'])
+        self.assertListEqual(tools.rsyncChoices(RSYNC_327_VERSION, 'Checksum'),
+                             ['xxh128', 'xxh3', 'xxh64', 'md5', 'md4', 'sha1', 'none'])
+        self.assertListEqual(tools.rsyncChoices(RSYNC_327_VERSION, 'Daemon auth'),
+                             ['sha512', 'sha256', 'sha1', 'md5', 'md4'])
+        self.assertListEqual(tools.rsyncChoices(RSYNC_310_VERSION, 'Compress'), [])
+        self.assertListEqual(tools.rsyncChoices('', 'Compress'), [])
+
     def test_rsyncCaps(self):
         if RSYNC_INSTALLED:
             caps = tools.rsyncCaps()
@@ -358,6 +392,7 @@ class TestTools(generic.TestCase):
 
         self.assertListEqual(tools.rsyncCaps(data=RSYNC_310_VERSION),
                              ['progress2',
+                              'permsformat',
                               '64-bit files',
                               '64-bit inums',
                               '64-bit timestamps',
@@ -383,6 +418,14 @@ class TestTools(generic.TestCase):
             self.assertEqual(tools.md5sum(f.name),
                              'acbd18db4cc2f85cedef654fccc4a4d8')
 
+    def test_fileDigest(self):
+        with NamedTemporaryFile() as f:
+            f.write(b'foo')
+            f.flush()
+
+            self.assertEqual(tools.fileDigest(f.name),
+                             hashlib.blake2b(b'foo').hexdigest())
+
     def test_checkCronPattern(self):
         self.assertTrue(tools.checkCronPattern('0'))
         self.assertTrue(tools.checkCronPattern('0,10,13,15,17,20,23'))
@@ -963,6 +1006,310 @@ class TestToolsUniquenessSet(generic.TestCase):
             self.assertFalse(uniqueness.check(t3))
 
 
+    def test_prefetch(self):
+        with TemporaryDirectory() as d:
+            paths = []
+            for i, data in enumerate(('bar', 'baz', 'bar', '42', 'foo', 'bar')):
+                paths.append(os.path.join(d, str(i)))
+                with open(paths[-1], 'wt') as f:
+                    f.write(data)
+            paths.append(os.path.join(d, 'link'))
+            os.link(paths[0], paths[-1])
+            os.utime(paths[2], times=(0, 0))
+
+            for equal in ('', paths[0]):
+                expected = []
+                uniqueness = tools.UniquenessSet(dc=True, list_equal_to=equal)
+                for path in paths:
+                    expected.append(uniqueness.check(path))
+
+                uniqueness = tools.UniquenessSet(dc=True, list_equal_to=equal)
+                with patch('tools.fileDigest',
+                           wraps=tools.fileDigest) as digest:
+                    uniqueness.prefetch(paths)
+                    result = [uniqueness.check(path) for path in paths]
+                self.assertListEqual(result, expected)
+
+                # hardlink and file of unique size are not hashed
+                hashed = set([c[0][0] for c in digest.call_args_list])
+                self.assertNotIn(paths[3], hashed)
+                self.assertNotIn(paths[-1], hashed)
+
+
+class TestDigestCache(generic.TestCase):
+    def test_cache(self):
+        with TemporaryDirectory() as d:
+            path = os.path.join(d, 'foo')
+            with open(path, 'wt') as f:
+                f.write('foo')
+
+            cache = tools.DigestCache()
+            with patch('tools.fileDigest',
+                       wraps=tools.fileDigest) as digest:
+                self.assertEqual(cache.digest(path), tools.fileDigest(path))
+                self.assertEqual(cache.digest(path), tools.fileDigest(path))
+                self.assertEqual(digest.call_count, 3)
+
+                # changed mtime is hashed again
+                os.utime(path, times=(0, 0))
+                cache.digest(path)
+                self.assertEqual(digest.call_count, 4)
+
+    def test_save(self):
+        with TemporaryDirectory() as d:
+            path = os.path.join(d, 'foo')
+            with open(path, 'wt') as f:
+                f.write('foo')
+            filename = os.path.join(d, 'cache.json')
+
+            cache = tools.DigestCache(filename)
+            cache.digest(path)
+            cache.save()
+            self.assertExists(filename)
+
+            cache = tools.DigestCache(filename)
+            with patch('tools.fileDigest') as digest:
+                self.assertEqual(cache.digest(path),
+                                 hashlib.blake2b(b'foo').hexdigest())
+                digest.assert_not_called()
+
+    def test_maxEntries(self):
+        cache = tools.DigestCache()
+        with patch.object(tools.DigestCache, 'MAX_ENTRIES', 2):
+            for i in range(3):
+                st = os.stat_result((0, i, 0, 1, 0, 0, 0, 0, 0, 0))
+                cache.set(st, str(i))
+        self.assertIsNone(cache.get(os.stat_result((0, 0, 0, 1, 0, 0, 0, 0, 0, 0))))
+        self.assertEqual(cache.get(os.stat_result((0, 2, 0, 1, 0, 0, 0, 0, 0, 0))), '2')
+
+    def test_digestMany(self):
+        with TemporaryDirectory() as d:
+            paths = []
+            for i in range(8):
+                paths.append(os.path.join(d, str(i)))
+                with open(paths[-1], 'wt') as f:
+                    f.write(str(i) * 100)
+
+            cache = tools.DigestCache(workers=4)
+            result = cache.digestMany(paths + [os.path.join(d, 'missing')])
+            self.assertDictEqual(result,
+                                 {p: tools.fileDigest(p) for p in paths})
+
+
+class TestJsonCache(generic.TestCase):
+    def test_update(self):
+        with TemporaryDirectory() as d:
+            filename = os.path.join(d, 'cache.json')
+            self.assertDictEqual(tools.readJsonCache(filename), {})
+
+            self.assertTrue(tools.updateJsonCache(filename, 'foo', {'a': 1}))
+            self.assertTrue(tools.updateJsonCache(filename, 'bar', 2))
+            self.assertDictEqual(tools.readJsonCache(filename),
+                                 {'foo': {'a': 1}, 'bar': 2})
+
+            # remove
+            self.assertTrue(tools.updateJsonCache(filename, 'foo', None))
+            self.assertDictEqual(tools.readJsonCache(filename), {'bar': 2})
+            self.assertListEqual(os.listdir(d), ['cache.json'])
+
+    def test_broken(self):
+        with TemporaryDirectory() as d:
+            filename = os.path.join(d, 'cache.json')
+            with open(filename, 'wt') as f:
+                f.write('[1, 2')
+            self.assertDictEqual(tools.readJsonCache(filename), {})
+
+            self.assertTrue(tools.updateJsonCache(filename, 'foo', 1))
+            self.assertDictEqual(tools.readJsonCache(filename), {'foo': 1})
+
+            # not serializable
+            self.assertFalse(tools.updateJsonCache(filename, 'bar', object()))
+            self.assertDictEqual(tools.readJsonCache(filename), {'foo': 1})
+            self.assertListEqual(os.listdir(d), ['cache.json'])
+
+    def test_unique_tmp(self):
+        with TemporaryDirectory() as d:
+            filename = os.path.join(d, 'cache.json')
+            # a leftover of another writer is not touched
+            with open(filename + '.tmp', 'wt') as f:
+                f.write('foo')
+            self.assertTrue(tools.updateJsonCache(filename, 'foo', 1))
+            self.assertCountEqual(os.listdir(d), ['cache.json', 'cache.json.tmp'])
+
+
+class TestRsyncVersionCache(generic.TestCaseCfg):
+    def setUp(self):
+        super(TestRsyncVersionCache, self).setUp()
+        tools._RSYNC_VERSION_CACHE.clear()
+        self.rsync = os.path.join(self.sharePath, 'rsync')
+        with open(self.rsync, 'wt') as f:
+            f.write('foo')
+
+    def tearDown(self):
+        tools._RSYNC_VERSION_CACHE.clear()
+        super(TestRsyncVersionCache, self).tearDown()
+
+    @patch('subprocess.Popen')
+    def test_rsyncVersion(self, popen):
+        popen.return_value.communicate.return_value = (RSYNC_310_VERSION, None)
+
+        with patch('tools.which', return_value=self.rsync):
+            self.assertEqual(tools.rsyncVersion(self.cfg), RSYNC_310_VERSION)
+            self.assertIn('progress2', tools.rsyncCaps(config=self.cfg))
+            self.assertEqual(popen.call_count, 1)
+
+            # persisted for the next process
+            tools._RSYNC_VERSION_CACHE.clear()
+            self.assertEqual(tools.rsyncVersion(self.cfg), RSYNC_310_VERSION)
+            self.assertEqual(popen.call_count, 1)
+
+            # rsync binary was updated
+            os.utime(self.rsync, (0, 0))
+            popen.return_value.communicate.return_value = (RSYNC_307_VERSION, None)
+            self.assertEqual(tools.rsyncVersion(self.cfg), RSYNC_307_VERSION)
+            self.assertEqual(popen.call_count, 2)
+
+    @patch('subprocess.Popen')
+    def test_rsyncRemoteVersion(self, popen):
+        popen.return_value.communicate.return_value = (RSYNC_310_VERSION, None)
+        popen.return_value.returncode = 0
+
+        self.assertIn('progress2', tools.rsyncRemoteCaps(self.cfg))
+        self.assertEqual(tools.rsyncRemoteVersion(self.cfg), RSYNC_310_VERSION)
+        self.assertEqual(popen.call_count, 1)
+        self.assertIn('ssh', popen.call_args[0][0])
+
+        # another host
+        self.cfg.setSshHost('foo')
+        tools.rsyncRemoteVersion(self.cfg)
+        self.assertEqual(popen.call_count, 2)
+
+        tools.rsyncRemoteVersion(self.cfg, force=True)
+        self.assertEqual(popen.call_count, 3)
+
+    @patch('subprocess.Popen')
+    def test_rsyncRemoteVersion_failed(self, popen):
+        popen.return_value.communicate.return_value = ('', None)
+        popen.return_value.returncode = 255
+
+        self.assertIsNone(tools.rsyncRemoteVersion(self.cfg))
+        self.assertListEqual(tools.rsyncRemoteCaps(self.cfg), [])
+        # failures are not cached
+        tools.rsyncRemoteVersion(self.cfg)
+        self.assertEqual(popen.call_count, 3)
+
+    def test_rsyncCompressArgs(self):
+        with patch('tools.rsyncVersion', return_value=RSYNC_327_VERSION), \
+             patch('tools.rsyncRemoteVersion', return_value=RSYNC_327_VERSION):
+            self.assertListEqual(tools.rsyncCompressArgs(self.cfg), [])
+
+            self.cfg.setSshCompress('zstd')
+            self.cfg.setSshSkipCompress('')
+            self.assertListEqual(tools.rsyncCompressArgs(self.cfg),
+                                 ['--compress', '--compress-choice=zstd'])
+
+            self.cfg.setSshCompressLevel(3)
+            self.assertListEqual(tools.rsyncCompressArgs(self.cfg),
+                                 ['--compress', '--compress-choice=zstd',
+                                  '--compress-level=3'])
+
+            # only used in SSH modes
+            self.cfg.setSnapshotsMode('ssh')
+            self.assertIn('--compress-choice=zstd', tools.rsyncPrefix(self.cfg))
+            self.cfg.setSnapshotsMode('local')
+            self.assertNotIn('--compress', tools.rsyncPrefix(self.cfg))
+
+    def test_rsyncCompressArgs_unsupported(self):
+        self.cfg.setSshCompress('zstd')
+        self.cfg.setSshCompressLevel(3)
+        self.cfg.setSshSkipCompress('')
+        # remote rsync doesn't know zstd
+        with patch('tools.rsyncVersion', return_value=RSYNC_327_VERSION), \
+             patch('tools.rsyncRemoteVersion',
+                   return_value=RSYNC_327_VERSION.replace('zstd ', '')):
+            self.assertListEqual(tools.rsyncCompressArgs(self.cfg),
+                                 ['--compress', '--compress-choice=lz4'])
+
+        # local rsync < 3.2 only knows zlib
+        with patch('tools.rsyncVersion', return_value=RSYNC_310_VERSION), \
+             patch('tools.rsyncRemoteVersion', return_value=RSYNC_310_VERSION):
+            self.assertListEqual(tools.rsyncCompressArgs(self.cfg), ['--compress'])
+
+    def test_rsyncCompressArgs_skip(self):
+        self.cfg.setSshCompress('zlib')
+        with patch('tools.rsyncVersion', return_value=RSYNC_310_VERSION), \
+             patch('tools.rsyncRemoteVersion', return_value=RSYNC_310_VERSION):
+            self.assertIn('--skip-compress=' + self.cfg.DEFAULT_SSH_SKIP_COMPRESS,
+                          tools.rsyncCompressArgs(self.cfg))
+            self.cfg.setSshSkipCompress('jpg/zip')
+            self.assertListEqual(tools.rsyncCompressArgs(self.cfg),
+                                 ['--compress', '--skip-compress=jpg/zip'])
+
+    def test_rsyncCompression_auto(self):
+        self.cfg.setSshCompress('auto')
+        with patch('tools.rsyncVersion', return_value=RSYNC_327_VERSION), \
+             patch('tools.rsyncRemoteVersion', return_value=RSYNC_327_VERSION):
+            # no measurement yet
+            self.assertEqual(tools.rsyncCompression(self.cfg), ('zstd', 0))
+
+            tools.setLinkThroughput(self.cfg, 1024 * 1024)
+            self.assertEqual(tools.linkThroughput(self.cfg), 1024 * 1024)
+            self.assertEqual(tools.rsyncCompression(self.cfg), ('zstd', 9))
+
+            # averaged with the recent measurement
+            tools.setLinkThroughput(self.cfg, 199 * 1024 * 1024)
+            self.assertEqual(tools.linkThroughput(self.cfg), 100 * 1024 * 1024)
+            self.assertEqual(tools.rsyncCompression(self.cfg), ('none', 0))
+            self.assertListEqual(tools.rsyncCompressArgs(self.cfg), [])
+
+            # another host
+            self.cfg.setSshHost('foo')
+            self.assertIsNone(tools.linkThroughput(self.cfg))
+
+    def test_rsyncChecksumChoice(self):
+        self.cfg.setSnapshotsMode('local')
+        with patch('tools.rsyncVersion', return_value=RSYNC_327_VERSION), \
+             patch('tools.rsyncRemoteVersion', return_value=None) as remote:
+            self.assertEqual(tools.rsyncChecksumChoice(self.cfg), 'xxh128')
+            self.assertNotIn('--checksum-choice=xxh128', tools.rsyncPrefix(self.cfg))
+            self.cfg.forceUseChecksum = True
+            self.assertIn('--checksum-choice=xxh128', tools.rsyncPrefix(self.cfg))
+            remote.assert_not_called()
+
+            # remote host wasn't probed
+            self.cfg.setSnapshotsMode('ssh')
+            self.assertIsNone(tools.rsyncChecksumChoice(self.cfg))
+            self.assertEqual(tools.rsyncChecksumChoice(self.cfg, remote=False),
+                             'xxh128')
+
+        # remote rsync without xxh128
+        with patch('tools.rsyncVersion', return_value=RSYNC_327_VERSION), \
+             patch('tools.rsyncRemoteVersion',
+                   return_value=RSYNC_327_VERSION.replace('xxh128 ', '')):
+            self.assertEqual(tools.rsyncChecksumChoice(self.cfg), 'xxh3')
+            self.assertIn('--checksum-choice=xxh3', tools.rsyncPrefix(self.cfg))
+
+        # rsync < 3.2
+        with patch('tools.rsyncVersion', return_value=RSYNC_310_VERSION), \
+             patch('tools.rsyncRemoteVersion', return_value=RSYNC_327_VERSION):
+            self.assertIsNone(tools.rsyncChecksumChoice(self.cfg))
+            self.assertNotIn('--checksum-choice',
+                             ' '.join(tools.rsyncPrefix(self.cfg)))
+
+    def test_rsyncAutoCompress(self):
+        mib = 1024 * 1024
+        choices = ['zstd', 'lz4', 'zlibx', 'zlib']
+        self.assertEqual(tools.rsyncAutoCompress(choices), ('zstd', 0))
+        self.assertEqual(tools.rsyncAutoCompress(choices, mib), ('zstd', 9))
+        self.assertEqual(tools.rsyncAutoCompress(choices, 5 * mib), ('zstd', 0))
+        self.assertEqual(tools.rsyncAutoCompress(choices, 20 * mib), ('lz4', 0))
+        self.assertEqual(tools.rsyncAutoCompress(['zstd', 'zlib'], 20 * mib),
+                         ('zstd', 1))
+        self.assertEqual(tools.rsyncAutoCompress(choices, 100 * mib), ('none', 0))
+        # rsync < 3.2
+        self.assertEqual(tools.rsyncAutoCompress([], mib), ('zlib', 0))
+
+
 class TestToolsExecuteSubprocess(generic.TestCase):
     # new method with subprocess
     def test_returncode(self):
@@ -993,6 +1340,25 @@ class TestToolsExecuteSubprocess(generic.TestCase):
         self.assertTrue(proc.pausable)
 
 
+class TestToolsExecuteParallel(generic.TestCase):
+    def test_returncode(self):
+        procs = [tools.Execute(['true']),
+                 tools.Execute(['false']),
+                 tools.Execute(['sh', '-c', 'exit 23'])]
+        self.assertListEqual(tools.ExecuteParallel(procs).run(), [0, 1, 23])
+
+    def test_callback(self):
+        lines = []
+        procs = [tools.Execute(['sh', '-c', 'for i in 1 2 3; do echo %s$i; done' % x],
+                               callback=lambda line, data: data.append(line),
+                               user_data=lines,
+                               filters=(lambda line: line.upper(), ))
+                 for x in 'ab']
+        tools.ExecuteParallel(procs).run()
+
+        self.assertListEqual(sorted(lines), ['A1', 'A2', 'A3', 'B1', 'B2', 'B3'])
+
+
 class TestToolsExecuteOsSystem(generic.TestCase):
     # old method with os.system
     def test_returncode(self):
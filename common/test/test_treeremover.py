@@ -0,0 +1,101 @@
+# Back In Time
+# Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey, Germar Reitze
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation,Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+import os
+import sys
+import stat
+import unittest
+from tempfile import TemporaryDirectory
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from treeremover import TreeRemover
+
+
+class TestTreeRemover(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def makeTree(self, name, depth=3, width=3, files=5):
+        root = os.path.join(self.tmp.name, name)
+        count = 0
+        dirs = [root]
+        for _ in range(depth):
+            new = []
+            for d in dirs:
+                for i in range(width):
+                    path = os.path.join(d, 'dir%d' % i)
+                    os.makedirs(path)
+                    new.append(path)
+                    count += 1
+            dirs = new
+
+        for d in dirs:
+            for i in range(files):
+                with open(os.path.join(d, 'file%d' % i), 'wt') as f:
+                    f.write('foo')
+                count += 1
+            os.symlink('/tmp', os.path.join(d, 'link'))
+            os.link(os.path.join(d, 'file0'), os.path.join(d, 'hardlink'))
+            count += 2
+        # root folder
+        return root, count + 1
+
+    def test_remove(self):
+        root, count = self.makeTree('foo')
+        counts = []
+        remover = TreeRemover(workers=4, callback=counts.append)
+
+        self.assertTrue(remover.remove(root))
+        self.assertFalse(os.path.exists(root))
+        self.assertEqual(remover.removed, count)
+        self.assertEqual(counts[-1], count)
+
+    def test_removeMany(self):
+        roots = [self.makeTree('foo%d' % i, width=2)[0] for i in range(5)]
+        self.assertDictEqual(TreeRemover(workers=3).removeMany(roots),
+                             {root: True for root in roots})
+        self.assertListEqual(os.listdir(self.tmp.name), [])
+
+    def test_read_only(self):
+        root, count = self.makeTree('foo', depth=2, width=2)
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            for name in filenames:
+                os.chmod(os.path.join(dirpath, name), stat.S_IRUSR)
+            os.chmod(dirpath, stat.S_IRUSR | stat.S_IXUSR)
+
+        self.assertTrue(TreeRemover(workers=2).remove(root))
+        self.assertFalse(os.path.exists(root))
+
+    def test_missing(self):
+        root = os.path.join(self.tmp.name, 'foo')
+        self.assertTrue(TreeRemover().remove(root))
+
+    def test_symlink(self):
+        target, count = self.makeTree('foo', depth=1)
+        link = os.path.join(self.tmp.name, 'bar')
+        os.symlink(target, link)
+
+        self.assertTrue(TreeRemover().remove(link))
+        self.assertFalse(os.path.lexists(link))
+        self.assertTrue(os.path.isdir(target))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -35,6 +35,10 @@ except ImportError:
 import hashlib
 import ipaddress
 import atexit
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from packaging.version import Version
 from time import sleep
@@ -853,29 +857,32 @@ def onBattery():
             pass
     return False
 
-def rsyncCaps(data = None):
+def rsyncCaps(data = None, config = None):
     """
     Get capabilities of the installed rsync binary. This can be different from
     version to version and also on build arguments used when building rsync.
 
     Args:
-        data (str): 'rsync --version' output. This is just for unittests.
+        data (str):                 'rsync --version' output. This is just
+                                    for unittests.
+        config (config.Config):     used to persist the probed capabilities
+                                    in the local data folder.
+                                    See :py:func:`rsyncVersion`
 
     Returns:
         list:       List of str with rsyncs capabilities
     """
     if not data:
-        proc = subprocess.Popen(['rsync', '--version'],
-                                stdout = subprocess.PIPE,
-                                universal_newlines = True)
-        data = proc.communicate()[0]
+        data = rsyncVersion(config)
     caps = []
-    #rsync >= 3.1 does provide --info=progress2
+    #rsync >= 3.1 does provide --info=progress2 and the log format
+    #escapes %U, %G and %B (uid, gid and permission bits)
     matchers = [r'rsync\s*version\s*(\d\.\d)', r'rsync\s*version\s*v(\d\.\d.\d)']
     for matcher in matchers:
         m = re.match(matcher, data)
         if m and Version(m.group(1)) >= Version('3.1'):
             caps.append('progress2')
+            caps.append('permsformat')
             break
 
     #all other capabilities are separated by ',' between
@@ -889,6 +896,463 @@ def rsyncCaps(data = None):
     return caps
 
 
+def rsyncChoices(data, name):
+    """
+    Get the algorithms rsync >= 3.2 lists in its 'rsync --version' output
+    below ``<name> list:``, e.g. ``Compress list:`` or ``Checksum list:``.
+
+    Args:
+        data (str): 'rsync --version' output
+        name (str): 'Compress', 'Checksum' or 'Daemon auth'
+
+    Returns:
+        list:       names in order of preference or an empty list if rsync
+                    doesn't list them
+    """
+    if not data:
+        return []
+    m = re.search(r'^{} list:\n((?:[ \t]+.*\n?)+)'.format(re.escape(name)),
+                  data, re.MULTILINE)
+    if not m:
+        return []
+    # skip notes like '(xxhash)'
+    return [i for i in m.group(1).split() if not i.startswith('(')]
+
+
+#: preferred compressions in order for 'auto' and as fallback
+RSYNC_COMPRESS_ORDER = ('zstd', 'lz4', 'zlibx', 'zlib')
+#: link throughput in bytes/sec above which 'auto' doesn't compress
+COMPRESS_AUTO_FAST = 60 * 1024 * 1024
+#: link throughput in bytes/sec above which 'auto' uses the cheapest choice
+COMPRESS_AUTO_MEDIUM = 15 * 1024 * 1024
+#: link throughput in bytes/sec below which 'auto' compresses stronger
+COMPRESS_AUTO_SLOW = 2 * 1024 * 1024
+
+
+def rsyncAutoCompress(choices, throughput = None):
+    """
+    Choose compression and level for link ``throughput``. Fast links don't
+    gain anything from compression but would be limited by CPU time. Slow
+    links benefit from stronger compression.
+
+    Args:
+        choices (list):     compressions supported by local and remote rsync
+                            in order of preference. Empty for rsync < 3.2
+                            which only supports zlib
+        throughput (float): measured bytes/sec or ``None`` if unknown
+
+    Returns:
+        tuple:              (compression, level) with level 0 for the
+                            default level of the compression
+    """
+    if throughput is not None and throughput >= COMPRESS_AUTO_FAST:
+        return ('none', 0)
+
+    if throughput is not None and throughput >= COMPRESS_AUTO_MEDIUM:
+        order = ('lz4', 'zstd', 'zlibx', 'zlib')
+    else:
+        order = RSYNC_COMPRESS_ORDER
+    available = [c for c in order if c in choices] or ['zlib']
+    choice = available[0]
+
+    level = 0
+    if choice == 'zstd' and throughput is not None:
+        if throughput < COMPRESS_AUTO_SLOW:
+            level = 9
+        elif throughput >= COMPRESS_AUTO_MEDIUM:
+            level = 1
+    return (choice, level)
+
+
+def rsyncCompression(config, profile_id = None):
+    """
+    Get the compression configured in :py:func:`config.Config.sshCompress`
+    which both local and remote rsync support. 'auto' is resolved with
+    :py:func:`rsyncAutoCompress` and :py:func:`linkThroughput`.
+
+    Args:
+        config (config.Config): current config
+        profile_id (str):       profile ID
+
+    Returns:
+        tuple:                  (compression, level). ``('none', 0)`` if
+                                compression is disabled
+    """
+    choice = config.sshCompress(profile_id)
+    if not choice or choice == 'none':
+        return ('none', 0)
+
+    local = rsyncChoices(rsyncVersion(config), 'Compress')
+    if local:
+        remote = rsyncChoices(rsyncRemoteVersion(config, profile_id), 'Compress')
+        supported = [c for c in local if c != 'none' and (not remote or c in remote)]
+    else:
+        # rsync < 3.2 only knows zlib
+        supported = ['zlib']
+
+    if choice == 'auto':
+        return rsyncAutoCompress(supported, linkThroughput(config, profile_id))
+
+    if choice in supported:
+        return (choice, config.sshCompressLevel(profile_id))
+
+    fallback = ([c for c in RSYNC_COMPRESS_ORDER if c in supported] or ['zlib'])[0]
+    logger.warning('Compression {} is not supported by rsync on both hosts. '
+                   'Use {} instead.'.format(choice, fallback))
+    return (fallback, 0)
+
+
+def rsyncCompressArgs(config, profile_id = None):
+    """
+    Get rsync args for the compression returned by
+    :py:func:`rsyncCompression`.
+
+    Args:
+        config (config.Config): current config
+        profile_id (str):       profile ID
+
+    Returns:
+        list:                   rsync args or an empty list if compression
+                                is disabled
+    """
+    choice, level = rsyncCompression(config, profile_id)
+    if choice == 'none':
+        return []
+
+    cmd = ['--compress']
+    if rsyncChoices(rsyncVersion(config), 'Compress'):
+        cmd.append('--compress-choice={}'.format(choice))
+    if level:
+        cmd.append('--compress-level={}'.format(level))
+    skip = config.sshSkipCompress(profile_id)
+    if skip:
+        cmd.append('--skip-compress={}'.format(skip))
+    return cmd
+
+
+#: fast checksums in order of preference for --checksum runs
+RSYNC_CHECKSUM_ORDER = ('xxh128', 'xxh3', 'xxh64')
+
+
+def rsyncChecksumChoice(config, remote = True, profile_id = None):
+    """
+    Get the fastest checksum supported by the local rsync and, if
+    ``remote`` is ``True`` and the profile uses SSH, by the rsync on the
+    remote host. The remote side is taken from the cached output of the
+    remote probe (see :py:func:`rsyncRemoteVersion`).
+
+    Args:
+        config (config.Config): current config
+        remote (bool):          files are sent to the remote host
+        profile_id (str):       profile ID
+
+    Returns:
+        str:                    name for ``--checksum-choice`` or ``None``
+                                to leave the choice to rsync
+    """
+    local = rsyncChoices(rsyncVersion(config), 'Checksum')
+    if not local:
+        return None
+
+    supported = local
+    if remote and config.snapshotsMode(profile_id) in ('ssh', 'ssh_encfs'):
+        # don't force a checksum an unknown remote rsync might not have
+        supported = rsyncChoices(rsyncRemoteVersion(config, profile_id),
+                                 'Checksum')
+
+    for choice in RSYNC_CHECKSUM_ORDER:
+        if choice in local and choice in supported:
+            return choice
+    return None
+
+
+def rsyncRemoteCaps(config, profile_id = None, force = False):
+    """
+    Get capabilities of the rsync binary on the remote host of SSH profile
+    ``profile_id``. See :py:func:`rsyncCaps` and :py:func:`rsyncRemoteVersion`.
+
+    Args:
+        config (config.Config): current config
+        profile_id (str):       profile ID
+        force (bool):           probe again even if there are cached
+                                capabilities
+
+    Returns:
+        list:                   List of str with rsyncs capabilities or an
+                                empty list if the remote host couldn't be
+                                probed
+    """
+    data = rsyncRemoteVersion(config, profile_id, force)
+    if not data:
+        return []
+
+    return rsyncCaps(data = data)
+
+
+def readJsonCache(filename):
+    """
+    Load the json cache ``filename`` written by :py:func:`updateJsonCache`.
+
+    Args:
+        filename (str): full path of the cache file
+
+    Returns:
+        dict:           cache content or an empty dict if the file doesn't
+                        exist or is broken
+    """
+    try:
+        with open(filename, 'rt') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+    return cache
+
+
+def updateJsonCache(filename, key, value):
+    """
+    Set ``key`` in the json cache ``filename`` to ``value`` and keep all
+    other entries. The file is written under a unique temporary name in the
+    same folder and renamed into place, so concurrent writers (e.g. a
+    scheduled backup and the GUI) never see or produce a partial file.
+
+    Args:
+        filename (str): full path of the cache file
+        key (str):      cache key
+        value:          json serializable value or ``None`` to remove
+                        ``key``
+
+    Returns:
+        bool:           ``True`` if the cache was written
+    """
+    cache = readJsonCache(filename)
+    if value is None:
+        if cache.pop(key, None) is None:
+            return True
+    else:
+        cache[key] = value
+
+    tmp = None
+    try:
+        fd, tmp = tempfile.mkstemp(dir = os.path.dirname(filename),
+                                   prefix = os.path.basename(filename) + '.',
+                                   suffix = '.tmp')
+        with os.fdopen(fd, 'wt') as f:
+            json.dump(cache, f, indent = 1, sort_keys = True)
+        os.replace(tmp, filename)
+    except (OSError, TypeError, ValueError) as e:
+        logger.debug('Failed to save cache {}: {}'.format(filename, str(e)))
+        if tmp is not None:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        return False
+    return True
+
+
+# 'rsync --version' output of local binaries and remote hosts
+# see rsyncVersion() and rsyncRemoteVersion()
+_RSYNC_VERSION_CACHE = {}
+RSYNC_VERSION_CACHE_FILE = 'rsync_version.json'
+#: seconds until capabilities of remote hosts are probed again
+RSYNC_REMOTE_VERSION_TTL = 7 * 24 * 3600
+
+
+def _rsyncVersionCacheFile(config):
+    return os.path.join(config._LOCAL_DATA_FOLDER, RSYNC_VERSION_CACHE_FILE)
+
+
+def _rsyncVersionCacheGet(key, config, ttl = None):
+    """
+    Look up ``key`` in the process wide cache and then in the persistent
+    cache of ``config``.
+    """
+    entry = _RSYNC_VERSION_CACHE.get(key)
+    if entry is None and config is not None:
+        entry = readJsonCache(_rsyncVersionCacheFile(config)).get(key)
+
+    if not isinstance(entry, dict) or not isinstance(entry.get('version'), str):
+        return None
+
+    if ttl is not None and time.time() - entry.get('time', 0) > ttl:
+        return None
+
+    _RSYNC_VERSION_CACHE[key] = entry
+    return entry['version']
+
+
+def _rsyncVersionCacheSet(key, version, config):
+    entry = {'version': version, 'time': time.time()}
+    _RSYNC_VERSION_CACHE[key] = entry
+    if config is None:
+        return
+
+    updateJsonCache(_rsyncVersionCacheFile(config), key, entry)
+
+
+def rsyncVersion(config = None):
+    """
+    'rsync --version' output of the local rsync binary. The output is cached
+    for the whole process and, if ``config`` is given, persisted in the
+    local data folder. The cache is keyed by path, inode and mtime of the
+    binary so an updated rsync will be probed again.
+
+    Args:
+        config (config.Config): current config or ``None`` to only cache
+                                in memory
+
+    Returns:
+        str:                    output of 'rsync --version'
+    """
+    path = which('rsync')
+    try:
+        st = os.stat(path)
+        key = 'local:{}:{}:{}'.format(path, st.st_ino, st.st_mtime_ns)
+    except (OSError, TypeError):
+        key = None
+
+    if key is not None:
+        data = _rsyncVersionCacheGet(key, config)
+        if data is not None:
+            return data
+
+    proc = subprocess.Popen(['rsync', '--version'],
+                            stdout = subprocess.PIPE,
+                            universal_newlines = True)
+    data = proc.communicate()[0]
+
+    if key is not None and data:
+        _rsyncVersionCacheSet(key, data, config)
+
+    return data
+
+
+def _rsyncRemoteKey(user, host, port):
+    return 'remote:{}@{}:{}'.format(user, host, port)
+
+
+def setRsyncRemoteVersion(config, data, user, host, port):
+    """
+    Store 'rsync --version' output ``data`` of a remote host which was
+    probed some other way (see :py:mod:`remoteprobe`). It is returned by
+    :py:func:`rsyncRemoteVersion` afterwards.
+
+    Args:
+        config (config.Config): current config
+        data (str):             output of 'rsync --version'
+        user (str):             remote user
+        host (str):             remote host
+        port (int):             remote port
+    """
+    _rsyncVersionCacheSet(_rsyncRemoteKey(user, host, port), data, config)
+
+
+def rsyncRemoteVersion(config, profile_id = None, force = False):
+    """
+    'rsync --version' output of the rsync binary on the remote host of SSH
+    profile ``profile_id``. Cached per user, host and port for
+    :py:data:`RSYNC_REMOTE_VERSION_TTL` seconds.
+
+    Args:
+        config (config.Config): current config
+        profile_id (str):       profile ID
+        force (bool):           probe again even if there is a cached output
+
+    Returns:
+        str:                    output of 'rsync --version' or ``None`` if
+                                the remote host couldn't be probed
+    """
+    key = _rsyncRemoteKey(config.sshUser(profile_id),
+                          config.sshHost(profile_id),
+                          config.sshPort(profile_id))
+    if not force:
+        data = _rsyncVersionCacheGet(key, config, RSYNC_REMOTE_VERSION_TTL)
+        if data is not None:
+            return data
+
+    cmd = config.sshCommand(cmd = ['rsync', '--version'],
+                            nice = False,
+                            ionice = False,
+                            profile_id = profile_id)
+    try:
+        proc = subprocess.Popen(cmd,
+                                stdout = subprocess.PIPE,
+                                stderr = subprocess.DEVNULL,
+                                universal_newlines = True)
+        data = proc.communicate()[0]
+    except OSError as e:
+        logger.debug('Failed to probe remote rsync: {}'.format(str(e)))
+        return None
+
+    if proc.returncode or not data.startswith('rsync'):
+        logger.debug('Failed to probe remote rsync. '
+                     'Command returned {}'.format(proc.returncode))
+        return None
+
+    _rsyncVersionCacheSet(key, data, config)
+    return data
+
+
+# measured throughput of the links to remote hosts
+# see linkThroughput() and setLinkThroughput()
+LINK_THROUGHPUT_CACHE_FILE = 'ssh_link.json'
+#: seconds until a measured throughput is outdated
+LINK_THROUGHPUT_TTL = 30 * 24 * 3600
+
+
+def _linkThroughputFile(config):
+    return os.path.join(config._LOCAL_DATA_FOLDER, LINK_THROUGHPUT_CACHE_FILE)
+
+
+def linkThroughput(config, profile_id = None):
+    """
+    Throughput of the link to the remote host of SSH profile ``profile_id``
+    measured on earlier snapshots. See :py:func:`setLinkThroughput`.
+
+    Args:
+        config (config.Config): current config
+        profile_id (str):       profile ID
+
+    Returns:
+        float:                  bytes/sec or ``None`` if there is no
+                                recent measurement
+    """
+    key = _rsyncRemoteKey(config.sshUser(profile_id),
+                          config.sshHost(profile_id),
+                          config.sshPort(profile_id))
+    entry = readJsonCache(_linkThroughputFile(config)).get(key)
+    if not isinstance(entry, dict) \
+            or not isinstance(entry.get('throughput'), (int, float)):
+        return None
+    if time.time() - entry.get('time', 0) > LINK_THROUGHPUT_TTL:
+        return None
+    return entry['throughput']
+
+
+def setLinkThroughput(config, throughput, profile_id = None):
+    """
+    Store ``throughput`` measured while taking a snapshot of SSH profile
+    ``profile_id``. It is averaged with the recent measurement to smooth
+    out single slow or fast transfers.
+
+    Args:
+        config (config.Config): current config
+        throughput (float):     bytes/sec
+        profile_id (str):       profile ID
+    """
+    key = _rsyncRemoteKey(config.sshUser(profile_id),
+                          config.sshHost(profile_id),
+                          config.sshPort(profile_id))
+    recent = linkThroughput(config, profile_id)
+    if recent is not None:
+        throughput = (recent + throughput) / 2
+
+    updateJsonCache(_linkThroughputFile(config), key,
+                    {'throughput': throughput, 'time': time.time()})
+
+
 def rsyncPrefix(config,
                 no_perms=True,
                 use_mode=['ssh', 'ssh_encfs'],
@@ -912,7 +1376,7 @@ def rsyncPrefix(config,
         list:                   rsync command with all args but without
                                 --include, --exclude, source and destination
     """
-    caps = rsyncCaps()
+    caps = rsyncCaps(config = config)
     cmd = []
 
     if config.nocacheOnLocal():
@@ -939,6 +1403,12 @@ def rsyncPrefix(config,
 
     if config.useChecksum() or config.forceUseChecksum:
         cmd.append('--checksum')
+        mode = config.snapshotsMode()
+        choice = rsyncChecksumChoice(config,
+                                     remote = mode in ['ssh', 'ssh_encfs']
+                                              and mode in use_mode)
+        if choice:
+            cmd.append('--checksum-choice={}'.format(choice))
 
     if config.copyUnsafeLinks():
         cmd.append('--copy-unsafe-links')
@@ -974,6 +1444,10 @@ def rsyncPrefix(config,
     if config.bwlimitEnabled():
         cmd.append('--bwlimit=%d' % config.bwlimit())
 
+    mode = config.snapshotsMode()
+    if mode in ['ssh', 'ssh_encfs'] and mode in use_mode:
+        cmd.extend(rsyncCompressArgs(config))
+
     if config.rsyncOptionsEnabled():
         cmd.extend(shlex.split(config.rsyncOptions()))
 
@@ -981,6 +1455,22 @@ def rsyncPrefix(config,
     return cmd
 
 
+def rsyncUnescape(name):
+    """
+    Revert the escaping of non-printable characters (``\\#ooo``) rsync does
+    on file names in its output unless ``--8-bit-output`` is used.
+
+    Args:
+        name (str): file name from rsync's output
+
+    Returns:
+        bytes:      raw file name
+    """
+    return re.sub(rb'\\#([0-7]{3})',
+                  lambda m: bytes((int(m.group(1), 8), )),
+                  name.encode())
+
+
 def rsyncSshArgs(config, use_mode=['ssh', 'ssh_encfs']):
     """
     Get SSH args for rsync based on current profile in ``config``.
@@ -1074,6 +1564,204 @@ def md5sum(path):
             md5.update(data)
     return md5.hexdigest()
 
+#: buffer size used by :py:func:`fileDigest`
+DIGEST_BUFFER_SIZE = 1024 * 1024
+
+def fileDigest(path):
+    """
+    Calculate a BLAKE2 digest for file in ``path``. This is a lot faster than
+    :py:func:`md5sum` and reads the file in large chunks. ``hashlib`` releases
+    the GIL while hashing so several files can be hashed in parallel threads.
+
+    Args:
+        path (str): full path to file
+
+    Returns:
+        str:        hex digest of file
+    """
+    digest = hashlib.blake2b()
+    buf = bytearray(DIGEST_BUFFER_SIZE)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering = 0) as f:
+        while True:
+            size = f.readinto(buf)
+            if not size:
+                break
+            digest.update(view[:size])
+    return digest.hexdigest()
+
+class DigestCache(object):
+    """
+    Persistent cache for :py:func:`fileDigest`. Digests are keyed by device,
+    inode, size and mtime of the file. Hardlinked files in different
+    snapshots share the same inode and are only hashed once. A file changed
+    in place gets a new mtime and will be hashed again.
+
+    Args:
+        filename (str): json file to load and save the cache. If ``None``
+                        the cache is only kept in memory
+        workers (int):  number of threads used by :py:func:`digestMany`
+    """
+    #: maximum number of digests kept. Oldest are dropped first
+    MAX_ENTRIES = 100000
+    FILENAME = 'digest_cache.json'
+
+    def __init__(self, filename = None, workers = None):
+        self.filename = filename
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self._cache = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(st):
+        """
+        Cache key for :py:class:`os.stat_result` ``st``.
+        """
+        return '{}:{}:{}:{}'.format(st.st_dev, st.st_ino,
+                                    st.st_size, st.st_mtime_ns)
+
+    def _load(self):
+        if self._cache is not None:
+            return self._cache
+
+        self._cache = {}
+        if self.filename:
+            try:
+                with open(self.filename, 'rt') as f:
+                    cache = json.load(f)
+                if isinstance(cache, dict):
+                    self._cache = cache
+            except (OSError, ValueError) as e:
+                if not isinstance(e, FileNotFoundError):
+                    logger.debug('Failed to load digest cache {}: {}'.format(
+                                 self.filename, str(e)), self)
+        return self._cache
+
+    def get(self, st):
+        """
+        Cached digest for :py:class:`os.stat_result` ``st`` or ``None``.
+        """
+        with self._lock:
+            return self._load().get(self.key(st))
+
+    def set(self, st, digest):
+        """
+        Store ``digest`` for :py:class:`os.stat_result` ``st``.
+        """
+        with self._lock:
+            cache = self._load()
+            key = self.key(st)
+            if cache.get(key) == digest:
+                return
+            # re-insert to keep the newest entries at the end
+            cache.pop(key, None)
+            cache[key] = digest
+            while len(cache) > self.MAX_ENTRIES:
+                del cache[next(iter(cache))]
+            self._dirty = True
+
+    def digest(self, path, st = None):
+        """
+        Digest of file ``path``. Take it from cache if possible.
+
+        Args:
+            path (str):             full path to file
+            st (os.stat_result):    stat of ``path`` if already known
+
+        Returns:
+            str:                    hex digest of file
+        """
+        if st is None:
+            st = os.stat(path)
+        digest = self.get(st)
+        if digest is None:
+            digest = fileDigest(path)
+            self.set(st, digest)
+        return digest
+
+    def digestMany(self, paths):
+        """
+        Digests of all files in ``paths``. Files which are not in cache are
+        hashed in a pool of :py:attr:`workers` threads. Files which can't be
+        read are left out.
+
+        Args:
+            paths (list):   full paths to files
+
+        Returns:
+            dict:           digest for every path
+        """
+        ret = {}
+        missing = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            digest = self.get(st)
+            if digest is None:
+                missing.append((path, st))
+            else:
+                ret[path] = digest
+
+        def run(item):
+            path, st = item
+            try:
+                return path, st, fileDigest(path)
+            except OSError:
+                return path, st, None
+
+        if len(missing) > 1 and self.workers > 1:
+            with ThreadPoolExecutor(max_workers = self.workers,
+                                    thread_name_prefix = 'DigestCache') as pool:
+                results = list(pool.map(run, missing))
+        else:
+            results = [run(i) for i in missing]
+
+        for path, st, digest in results:
+            if digest is not None:
+                self.set(st, digest)
+                ret[path] = digest
+        return ret
+
+    def save(self):
+        """
+        Write the cache to :py:attr:`filename` if it has changed.
+        """
+        with self._lock:
+            if not self.filename or not self._dirty:
+                return
+            try:
+                with open(self.filename + '.tmp', 'wt') as f:
+                    json.dump(self._cache, f)
+                os.replace(self.filename + '.tmp', self.filename)
+                self._dirty = False
+            except OSError as e:
+                logger.debug('Failed to save digest cache {}: {}'.format(
+                             self.filename, str(e)), self)
+
+_DIGEST_CACHES = {}
+
+def digestCache(config = None):
+    """
+    Process wide :py:class:`DigestCache`. If ``config`` is given the cache is
+    persisted in the local data folder.
+
+    Args:
+        config (config.Config): current config or ``None`` to only cache
+                                in memory
+
+    Returns:
+        DigestCache:            shared cache instance
+    """
+    filename = None
+    if config is not None:
+        filename = os.path.join(config._LOCAL_DATA_FOLDER, DigestCache.FILENAME)
+    if filename not in _DIGEST_CACHES:
+        _DIGEST_CACHES[filename] = DigestCache(filename)
+    return _DIGEST_CACHES[filename]
+
 def checkCronPattern(s):
     """
     Check if ``s`` is a valid cron pattern.
@@ -1885,7 +2573,7 @@ class UniquenessSet:
 
     Args:
         dc (bool):              if ``True`` use deep check which will compare
-                                files md5sums if they are of same size but no
+                                files digests if they are of same size but no
                                 hardlinks (don't have the same inode).
                                 If ``False`` use files size and mtime
         follow_symlink (bool):  if ``True`` check symlinks target instead of the
@@ -1893,20 +2581,80 @@ class UniquenessSet:
         list_equal_to (str):    full path to file. If not empty only return
                                 equal files to the given path instead of
                                 unique files.
+        cache (DigestCache):    cache for file digests. If ``None`` a new
+                                in-memory cache is used
     """
-    def __init__(self, dc = False, follow_symlink = False, list_equal_to = ''):
+    def __init__(self, dc = False, follow_symlink = False, list_equal_to = '',
+                 cache = None):
         self.deep_check = dc
         self.follow_sym = follow_symlink
-        self._uniq_dict = {}      # if not self._uniq_dict[size] -> size already checked with md5sum
+        self.cache = cache if cache is not None else DigestCache()
+        self._uniq_dict = {}      # if not self._uniq_dict[size] -> size already checked with digest
         self._size_inode = set()  # if (size,inode) in self._size_inode -> path is a hlink
+        self._digests = {}        # digests calculated by prefetch()
         self.list_equal_to = list_equal_to
         if list_equal_to:
             st = os.stat(list_equal_to)
             if self.deep_check:
-                self.reference = (st.st_size, md5sum(list_equal_to))
+                self.reference = (st.st_size, self.cache.digest(list_equal_to, st))
             else:
                 self.reference = (st.st_size, int(st.st_mtime))
 
+    def _path(self, input_path):
+        if self.follow_sym and os.path.islink(input_path):
+            return os.readlink(input_path)
+        return input_path
+
+    def _digest(self, path):
+        digest = self._digests.pop(path, None)
+        if digest is None:
+            digest = self.cache.digest(path)
+        return digest
+
+    def prefetch(self, input_paths):
+        """
+        Calculate digests of all files in ``input_paths`` which
+        :py:func:`check` would need in deep check mode, in parallel. Files
+        are not hashed if they are hardlinks of an other file or if they have
+        a size unique among all files. This doesn't change the result of
+        :py:func:`check`, but the files need to be checked in the same order
+        afterwards.
+
+        Args:
+            input_paths (list): full paths to files
+        """
+        if not self.deep_check:
+            return
+
+        hashing = []
+        if self.list_equal_to:
+            for path in map(self._path, input_paths):
+                try:
+                    if os.stat(path).st_size == self.reference[0]:
+                        hashing.append(path)
+                except OSError:
+                    pass
+        else:
+            size_inode = set(self._size_inode)
+            bySize = {}
+            for size, prev in self._uniq_dict.items():
+                if isinstance(size, int) and prev:
+                    bySize[size] = [prev]
+            for path in map(self._path, input_paths):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if (st.st_size, st.st_ino) in size_inode:
+                    continue
+                size_inode.add((st.st_size, st.st_ino))
+                bySize.setdefault(st.st_size, []).append(path)
+            for size, paths in bySize.items():
+                if len(paths) > 1 or size in self._uniq_dict:
+                    hashing.extend(paths)
+
+        self._digests.update(self.cache.digestMany(hashing))
+
     def check(self, input_path):
         """
         Check file ``input_path`` for either uniqueness or equality
@@ -1922,9 +2670,7 @@ class UniquenessSet:
                                 ``list_equal_to``
         """
         # follow symlinks ?
-        path = input_path
-        if self.follow_sym and os.path.islink(input_path):
-            path = os.readlink(input_path)
+        path = self._path(input_path)
 
         if self.list_equal_to:
             return self.checkEqual(path)
@@ -1957,13 +2703,13 @@ class UniquenessSet:
             else:
                 prev = self._uniq_dict[size]
                 if prev:
-                    # store md5sum instead of previously stored size
-                    md5sum_prev = md5sum(prev)
+                    # store digest instead of previously stored size
+                    digest_prev = self._digest(prev)
                     self._uniq_dict[size] = None
-                    self._uniq_dict[md5sum_prev] = prev
-                    logger.debug("[deep test]: size duplicate, remove the size, store prev md5sum", self)
-                unique_key = md5sum(path)
-                logger.debug("[deep test]: store current md5sum?", self)
+                    self._uniq_dict[digest_prev] = prev
+                    logger.debug("[deep test]: size duplicate, remove the size, store prev digest", self)
+                unique_key = self._digest(path)
+                logger.debug("[deep test]: store current digest?", self)
         else:
             # store a tuple of (size, modification time)
             obj  = os.stat(path)
@@ -1990,7 +2736,7 @@ class UniquenessSet:
         st = os.stat(path)
         if self.deep_check:
             if self.reference[0] == st.st_size:
-                return self.reference[1] == md5sum(path)
+                return self.reference[1] == self._digest(path)
             return False
         else:
             return self.reference == (st.st_size, int(st.st_mtime))
@@ -2630,6 +3376,87 @@ class Execute(object):
             logger.info('Kill process "%s"' %self.printable_cmd, self.parent, 2)
             return self.currentProc.kill()
 
+class ExecuteParallel(object):
+    """
+    Run multiple :py:class:`Execute` instances at the same time, each in its
+    own thread. Callbacks and filters are serialized with a lock so they can
+    share their ``user_data`` and don't need to be thread safe.
+
+    Args:
+        procs (list):   :py:class:`Execute` instances
+
+    Note:
+        Signals SIGTSTP ("keyboard stop") and SIGCONT send to Python
+        main process will be forwarded to all commands.
+        SIGHUP will kill all of them.
+    """
+    def __init__(self, procs):
+        self.procs = procs
+        self.lock = threading.Lock()
+
+        for proc in procs:
+            if proc.callback:
+                proc.callback = self._locked(proc.callback)
+            proc.filters = tuple(self._locked(f) for f in proc.filters)
+
+    def _locked(self, func):
+        def wrapper(*args):
+            with self.lock:
+                return func(*args)
+
+        return wrapper
+
+    def run(self):
+        """
+        Start all commands and wait until they are finished.
+
+        Returns:
+            list:   return codes of the commands in the same order as
+                    ``procs``
+        """
+        ret = [None] * len(self.procs)
+
+        def worker(i):
+            ret[i] = self.procs[i].run()
+
+        try:
+            # Execute.run() can't register signals outside of the main thread
+            signal.signal(signal.SIGTSTP, self.pause)
+            signal.signal(signal.SIGCONT, self.resume)
+            signal.signal(signal.SIGHUP, self.kill)
+        except ValueError:
+            # signal only work in qt main thread
+            pass
+
+        threads = [threading.Thread(target=worker, args=(i, ), daemon=True)
+                   for i in range(len(self.procs))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        try:
+            signal.signal(signal.SIGTSTP, signal.SIG_DFL)
+            signal.signal(signal.SIGCONT, signal.SIG_DFL)
+            signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        except ValueError:
+            pass
+
+        # a worker thread which died with an exception has no return code
+        return [-1 if i is None else i for i in ret]
+
+    def pause(self, signum, frame):
+        for proc in self.procs:
+            proc.pause(signum, frame)
+
+    def resume(self, signum, frame):
+        for proc in self.procs:
+            proc.resume(signum, frame)
+
+    def kill(self, signum, frame):
+        for proc in self.procs:
+            proc.kill(signum, frame)
+
 class Daemon:
     """
     A generic daemon class.
@@ -0,0 +1,251 @@
+#    Back In Time
+#    Copyright (C) 2008-2022 Oprea Dan, Bart de Koning, Richard Bailey,
+#    Germar Reitze
+#
+#    This program is free software; you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation; either version 2 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License along
+#    with this program; if not, write to the Free Software Foundation, Inc.,
+#    51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Parallel removal of local directory trees.
+
+Snapshots on remote hosts are removed by syncing an empty folder onto them
+with ``rsync --delete``. For local snapshots that is one traversal too much:
+rsync walks the whole tree to delete it and :py:func:`shutil.rmtree` walks it
+again to remove the empty folders.
+
+:py:class:`TreeRemover` walks the tree only once. Every folder is one task
+for a bounded thread pool. A task lists the folder with :py:func:`os.scandir`
+on an open file descriptor, unlinks all files relative to that descriptor and
+queues its subfolders. A folder is removed as soon as the last of its
+subfolders is gone. Several trees can share the same pool and are removed
+concurrently.
+
+Permissions are only touched if an unlink fails. Snapshot folders are read
+only, so the owner write bit of a folder is set the first time removing one
+of its entries fails with :py:data:`errno.EACCES` or :py:data:`errno.EPERM`.
+"""
+
+import os
+import stat
+import errno
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import logger
+
+_OPEN_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+
+
+class _Folder:
+    """
+    One folder which is removed as soon as ``pending`` drops to zero.
+    """
+    __slots__ = ('path', 'parent', 'pending', 'root')
+
+    def __init__(self, path, parent, root):
+        self.path = path
+        self.parent = parent
+        self.root = root
+        # the folder's own task plus one for every subfolder
+        self.pending = 1
+
+
+class _Root(object):
+    """
+    State of one tree passed to :py:func:`TreeRemover.removeMany`.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.errors = []
+        self.done = threading.Event()
+
+
+class TreeRemover(object):
+    """
+    Remove local directory trees with a pool of ``workers`` threads.
+
+    Args:
+        workers (int):          number of threads
+        callback (method):      called with the number of removed files and
+                                folders every ``interval`` seconds while
+                                removing
+        interval (float):       seconds between two ``callback`` calls
+    """
+    INTERVAL = 1.0
+
+    def __init__(self, workers=4, callback=None, interval=INTERVAL):
+        self.workers = max(1, workers)
+        self.callback = callback
+        self.interval = interval
+        self.removed = 0
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def remove(self, path):
+        """
+        Remove ``path`` and everything underneath it.
+
+        Args:
+            path (str):     folder to remove
+
+        Returns:
+            bool:           ``True`` if ``path`` was removed completely
+        """
+        return self.removeMany([path])[path]
+
+    def removeMany(self, paths):
+        """
+        Remove all ``paths`` concurrently.
+
+        Args:
+            paths (list):   folders to remove
+
+        Returns:
+            dict:           ``True`` or ``False`` for every path depending
+                            on whether it was removed completely
+        """
+        roots = [_Root(p) for p in paths]
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix='TreeRemover') as pool:
+            self._pool = pool
+            for root in roots:
+                path = os.fsencode(root.path)
+                if os.path.islink(path) or not os.path.isdir(path):
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        root.errors.append(e)
+                    root.done.set()
+                    continue
+
+                self._submit(_Folder(path, None, root))
+
+            for root in roots:
+                while not root.done.wait(self.interval):
+                    self._report()
+        self._pool = None
+        self._report()
+
+        ret = {}
+        for root in roots:
+            for e in root.errors:
+                logger.error('Failed to remove {}: {}'.format(root.path, e),
+                             self)
+            ret[root.path] = not root.errors
+        return ret
+
+    def _report(self):
+        if self.callback:
+            self.callback(self.removed)
+
+    def _submit(self, folder):
+        self._pool.submit(self._run, folder)
+
+    def _run(self, folder):
+        try:
+            self._scan(folder)
+        except Exception as e:
+            folder.root.errors.append(e)
+        self._release(folder)
+
+    def _scan(self, folder):
+        """
+        Unlink all files in ``folder`` and queue its subfolders.
+        """
+        try:
+            fd = os.open(folder.path, _OPEN_FLAGS)
+        except FileNotFoundError:
+            return
+        except PermissionError:
+            # folder without read or execute permission
+            os.chmod(folder.path, stat.S_IRWXU)
+            fd = os.open(folder.path, _OPEN_FLAGS)
+
+        subfolders = []
+        removed = 0
+        writable = False
+        try:
+            with os.scandir(fd) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subfolders.append(entry.name)
+                        continue
+
+                    try:
+                        os.unlink(entry.name, dir_fd=fd)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        if writable or e.errno not in (errno.EACCES,
+                                                       errno.EPERM):
+                            raise
+                        self._makeWritable(fd)
+                        writable = True
+                        os.unlink(entry.name, dir_fd=fd)
+                    removed += 1
+
+            if subfolders and not writable:
+                # subfolders can only be removed from a writable folder
+                self._makeWritable(fd)
+        finally:
+            os.close(fd)
+
+        with self._lock:
+            self.removed += removed
+            folder.pending += len(subfolders)
+
+        for name in subfolders:
+            self._submit(_Folder(os.path.join(folder.path, os.fsencode(name)),
+                                 folder,
+                                 folder.root))
+
+    @staticmethod
+    def _makeWritable(fd):
+        mode = os.fstat(fd).st_mode
+        if mode & stat.S_IRWXU != stat.S_IRWXU:
+            os.fchmod(fd, stat.S_IMODE(mode) | stat.S_IRWXU)
+
+    def _release(self, folder):
+        """
+        Decrease the pending counter of ``folder`` and remove it and all of
+        its parents which have no pending tasks left.
+        """
+        while folder is not None:
+            with self._lock:
+                folder.pending -= 1
+                if folder.pending:
+                    return
+
+            try:
+                self._rmdir(folder)
+            except Exception as e:
+                folder.root.errors.append(e)
+
+            if folder.parent is None:
+                folder.root.done.set()
+            folder = folder.parent
+
+    def _rmdir(self, folder):
+        head, tail = os.path.split(folder.path)
+        fd = os.open(head, _OPEN_FLAGS)
+        try:
+            os.rmdir(tail, dir_fd=fd)
+        except FileNotFoundError:
+            pass
+        else:
+            with self._lock:
+                self.removed += 1
+        finally:
+            os.close(fd)
@@ -115,6 +115,7 @@ class MainWindow(QMainWindow):
         self.snapshots = snapshots.Snapshots(config)
 
         self.lastTakeSnapshotMessage = None
+        self.progressRecord = progress.ProgressRecord(self.config)
         self.tmpDirs = []
         self.firstUpdateAll = True
         self.disableProfileChanged = False
@@ -983,8 +984,8 @@ class MainWindow(QMainWindow):
                            self.act_stop_take_snapshot):
                 action.setVisible(False)
 
-            # TODO: check if there is a more elegant way than always get a
-            # new snapshot list which is very expensive (time)
+            # cheap as long as the snapshots folder didn't change because
+            # the list comes from the snapshot catalog
             snapshotsList = snapshots.listSnapshots(self.config)
 
             if snapshotsList != self.snapshotsList:
@@ -1017,12 +1018,17 @@ class MainWindow(QMainWindow):
 
             self.status.setText(message)
 
-        pg = progress.ProgressFile(self.config)
-        if pg.fileReadable():
+        # the profile might have changed
+        if self.progressRecord.filename \
+                != self.config.takeSnapshotProgressRecordFile():
+            self.progressRecord.close()
+            self.progressRecord = progress.ProgressRecord(self.config)
+
+        pg = self.progressRecord.read()
+        if pg is not None:
             self.progressBar.setVisible(True)
             self.progressBarDummy.setVisible(False)
-            pg.load()
-            self.progressBar.setValue(pg.intValue('percent'))
+            self.progressBar.setValue(pg.percent)
             message = ' | '.join(self.getProgressBarFormat(pg, message))
             self.status.setText(message)
         else:
@@ -1176,11 +1182,13 @@ class MainWindow(QMainWindow):
             thread = FillTimeLineThread(self)
             thread.addSnapshot.connect(self.timeLine.addSnapshot)
             thread.finished.connect(self.timeLine.checkSelection)
+            thread.finished.connect(self.timeLine.updateSizes)
             thread.start()
         else:
             for sid in self.snapshotsList:
                 item = self.timeLine.addSnapshot(sid)
             self.timeLine.checkSelection()
+            self.timeLine.updateSizes()
 
     def btnTakeSnapshotClicked(self):
         backintime.takeSnapshotAsync(self.config)
@@ -53,6 +53,7 @@ class QtSysTrayIcon:
         self.snapshots = snapshots.Snapshots()
         self.config = self.snapshots.config
         self.decode = None
+        self.progressRecord = None
 
         if len(sys.argv) > 1:
             if not self.config.setCurrentProfile(sys.argv[1]):
@@ -184,10 +185,12 @@ class QtSysTrayIcon:
                                                          ))
                 self.status_icon.setToolTip(message[1])
 
-        pg = progress.ProgressFile(self.config)
-        if pg.fileReadable():
-            pg.load()
-            percent = pg.intValue('percent')
+        if self.progressRecord is None:
+            self.progressRecord = progress.ProgressRecord(self.config)
+
+        pg = self.progressRecord.read()
+        if pg is not None:
+            percent = pg.percent
             ## disable progressbar in icon until BiT has it's own icon
             ## fixes bug #902
             # if percent != self.progressBar.value():
@@ -38,7 +38,7 @@ from PyQt6.QtCore import (QDir, Qt, pyqtSlot, pyqtSignal, QModelIndex,
 from PyQt6.QtWidgets import (QFileDialog, QAbstractItemView, QListView,
                              QTreeView, QDialog, QApplication, QStyleFactory,
                              QTreeWidget, QTreeWidgetItem, QComboBox,
-                             QSystemTrayIcon)
+                             QSystemTrayIcon, QHeaderView)
 from datetime import (datetime, date, timedelta)
 from calendar import monthrange
 from packaging.version import Version
@@ -47,6 +47,7 @@ from qttools_path import registerBackintimePath
 registerBackintimePath('common')
 import snapshots  # noqa: E402
 import tools  # noqa: E402
+import progress  # noqa: E402
 import logger  # noqa: E402
 
 
@@ -354,11 +355,19 @@ class TimeLine(QTreeWidget):
         self.setRootIsDecorated(False)
         self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
-        self.setHeaderLabels([_('Snapshots'), 'foo'])
+        self.setHeaderLabels([_('Snapshots'), 'foo', _('Size')])
         self.setSortingEnabled(True)
         self.sortByColumn(1, Qt.SortOrder.DescendingOrder)
         self.hideColumn(1)
+        self.headerItem().setToolTip(
+            2, _('Data added by the snapshot. Unchanged files are shared '
+                 'with older snapshots.'))
         self.header().setSectionsClickable(False)
+        self.header().setStretchLastSection(False)
+        self.header().setSectionResizeMode(
+            0, QHeaderView.ResizeMode.Stretch)
+        self.header().setSectionResizeMode(
+            2, QHeaderView.ResizeMode.ResizeToContents)
 
         self.parent = parent
         self.snapshots = parent.snapshots
@@ -483,6 +492,19 @@ class TimeLine(QTreeWidget):
         if self.currentItem() is None:
             self.selectRootItem()
 
+    def updateSizes(self):
+        """
+        Show the size of all snapshots. The figures are recorded when a
+        snapshot is taken and read from the snapshot catalog.
+        """
+        items = [item for item in self.iterSnapshotItems()
+                 if not item.snapshotID().isRoot]
+        sizes = snapshots.snapshotSizes(
+            self.parent.config, [item.snapshotID() for item in items])
+
+        for item in items:
+            item.setSize(sizes[item.snapshotID()])
+
     def selectRootItem(self):
         self.setCurrentItem(self.rootItem)
 
@@ -557,6 +579,19 @@ class SnapshotItem(TimeLineItem):
         sid = self.snapshotID()
         self.setText(0, sid.displayName)
 
+    def setSize(self, size):
+        if size is None:
+            self.setText(2, '')
+            return
+
+        self.setText(2, progress.formatSize(size.newBytes))
+        self.setToolTip(
+            2,
+            _('Total: {total}, new: {new}, shared: {shared}').format(
+                total=progress.formatSize(size.totalBytes),
+                new=progress.formatSize(size.newBytes),
+                shared=progress.formatSize(size.sharedBytes)))
+
 
 class HeaderItem(TimeLineItem):
     def __init__(self, name, sid):
@@ -198,6 +198,8 @@ class SnapshotsDialog(QDialog):
             self.cbDeepCheck.hide()
 
         #update list and combobox
+        self.filterThread = None
+        self.comboThread = None
         self.UpdateSnapshotsAndComboEqualTo()
 
     def addSnapshot(self, sid):
@@ -210,6 +212,30 @@ class SnapshotsDialog(QDialog):
             self.comboDiff.setCurrentSnapshotID(sid)
         self.comboDiff.checkSelection()
 
+    def startFilterThread(self, old, slot, finished, *args):
+        """
+        Cancel the running filter thread ``old`` and start a new one.
+
+        Args:
+            old (FilterSnapshotsThread):    previous thread or ``None``
+            slot (method):                  called with every snapshot ID
+                                            which passed the filter
+            finished (method):              called when the thread finished
+            *args:                          arguments for
+                                            :py:func:`snapshots.Snapshots.iterFilter`
+
+        Returns:
+            FilterSnapshotsThread:          the new thread
+        """
+        if old is not None:
+            old.requestInterruption()
+
+        thread = FilterSnapshotsThread(self, *args)
+        thread.addSnapshot.connect(slot)
+        thread.finished.connect(finished)
+        thread.start()
+        return thread
+
     def updateSnapshots(self):
         self.timeLine.clear()
         self.comboDiff.clear()
@@ -219,26 +245,40 @@ class SnapshotsDialog(QDialog):
             equal_to = equal_to_sid.pathBackup(self.path)
         else:
             equal_to = False
-        snapshotsFiltered = self.snapshots.filter(self.sid, self.path,
-                                self.snapshotsList,
+        self.filterThread = self.startFilterThread(
+                                self.filterThread,
+                                self.filteredSnapshot,
+                                self.filterFinished,
                                 self.cbOnlyDifferentSnapshots.isChecked(),
                                 self.cbDeepCheck.isChecked(),
                                 equal_to)
-        for sid in snapshotsFiltered:
+
+    def filteredSnapshot(self, sid):
+        # ignore results of canceled threads which were already queued
+        if self.sender() is self.filterThread:
             self.addSnapshot(sid)
 
-        self.updateToolbar()
+    def filterFinished(self):
+        if self.sender() is self.filterThread:
+            self.updateToolbar()
 
     def UpdateComboEqualTo(self):
         self.comboEqualTo.clear()
-        snapshotsFiltered = self.snapshots.filter(self.sid, self.path, self.snapshotsList)
-        for sid in snapshotsFiltered:
-            self.comboEqualTo.addSnapshotID(sid)
+        self.comboThread = self.startFilterThread(self.comboThread,
+                                                  self.comboEqualToSnapshot,
+                                                  self.comboEqualToFinished)
+
+    def comboEqualToSnapshot(self, sid):
+        if self.sender() is not self.comboThread:
+            return
+        self.comboEqualTo.addSnapshotID(sid)
 
-            if sid == self.sid:
-                self.comboEqualTo.setCurrentSnapshotID(sid)
+        if sid == self.sid:
+            self.comboEqualTo.setCurrentSnapshotID(sid)
 
-        self.comboEqualTo.checkSelection()
+    def comboEqualToFinished(self):
+        if self.sender() is self.comboThread:
+            self.comboEqualTo.checkSelection()
 
     def UpdateSnapshotsAndComboEqualTo(self):
         self.updateSnapshots()
@@ -357,7 +397,9 @@ class SnapshotsDialog(QDialog):
         DiffOptionsDialog(self).exec()
 
     def comboEqualToChanged(self, index):
-        self.updateSnapshots()
+        # the reference file is only used for equal snapshots
+        if self.cbOnlyEqualSnapshots.isChecked():
+            self.updateSnapshots()
 
     def btnDeleteClicked(self):
         items = self.timeLine.selectedItems()
@@ -420,6 +462,35 @@ class SnapshotsDialog(QDialog):
             self.sid = sid
         super(SnapshotsDialog, self).accept()
 
+    def done(self, result):
+        # threads must not outlive the dialog
+        for thread in self.findChildren(FilterSnapshotsThread):
+            thread.requestInterruption()
+        for thread in self.findChildren(FilterSnapshotsThread):
+            thread.wait()
+        super(SnapshotsDialog, self).done(result)
+
+class FilterSnapshotsThread(QThread):
+    """
+    filter snapshots in background thread so GUI will not freeze.
+    Snapshots are emitted as soon as they passed the filter.
+    """
+    addSnapshot = pyqtSignal(snapshots.SID)
+    def __init__(self, parent, *args):
+        self.snapshots = parent.snapshots
+        self.sid = parent.sid
+        self.path = parent.path
+        self.snapshotsList = list(parent.snapshotsList)
+        self.args = args
+        super(FilterSnapshotsThread, self).__init__(parent)
+
+    def run(self):
+        for sid in self.snapshots.iterFilter(self.sid, self.path,
+                                             self.snapshotsList,
+                                             *self.args,
+                                             cancel = self.isInterruptionRequested):
+            self.addSnapshot.emit(sid)
+
 class RemoveFileThread(QThread):
     """
     remove files in background thread so GUI will not freeze